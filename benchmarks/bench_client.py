@@ -0,0 +1,171 @@
+"""
+Throughput benchmarks for the main client operations, run against a local fake Vidispine server.
+
+Needs pytest-benchmark.  From the top of the repository:
+
+python -m pytest benchmarks/ --benchmark-autosave          #record a run
+python -m pytest benchmarks/ --benchmark-compare           #compare with the last saved run
+
+Add --benchmark-compare-fail=mean:10% to fail if anything has become more than 10% slower.
+"""
+import io
+import os
+import tempfile
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from gnmvidispine.vidispine_api import VSApi
+from gnmvidispine.vs_item import VSItem
+from gnmvidispine.vs_job import VSFindJobs, VSJobSet
+from gnmvidispine.vs_search import VSItemSearch
+from gnmvidispine.vs_storage import VSStorage
+
+
+def bench_item_populate(benchmark, connection_args):
+    item = VSItem(**connection_args)
+    benchmark(item.populate, "VX-10")
+    assert item.name == "VX-10"
+
+
+def bench_item_populate_many(benchmark, connection_args):
+    ids = ["VX-{0}".format(n) for n in range(1, 201)]
+    items = benchmark(VSItem(**connection_args).populate_many, ids)
+    assert len(items) == 200
+
+
+@pytest.mark.parametrize("populate", [False, True])
+def bench_search_full_scan(benchmark, connection_args, populate):
+    search = VSItemSearch(**connection_args)
+    search.addCriterion({'title': 'anything'})
+
+    def scan():
+        return sum(1 for i in search.execute().results(shouldPopulate=populate))
+    assert benchmark(scan) == 2000
+
+
+def bench_search_fields(benchmark, connection_args):
+    search = VSItemSearch(**connection_args)
+    search.addCriterion({'title': 'anything'})
+
+    def scan():
+        return sum(1 for i in search.execute().results(shouldPopulate=True, fields=["field_0", "field_1"]))
+    assert benchmark(scan) == 2000
+
+
+@pytest.mark.parametrize("inline", [False, True])
+def bench_search_hydrated(benchmark, connection_args, inline):
+    """
+    title, original shape and thumbnails for the first 100 hits, by separate requests or inlined in the search
+    """
+    search = VSItemSearch(**connection_args)
+    search.addCriterion({'title': 'anything'})
+    if inline:
+        search.setContent(["metadata", "shape", "thumbnail"])
+
+    def scan():
+        n = 0
+        for item in search.execute().results(shouldPopulate=True):
+            item.get("field_0")
+            list(item.get_shape("original").fileURIs())
+            item.thumbnails().count()
+            n += 1
+            if n == 100:
+                break
+        return n
+    assert benchmark(scan) == 100
+
+
+def bench_search_prefetch(benchmark, connection_args):
+    search = VSItemSearch(**connection_args)
+    search.addCriterion({'title': 'anything'})
+
+    def scan():
+        return sum(1 for i in search.execute().results(shouldPopulate=False, prefetch=4))
+    assert benchmark(scan) == 2000
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def bench_storage_files(benchmark, connection_args, compact):
+    storage = VSStorage(**connection_args)
+    storage.populate("VX-1")
+    assert benchmark(lambda: len(list(storage.files(compact=compact)))) == 2000
+
+
+def bench_storage_files_parallel(benchmark, connection_args):
+    storage = VSStorage(**connection_args)
+    storage.populate("VX-1")
+    assert benchmark(lambda: sum(1 for f in storage.files_parallel(threads=4))) == 2000
+
+
+@pytest.mark.parametrize("deep,prefetch", [(True, False), (False, False), (False, True)])
+def bench_find_jobs(benchmark, connection_args, deep, prefetch):
+    connection = VSApi(**connection_args)
+    assert benchmark(lambda: sum(1 for j in VSFindJobs(connection=connection, deep=deep, prefetch=prefetch))) == 300
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def bench_job_status_poll(benchmark, connection_args, bulk):
+    """
+    refreshing the status of the 50 running jobs, one request each or from the listing
+    """
+    connection = VSApi(**connection_args)
+    job_set = VSJobSet(connection, ["VX-{0}".format(n) for n in range(3, 301, 6)])
+    job_set.update()
+
+    def poll():
+        if bulk:
+            job_set.update()
+        else:
+            for job in job_set:
+                job.update()
+        return len(job_set.pending())
+    assert benchmark(poll) == 50
+
+
+@pytest.fixture
+def upload_file():
+    tmpdir = tempfile.mkdtemp()
+    filename = os.path.join(tmpdir, "upload.dat")
+    with open(filename, "wb") as f:
+        f.write(os.urandom(32*1024*1024))
+    yield filename
+    os.unlink(filename)
+    os.rmdir(tmpdir)
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def bench_chunked_upload(benchmark, connection_args, fake_server, upload_file, threads):
+    item = VSItem(**connection_args)
+    item.name = "VX-1"
+    benchmark(item.streaming_import_to_shape, upload_file, threads=threads, chunk_size=4*1024*1024)
+    assert len(fake_server.uploads["VX-1"]) == 32*1024*1024
+
+
+def _first_file(connection_args):
+    storage = VSStorage(**connection_args)
+    storage.populate("VX-1")
+    return next(storage.files())
+
+
+def bench_download_to(benchmark, connection_args, fake_server):
+    f = _first_file(connection_args)
+
+    def download():
+        sink = io.BytesIO()
+        f.download_to(sink)
+        return len(sink.getvalue())
+    assert benchmark(download) == fake_server.file_size
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def bench_download_parallel(benchmark, connection_args, fake_server, threads):
+    f = _first_file(connection_args)
+    tmpdir = tempfile.mkdtemp()
+    destination = os.path.join(tmpdir, "download.dat")
+    try:
+        benchmark(f.download_parallel, destination, threads=threads, chunk_size=2*1024*1024)
+        assert os.path.getsize(destination) == fake_server.file_size
+    finally:
+        os.unlink(destination)
+        os.rmdir(tmpdir)
@@ -0,0 +1,22 @@
+"""
+Fixtures for the benchmarks.  Each benchmark runs the library against a VSFakeServer on a local port; set
+GNMVIDISPINE_BENCH_LATENCY to a number of seconds to add that much latency to every response, which is closer to a
+real server on a network.
+"""
+import os
+import pytest
+from gnmvidispine.vs_fake_server import VSFakeServer
+
+
+@pytest.fixture(scope="session")
+def fake_server():
+    latency = float(os.environ.get("GNMVIDISPINE_BENCH_LATENCY", "0"))
+    server = VSFakeServer(items=2000, files=2000, jobs=300, fields=50, file_size=16*1024*1024, latency=latency)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def connection_args(fake_server):
+    return dict(host=fake_server.host, port=fake_server.port, user="admin", passwd="admin")
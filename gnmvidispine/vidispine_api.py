@@ -9,11 +9,16 @@ from pprint import pprint
 import json
 import re
 import logging
+import time
 from time import sleep
 import io
 import os
 from socket import error as socket_error
 from itertools import chain
+from .vs_connection_pool import VSConnectionPool, register_pool, registered_pool
+from .vs_governor import VSGovernorSlot
+from . import vs_xml
+from .vs_xml import set_backend as set_xml_backend, vs_path
 
 logger = logging.getLogger(__name__)
 
@@ -159,6 +164,7 @@ class VSApi(object):
     passwd=""
     host=""
     port=8080
+    https=False
     debug=False
 
     retry_attempts = 100
@@ -166,7 +172,24 @@ class VSApi(object):
 
     xmlns = "{http://xml.vidispine.com/schema/vidispine}"
 
-    def __init__(self,host="localhost",port=8080,user="",passwd="",url=None,run_as=None, conn=None, logger=None, https=False):
+    #format that entity documents are requested in, "xml" or "json"
+    transport = "xml"
+
+    #VSConditionalCache used to make conditional GET requests, or None to always fetch in full
+    conditional_cache = None
+
+    #VSInstrumentation that is told about every request (see vs_metrics), or None to measure nothing
+    instrumentation = None
+
+    #VSRetryPolicy deciding how failed requests are retried (see vs_retry), or None to use retry_attempts and retry_delay
+    retry_policy = None
+
+    #VSRequestGovernor limiting the rate and concurrency of requests (see vs_governor), or None for no limits
+    governor = None
+
+    def __init__(self,host="localhost",port=8080,user="",passwd="",url=None,run_as=None, conn=None, logger=None, https=None,
+                 pool=None, transport=None, conditional_cache=None, instrumentation=None, retry_policy=None,
+                 governor=None):
         """
         Initialise a new Vidispine connection.
         :param host: Hostname to connect to Vidispine on
@@ -178,7 +201,21 @@ class VSApi(object):
         authenticate with administrator credentials.  Allows a program to have admin credentials but run requests on behalf of users.
         :param conn: Use this httplib connection object rather than initiating a new one. Only for testing.
         :param logger: Use this logger object rather than initiating a new one. Only for testing.
-        :param https: Set this to True to use https
+        :param https: Set this to True to use https, or False for http. If left as None, a pool registered for this host,
+        port and user is used whichever scheme it was registered with, and otherwise http.
+        :param pool: Use this VSConnectionPool for requests rather than a dedicated connection. The pool is registered
+        for this host, port and user, so any other object subsequently created with the same details will share it.
+        :param transport: "xml" (default) or "json". In json mode items, jobs, files, storages, shapes and search results
+        are requested as application/json, which is considerably quicker to parse, and dataContent holds the decoded
+        JSON document rather than an XML element tree. contentDict and the other public attributes are the same in both.
+        :param conditional_cache: Use this VSConditionalCache to revalidate GET requests with ETag/Last-Modified rather
+        than fetching them in full each time. To use one for every object, set VSApi.conditional_cache instead.
+        :param instrumentation: Record the timings, sizes and outcome of this object's requests with this
+        VSInstrumentation (see vs_metrics). To instrument every object, set VSApi.instrumentation instead.
+        :param retry_policy: Retry failed requests according to this VSRetryPolicy (see vs_retry) rather than at fixed
+        intervals. To use one for every object, set VSApi.retry_policy instead.
+        :param governor: Hold requests within the rate and concurrency limits of this VSRequestGovernor (see
+        vs_governor). To limit every object, set VSApi.governor instead.
         """
         from urllib.parse import urlparse
         self.user=user
@@ -190,6 +227,18 @@ class VSApi(object):
         self._undelayedcounter = 0
         self.name = None
         self.logger = logger if logger is not None else logging.getLogger(__name__)
+        if transport is not None:
+            if transport not in ("xml", "json"):
+                raise ValueError("transport must be xml or json, not {0}".format(transport))
+            self.transport = transport
+        if conditional_cache is not None:
+            self.conditional_cache = conditional_cache
+        if instrumentation is not None:
+            self.instrumentation = instrumentation
+        if retry_policy is not None:
+            self.retry_policy = retry_policy
+        if governor is not None:
+            self.governor = governor
         if port:
             self.port=port
 
@@ -200,14 +249,36 @@ class VSApi(object):
             else:
                 self.host = bits.netloc
 
+        self._setup_connection(conn, pool, https)
+
+    def _setup_connection(self, conn, pool, https):
+        """
+        Internal method called by the constructor to set up the connection, or the pool, that requests are sent on
+        :param conn: connection object passed to the constructor, or None
+        :param pool: VSConnectionPool passed to the constructor, or None
+        :param https: True, False or None as passed to the constructor
+        """
+        self._pool = None
         if conn is not None:
             self._conn = conn
+            self.https = bool(https) if https is not None else isinstance(conn, http.client.HTTPSConnection)
+            return
+
+        if pool is not None:
+            https = bool(https)
+            register_pool(pool, self.host, self.port, self.user, self.passwd, https=https)
         else:
-            if https:
-                self._conn = http.client.HTTPSConnection(self.host, self.port)
-            else:
-                self._conn = http.client.HTTPConnection(self.host, self.port)
-        
+            #an explicit scheme only picks up a pool registered for that scheme, so https is never downgraded
+            pool, https = registered_pool(self.host, self.port, self.user, self.passwd, https=https)
+
+        self.https = bool(https)
+        if pool is not None:
+            self._pool = pool
+            self._pool_key = VSConnectionPool.make_key(self.host, self.port, self.https, self.user, self.passwd)
+            self._conn = None
+        else:
+            self._conn = self._new_connection()
+
     class NotPopulatedError(Exception):
         """
         Exception explaining that the Vidispine object must have been populated by a call to populate() or similar
@@ -235,7 +306,106 @@ class VSApi(object):
                 self._conn.close()
         except:
             pass
-        self._conn = http.client.HTTPConnection(self.host,self.port)
+        self._conn = self._new_connection()
+
+    def _child_args(self):
+        """
+        Internal method returning keyword arguments to create another object with the same server, credentials, scheme
+        and per-object settings as this one, but a connection of its own (or from the same pool)
+        """
+        return {'host': self.host, 'port': self.port, 'user': self.user, 'passwd': self.passwd,
+                'run_as': self.run_as, 'https': self.https, 'transport': self.transport,
+                'conditional_cache': self.conditional_cache, 'instrumentation': self.instrumentation,
+                'retry_policy': self.retry_policy, 'governor': self.governor}
+
+    def _new_connection(self):
+        """
+        Internal method to make a new dedicated connection to the server, with the object's scheme
+        :return: HTTPConnection or HTTPSConnection
+        """
+        if self.https:
+            return http.client.HTTPSConnection(self.host, self.port)
+        return http.client.HTTPConnection(self.host, self.port)
+
+    def _get_connection(self):
+        """
+        Internal method to get a connection to send a request on, either from the pool or the dedicated one
+        :return: HTTPConnection
+        """
+        if self._pool is not None:
+            return self._pool.acquire(self._pool_key)
+        return self._conn
+
+    def _replace_connection(self, conn):
+        """
+        Internal method to swap a broken connection for a new one
+        :param conn: connection that failed
+        :return: HTTPConnection to use instead
+        """
+        if self._pool is not None:
+            self._pool.discard(self._pool_key, conn)
+            return self._pool.acquire(self._pool_key)
+        self.reset_http()
+        return self._conn
+
+    def _discard_connection(self, conn):
+        if self._pool is not None:
+            self._pool.discard(self._pool_key, conn)
+
+    def _drop_connection(self, conn):
+        """
+        Internal method to get rid of a broken connection without getting another, before raising the error
+        """
+        if self._pool is not None:
+            self._pool.discard(self._pool_key, conn)
+        else:
+            self.reset_http()
+
+    def _next_retry_delay(self, retry, error=None, status=None):
+        """
+        Internal method called after each attempt when a retry policy is in use
+        :param retry: VSRetryState for the request
+        :param error: the exception if the attempt failed without a response, which is re-raised if the policy gives up
+        :param status: HTTP status returned, or None if the request failed without a response
+        :return: number of seconds to wait before the next attempt, or None if the response should be returned
+        """
+        if error is None and status < 400:
+            retry.succeeded()
+            return None
+        delay = retry.failed(status=status)
+        if delay is None:
+            if error is not None:
+                raise error
+            return None
+        self.logger.warning("Attempt {0} failed with {1}. Waiting {2:.2f}s before retry.".format(
+            retry.attempts, status if status is not None else error.__class__.__name__, delay))
+        return delay
+
+    def release_response(self, response, reuse=True):
+        """
+        Tells the connection pool that the given response from sendAuthorized() is finished with. This does nothing
+        if the object is not using a pool.
+        :param response: HTTPResponse returned by sendAuthorized()
+        :param reuse: if True (default) the response must have been completely read, and its connection is returned to
+        the pool for re-use. If False the connection is handed over to the caller along with the response; use this when
+        returning an unread response (e.g. a download) to the caller.
+        :return: None
+        """
+        slot = getattr(response, '_vs_governor_slot', None)
+        if isinstance(slot, VSGovernorSlot):
+            slot.release()
+        if self.instrumentation is not None:
+            self._finish_record(getattr(response, '_vs_record', None), response)
+        if self._pool is None:
+            return
+        conn = getattr(response, '_vs_pooled_conn', None)
+        if conn is None:
+            return
+        response._vs_pooled_conn = None
+        if reuse:
+            self._pool.release(self._pool_key, conn)
+        else:
+            self._pool.detach(self._pool_key, conn)
 
     def __eq__(self, other):
         if not isinstance(self,VSApi) or not isinstance(other,VSApi):
@@ -250,36 +420,138 @@ class VSApi(object):
     
     def sendAuthorized(self,method,url,body,headers,rawData=False):
         """
-        Internal method to sign requests. Callers should use request() instead
+        Internal method to sign requests. Callers should use request() instead.
+        If a retry_policy is set, connection errors and the statuses that it has rules for are retried here, so every
+        way of making a request is retried the same way; the last response is returned whatever its status.
         :param method:
         :param url:
         :param body:
         :param headers:
         :return:
         """
-        import time
-        attempt = 0
-        str_for_user = '%s:%s' % (self.user, self.passwd)
-        auth = base64.encodebytes(str_for_user.encode("UTF-8")).decode().replace('\n', '')
+        retry = self.retry_policy.begin(self.host, self.port) if self.retry_policy is not None else None
+        while True:
+            if retry is not None:
+                retry.check()
+            try:
+                response = self._send_governed(method,url,body,headers,rawData)
+            except (http.client.CannotSendRequest, http.client.BadStatusLine, socket_error) as e:
+                if retry is None:
+                    raise
+                sleep(self._next_retry_delay(retry, e))
+                continue
+            if retry is None:
+                return response
+            delay = self._next_retry_delay(retry, status=response.status)
+            if delay is None:
+                return response
+            try:
+                response.read()
+            except Exception:
+                self.release_response(response, reuse=False)
+            else:
+                self.release_response(response)
+            sleep(delay)
 
-        headers['Authorization']="Basic %s" % auth
-        if self.run_as is not None:
-            headers['RunAs'] = self.run_as
+    def _send_governed(self,method,url,body,headers,rawData=False):
+        """
+        Internal method to make one attempt at a request, within the governor's limits if there is one
+        """
+        slot = self.governor.acquire(self.host, self.port, method, url) if self.governor is not None else None
+        try:
+            response = self._send_recorded(method,url,body,headers,rawData,slot)
+        except Exception:
+            if slot is not None:
+                slot.release()
+            raise
+        if slot is not None:
+            #released by release_response()
+            response._vs_governor_slot = slot
+        return response
+
+    def _send_recorded(self,method,url,body,headers,rawData=False,slot=None):
+        """
+        Internal method to send a request, describing it to the instrumentation if there is any
+        :param slot: VSGovernorSlot the request was let through with, if any
+        """
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            return self._send(method,url,body,headers,rawData)
+
+        record = self._start_record(instrumentation, method, url)
+        if slot is not None:
+            record.queue_time = slot.waited
+        try:
+            response = self._send(method,url,body,headers,rawData,record)
+        except Exception as e:
+            record.error = e
+            self._finish_record(record)
+            raise
+        record.status = response.status
+        record.ttfb = time.time() - record.started
+        response._vs_record = record
+        return response
+
+    def _start_record(self, instrumentation, method, url):
+        """
+        Internal method to begin a VSRequestRecord for a request that is about to be sent
+        """
+        from .vs_metrics import VSRequestRecord
+        record = VSRequestRecord(method, url, instrumentation.url_template(url))
+        try:
+            record.context = instrumentation.request_started(record)
+        except Exception:
+            logger.exception("Instrumentation failed when starting {0} {1}".format(method, url))
+        return record
+
+    def _finish_record(self, record, response=None):
+        """
+        Internal method to complete a VSRequestRecord and pass it to the instrumentation.  Does nothing if the record
+        has already been finished.
+        :param record: VSRequestRecord, or None (or anything else, e.g. from a mock response) to do nothing
+        :param response: the response it describes, if there is one
+        """
+        from .vs_metrics import VSRequestRecord
+        if not isinstance(record, VSRequestRecord) or record.total_time is not None:
+            return
+        record.total_time = time.time() - record.started
+        if record.bytes_in is None and response is not None:
+            try:
+                length = response.getheader('content-length')
+                if length is not None:
+                    record.bytes_in = int(length)
+            except (AttributeError, ValueError):
+                pass
+        try:
+            self.instrumentation.request_finished(record)
+        except Exception:
+            logger.exception("Instrumentation failed when finishing {0} {1}".format(record.method, record.url))
+
+    def _send(self,method,url,body,headers,rawData=False,record=None):
+        """
+        Internal method that does the work of sendAuthorized()
+        :param record: VSRequestRecord to note connection time, size and retries in, or None
+        """
+        attempt = 0
+        self._authorize(headers)
 
         response = None
-        conn = self._conn
+        conn = self._get_connection()
 
-        if rawData == False and body is not None:
+        body_to_send = self._encode_body(body, rawData)
+        if record is not None and body and body_to_send is not None:
             try:
-                body_to_send = body.decode('utf-8', "backslashreplace").encode('utf-8', "backslashreplace")
-            except AttributeError: #if body is a string as opposed to bytes, we get this error
-                body_to_send = body.encode('utf-8', "backslashreplace")
-        else:
-            body_to_send = body
+                record.bytes_out = len(body_to_send)
+            except TypeError:
+                pass
 
         while True:
             self.logger.debug("sending {0} request to {1} with headers {2}".format(method,url,headers))
             try:
+                if record is not None and getattr(conn, 'sock', False) is None:
+                    connect_started = time.time()
+                    conn.connect()
+                    record.connect_time = time.time() - connect_started
                 conn.request(
                     method,
                     url,
@@ -287,51 +559,124 @@ class VSApi(object):
                     headers
                 )
             except http.client.CannotSendRequest:
+                if self.retry_policy is not None:
+                    self._drop_connection(conn)
+                    raise
                 attempt+=1
                 logger.warning("HTTP connection re-use issue detected, resetting connection")
-                self.reset_http()
+                conn = self._replace_connection(conn)
                 time.sleep(1)
                 if attempt>10:
                     raise
+                if record is not None:
+                    record.retries+=1
                 continue
             except socket_error as e:
+                if self.retry_policy is not None:
+                    self._drop_connection(conn)
+                    raise
                 attempt +=1
                 logger.warning("Socket error: {0}, resetting conection".format(e))
-                self.reset_http()
+                conn = self._replace_connection(conn)
                 time.sleep(1)
                 if attempt>10:
                     raise
+                if record is not None:
+                    record.retries+=1
+                continue
+
+            try:
+                response = conn.getresponse()
+            except http.client.RemoteDisconnected:
+                #a pooled keep-alive connection may have been closed by the server while it was idle. In that case
+                #nothing was processed, so it is safe to send the request again straight away on a fresh connection
+                if self._pool is None or not getattr(conn, '_vs_pool_reused', False) or attempt>10:
+                    self._discard_connection(conn)
+                    raise
+                attempt+=1
+                logger.debug("Pooled connection to {0} was closed by the server, retrying on a new one".format(self.host))
+                conn = self._replace_connection(conn)
+                if record is not None:
+                    record.retries+=1
                 continue
+            except Exception:
+                self._discard_connection(conn)
+                raise
 
-            response = conn.getresponse()
             if response.status == 303:
-                url = response.msg.dict['location']
+                url = response.getheader('location')
                 logger.debug("Response was a redirect to {0}".format(url))
-                conn = http.client.HTTPConnection(self.host,self.port)
-            elif response.status == 504:    #gateway timeout
-                #if we're getting timeouts, apply an exponential backoff
-                if self._delay==0:
-                    self._delay = 1
+                if self._pool is not None:
+                    response.read()
                 else:
-                    self._delay *= 2
-                self._delayedcounter+=1
-                self._undelayedcounter=0
-
-                if self._delay > 8192:
-                    self._delay = 1
-
-                logger.warning("Gateway timeout error communicating with {0}. Waiting {1} seconds before trying again.".format(url,self._delay))
-                time.sleep(self._delay)
+                    conn = self._new_connection()
+            elif response.status == 504 and self.retry_policy is None:    #gateway timeout
+                response.read()
+                time.sleep(self._gateway_timeout_delay(url))
+                if record is not None:
+                    record.retries+=1
             else:
-                self._undelayedcounter+=1
-                if self._delay>0 and self._undelayedcounter>10*self._delayedcounter:
-                    logger.warning("{0} attempts have now suceeded with no delay, so removing the delay.".format(self._undelayedcounter))
-                    self._delay=0
-                    self._delayedcounter=0
+                self._note_undelayed()
                 break
 
+        if self._pool is not None:
+            response._vs_pooled_conn = conn
         return response
 
+    def _authorize(self, headers):
+        """
+        Internal method to add authentication headers to the given header dictionary
+        :param headers: dictionary of headers, which is modified in place
+        :return: the headers dictionary
+        """
+        str_for_user = '%s:%s' % (self.user, self.passwd)
+        auth = base64.encodebytes(str_for_user.encode("UTF-8")).decode().replace('\n', '')
+
+        headers['Authorization']="Basic %s" % auth
+        if self.run_as is not None:
+            headers['RunAs'] = self.run_as
+        return headers
+
+    @staticmethod
+    def _encode_body(body, rawData=False):
+        """
+        Internal method to convert a request body into UTF-8 bytes, unless it is raw data
+        """
+        if rawData == False and body is not None:
+            try:
+                return body.decode('utf-8', "backslashreplace").encode('utf-8', "backslashreplace")
+            except AttributeError: #if body is a string as opposed to bytes, we get this error
+                return body.encode('utf-8', "backslashreplace")
+        return body
+
+    def _gateway_timeout_delay(self, url):
+        """
+        Internal method called when a request gets a 504 Gateway Timeout. Applies an exponential backoff and returns
+        the number of seconds to wait before trying again.
+        """
+        if self._delay==0:
+            self._delay = 1
+        else:
+            self._delay *= 2
+        self._delayedcounter+=1
+        self._undelayedcounter=0
+
+        if self._delay > 8192:
+            self._delay = 1
+
+        logger.warning("Gateway timeout error communicating with {0}. Waiting {1} seconds before trying again.".format(url,self._delay))
+        return self._delay
+
+    def _note_undelayed(self):
+        """
+        Internal method called when a request does not time out, removing any backoff once things have recovered
+        """
+        self._undelayedcounter+=1
+        if self._delay>0 and self._undelayedcounter>10*self._delayedcounter:
+            logger.warning("{0} attempts have now suceeded with no delay, so removing the delay.".format(self._undelayedcounter))
+            self._delay=0
+            self._delayedcounter=0
+
     def chunked_upload_request(self,upload_io,total_size,chunk_size,
                                path,transferPriority=500,throttle=True,method="GET",matrix=None,query=None,
                                filename=None,
@@ -347,7 +692,7 @@ class VSApi(object):
         """
         from uuid import uuid4
         
-        transfer_id = uuid4().get_hex()
+        transfer_id = uuid4().hex
         
         query_params={
             'transferId': transfer_id,
@@ -402,38 +747,225 @@ class VSApi(object):
         :param accept: String representing the MIME type of data to accept in return. Default is application/xml.
         :return: A parsed XML element tree if data is returned or the string "Success" if there is no data. Raises VSException
         subclasses if an error occurs.
+        If a conditional_cache is set, GET requests are revalidated against a previously cached response where possible.
+        """
+        cache = self.conditional_cache
+        extra_args = {}
+        if cache is not None:
+            if method == "GET":
+                cache_key = cache.make_key(self, self._build_url(path.replace(' ', '%20'), matrix, query), accept)
+                response_headers = {}
+                extra_args = {'extra_headers': cache.validators(cache_key), 'response_headers': response_headers}
+            else:
+                cache.discard_path(self, path.replace(' ', '%20'))
+                cache = None
+        if self.instrumentation is not None:
+            #raw_request() adds the record of each attempt, so that parsing can be timed against the one that worked
+            records = []
+            extra_args['records'] = records
+
+        send = lambda: self.raw_request(path.replace(' ', '%20'),method=method,matrix=matrix,query=query,body=body,
+                                        accept=accept,**extra_args)
+        try:
+            raw_body = self._with_retries(send)
+        except HTTPError as e:
+            if e.code!=304 or cache is None:
+                raise
+            cached = cache.not_modified(cache_key)
+            if cached is not None:
+                return cached
+            #evicted since the request was made, so ask again unconditionally
+            extra_args['extra_headers'] = {}
+            raw_body = self._with_retries(send)
+
+        if self.instrumentation is not None:
+            document = self._timed_parse(raw_body, accept, records[-1] if records else None)
+        else:
+            document = self._parse_response_body(raw_body, accept)
+        if cache is not None:
+            cache.store(cache_key, response_headers, document)
+        return document
+
+    def _timed_parse(self, raw_body, accept, record):
+        """
+        Internal method to parse a response body and report the time taken to the instrumentation, against the record
+        of the request that returned it
+        :param record: VSRequestRecord of the request, or None
+        """
+        parse_started = time.time()
+        document = self._parse_response_body(raw_body, accept)
+        if record is not None:
+            record.parse_time = time.time() - parse_started
+            try:
+                self.instrumentation.response_parsed(record)
+            except Exception:
+                logger.exception("Instrumentation failed after parsing {0} {1}".format(record.method, record.url))
+        return document
+
+    def _with_retries(self, send):
+        """
+        Internal method that makes a request for request() or stream_request(), retrying it every retry_delay seconds
+        up to retry_attempts times if a 503 or a bad status line comes back
+        :param send: function that makes the request
+        :return: whatever send() returns
         """
-        from xml.parsers.expat import ExpatError
         n=0
-        raw_body=""
         while True:
+            n+=1
             try:
-                n+=1
-                raw_body=self.raw_request(path.replace(' ', '%20'),method=method,matrix=matrix,query=query,body=body,accept=accept)
-                break
-            except HTTPError as e:
-                if e.code==503: #server unavailable
-                    self.logger.warning("Server not available error when contacting Vidispine. Waiting {0}s before retry.".format(self.retry_delay))
-                    sleep(self.retry_delay)
-                    if n>self.retry_attempts:
-                        self.logger.error("Did not work after %d retries, giving up" % self.retry_attempts)
-                        raise e
-                else:
-                    raise e
-            except http.client.BadStatusLine as e: #retry if we got a bad status line
-                logging.warning("Bad status line: {0}".format(e))
-                sleep(self.retry_delay)
-                if n>self.retry_attempts:
-                    self.logger.error("Did not work after %d tries, giving up" % self.retry_attempts)
-                    raise e
+                return send()
+            except (HTTPError, http.client.BadStatusLine) as e:
+                sleep(self._fixed_retry_delay(e, n))
+
+    def _fixed_retry_delay(self, error, attempt):
+        """
+        Internal method deciding whether to retry an error at fixed intervals, as is done when there is no retry_policy.
+        With a policy, sendAuthorized() has already retried everything that the policy allows.
+        :param error: HTTPError or BadStatusLine that was raised, which is re-raised if it is not to be retried
+        :param attempt: number of attempts made so far
+        :return: number of seconds to wait before trying again
+        """
+        if self.retry_policy is not None:
+            raise error
+        if isinstance(error, HTTPError):
+            if error.code!=503: #server unavailable
+                raise error
+            self.logger.warning("Server not available error when contacting Vidispine. Waiting {0}s before retry.".format(self.retry_delay))
+            if attempt>self.retry_attempts:
+                self.logger.error("Did not work after %d retries, giving up" % self.retry_attempts)
+                raise error
+        else:
+            logging.warning("Bad status line: {0}".format(error))
+            if attempt>self.retry_attempts:
+                self.logger.error("Did not work after %d tries, giving up" % self.retry_attempts)
+                raise error
+        return self.retry_delay
+
+    def _request_document(self, path, **kwargs):
+        """
+        Internal method to request an entity document in the format given by self.transport. Takes the same arguments
+        as request()
+        :return: parsed XML element tree or decoded JSON document
+        """
+        if self.transport == "json":
+            kwargs['accept'] = 'application/json'
+        return self.request(path, **kwargs)
+
+    def stream_request(self,path,method="GET",matrix=None,query=None,body=None,chunk_size=65536):
+        """
+        Send a request to Vidispine and parse the XML that comes back incrementally, as it is received, rather than
+        buffering the whole response as request() does.  This is a generator that yields each child element of the
+        document root (e.g. each <hits>, <item> or <file>) as soon as it has been completely received.  Yielded
+        elements are removed from the document, so memory use depends on how many the caller keeps hold of rather than
+        on the size of the response.
+        The response is read on a connection of its own, so it is safe to make other requests with this object while
+        iterating.  Errors and 503 retries are handled as for request(); errors can only be raised before the first
+        element is yielded.
+        :param path: URL path to send the request to, not including /API
+        :param method: GET, PUT, POST, DELETE, etc. - the HTTP method to request
+        :param matrix: A dictionary of "matrix parameters" for the API call
+        :param query: A dictionary of "query parameters" for the API call
+        :param body: String representing the raw request body to send
+        :param chunk_size: number of bytes to read from the network at a time
+        :return: yields ElementTree elements
+        """
+        response = self._with_retries(lambda: self._open_stream(path.replace(' ', '%20'),method=method,matrix=matrix,
+                                                                query=query,body=body))
+
+        #the caller may make other requests while iterating, so the stream only counts towards the governor's limits
+        #until its headers have arrived; otherwise a nested request could wait forever for the stream's own slot
+        slot = getattr(response, '_vs_governor_slot', None)
+        if isinstance(slot, VSGovernorSlot):
+            slot.release()
+
+        #the response now owns the dedicated connection, so give this object a new one for any requests made meanwhile
+        stream_conn = self._detach_dedicated_connection()
+
+        parser = vs_xml.pull_parser()
+        depth = 0
+        root = None
+        got_data = False
+        completed = False
+        try:
+            while True:
+                data = response.read(chunk_size)
+                if not data:
+                    break
+                got_data = True
+                parser.feed(data)
+                for event, elem in parser.read_events():
+                    if event=="start":
+                        depth+=1
+                        if depth==1:
+                            root = elem
+                    else:
+                        depth-=1
+                        if depth==1:
+                            root.remove(elem)
+                            yield elem
+            if got_data:
+                parser.close()
+            completed = True
+        finally:
+            self.release_response(response, reuse=completed)
+            if stream_conn is not None:
+                stream_conn.close()
+            elif not completed:
+                response.close()
+
+    def _open_stream(self,path,method="GET",matrix=None,query=None,body=None):
+        """
+        Internal method to send a request for stream_request() and return the unread response, raising VSException
+        subclasses if an error status is returned
+        """
+        base_headers = self._request_headers("application/xml", body, "application/xml", {})
+        url = self._build_url(path, matrix, query)
+
+        if method == "POST" and body is None:
+            body = ""
 
+        response=self.sendAuthorized(method,url,body,base_headers)
+        if response.status<200 or response.status>299:
+            try:
+                response_body = response.read()
+            except Exception:
+                self.release_response(response, reuse=False)
+                raise
+            self.release_response(response)
+            raise HTTPError(response.status,method,url,response.status,response.reason,response_body).to_VSException(method=method,url=url,body=body)
+        return response
+
+    def _detach_dedicated_connection(self):
+        """
+        Internal method that hands the dedicated connection over to the caller and replaces it with a new one.  Does
+        nothing if the object is using a pool (each pooled request has its own connection anyway) or was given a
+        connection object that it did not create.
+        :return: the detached HTTPConnection, or None
+        """
+        if self._pool is not None or not isinstance(self._conn, http.client.HTTPConnection):
+            return None
+        old_conn = self._conn
+        self._conn = self._new_connection()
+        return old_conn
+
+    @staticmethod
+    def _parse_response_body(raw_body, accept):
+        """
+        Internal method to turn a response body into what request() returns
+        :param raw_body: bytes returned by the server
+        :param accept: MIME type that was requested
+        :return: parsed ElementTree for xml, decoded dict or list for json, the raw body for anything else or "Success"
+        if there was no body
+        """
         if raw_body.__len__() > 0:
+            if accept=='application/json':
+                return json.loads(always_string(raw_body))
             try:
                 if accept=='application/xml':
-                    return ET.fromstring(raw_body)
+                    return vs_xml.fromstring(raw_body)
                 else:
                     return raw_body
-            except ExpatError:
+            except vs_xml.PARSE_ERRORS:
                 logging.error("XML that caused the error: ")
                 logging.error(raw_body)
                 raise
@@ -460,23 +992,26 @@ class VSApi(object):
 
         return ["{0}={1}".format(key, VSApi._escape_for_query(item)) for item in toprocess]
 
-    def raw_request(self,path,method="GET",matrix=None,query=None,body=None,accept="application/xml",
-                    content_type='application/xml',rawData=False,extra_headers={}):
+    @staticmethod
+    def _request_headers(accept, body, content_type, extra_headers):
         """
-        Internal method to build request parameters.  Callers should use request() instead.
-        :param path:
-        :param method:
-        :param matrix:
-        :param query:
-        :param body:
-        :return:
+        Internal method to build the basic headers for a request
         """
         base_headers={ 'Accept': accept, }
         if body is not None:
             base_headers['Content-Type'] = content_type
 
         base_headers.update(extra_headers)
+        return base_headers
 
+    def _build_url(self, path, matrix=None, query=None):
+        """
+        Internal method to build the full request URL from a path and matrix/query dictionaries
+        :param path: URL path, not including /API
+        :param matrix: dictionary of matrix parameters, or None
+        :param query: dictionary of query parameters, or None
+        :return: string
+        """
         if matrix:
             matrixpart = ";"+ ";".join(flatmap(lambda k_v: self._get_param_list(k_v[0],k_v[1]), list(matrix.items())))
         else:
@@ -490,23 +1025,55 @@ class VSApi(object):
         url="/API"+path+matrixpart
         if(len(querypart)> 0):
             url+='?'+querypart
+        return url
+
+    def raw_request(self,path,method="GET",matrix=None,query=None,body=None,accept="application/xml",
+                    content_type='application/xml',rawData=False,extra_headers={},response_headers=None,records=None):
+        """
+        Internal method to build request parameters.  Callers should use request() instead.
+        :param path:
+        :param method:
+        :param matrix:
+        :param query:
+        :param body:
+        :param response_headers: if a dictionary is given, the response headers are put into it with lower-case names
+        :param records: if a list is given and instrumentation is set, the VSRequestRecord of the request is appended to it
+        :return:
+        """
+        base_headers = self._request_headers(accept, body, content_type, extra_headers)
+        url = self._build_url(path, matrix, query)
 
         if method == "POST" and body is None:
             body = ""
 
         response=self.sendAuthorized(method,url,body,base_headers,rawData=rawData)
+        try:
+            response_body = response.read()
+        except Exception:
+            self.release_response(response, reuse=False)
+            raise
+        if self.instrumentation is not None:
+            record = getattr(response, '_vs_record', None)
+            if record is not None:
+                record.bytes_in = len(response_body)
+                if records is not None:
+                    records.append(record)
+        self.release_response(response)
+
+        if response_headers is not None:
+            response_headers.update([(k.lower(), v) for k, v in response.getheaders()])
 
         if response.status<200 or response.status>299:
-            raise HTTPError(response.status,method,url,response.status,response.reason,response.read()).to_VSException(method=method,url=url,body=body)
+            raise HTTPError(response.status,method,url,response.status,response.reason,response_body).to_VSException(method=method,url=url,body=body)
 
-        return response.read()
+        return response_body
 
     def xml_content(self):
         """
         Returns a string representing the XML of the VSApi object
         :return: a String
         """
-        return ET.tostring(self.dataContent,encoding='utf8')
+        return vs_xml.tostring(self.dataContent,encoding='utf8')
 
     def set_metadata(self,path,md,mode="default"):
         """
@@ -559,14 +1126,14 @@ class VSApi(object):
         return rtn
 
     def dump_xml(self):
-        return ET.tostring(self.dataContent)
+        return vs_xml.tostring(self.dataContent)
 
     def as_xml(self):
         """
         Return a string representing the XML document that is encapsulated by this object
         :return: String representing XML
         """
-        return ET.tostring(self.dataContent)
+        return vs_xml.tostring(self.dataContent)
 
     def findPortalDataNode(self,node,should_create=False):
         foundKey = False
@@ -581,9 +1148,9 @@ class VSApi(object):
                 return child
 
         if should_create:
-            keynode =  ET.SubElement(node,"{0}key".format(self.xmlns))
+            keynode =  vs_xml.SubElement(node,"{0}key".format(self.xmlns))
             keynode.text = "extradata"
-            valnode = ET.SubElement(node,"{0}value".format(self.xmlns))
+            valnode = vs_xml.SubElement(node,"{0}value".format(self.xmlns))
             return valnode
         return None
 
@@ -632,3 +1199,41 @@ def always_string(maybe_string):
         return str(maybe_string)
     else:
         raise TypeError("always_string got an unexpected type {0}".format(type(maybe_string)))
+
+
+def json_list(value):
+    """
+    Vidispine's JSON gives a list for any element that may repeat, but older versions give a single value when there
+    is only one.  This returns a list either way, and an empty list for None.
+    """
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def json_text(value):
+    """
+    Converts a value from a JSON document into what the text of the equivalent XML element would be, so that the same
+    data gives identical results from either transport: numbers and booleans become strings and empty strings
+    become None.  For a repeatable element the first value is used, as find() would.
+    """
+    if isinstance(value, list):
+        value = value[0] if len(value) > 0 else None
+    if isinstance(value, dict):
+        value = value.get('value')
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return always_string(value)
+
+
+def document_value(doc, key):
+    """
+    Returns the text of the child key of an XML element or JSON object, or None if it is not present
+    """
+    if isinstance(doc, dict):
+        return json_text(doc.get(key))
+    return vs_path("vs:" + key).text(doc)
@@ -1,4 +1,5 @@
 from .vidispine_api import VSApi
+from . import vs_xml
 from pprint import pprint
 import xml.etree.ElementTree as ET
 
@@ -50,7 +51,7 @@ class VSAccess(VSApi):
         try:
             node.find('{0}{1}'.format(ns,path)).text = value
         except Exception:
-            n = ET.Element(path)
+            n = node.makeelement(path, {})
             n.text = value
             node.append(n)
 
@@ -121,10 +122,10 @@ class VSAccess(VSApi):
         :return: String of Vidispine XML
         """
         ns = "{http://xml.vidispine.com/schema/vidispine}"
-        docNode = ET.Element('{0}AccessControlDocument'.format(ns))
+        docNode = self.dataContent.makeelement('{0}AccessControlDocument'.format(ns), {})
         for n in self.dataContent:
             docNode.append(n)
-        return ET.tostring(docNode,encoding="UTF-8")
+        return vs_xml.tostring(docNode,encoding="UTF-8")
 
 
 class VSAcl(VSApi):
@@ -0,0 +1,792 @@
+"""
+asyncio-native versions of the Vidispine API classes.
+
+These mirror VSApi.request/raw_request/chunked_upload_request as coroutines, with the same 303/503/504 retry
+behaviour and VSException mapping, so that a single event loop can keep hundreds of requests in flight:
+
+async def main():
+    search = AsyncVSItemSearch(host=host,port=port,user=user,passwd=passwd)
+    search.addCriterion({'title': 'spam'})
+    result = await search.execute()
+    async for item in result.results(shouldPopulate=True):  #each page of items is populated concurrently
+        print(item.get('title'))
+
+    job = AsyncVSJob(host=host,port=port,user=user,passwd=passwd)
+    await job.populate('VX-1234')
+
+Only the methods documented as coroutines on each class are async; other inherited methods that talk to the server
+may return a coroutine that must be awaited, or may not work at all, so check before relying on them.
+"""
+import asyncio
+import http.client
+import logging
+import os
+import ssl
+import threading
+import time
+from collections import OrderedDict
+from socket import error as socket_error
+from uuid import uuid4
+
+from .vidispine_api import VSApi, HTTPError, json_list
+from .vs_item import VSItem, VSTranscodeError
+from .vs_collection import VSCollection
+from .vs_job import VSJob, VSJobSet
+from .vs_search import VSSearch, VSSearchResult
+from .vs_storage import VSStorage, VSFile
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncResponse(object):
+    """
+    A completely-read HTTP response, providing the parts of the http.client.HTTPResponse interface that we use
+    """
+    def __init__(self, status, reason, headers, body, version="HTTP/1.1"):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.version = version
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    def read(self):
+        return self.body
+
+    @property
+    def will_close(self):
+        connection = self.getheader('connection', '').lower()
+        if connection == 'close':
+            return True
+        if self.version == "HTTP/1.0" and connection != 'keep-alive':
+            return True
+        return False
+
+
+class AsyncConnection(object):
+    """
+    A single HTTP/1.1 connection on top of asyncio streams
+    """
+    def __init__(self, reader, writer, host, port):
+        self.reader = reader
+        self.writer = writer
+        self.host = host
+        self.port = port
+        self.reused = False
+
+    @property
+    def is_usable(self):
+        return not self.writer.is_closing() and not self.reader.at_eof()
+
+    async def send(self, method, url, body, headers):
+        """
+        Writes a request to the connection
+        """
+        lines = ["{0} {1} HTTP/1.1".format(method, url), "Host: {0}:{1}".format(self.host, self.port)]
+        if body is not None:
+            lines.append("Content-Length: {0}".format(len(body)))
+        elif method in ("POST", "PUT"):
+            lines.append("Content-Length: 0")
+        for k, v in list(headers.items()):
+            lines.append("{0}: {1}".format(k, v))
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode("iso-8859-1")
+        if body is not None:
+            self.writer.write(head + body)
+        else:
+            self.writer.write(head)
+        await self.writer.drain()
+
+    async def _read_headers(self):
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            name, _, value = line.decode("iso-8859-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    async def _read_chunked(self):
+        parts = []
+        while True:
+            size_line = await self.reader.readline()
+            try:
+                size = int(size_line.split(b";")[0].strip(), 16)
+            except ValueError:
+                raise http.client.IncompleteRead(b"".join(parts))
+            if size == 0:
+                await self._read_headers()  #trailers
+                return b"".join(parts)
+            parts.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+    async def read_response(self, method):
+        """
+        Reads a complete response from the connection
+        :return: AsyncResponse
+        """
+        while True:
+            status_line = await self.reader.readline()
+            if not status_line:
+                raise http.client.RemoteDisconnected("Remote end closed connection without response")
+            try:
+                version, status, reason = (status_line.decode("iso-8859-1").rstrip("\r\n").split(None, 2) + [""])[:3]
+                status = int(status)
+            except ValueError:
+                raise http.client.BadStatusLine(status_line)
+            if not version.startswith("HTTP/"):
+                raise http.client.BadStatusLine(status_line)
+            headers = await self._read_headers()
+            if status >= 200 or status == 101:
+                break
+            #skip over any 1xx informational responses
+
+        if method == "HEAD" or status in (204, 304):
+            body = b""
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = await self._read_chunked()
+        elif 'content-length' in headers:
+            body = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            body = await self.reader.read()
+            headers['connection'] = 'close'
+        return AsyncResponse(status, reason, headers, body, version=version)
+
+    def close(self):
+        try:
+            self.writer.close()
+        except RuntimeError:
+            #its event loop has been closed, so the transport can't close the socket itself
+            sock = getattr(self.writer.transport, '_sock', None)
+            if sock is not None:
+                sock.close()
+        except Exception as e:
+            logger.debug("Error closing connection: {0}".format(e))
+
+
+class AsyncConnectionPool(object):
+    """
+    Pool of keep-alive asyncio connections, keyed by (host, port, scheme, user, password) in the same way as
+    VSConnectionPool.  maxsize limits both the number of idle connections kept and the number of requests in flight at
+    once for each key.  A pool is tied to the event loop that first uses it, and starts afresh if used from another loop.
+    """
+    def __init__(self, maxsize=100, connect_timeout=None, ssl_context=None):
+        self.maxsize = maxsize
+        self.connect_timeout = connect_timeout
+        self.ssl_context = ssl_context
+        self._loop = None
+        self._idle = {}
+        self._semaphores = {}
+        self.created = 0
+        self.reused = 0
+
+    def _check_loop(self):
+        """
+        Internal method that starts afresh if the pool is being used from a different event loop to before, closing the
+        idle connections that belong to the old one
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            old_loop = self._loop
+            stale = [conn for idle in self._idle.values() for conn in idle]
+            self._loop = loop
+            self._idle = {}
+            self._semaphores = {}
+            for conn in stale:
+                if old_loop is not None and old_loop.is_running():
+                    old_loop.call_soon_threadsafe(conn.close)
+                else:
+                    conn.close()
+
+    async def acquire(self, key):
+        """
+        Checks out a connection for the given key, waiting if maxsize are already in use
+        :return: AsyncConnection
+        """
+        self._check_loop()
+        if key not in self._semaphores:
+            self._semaphores[key] = asyncio.Semaphore(self.maxsize)
+        await self._semaphores[key].acquire()
+
+        idle = self._idle.get(key)
+        while idle:
+            conn = idle.pop()
+            if conn.is_usable:
+                conn.reused = True
+                self.reused += 1
+                return conn
+            conn.close()
+
+        host, port, scheme = key[0], key[1], key[2]
+        try:
+            if scheme == "https":
+                ctx = self.ssl_context if self.ssl_context is not None else ssl.create_default_context()
+                opener = asyncio.open_connection(host, port, ssl=ctx)
+            else:
+                opener = asyncio.open_connection(host, port)
+            reader, writer = await asyncio.wait_for(opener, self.connect_timeout)
+        except BaseException:
+            self._semaphores[key].release()
+            raise
+        self.created += 1
+        return AsyncConnection(reader, writer, host, port)
+
+    def release(self, key, conn):
+        """
+        Returns a connection to the pool after its response has been read
+        """
+        idle = self._idle.setdefault(key, [])
+        if len(idle) < self.maxsize and conn.is_usable:
+            idle.append(conn)
+        else:
+            conn.close()
+        self._semaphores[key].release()
+
+    def discard(self, key, conn):
+        """
+        Closes a connection that has failed, rather than returning it to the pool
+        """
+        conn.close()
+        self._semaphores[key].release()
+
+    def close(self):
+        """
+        Closes all idle connections
+        """
+        for idle in list(self._idle.values()):
+            for conn in idle:
+                conn.close()
+        self._idle = {}
+
+
+#pools shared by async objects that were not given one, most recently used last
+_async_registry = OrderedDict()
+_async_registry_lock = threading.Lock()
+_async_registry_size = 32
+
+
+def _shared_async_pool(key):
+    """
+    Returns the AsyncConnectionPool shared by async objects for the given key, creating it if need be.  Only the most
+    recently used _async_registry_size are kept; objects already using an older one carry on with it.
+    """
+    with _async_registry_lock:
+        pool = _async_registry.pop(key, None)
+        if pool is None:
+            pool = AsyncConnectionPool()
+        _async_registry[key] = pool
+        while len(_async_registry) > _async_registry_size:
+            _async_registry.popitem(last=False)
+        return pool
+
+
+class AsyncVSApi(VSApi):
+    """
+    Base class for the asyncio versions of the API classes. It takes the same arguments as VSApi; pool= should be an
+    AsyncConnectionPool.  If no pool is given, all async objects for the same server and user share one automatically.
+
+    request(), raw_request(), sendAuthorized() and chunked_upload_request() are coroutines here.
+    """
+    def _setup_connection(self, conn, pool, https):
+        """
+        Internal method called by the constructor. Async objects send on an AsyncConnectionPool rather than the blocking
+        connection or VSConnectionPool that VSApi would set up.
+        """
+        self._pool = None
+        self._conn = None
+        self.https = bool(https)
+        self._async_key = (self.host, self._normalised_port(), "https" if self.https else "http", self.user, self.passwd)
+        if pool is None:
+            pool = _shared_async_pool(self._async_key)
+        self._async_pool = pool
+
+    def _normalised_port(self):
+        try:
+            return int(self.port)
+        except (TypeError, ValueError):
+            return self.port
+
+    def _child_args(self):
+        """
+        Returns keyword arguments to create another async object on the same connection
+        """
+        args = super(AsyncVSApi, self)._child_args()
+        args['pool'] = self._async_pool
+        return args
+
+    async def sendAuthorized(self,method,url,body,headers,rawData=False):
+        """
+        Internal method to sign and send requests. Callers should use request() instead.  As with VSApi.sendAuthorized,
+        failed attempts are retried here if a retry_policy is set.
+        :return: AsyncResponse
+        """
+        retry = self.retry_policy.begin(self.host, self.port) if self.retry_policy is not None else None
+        while True:
+            if retry is not None:
+                retry.check()
+            try:
+                response = await self._send_governed(method,url,body,headers,rawData)
+            except (http.client.BadStatusLine, socket_error, asyncio.IncompleteReadError) as e:
+                if retry is None:
+                    raise
+                await asyncio.sleep(self._next_retry_delay(retry, e))
+                continue
+            if retry is None:
+                return response
+            delay = self._next_retry_delay(retry, status=response.status)
+            if delay is None:
+                return response
+            #the response has been read completely already, so there is nothing to give back
+            await asyncio.sleep(delay)
+
+    async def _send_governed(self,method,url,body,headers,rawData=False):
+        """
+        Internal method to make one attempt at a request, within the governor's limits if there is one
+        """
+        slot = None
+        if self.governor is not None:
+            slot = await self.governor.acquire_async(self.host, self.port, method, url)
+        try:
+            return await self._send_recorded_async(method,url,body,headers,rawData,slot)
+        finally:
+            #the response has been read completely by now
+            if slot is not None:
+                slot.release()
+
+    async def _send_recorded_async(self,method,url,body,headers,rawData=False,slot=None):
+        """
+        Internal method to send a request, describing it to the instrumentation if there is any.  The response has been
+        read completely when it is returned, so its record is finished here.
+        :param slot: VSGovernorSlot the request was let through with, if any
+        """
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            return await self._send_async(method,url,body,headers,rawData)
+
+        record = self._start_record(instrumentation, method, url)
+        if slot is not None:
+            record.queue_time = slot.waited
+        if body:
+            try:
+                record.bytes_out = len(self._encode_body(body, rawData))
+            except TypeError:
+                pass
+        try:
+            response = await self._send_async(method,url,body,headers,rawData)
+        except BaseException as e:
+            record.error = e
+            self._finish_record(record)
+            raise
+        record.status = response.status
+        #the body is read along with the headers, so this includes the time taken to receive it
+        record.ttfb = time.time() - record.started
+        record.bytes_in = len(response.body)
+        self._finish_record(record, response)
+        response._vs_record = record
+        return response
+
+    async def _send_async(self,method,url,body,headers,rawData=False):
+        """
+        Internal method that does the work of sendAuthorized()
+        """
+        attempt = 0
+        self._authorize(headers)
+        body_to_send = self._encode_body(body, rawData)
+        if body_to_send is not None and not body:
+            body_to_send = None
+
+        while True:
+            self.logger.debug("sending {0} request to {1} with headers {2}".format(method,url,headers))
+            conn = await self._async_pool.acquire(self._async_key)
+            try:
+                await conn.send(method, url, body_to_send, headers)
+            except (socket_error, asyncio.IncompleteReadError) as e:
+                self._async_pool.discard(self._async_key, conn)
+                if self.retry_policy is not None:
+                    raise
+                attempt += 1
+                logger.warning("Socket error: {0}, resetting conection".format(e))
+                await asyncio.sleep(1)
+                if attempt>10:
+                    raise
+                continue
+
+            try:
+                response = await conn.read_response(method)
+            except http.client.RemoteDisconnected:
+                self._async_pool.discard(self._async_key, conn)
+                #an idle keep-alive connection was closed by the server, so nothing was processed and it is safe to retry
+                if not conn.reused or attempt>10:
+                    raise
+                attempt += 1
+                continue
+            except BaseException:
+                self._async_pool.discard(self._async_key, conn)
+                raise
+
+            if response.will_close:
+                self._async_pool.discard(self._async_key, conn)
+            else:
+                self._async_pool.release(self._async_key, conn)
+
+            if response.status == 303:
+                url = response.getheader('location')
+                logger.debug("Response was a redirect to {0}".format(url))
+            elif response.status == 504 and self.retry_policy is None:    #gateway timeout
+                await asyncio.sleep(self._gateway_timeout_delay(url))
+            else:
+                self._note_undelayed()
+                return response
+
+    async def raw_request(self,path,method="GET",matrix=None,query=None,body=None,accept="application/xml",
+                          content_type='application/xml',rawData=False,extra_headers={},records=None):
+        """
+        Coroutine version of VSApi.raw_request
+        :param records: if a list is given and instrumentation is set, the VSRequestRecord of the request is appended to it
+        :return: raw response body as bytes. Raises VSException subclasses if an error occurs.
+        """
+        base_headers = self._request_headers(accept, body, content_type, extra_headers)
+        url = self._build_url(path, matrix, query)
+
+        if method == "POST" and body is None:
+            body = ""
+
+        response = await self.sendAuthorized(method,url,body,base_headers,rawData=rawData)
+        record = getattr(response, '_vs_record', None)
+        if records is not None and record is not None:
+            records.append(record)
+
+        if response.status<200 or response.status>299:
+            raise HTTPError(response.status,method,url,response.status,response.reason,response.read()).to_VSException(method=method,url=url,body=body)
+
+        return response.read()
+
+    async def request(self,path,method="GET",matrix=None,query=None,body=None, accept='application/xml'):
+        """
+        Coroutine version of VSApi.request.  Automatically retries at retry_delay intervals if a 503 Server Unavailable
+        is returned.
+        :return: A parsed XML element tree if data is returned or the string "Success" if there is no data. Raises VSException
+        subclasses if an error occurs.
+        """
+        extra_args = {}
+        if self.instrumentation is not None:
+            records = []
+            extra_args['records'] = records
+        n=0
+        while True:
+            n+=1
+            try:
+                raw_body = await self.raw_request(path.replace(' ', '%20'),method=method,matrix=matrix,query=query,body=body,accept=accept,
+                                                  **extra_args)
+                break
+            except (HTTPError, http.client.BadStatusLine) as e:
+                await asyncio.sleep(self._fixed_retry_delay(e, n))
+
+        if self.instrumentation is not None:
+            return self._timed_parse(raw_body, accept, records[-1] if records else None)
+        return self._parse_response_body(raw_body, accept)
+
+    async def chunked_upload_request(self,upload_io,total_size,chunk_size,
+                                     path,transferPriority=500,throttle=True,method="GET",matrix=None,query=None,
+                                     filename=None,
+                                     accept="application/xml",content_type='application/octet-stream',extra_headers={}):
+        """
+        Coroutine version of VSApi.chunked_upload_request. Chunks are read from upload_io in a worker thread so that the
+        event loop is not blocked by disk access.
+        :return: None
+        """
+        transfer_id = uuid4().hex
+
+        query_params={
+            'transferId': transfer_id,
+            'transferPriority': transferPriority,
+            'throttle'        : throttle,
+        }
+        if filename is not None:
+            query_params['filename'] = filename
+
+        if query is not None:
+            query_params.update(query)
+
+        raw_data = content_type == 'application/octet-stream'
+        loop = asyncio.get_running_loop()
+
+        def read_chunk(startbyte):
+            upload_io.seek(startbyte, os.SEEK_SET)
+            return upload_io.read(chunk_size)
+
+        self.logger.debug("Commencing upload from {0} in chunks of {1}".format(upload_io,chunk_size))
+        for startbyte in range(0,total_size,chunk_size):
+            headers = {
+                'size': total_size,
+                'index': startbyte
+            }
+            headers.update(extra_headers)
+            body_buffer = await loop.run_in_executor(None, read_chunk, startbyte)
+            await self.raw_request(path,method=method,matrix=matrix,query=query_params,body=body_buffer,
+                                   content_type=content_type,rawData=raw_data,extra_headers=headers)
+            self.logger.debug("Uploaded a total of {0} bytes".format(startbyte+len(body_buffer)))
+
+
+class AsyncVSJob(AsyncVSApi, VSJob):
+    """
+    asyncio version of VSJob. populate(), update() and abort() are coroutines.
+    """
+    async def populate(self,id,metadata=False):
+        self.name = id
+        if metadata:
+            self.dataContent = await self._request_document("/job/%s?metadata=true" % id)
+        else:
+            self.dataContent = await self._request_document("/job/%s" % id)
+
+        self._populateInternal()
+        return self
+
+    async def update(self,noraise=True):
+        self.dataContent = await self._request_document("/job/%s" % self.name)
+        self._populateInternal()
+
+        if not noraise:
+            if self.didFail():
+                from .vs_job import VSJobFailed
+                raise VSJobFailed(self)
+
+    async def abort(self):
+        await self.request("/job/{0}".format(self.name),method="DELETE")
+
+
+class AsyncVSItem(AsyncVSApi, VSItem):
+    """
+    asyncio version of VSItem. populate(), reload(), set_metadata(), transcode() and streaming_import_to_shape()
+    are coroutines.
+    """
+    async def populate(self, entity_id=None, type="item", specificFields=None):
+        content = await self._request_document(self._metadata_path(entity_id, type, specificFields), method="GET")
+        if isinstance(content, dict):
+            return self.fromJSON(content,objectClass=type)
+        return self.fromXML(content,objectClass=type)
+
+    async def reload(self):
+        self.contentDict = {}
+        await self.populate(self.name)
+
+    async def set_metadata(self, md, group=None, entitytype="default", mode="default"):
+        if entitytype == "item":
+            path = "/item/%s/metadata" % (self.name)
+        else:
+            path = "/%s/%s/metadata" % (self.type,self.name)
+
+        if mode == "add":
+            metadoc = self._make_metadata_document(md,group,mode="add")
+        else:
+            metadoc = self._make_metadata_document(md,group)
+
+        return await self.request(path, method="PUT", body=metadoc)
+
+    async def transcode(self, shapetag, priority='MEDIUM', wait=True, allow_object=False, create_thumbnails=False,
+                        job_metadata=None, poll_interval=5):
+        """
+        Transcode the item's video to a new format. See VSItem.transcode; while waiting, other tasks on the event loop
+        carry on running.
+        :return: the job ID of the transcode job, or a populated AsyncVSJob object (if wait=False) or None (if wait=True)
+        """
+        path = "/item/{id}/transcode".format(id=self.name)
+        jobDocument = await self.request(path, method="POST",
+                                         query=self._transcode_query(shapetag, priority, create_thumbnails, job_metadata))
+        jobID = jobDocument.find("{0}jobId".format(self.xmlns)).text
+        logger.debug("Transcode job ID is %s" % jobID)
+
+        job = AsyncVSJob(**self._child_args())
+        if wait == False:
+            if allow_object:
+                return await job.populate(jobID)
+            return jobID
+
+        while True:
+            await job.populate(jobID)
+            status = job.status() or ""
+            if status in VSJobSet.terminal_states:
+                if status.startswith("FINISHED"):
+                    return None
+                raise VSTranscodeError(job)
+            await asyncio.sleep(poll_interval)
+
+    async def streaming_import_to_shape(self, filename, transferPriority=500, throttle=True, rename=None, **kwargs):
+        """
+        Coroutine version of VSItem.streaming_import_to_shape
+        """
+        import io
+        args = self.import_base(**kwargs)
+        if rename is None: rename=os.path.basename(filename)
+
+        with io.FileIO(filename) as f:
+            await self.chunked_upload_request(f,os.path.getsize(filename),chunk_size=1024*1024,
+                                              path="/item/{0}/shape/raw".format(self.name),filename=rename,
+                                              transferPriority=transferPriority,throttle=throttle,query=args,method="POST")
+
+
+class AsyncVSCollection(AsyncVSApi, VSCollection):
+    """
+    asyncio version of VSCollection. populate() is a coroutine.
+    """
+    async def populate(self, id, type="collection", specificFields=None):
+        content = await self.request(self._metadata_path(id, "collection", specificFields), method="GET")
+        self.fromXML(content, objectClass="collection")
+        response = await self.request("/collection/{0}".format(self.name))
+        self.itemCount = sum(1 for node in response.findall("{0}content".format(self.xmlns)))
+        return self
+
+
+class AsyncVSFile(VSFile):
+    """
+    VSFile belonging to an AsyncVSStorage. delete(), move() and setState() are coroutines.
+    """
+    async def delete(self):
+        await self.parent.request("/storage/{0}/file/{1}".format(self.parent.name, self.name), method="DELETE")
+
+    async def move(self, storage):
+        if isinstance(storage,VSStorage):
+            destname = storage.name
+        else:
+            destname = storage
+        await self.parent.request("/storage/{0}/file/{1}/storage/{2}".format(self.parent.name, self.name, destname),
+                                  method="POST",
+                                  query={'move': 'true'})
+
+    async def setState(self, newstate):
+        await self.parent.request("/storage/{0}/file/{1}/state/{2}".format(self.parent.name, self.name, newstate), method="PUT")
+
+
+class AsyncVSStorage(AsyncVSApi, VSStorage):
+    """
+    asyncio version of VSStorage. populate(), fileForID() and file_count() are coroutines, and files() is an async
+    generator.
+    """
+    async def populate(self, vsid):
+        if vsid is not None:
+            self.dataContent = await self._request_document("/storage/%s" % vsid, method="GET")
+        VSStorage.populate(self, None)
+        return self
+
+    async def fileForID(self, vsid):
+        response = await self._request_document("/storage/{storage}/file/{fileid}?includeItem=true".format(storage=self.name,fileid=vsid))
+        return AsyncVSFile(self, response)
+
+    async def _file_request(self, path, got_files, pageSize, state, include_item):
+        mtx, q = self._file_request_params(path, got_files, pageSize, state, include_item)
+        return await self._request_document("/storage/{storage}/file".format(storage=self.name),
+                                            method="GET",
+                                            matrix=mtx,
+                                            query=q)
+
+    async def file_count(self, path='/', include_item=True, state=None):
+        response = await self._file_request(path, 0, 0, state=state, include_item=include_item)
+        return int(self._hits(response))
+
+    async def files(self, path='/', include_item=True, state=None, pageSize=100):
+        """
+        Async generator that yields AsyncVSFile objects for each file on the storage
+        """
+        got_files = 0
+        while True:
+            response = await self._file_request(path, got_files, pageSize, state, include_item)
+            start_num_files = got_files
+            if isinstance(response, dict):
+                filenodes = json_list(response.get('file'))
+            else:
+                filenodes = response.findall("{0}file".format(self.xmlns))
+            for filenode in filenodes:
+                got_files += 1
+                yield AsyncVSFile(self,filenode)
+
+            if got_files == start_num_files: #no files returned => we got to the end
+                break
+
+
+class AsyncVSSearchResult(AsyncVSApi, VSSearchResult):
+    """
+    asyncio version of VSSearchResult. setup() is a coroutine and results()/results_page() are async generators.
+    When shouldPopulate is True, all of the items on a page are populated concurrently.
+    """
+    async def _nextPage(self, page_number=-1):
+        xmlData = await self._request_document(self.searchURL,method="PUT",
+                                               matrix=self._page_matrix(page_number),
+                                               query=self._page_query(),
+                                               body=self.searchParam)
+        return self._check_page(xmlData)
+
+    async def setup(self,page_number=-1):
+        self.cachedData = await self._nextPage(page_number=page_number)
+        return self
+
+    async def _page_objects(self, pageData, shouldPopulate, fields=None):
+        rtn = []
+        item_nodes = {} if self.content else None
+        for entity_type, entity_id in self._page_node_refs(pageData,item_nodes=item_nodes):
+            if entity_type=="collection":
+                obj = AsyncVSCollection(**self._child_args())
+            else:
+                obj = AsyncVSItem(**self._child_args())
+            obj.name = entity_id
+            if entity_type=="item" and item_nodes is not None and entity_id in item_nodes:
+                obj.fromSearchResult(item_nodes.pop(entity_id), content=self.content)
+            rtn.append(obj)
+
+        if self.content and "metadata" in self.content:
+            #the results already have their metadata, so there is nothing to populate
+            shouldPopulate = False
+        if shouldPopulate:
+            await asyncio.gather(*[obj.populate(obj.name, specificFields=fields) for obj in rtn])
+        return rtn
+
+    async def results(self,shouldPopulate=True,fields=None):
+        while(self.totalItems<0 or self.itemsRetrieved<self.totalItems):
+            if self.cachedData is not None:
+                pageData = self.cachedData
+                self.cachedData = None
+            else:
+                logger.debug("getting next page of results...")
+                pageData = await self._nextPage()
+
+            page = await self._page_objects(pageData, shouldPopulate, fields)
+            if len(page)==0:
+                break
+            for obj in page:
+                self.itemsRetrieved += 1
+                yield obj
+
+    async def results_page(self,page_number,shouldPopulate=True,fields=None):
+        if self.cachedData is not None:
+            pageData = self.cachedData
+            self.cachedData = None
+        else:
+            pageData = await self._nextPage(page_number)
+        for obj in await self._page_objects(pageData, shouldPopulate, fields):
+            self.itemsRetrieved += 1
+            yield obj
+
+
+class AsyncVSSearch(AsyncVSApi, VSSearch):
+    """
+    asyncio version of VSSearch. execute() is a coroutine returning an AsyncVSSearchResult.
+    """
+    async def execute(self,page_number=-1):
+        xmlBody = self._makeXML()
+        url = self._search_url()
+        logger.debug("AsyncVSSearch::execute - url is %s" % url)
+
+        rtn = AsyncVSSearchResult(search_url=url,body=xmlBody,searchType=self.searchType,debug=self.debug,
+                                  pageSize=self.pageSize,content=self.content,fields=self.contentFields,
+                                  **self._child_args())
+        return await rtn.setup(page_number=page_number)
+
+
+class AsyncVSItemSearch(AsyncVSSearch):
+    def __init__(self,*args,**kwargs):
+        super(AsyncVSItemSearch,self).__init__(searchType="item", *args, **kwargs)
+
+
+class AsyncVSCollectionSearch(AsyncVSSearch):
+    def __init__(self,*args,**kwargs):
+        super(AsyncVSCollectionSearch,self).__init__(searchType="collection", *args,**kwargs)
@@ -0,0 +1,422 @@
+"""
+Caching of populated items and collections, so that repeated populate() calls for the same entity don't go to the
+server every time.
+
+cache = VSItemCache(backend=VSLRUCacheBackend(maxsize=5000), ttl=300, ttls={'collection': 60})
+VSItem.cache = cache            #every VSItem and VSCollection from now on, or:
+item = VSItem(host,port,user,passwd,cache=cache)    #just this one
+
+item.populate("VX-1234")        #goes to the server and stores the result
+item.populate("VX-1234")        #served from the cache, no request made
+
+Entries are stored for ttl seconds.  After that, if the entity's metadata/changes show no changeset newer than the one
+the cached copy was made from, the entry is renewed for another ttl without fetching the metadata again; otherwise it
+is re-fetched.  Call invalidate() (or note_change() from a notification handler) to drop an entry immediately.
+
+Copies are kept separately for each user and RunAs user, as Vidispine may show them different metadata or none at
+all; invalidate() and note_change() drop them for everyone.  Entries are stored as JSON, so that nothing read back from
+a shared backend can run code.
+
+Three storage backends are provided:
+ - VSLRUCacheBackend: in-process, bounded to maxsize entities, least recently used evicted first
+ - VSSQLiteCacheBackend: on disk, so that it survives restarts and can be shared by processes on the same machine
+ - VSMemcacheCacheBackend: any client with the python-memcached get/set/delete/flush_all interface.  VSLocalMemcacheClient
+   is an in-process stand-in with the same interface, for development and tests without a memcached server.
+"""
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from . import vs_xml
+from .vidispine_api import json_list
+
+logger = logging.getLogger(__name__)
+
+
+class VSCacheBackend(object):
+    """
+    Interface for cache storage.  Values are bytes; expire is a lifetime in seconds after which the backend may discard
+    the value, or 0 for no limit.
+    """
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, expire=0):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class VSLRUCacheBackend(VSCacheBackend):
+    """
+    In-process cache holding at most maxsize entries, discarding the least recently used first.  Thread-safe.
+    """
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value, expires_at = self._entries[key]
+            except KeyError:
+                return None
+            if expires_at and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expire=0):
+        with self._lock:
+            self._entries[key] = (value, time.time() + expire if expire else 0)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class VSSQLiteCacheBackend(VSCacheBackend):
+    """
+    Cache stored in an sqlite database file, holding at most maxsize entries and discarding the least recently used
+    first.  Thread-safe; several processes can share the same file.
+    """
+    def __init__(self, path, maxsize=100000):
+        self.path = path
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._db.execute("CREATE TABLE IF NOT EXISTS vs_cache (key TEXT PRIMARY KEY, value BLOB, "
+                             "expires_at REAL, accessed_at REAL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS vs_cache_accessed ON vs_cache (accessed_at)")
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM vs_cache").fetchone()[0]
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, expires_at FROM vs_cache WHERE key=?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] and row[1] < now:
+                self._db.execute("DELETE FROM vs_cache WHERE key=?", (key,))
+                return None
+            self._db.execute("UPDATE vs_cache SET accessed_at=? WHERE key=?", (now, key))
+            return bytes(row[0])
+
+    def set(self, key, value, expire=0):
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO vs_cache (key, value, expires_at, accessed_at) VALUES (?,?,?,?)",
+                             (key, sqlite3.Binary(value), now + expire if expire else 0, now))
+            count = self._db.execute("SELECT COUNT(*) FROM vs_cache").fetchone()[0]
+            if count > self.maxsize:
+                self._db.execute("DELETE FROM vs_cache WHERE key IN "
+                                 "(SELECT key FROM vs_cache ORDER BY accessed_at LIMIT ?)", (count - self.maxsize,))
+
+    def delete(self, key):
+        with self._lock:
+            self._db.execute("DELETE FROM vs_cache WHERE key=?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM vs_cache")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class VSLocalMemcacheClient(object):
+    """
+    In-process stand-in for a memcached client, with the python-memcached get/set/delete/flush_all interface.  Like a
+    memcached server, it holds a bounded number of items and evicts the least recently used.
+    """
+    def __init__(self, maxsize=1000):
+        self._store = VSLRUCacheBackend(maxsize=maxsize)
+
+    def get(self, key):
+        return self._store.get(key)
+
+    def set(self, key, value, time=0):
+        self._store.set(key, value, expire=time)
+        return True
+
+    def delete(self, key):
+        self._store.delete(key)
+        return True
+
+    def flush_all(self):
+        self._store.clear()
+
+
+class VSMemcacheCacheBackend(VSCacheBackend):
+    """
+    Cache stored through a memcached client such as memcache.Client from python-memcached, or VSLocalMemcacheClient.
+    Size is bounded by the memcached server's own eviction.
+    """
+    max_key_length = 250
+
+    def __init__(self, client=None, prefix="gnmvidispine:"):
+        self.client = client if client is not None else VSLocalMemcacheClient()
+        self.prefix = prefix
+
+    def _key(self, key):
+        #memcached keys can't contain whitespace or control characters and are limited to 250 bytes
+        full_key = self.prefix + key
+        if len(full_key) > self.max_key_length or re.search(r'[\s\x00-\x1f]', full_key):
+            full_key = self.prefix + hashlib.sha1(key.encode("UTF-8")).hexdigest()
+        return full_key
+
+    def get(self, key):
+        return self.client.get(self._key(key))
+
+    def set(self, key, value, expire=0):
+        self.client.set(self._key(key), value, time=int(expire))
+
+    def delete(self, key):
+        self.client.delete(self._key(key))
+
+    def clear(self):
+        self.client.flush_all()
+
+
+def _changeset_number(changeset_id):
+    """
+    Returns the numeric part of a changeset id, e.g. 1234 for VX-1234, for ordering
+    """
+    try:
+        return int(changeset_id.rsplit("-", 1)[-1])
+    except (ValueError, AttributeError):
+        return -1
+
+
+def latest_changeset(changeset_ids):
+    """
+    Returns the most recent of the given changeset ids, or None if there are none
+    """
+    ids = [c.strip() for c in changeset_ids if c is not None and c.strip() != ""]
+    if len(ids) == 0:
+        return None
+    return max(ids, key=_changeset_number)
+
+
+class VSItemCache(object):
+    """
+    Cache of populated VSItem and VSCollection objects.  See the module documentation for usage.
+    """
+    def __init__(self, backend=None, ttl=300, ttls=None, revalidate=True, keep_for=86400):
+        """
+        :param backend: a VSCacheBackend; defaults to a VSLRUCacheBackend of 1000 entries
+        :param ttl: number of seconds an entry is used for before it is checked against the server again
+        :param ttls: dictionary of entity type ("item" or "collection") to ttl, for types that should differ from ttl
+        :param revalidate: when an entry expires, compare its changeset against the entity's metadata/changes and
+        renew it if nothing has changed, rather than always fetching the metadata again
+        :param keep_for: number of seconds an expired entry is kept for so that it can be revalidated
+        """
+        self.backend = backend if backend is not None else VSLRUCacheBackend()
+        self.ttl = ttl
+        self.ttls = ttls if ttls is not None else {}
+        self.revalidate = revalidate
+        self.keep_for = keep_for
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def ttl_for(self, entity_type):
+        return self.ttls.get(entity_type, self.ttl)
+
+    @staticmethod
+    def _key(conn, entity_type, entity_id):
+        return "{0}:{1}/{2}/{3}".format(conn.host, conn.port, entity_type, entity_id)
+
+    @staticmethod
+    def _variant_key(conn, specificFields):
+        """
+        Internal method returning the key of one cached copy of an entity within its entry.  Copies are kept apart by
+        the user and RunAs user they were loaded as, so that nobody is given metadata that Vidispine would not show them.
+        """
+        if isinstance(specificFields, list) or isinstance(specificFields, tuple):
+            fields = ",".join(specificFields)
+        else:
+            fields = "*"
+        return json.dumps([conn.user, conn.run_as, fields])
+
+    def _load(self, key):
+        raw = self.backend.get(key)
+        if raw is None:
+            return {}
+        try:
+            variants = json.loads(raw.decode("UTF-8") if isinstance(raw, bytes) else raw)
+            if not isinstance(variants, dict):
+                raise ValueError("expected an object, got {0}".format(variants.__class__.__name__))
+            return variants
+        except Exception as e:
+            logger.warning("Discarding unreadable cache entry for {0}: {1}".format(key, e))
+            self.backend.delete(key)
+            return {}
+
+    def _save(self, key, variants):
+        if len(variants) == 0:
+            self.backend.delete(key)
+        else:
+            self.backend.set(key, json.dumps(variants).encode("UTF-8"),
+                             expire=self.keep_for + max([self.ttl] + list(self.ttls.values())))
+
+    def lookup(self, item, entity_id, entity_type="item", specificFields=None):
+        """
+        Loads item from the cache if there is a usable entry for it, revalidating an expired entry against the server
+        if possible.
+        :param item: VSItem or VSCollection to load into
+        :return: True if item was loaded, False if it must be populated from the server
+        """
+        key = self._key(item, entity_type, entity_id)
+        variants = self._load(key)
+        fields_key = self._variant_key(item, specificFields)
+        record = variants.get(fields_key)
+        if record is None:
+            self.misses += 1
+            return False
+
+        if record['expires_at'] < time.time():
+            if not self.revalidate or record['changeset'] is None:
+                self.misses += 1
+                return False
+            current = self.server_changeset(item, entity_type, entity_id)
+            if current is None or current != record['changeset']:
+                logger.debug("{0} has changed since it was cached ({1} -> {2})".format(key, record['changeset'], current))
+                del variants[fields_key]
+                self._save(key, variants)
+                self.misses += 1
+                return False
+            self.revalidations += 1
+            record['expires_at'] = time.time() + self.ttl_for(entity_type)
+            self._save(key, variants)
+
+        self.hits += 1
+        self._restore(item, record)
+        return True
+
+    def store(self, item, entity_id=None, entity_type="item", specificFields=None):
+        """
+        Stores a populated VSItem or VSCollection
+        :param entity_id: the ID that the item was requested by, if not item.name (e.g. an external ID)
+        """
+        if entity_id is None:
+            entity_id = item.name
+        key = self._key(item, entity_type, entity_id)
+        variants = self._load(key)
+        variants[self._variant_key(item, specificFields)] = self._record(item, entity_type)
+        self._save(key, variants)
+
+    def invalidate(self, entity_id, entity_type="item", conn=None, host=None, port=None):
+        """
+        Drops any cached copies of the given entity, for every user.  Pass either a connection object (any VSApi) or host
+        and port.
+        """
+        if conn is not None:
+            host, port = conn.host, conn.port
+        self.backend.delete("{0}:{1}/{2}/{3}".format(host, port, entity_type, entity_id))
+
+    def note_change(self, conn, entity_id, changeset_id, entity_type="item"):
+        """
+        Drops the cached copies of the given entity unless they are already at least as recent as changeset_id. Call
+        this from a metadata-modification notification handler to keep the cache up to date without polling.
+        """
+        key = self._key(conn, entity_type, entity_id)
+        variants = self._load(key)
+        current = dict([(k, v) for k, v in variants.items()
+                        if v['changeset'] is not None and
+                        _changeset_number(v['changeset']) >= _changeset_number(changeset_id)])
+        if len(current) != len(variants):
+            self._save(key, current)
+
+    def clear(self):
+        self.backend.clear()
+
+    def _record(self, item, entity_type):
+        if isinstance(item.dataContent, dict):
+            data_format = "json"
+            data = item.dataContent
+        else:
+            data_format = "xml"
+            data = vs_xml.tostring(item.dataContent, encoding="unicode")
+        return {
+            'name': item.name,
+            'type': item.type,
+            'format': data_format,
+            'data': data,
+            'extra': item._cache_extra(),
+            'changeset': self.document_changeset(item.dataContent),
+            'expires_at': time.time() + self.ttl_for(entity_type),
+        }
+
+    @staticmethod
+    def _restore(item, record):
+        #contentDict is rebuilt from the document, as populate() would
+        item.contentDict = {}
+        if record['format'] == "json":
+            item.fromJSON(record['data'], objectClass=record['type'])
+        else:
+            item.fromXML(record['data'], objectClass=record['type'])
+        item.name = record['name']
+        item.type = record['type']
+        item._restore_cache_extra(record['extra'])
+
+    @staticmethod
+    def document_changeset(doc):
+        """
+        Returns the most recent changeset that a metadata document says it was built from, or None
+        """
+        if isinstance(doc, dict):
+            metadata = doc
+            items = json_list(doc.get('item'))
+            if len(items) > 0:
+                metadata = items[0].get('metadata', {})
+            elif 'metadata' in doc:
+                metadata = doc['metadata']
+            revision = metadata.get('revision')
+        else:
+            revision = None
+            for path in ("vs:item/vs:metadata/vs:revision", "vs:metadata/vs:revision", "vs:revision"):
+                revision = vs_xml.vs_path(path).text(doc)
+                if revision is not None:
+                    break
+        if revision is None:
+            return None
+        return latest_changeset(revision.split(","))
+
+    @staticmethod
+    def server_changeset(conn, entity_type, entity_id):
+        """
+        Asks the server for the most recent changeset of the given entity
+        """
+        doc = conn._request_document("/{0}/{1}/metadata/changes".format(entity_type, entity_id))
+        if isinstance(doc, dict):
+            ids = [c.get('id') for c in json_list(doc.get('changeSet'))]
+        else:
+            ids = [node.text for node in vs_xml.vs_path("vs:changeSet/vs:id").findall(doc)]
+        return latest_changeset(ids)
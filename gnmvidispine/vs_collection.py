@@ -43,9 +43,16 @@ class VSCollection(VSItem):
         :return:
         """
         super(VSCollection,self).populate(id,type="collection",specificFields=specificFields)
+
+    def _after_populate(self):
         response = self.request("/collection/{0}".format(self.name))
         self.itemCount = sum(1 for node in response.findall("{0}content".format(self.xmlns)))
-        
+
+    def _cache_extra(self):
+        return {'itemCount': self.itemCount}
+
+    def _restore_cache_extra(self, extra):
+        self.itemCount = extra.get('itemCount', -1)
 
     def addToCollection(self, item, type="item"):
         """
@@ -157,32 +164,52 @@ class VSCollection(VSItem):
         newItem.createEmpty(metadata=md,title=self.get('title'))
         return newItem
 
-    def content(self, shouldPopulate=True):
+    def content(self, shouldPopulate=True, fields=None):
         """
         Generator to iterate through all contents of this Collection
         :param shouldPopulate: True if the objects should be populated (looked up in database) before yielding them.
         False to return un-populated objects
+        :param fields: list or tuple of the names of the fields to load when populating. If None (default), load every
+        field
         :return: None (yields results)
         """
         response = self.request("/collection/{0}".format(self.name))
         ns = "{http://xml.vidispine.com/schema/vidispine}"
 
+        populated_items = {}
+        if shouldPopulate:
+            #load the metadata for all of the items in one request rather than one request each
+            item_ids = [itemNode.find("{0}id".format(ns)).text for itemNode in response.findall("{0}content".format(ns))
+                        if itemNode.find("{0}type".format(ns)).text == "item"]
+            try:
+                loader = VSItem(self.host,self.port,self.user,self.passwd,transport=self.transport)
+                for item in loader.populate_many(item_ids, specificFields=fields):
+                    populated_items[item.name] = item
+            except Exception as e:
+                #fall back to loading items one at a time, so that one bad item does not stop the others being returned
+                logging.error(e)
+                logging.error(format_exc())
+
         for itemNode in response.findall("{0}content".format(ns)):
             try:
                 entrytype = itemNode.find("{0}type".format(ns))
                 if entrytype.text == "collection":
-                    rtn = VSCollection(self.host,self.port,self.user,self.passwd)
+                    rtn = VSCollection(self.host,self.port,self.user,self.passwd,transport=self.transport)
                     if shouldPopulate:
-                        rtn.populate(itemNode.find("{0}id".format(ns)).text)
+                        rtn.populate(itemNode.find("{0}id".format(ns)).text, specificFields=fields)
                     else:
                         rtn.name = itemNode.find("{0}id".format(ns)).text
                     yield rtn
                 if entrytype.text == "item":
-                    rtn = VSItem(self.host,self.port,self.user,self.passwd)
-                    if shouldPopulate:
-                        rtn.populate(itemNode.find("{0}id".format(ns)).text)
+                    item_id = itemNode.find("{0}id".format(ns)).text
+                    if item_id in populated_items:
+                        rtn = populated_items[item_id]
                     else:
-                        rtn.name = itemNode.find("{0}id".format(ns)).text
+                        rtn = VSItem(self.host,self.port,self.user,self.passwd,transport=self.transport)
+                        if shouldPopulate:
+                            rtn.populate(item_id, specificFields=fields)
+                        else:
+                            rtn.name = item_id
                     yield rtn
             except Exception as e:
                 logging.error(e)
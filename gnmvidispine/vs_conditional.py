@@ -0,0 +1,143 @@
+import threading
+import logging
+from collections import OrderedDict
+from copy import deepcopy
+
+logger = logging.getLogger(__name__)
+
+
+class VSConditionalCache(object):
+    """
+    A thread-safe, bounded cache of GET responses together with the ETag and Last-Modified validators that the server
+    sent with them.
+
+    When a cache is set, VSApi.request() sends If-None-Match/If-Modified-Since for any GET it has a cached response for.
+    If the server answers 304 Not Modified, a copy of the cached parsed document is returned instead of downloading
+    and parsing the body again.  This is worthwhile for configuration-type resources that are reloaded frequently but
+    rarely change, e.g. storages, field groups, field definitions and global metadata.
+
+    cache = VSConditionalCache(maxsize=500)
+    VSApi.conditional_cache = cache             #for every object, or:
+    storage = VSStorage(host,port,user,passwd,conditional_cache=cache)     #for just this one
+
+    At most maxsize responses are held; the least recently used is discarded first.  Responses without an ETag or
+    Last-Modified header are not stored.  Any PUT, POST or DELETE made through a VSApi using the cache discards cached
+    responses for the same path and for any path above or beneath it.
+    """
+    def __init__(self, maxsize=256, copy=True):
+        """
+        Initialise a new cache
+        :param maxsize: maximum number of responses to hold
+        :param copy: if True (default) each caller gets its own copy of a cached document, so it can be modified safely.
+        If your code never modifies what request() returns, set this to False to return the cached object itself.
+        """
+        if maxsize<1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.copy = copy
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(api, url, accept):
+        """
+        Returns the key that identifies a response.  Responses depend on the credentials (and RunAs user) they were
+        requested with as well as the URL.
+        :param api: VSApi object making the request
+        :param url: full request URL, as built by VSApi._build_url
+        :param accept: MIME type requested
+        :return: tuple
+        """
+        return (api.host, str(api.port), api.user, api.run_as, accept, url)
+
+    def validators(self, key):
+        """
+        Returns the conditional request headers to send for the given key, or an empty dictionary if nothing is cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return {}
+        headers = {}
+        if entry['etag'] is not None:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified'] is not None:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def not_modified(self, key):
+        """
+        Called when the server has said that the document for key is not modified
+        :return: the cached document, or None if it has been evicted in the meantime
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return self._output(entry['document'])
+
+    def store(self, key, headers, document):
+        """
+        Called when the server has returned a full response.  Stores it if it has validators.
+        :param key: key from make_key()
+        :param headers: dictionary of response headers, with lower-case names
+        :param document: parsed response body
+        """
+        etag = headers.get('etag')
+        last_modified = headers.get('last-modified')
+        with self._lock:
+            self.misses += 1
+            if etag is None and last_modified is None:
+                self._entries.pop(key, None)
+                return
+            self._entries[key] = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'document': self._output(document),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard_path(self, api, path):
+        """
+        Discards any cached responses from the same server for path, anything beneath it, and anything above it (whose
+        documents may include what has changed, e.g. /storage/VX-1 when /storage/VX-1/metadata is written)
+        :param api: VSApi object making the request
+        :param path: URL path, not including /API
+        """
+        written = self._path_segments("/API" + path)
+        host, port = api.host, str(api.port)
+        with self._lock:
+            for key in list(self._entries.keys()):
+                if key[0] != host or key[1] != port:
+                    continue
+                cached = self._path_segments(key[5])
+                common = min(len(cached), len(written))
+                if cached[:common] == written[:common]:
+                    del self._entries[key]
+
+    @staticmethod
+    def _path_segments(url):
+        """
+        Returns the path segments of url, without any matrix or query parameters
+        """
+        return [segment.split(";")[0] for segment in url.split("?")[0].strip("/").split("/")]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _output(self, document):
+        if self.copy and not isinstance(document, (str, bytes)):
+            return deepcopy(document)
+        return document
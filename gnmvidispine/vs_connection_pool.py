@@ -0,0 +1,219 @@
+import http.client
+import threading
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """
+    Raised if a blocking pool could not provide a connection within its timeout
+    """
+    pass
+
+
+class VSConnectionPool(object):
+    """
+    A thread-safe pool of keep-alive HTTP connections to Vidispine.
+
+    Connections are keyed by (host, port, scheme, user, password) so one pool can serve several servers or accounts.
+    At most maxsize idle connections are kept per key; if block=True then no more than maxsize connections per key
+    are ever checked out at once, and acquire() waits up to timeout seconds for one to be returned.
+
+    Normally you would not call the pool directly, but pass it to the first VSApi object that you create:
+
+    pool = VSConnectionPool(maxsize=8)
+    search = VSItemSearch(host=host,port=port,user=user,passwd=passwd,pool=pool)
+
+    The pool is registered against the host, port and credentials of that object, so every VSItem, VSShape, VSJob etc.
+    that is created for the same server and user (e.g. by VSSearchResult.results()) shares it automatically.
+    """
+    def __init__(self, maxsize=10, block=False, timeout=None, connection_timeout=None):
+        """
+        Initialise a new connection pool
+        :param maxsize: maximum number of keep-alive connections to hold per key
+        :param block: if True, never hand out more than maxsize connections per key at once
+        :param timeout: if block is True, how long to wait for a free connection before raising PoolTimeout. None means wait forever.
+        :param connection_timeout: socket timeout to apply to new connections, in seconds. None means the system default.
+        """
+        if maxsize<1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.block = block
+        self.timeout = timeout
+        self.connection_timeout = connection_timeout
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._slots = {}
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    @staticmethod
+    def make_key(host, port, https, user, passwd):
+        """
+        Returns the key that identifies connections to the given server with the given credentials
+        :return: tuple
+        """
+        try:
+            port = int(port)
+        except (TypeError, ValueError):
+            pass
+        return (host, port, "https" if https else "http", user, passwd)
+
+    def _slot_for(self, key):
+        with self._lock:
+            if key not in self._slots:
+                self._slots[key] = threading.BoundedSemaphore(self.maxsize)
+            return self._slots[key]
+
+    def _new_connection(self, key):
+        host, port, scheme, user, passwd = key
+        kwargs = {}
+        if self.connection_timeout is not None:
+            kwargs['timeout'] = self.connection_timeout
+        if scheme=="https":
+            conn = http.client.HTTPSConnection(host, port, **kwargs)
+        else:
+            conn = http.client.HTTPConnection(host, port, **kwargs)
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def acquire(self, key):
+        """
+        Checks out a connection for the given key, re-using an idle one if there is one available.
+        Every connection acquired must be given back with release(), discard() or detach().
+        :param key: key from make_key()
+        :return: HTTPConnection or HTTPSConnection
+        """
+        if self.block:
+            if not self._slot_for(key).acquire(timeout=self.timeout if self.timeout is not None else -1):
+                raise PoolTimeout("No connection to {0}:{1} became free within {2}s".format(key[0], key[1], self.timeout))
+
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.reused += 1
+                conn = idle.pop()
+                conn._vs_pool_reused = True
+                return conn
+
+        conn = self._new_connection(key)
+        conn._vs_pool_reused = False
+        return conn
+
+    def release(self, key, conn):
+        """
+        Returns a connection to the pool once its response has been completely read.
+        If the pool already holds maxsize idle connections for the key, the connection is closed instead.
+        :param key: key that the connection was acquired with
+        :param conn: connection to return
+        :return: None
+        """
+        should_close = False
+        with self._lock:
+            idle = self._idle.setdefault(key, deque())
+            if len(idle)<self.maxsize:
+                idle.append(conn)
+            else:
+                should_close = True
+        if should_close:
+            self._close(conn)
+        self._free_slot(key)
+
+    def discard(self, key, conn):
+        """
+        Closes a connection that has failed, rather than returning it to the pool
+        :param key: key that the connection was acquired with
+        :param conn: connection to close
+        :return: None
+        """
+        with self._lock:
+            self.discarded += 1
+        self._close(conn)
+        self._free_slot(key)
+
+    def detach(self, key, conn):
+        """
+        Stops tracking a connection without closing it.  This is used when a response is handed back to the caller
+        unread, e.g. for file downloads; the connection is left to be garbage-collected along with the response.
+        :param key: key that the connection was acquired with
+        :param conn: connection to forget about
+        :return: None
+        """
+        self._free_slot(key)
+
+    def _free_slot(self, key):
+        if self.block:
+            try:
+                self._slot_for(key).release()
+            except ValueError:  #released more times than acquired
+                logger.warning("Connection pool slot for {0}:{1} released twice".format(key[0], key[1]))
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception as e:
+            logger.debug("Error closing pooled connection: {0}".format(e))
+
+    def idle_count(self, key=None):
+        """
+        Returns the number of idle connections held, either for the given key or in total
+        :return: integer
+        """
+        with self._lock:
+            if key is not None:
+                return len(self._idle.get(key, []))
+            return sum(len(v) for v in list(self._idle.values()))
+
+    def close(self):
+        """
+        Closes all idle connections held by the pool
+        :return: None
+        """
+        with self._lock:
+            to_close = [conn for idle in list(self._idle.values()) for conn in idle]
+            self._idle = {}
+        for conn in to_close:
+            self._close(conn)
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _registry_key(host, port, https, user, passwd):
+    return VSConnectionPool.make_key(host, port, https, user, passwd)
+
+
+def register_pool(pool, host, port, user, passwd, https=None):
+    """
+    Registers a pool to be used by every VSApi object created for the given server, scheme and credentials.
+    :param pool: VSConnectionPool, or None to remove any existing registration
+    :param https: True if the pool's connections are https. When removing a registration, None (the default) removes
+    both schemes.
+    :return: None
+    """
+    with _registry_lock:
+        if pool is None:
+            for scheme in ((True, False) if https is None else (https,)):
+                _registry.pop(_registry_key(host, port, scheme, user, passwd), None)
+        else:
+            _registry[_registry_key(host, port, https, user, passwd)] = pool
+
+
+def registered_pool(host, port, user, passwd, https=None):
+    """
+    Looks up the pool registered for the given server and credentials
+    :param https: True or False to only find a pool for that scheme, or None to find one for either (https first)
+    :return: tuple of (VSConnectionPool, https flag) or (None, https) if nothing is registered
+    """
+    with _registry_lock:
+        for scheme in ((True, False) if https is None else (bool(https),)):
+            pool = _registry.get(_registry_key(host, port, scheme, user, passwd))
+            if pool is not None:
+                return pool, scheme
+    return None, https
@@ -0,0 +1,366 @@
+"""
+Parallel, resumable downloads of Vidispine files.
+
+VSRangedDownload fetches a file from /storage/file/{id}/data as a number of HTTP Range requests, several at once, each
+on its own connection (or one from the registered VSConnectionPool).  The destination file is created at its full size
+up front and memory mapped, so each range is read from the socket straight into place:
+
+download = VSRangedDownload(storage, "VX-1234", "/path/to/media.mxf", size=1234567890, expected_hash="da39a3ee...",
+                            threads=4, journal="/path/to/media.mxf.download")
+download.run()
+print(download.throughput)
+
+If a journal filename is given, every byte range written is recorded in it.  Running the same download again after an
+interruption only fetches what is missing; the journal is removed when the download completes.  If expected_hash is
+given the finished file is checked against it, and VSHashMismatch is raised if it does not match.
+
+If the size is not known, or the server does not honour Range requests, the file is fetched in one request instead.
+
+copy_response() streams a single response into any file-like object through a fixed-size buffer, hashing it on the way;
+VSFile.download_to() and VSShape.download_to() use it.
+"""
+import hashlib
+import logging
+import mmap
+import os
+import threading
+import time
+
+from .vidispine_api import VSApi, HTTPError
+from .vs_upload import VSUploadJournal, _add_range, _missing_ranges
+
+logger = logging.getLogger(__name__)
+
+
+class VSHashMismatch(Exception):
+    """
+    Raised if a downloaded file does not have the hash that Vidispine holds for it
+    """
+    def __init__(self, filename, expected, actual):
+        super(VSHashMismatch, self).__init__("{0} has hash {1}, expected {2}".format(filename, actual, expected))
+        self.filename = filename
+        self.expected = expected
+        self.actual = actual
+
+
+def copy_response(response, sink, buffer_size=1024*1024, hash_algorithm=None, progress=None):
+    """
+    Copies the body of an HTTP response to a file-like object, without holding more than buffer_size bytes of it in
+    memory.  Data is read into one re-used buffer and written from there.
+    :param response: HTTPResponse, or anything else with a read() method
+    :param sink: object with a write() method, e.g. an open file, a pipe or a socket file
+    :param buffer_size: size of the buffer to copy through, in bytes
+    :param hash_algorithm: hashlib name of an algorithm to hash the data with as it is copied, or None
+    :param progress: optional function called with the number of bytes copied each time the buffer is written
+    :return: tuple of (number of bytes copied, hex digest or None)
+    """
+    h = hashlib.new(hash_algorithm) if hash_algorithm is not None else None
+    total = 0
+    buf = bytearray(buffer_size)
+    view = memoryview(buf)
+    readinto = getattr(response, 'readinto', None)
+    try:
+        while True:
+            if readinto is not None:
+                n = readinto(view)
+            else:
+                data = response.read(buffer_size)
+                n = len(data)
+                view[:n] = data
+            if not n:
+                break
+            sink.write(view[:n])
+            if h is not None:
+                h.update(view[:n])
+            total += n
+            if progress is not None:
+                progress(n)
+    finally:
+        view.release()
+    return total, h.hexdigest() if h is not None else None
+
+
+class VSDownloadJournal(VSUploadJournal):
+    """
+    Records the byte ranges of a download that have been written, so that it can be resumed
+    """
+    pass
+
+
+class _RangesNotSupported(Exception):
+    pass
+
+
+class VSRangedDownload(object):
+    """
+    Downloads a Vidispine file to a local file in ranges, several at once.  See the module documentation.
+    """
+    read_size = 8*1024*1024
+
+    def __init__(self, connection, file_id, destination, size=None, expected_hash=None, hash_algorithm="sha1",
+                 threads=4, chunk_size=8*1024*1024, retries=3, journal=None, progress=None):
+        """
+        Prepare a new download
+        :param connection: Initialised VSApi object (or any other Vidispine base object) with the connection details to use
+        :param file_id: Vidispine ID of the file to download
+        :param destination: local file name to write to
+        :param size: size of the file in bytes, if known.  If None the file is fetched in a single request
+        :param expected_hash: hash that the finished file should have, or None to skip the check
+        :param hash_algorithm: hashlib name of the algorithm that expected_hash was made with. Vidispine uses SHA-1 unless
+        configured otherwise
+        :param threads: number of ranges to fetch at once
+        :param chunk_size: size of each range in bytes
+        :param retries: number of times to retry a range that fails before giving up
+        :param journal: filename to record progress in so that the download can be resumed, or a VSDownloadJournal, or None
+        :param progress: optional function called as progress(bytes_done, total_size, bytes_per_second) after each range
+        """
+        self.connection = connection
+        self.file_id = file_id
+        self.destination = destination
+        self.total_size = int(size) if size is not None else None
+        self.expected_hash = expected_hash
+        self.hash_algorithm = hash_algorithm
+        self.threads = threads
+        self.chunk_size = chunk_size
+        self.retries = retries
+        if journal is not None and not isinstance(journal, VSUploadJournal):
+            journal = VSDownloadJournal(journal)
+        self.journal = journal
+        self.progress = progress
+
+        self.bytes_received = 0
+        self.bytes_done = 0
+        self.ranges_fetched = 0
+        self.elapsed = 0
+        self.hash = None
+        self._done = []
+        self._pending = []
+        self._lock = threading.Lock()
+        self._error = None
+        self._local = threading.local()
+        self._mmap = None
+        self._started = None
+
+    @property
+    def url(self):
+        return "/API/storage/file/{0}/data".format(self.file_id)
+
+    @property
+    def throughput(self):
+        """
+        Average rate of the download so far, in bytes per second
+        """
+        elapsed = time.time() - self._started if self._started is not None and self.elapsed == 0 else self.elapsed
+        if elapsed <= 0:
+            return 0
+        return self.bytes_received / elapsed
+
+    def _spec(self):
+        return {'file': self.file_id, 'size': self.total_size, 'hash': self.expected_hash,
+                'destination': os.path.abspath(self.destination)}
+
+    def _sender(self):
+        """
+        Internal method returning the VSApi that the current thread fetches ranges with
+        """
+        sender = getattr(self._local, 'sender', None)
+        if sender is None:
+            #same scheme, governor, retry policy and instrumentation as the connection it was given
+            sender = VSApi(**self.connection._child_args())
+            self._local.sender = sender
+        return sender
+
+    def _next_range(self):
+        """
+        Internal method returning the (start, end) of the next range to fetch, or None if there is nothing left
+        """
+        with self._lock:
+            if self._error is not None or len(self._pending) == 0:
+                return None
+            start, end = self._pending[0]
+            range_end = min(end, start + self.chunk_size)
+            if range_end == end:
+                self._pending.pop(0)
+            else:
+                self._pending[0] = (range_end, end)
+            return start, range_end
+
+    def _get(self, headers):
+        """
+        Internal method to send a GET for the file data
+        :return: HTTPResponse, which has been checked for success
+        """
+        sender = self._sender()
+        headers['Accept'] = '*'
+        response = sender.sendAuthorized('GET', self.url, '', headers)
+        if response.status < 200 or response.status > 299:
+            error_body = response.read()
+            sender.release_response(response)
+            raise HTTPError(response.status, 'GET', self.url, response.status, response.reason, error_body)
+        return response
+
+    def _read_into(self, response, view):
+        got = 0
+        while got < len(view):
+            n = response.readinto(view[got:])
+            if not n:
+                raise IOError("Connection closed after {0} of {1} bytes of {2}".format(got, len(view), self.file_id))
+            got += n
+            with self._lock:
+                self.bytes_received += n
+
+    def _fetch_range(self, start, end):
+        attempt = 0
+        while True:
+            view = memoryview(self._mmap)[start:end]
+            try:
+                response = self._get({'Range': 'bytes={0}-{1}'.format(start, end-1)})
+                if response.status != 206:
+                    self._sender().release_response(response, reuse=False)
+                    response.close()
+                    raise _RangesNotSupported()
+                try:
+                    self._read_into(response, view)
+                except Exception:
+                    self._sender().release_response(response, reuse=False)
+                    raise
+                self._sender().release_response(response)
+                return
+            except (HTTPError, IOError, OSError) as e:
+                attempt += 1
+                if attempt > self.retries or (isinstance(e, HTTPError) and e.code < 500):
+                    if isinstance(e, HTTPError):
+                        raise e.to_VSException(method='GET', url=self.url, body="")
+                    raise
+                logger.warning("Range at {0} of {1} failed ({2}), retrying".format(start, self.file_id, e))
+                time.sleep(min(2**attempt, 30))
+            finally:
+                view.release()
+
+    def _note_progress(self):
+        if self.progress is not None:
+            self.progress(self.bytes_done, self.total_size, self.throughput)
+
+    def _worker(self):
+        try:
+            while True:
+                r = self._next_range()
+                if r is None:
+                    return
+                start, end = r
+                self._fetch_range(start, end)
+                with self._lock:
+                    self._done = _add_range(self._done, start, end)
+                    self.bytes_done += end-start
+                    self.ranges_fetched += 1
+                    if self.journal is not None:
+                        self._mmap.flush()
+                        self.journal.save(None, self._done)
+                self._note_progress()
+        except Exception as e:
+            with self._lock:
+                if self._error is None:
+                    self._error = e
+
+    def _open_destination(self):
+        """
+        Internal method to create or re-open the destination at its full size and map it
+        :return: True if a previous partial download can be carried on from
+        """
+        resuming = self.journal is not None and self.journal.begin(self._spec()) and \
+            os.path.exists(self.destination) and os.path.getsize(self.destination) == self.total_size
+        if resuming:
+            self._done = list(self.journal.done)
+            self.bytes_done = sum([end-start for start, end in self._done])
+            logger.info("Resuming download of {0} with {1} bytes already present".format(self.file_id, self.bytes_done))
+        else:
+            self._done = []
+            self.bytes_done = 0
+            with open(self.destination, "wb") as f:
+                f.truncate(self.total_size)
+        if self.total_size > 0:
+            with open(self.destination, "r+b") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0)
+        return resuming
+
+    def _fetch_ranges(self):
+        self._open_destination()
+        self._pending = _missing_ranges(self._done, self.total_size)
+        try:
+            workers = [threading.Thread(target=self._worker, name="VSRangedDownload-{0}".format(n))
+                       for n in range(0, min(self.threads, len(self._pending)))]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+            if self._error is None and self.expected_hash is not None:
+                self.hash = self._hash_of(self._mmap if self._mmap is not None else b"")
+        finally:
+            if self._mmap is not None:
+                self._mmap.flush()
+                self._mmap.close()
+                self._mmap = None
+
+    def _hash_of(self, data):
+        h = hashlib.new(self.hash_algorithm)
+        view = memoryview(data)
+        try:
+            for pos in range(0, len(view), self.read_size):
+                h.update(view[pos:pos+self.read_size])
+        finally:
+            view.release()
+        return h.hexdigest()
+
+    def _fetch_whole(self):
+        """
+        Internal method to fetch the file in one request, for when ranges can't be used
+        """
+        try:
+            response = self._get({})
+        except HTTPError as e:
+            raise e.to_VSException(method='GET', url=self.url, body="")
+
+        def note(nbytes):
+            self.bytes_received += nbytes
+            self.bytes_done += nbytes
+            self._note_progress()
+
+        try:
+            with open(self.destination, "wb") as f:
+                nbytes, self.hash = copy_response(response, f, buffer_size=self.read_size,
+                                                  hash_algorithm=self.hash_algorithm, progress=note)
+        except Exception:
+            self._sender().release_response(response, reuse=False)
+            raise
+        self._sender().release_response(response)
+        self.ranges_fetched = 1
+
+    def run(self):
+        """
+        Performs the download, blocking until it is complete
+        :return: the destination file name. Raises the first error encountered if a range could not be fetched after
+        retrying (the journal, if any, then holds everything that was written), or VSHashMismatch if the finished file
+        does not match expected_hash.
+        """
+        self._started = time.time()
+        self.elapsed = 0
+        self._error = None
+        if self.total_size is None:
+            self._fetch_whole()
+        else:
+            self._fetch_ranges()
+            if isinstance(self._error, _RangesNotSupported):
+                logger.info("Server does not support ranges for {0}, fetching it whole".format(self.file_id))
+                self._error = None
+                self.bytes_done = 0
+                self._fetch_whole()
+        self.elapsed = time.time() - self._started
+
+        if self._error is not None:
+            raise self._error
+        if self.journal is not None:
+            self.journal.finish()
+        if self.expected_hash is not None and self.hash.lower() != self.expected_hash.lower():
+            raise VSHashMismatch(self.destination, self.expected_hash, self.hash)
+        logger.debug("Downloaded {0} bytes of {1} in {2:.1f}s".format(self.bytes_done, self.file_id, self.elapsed))
+        return self.destination
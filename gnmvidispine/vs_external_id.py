@@ -1,4 +1,5 @@
 from .vidispine_api import VSApi
+from . import vs_xml
 import xml.etree.cElementTree as ET
 
 
@@ -46,7 +47,7 @@ class ExternalIdNamespace(VSApi):
         :return: self, or raises VSException
         """
         path = "/external-id/{0}".format(self.name)
-        self.request(path,method="PUT",body=ET.tostring(self._xmldoc,encoding="utf8"))
+        self.request(path,method="PUT",body=vs_xml.tostring(self._xmldoc,encoding="utf8"))
         return self
 
     def safe_get(self, xpath, default=None):
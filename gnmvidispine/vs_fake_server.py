@@ -0,0 +1,482 @@
+"""
+A fake Vidispine server, for benchmarking and integration-testing this library without a real one.
+
+VSFakeServer runs a multi-threaded HTTP/1.1 server on a local port and answers the requests that the library makes
+for items, searches, shapes, thumbnails, storages, files, jobs, chunked uploads and file downloads, with documents
+shaped like those Vidispine returns.  Each item has an "original" and a "lowres" shape and three thumbnails.  The content is generated from a fixed data set whose size you choose:
+
+server = VSFakeServer(items=5000, files=5000, jobs=500, latency=0.005)
+server.start()
+item = VSItem(host=server.host, port=server.port, user="admin", passwd="admin")
+item.populate("VX-10")
+...
+server.stop()
+
+Latency is added to every response (a number of seconds, or a (min, max) tuple to choose from at random).  Errors can
+be injected either at random, with error_rate (a fraction of requests answered with 503 or 504), or explicitly with
+fail_next().  Credentials are not checked.  Only XML is served.
+
+server.requests counts the requests received by method and path template, and server.uploads holds the files
+assembled from chunked uploads, by item ID.
+"""
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlsplit, parse_qs, unquote
+
+logger = logging.getLogger(__name__)
+
+NS = "http://xml.vidispine.com/schema/vidispine"
+
+_item_field = """<field uuid="{uuid}" user="admin" timestamp="2018-05-01T10:00:00.000+01:00" change="VX-{change}">
+<name>{name}</name><value uuid="{uuid}" user="admin" timestamp="2018-05-01T10:00:00.000+01:00" change="VX-{change}">{value}</value>
+</field>"""
+
+_item_template = """<item id="{id}" start="-INF" end="+INF">{content}</item>"""
+
+_metadata_template = """<metadata><revision>VX-{n},VX-{rev}</revision>
+<timespan start="-INF" end="+INF">{fields}<group><name>Asset</name>{groupfields}</group></timespan></metadata>"""
+
+_shape_template = """<id>{id}</id><essenceVersion>0</essenceVersion><tag>{tag}</tag><mimeType>application/mxf</mimeType>
+<containerComponent><id>{id}</id>{file}</containerComponent>"""
+
+_shape_tags = ("original", "lowres")
+_thumbnail_count = 3
+
+_file_template = """<file><id>{id}</id><path>{path}</path><uri>file:///srv/media/{path}</uri><state>CLOSED</state>
+<size>{size}</size><hash>{hash}</hash><timestamp>2018-05-01T10:00:00.000+01:00</timestamp><refreshFlag>1</refreshFlag>
+<storage>{storage}</storage>{item}<metadata/></file>"""
+
+_job_template = """<job><jobId>{id}</jobId><user>admin</user><started>2018-05-01T09:00:00.000Z</started>
+<status>{status}</status><type>{type}</type><priority>MEDIUM</priority><currentStep><description>Step</description>
+<number>1</number><status>{status}</status></currentStep><totalSteps>3</totalSteps>
+<data><key>itemId</key><value>VX-{item}</value></data><data><key>transcodeProgress</key><value>100</value></data></job>"""
+
+_storage_template = """<StorageDocument xmlns="{ns}"><id>{id}</id><state>READY</state><type>LOCAL</type>
+<capacity>1099511627776</capacity><freeCapacity>549755813888</freeCapacity><timestamp>2018-05-01T10:00:00.000+01:00</timestamp>
+<method><id>VX-1</id><uri>file:///srv/media/</uri><read>true</read><write>true</write><browse>true</browse>
+<lastSuccess>2018-05-01T10:00:00.000+01:00</lastSuccess><type>NONE</type></method></StorageDocument>"""
+
+_job_statuses = ("FINISHED", "FINISHED", "FINISHED", "STARTED", "FAILED_TOTAL", "ABORTED")
+_job_types = ("TRANSCODE", "THUMBNAIL", "IMPORT", "ESSENCE_VERSION")
+
+
+def _matrix_and_path(path):
+    """
+    splits matrix parameters out of a URL path
+    :return: tuple of (path without matrix parameters, dictionary of matrix parameters)
+    """
+    segments = []
+    matrix = {}
+    for segment in path.split('/'):
+        parts = segment.split(';')
+        segments.append(parts[0])
+        for param in parts[1:]:
+            if '=' in param:
+                k, v = param.split('=', 1)
+                matrix[k] = unquote(v)
+            else:
+                matrix[param] = ''
+    return "/".join(segments), matrix
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s" % (self.address_string(), format % args))
+
+    def _reply(self, status, body=b"", content_type="application/xml", headers=None):
+        if isinstance(body, str):
+            body = body.encode("UTF-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _handle(self):
+        server = self.server.fake
+        length = int(self.headers.get('Content-Length', 0) or 0)
+        body = self.rfile.read(length) if length > 0 else b""
+
+        url = urlsplit(self.path)
+        path, matrix = _matrix_and_path(url.path)
+        query = dict([(k, v[-1]) for k, v in parse_qs(url.query, keep_blank_values=True).items()])
+        server._count(self.command, path)
+        server._delay()
+
+        error = server._injected_error()
+        if error is not None:
+            self._reply(error, "<ExceptionDocument xmlns=\"{0}\"/>".format(NS))
+            return
+
+        try:
+            status, response_body, headers = server._route(self.command, path, matrix, query, body, self.headers)
+        except Exception as e:
+            logger.exception("Fake server could not handle {0} {1}".format(self.command, self.path))
+            status, response_body, headers = 500, str(e), {}
+        content_type = headers.pop('Content-Type', 'application/xml')
+        self._reply(status, response_body, content_type, headers)
+
+    do_GET = _handle
+    do_PUT = _handle
+    do_POST = _handle
+    do_DELETE = _handle
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class VSFakeServer(object):
+    """
+    A local HTTP server imitating Vidispine.  See the module documentation.
+    """
+    def __init__(self, items=1000, files=1000, jobs=100, fields=50, file_size=1024*1024, storage="VX-1",
+                 latency=0, error_rate=0.0, seed=1, host="localhost", port=0):
+        """
+        :param items: number of items, VX-1 to VX-{items}
+        :param files: number of files on the storage
+        :param jobs: number of jobs
+        :param fields: number of metadata fields on each item, field_0 onwards (and the same again as asset_field_0
+        onwards in a group)
+        :param file_size: size in bytes of the file that is downloaded from /storage/file/{id}/data
+        :param storage: ID of the storage that holds the files
+        :param latency: seconds to wait before answering each request, or a (min, max) tuple to choose at random from
+        :param error_rate: fraction of requests (0 to 1) to answer with a 503 or 504 instead
+        :param seed: seed for the random choices of latency and errors, so that runs can be repeated
+        :param host: address to listen on
+        :param port: port to listen on; the default of 0 picks a free one
+        """
+        self.item_count = items
+        self.file_count = files
+        self.job_count = jobs
+        self.field_count = fields
+        self.file_size = file_size
+        self.storage = storage
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = Counter()
+        self.uploads = {}
+        #job statuses set with set_job_status, by job number
+        self.job_statuses = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._fail_queue = []
+        self._transfers = {}
+        self._file_data = None
+        self._file_hash = None
+        self._httpd = _ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.fake = self
+        self._thread = None
+
+    @property
+    def host(self):
+        return self._httpd.server_address[0]
+
+    @property
+    def port(self):
+        return self._httpd.server_address[1]
+
+    def start(self):
+        """
+        Starts serving on a background thread
+        :return: self
+        """
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="VSFakeServer")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def fail_next(self, status=503, count=1):
+        """
+        Answers the next count requests with the given error status
+        """
+        with self._lock:
+            self._fail_queue.extend([status] * count)
+
+    def set_job_status(self, job_id, status):
+        """
+        Changes the status of a job from the one it is given by default
+        """
+        with self._lock:
+            self.job_statuses[self._number(job_id)] = status
+
+    def _job_status(self, n):
+        return self.job_statuses.get(n, _job_statuses[n % len(_job_statuses)])
+
+    @property
+    def file_data(self):
+        """
+        The content served for every file, file_size bytes long
+        """
+        if self._file_data is None:
+            block = hashlib.sha256(b"gnmvidispine").digest() * 128
+            self._file_data = (block * (self.file_size // len(block) + 1))[:self.file_size]
+        return self._file_data
+
+    @property
+    def file_hash(self):
+        """
+        Hex SHA-1 digest of file_data
+        """
+        if self._file_hash is None:
+            self._file_hash = hashlib.sha1(self.file_data).hexdigest()
+        return self._file_hash
+
+    def _count(self, method, path):
+        template = re.sub(r'/[A-Za-z]{2}-\d+', '/{id}', path)
+        with self._lock:
+            self.requests[(method, template)] += 1
+
+    def _delay(self):
+        latency = self.latency
+        if isinstance(latency, tuple):
+            with self._lock:
+                latency = self._random.uniform(*latency)
+        if latency > 0:
+            time.sleep(latency)
+
+    def _injected_error(self):
+        with self._lock:
+            if self._fail_queue:
+                return self._fail_queue.pop(0)
+            if self.error_rate > 0 and self._random.random() < self.error_rate:
+                return self._random.choice((503, 504))
+        return None
+
+    def _route(self, method, path, matrix, query, body, headers):
+        parts = [p for p in path.split('/') if p != ""]
+        if len(parts) == 0 or parts[0] != "API":
+            return 404, "", {}
+        parts = parts[1:]
+
+        if parts == ["item"] and method == "PUT":
+            return 200, self._item_search(matrix, query, body), {}
+        if len(parts) == 3 and parts[0] == "item" and parts[2] == "metadata" and method == "GET":
+            return self._item_metadata(parts[1], matrix)
+        if len(parts) == 3 and parts[0] == "item" and parts[2] == "shape" and method == "GET":
+            return self._item_shapes(parts[1])
+        if len(parts) == 4 and parts[0] == "item" and parts[2] == "shape" and method == "GET":
+            return self._item_shape(parts[1], parts[3])
+        if len(parts) == 3 and parts[0] == "item" and parts[2] == "thumbnailresource" and method == "GET":
+            return self._item_thumbnail_resources(parts[1])
+        if len(parts) == 3 and parts[0] == "thumbnail" and method == "GET":
+            return 200, "<URIListDocument xmlns=\"{0}\">{1}</URIListDocument>".format(
+                NS, "".join(["<uri>{0}@PAL</uri>".format(t) for t in range(0, _thumbnail_count)])), {}
+        if len(parts) == 4 and parts[0] == "item" and parts[2:] == ["shape", "raw"] and method == "POST":
+            return self._upload_chunk(parts[1], query, body, headers)
+        if len(parts) == 2 and parts[0] == "storage" and method == "GET":
+            return 200, _storage_template.format(ns=NS, id=parts[1]), {}
+        if len(parts) == 3 and parts[0] == "storage" and parts[2] == "file" and method == "GET":
+            return 200, self._file_list(matrix, query), {}
+        if len(parts) == 4 and parts[:2] == ["storage", "file"] and parts[3] == "data" and method == "GET":
+            return self._file_data_response(headers)
+        if parts == ["job"] and method == "GET":
+            return 200, self._job_list(matrix), {}
+        if len(parts) == 2 and parts[0] == "job" and method == "GET":
+            return self._job(parts[1])
+        return 404, "<ExceptionDocument xmlns=\"{0}\"><notFound><type>{1}</type></notFound></ExceptionDocument>".format(
+            NS, "/".join(parts)), {}
+
+    @staticmethod
+    def _number(entity_id):
+        m = re.match(r'^[A-Za-z]{2}-(\d+)$', entity_id)
+        return int(m.group(1)) if m else None
+
+    def _item_xml(self, n, field_names=None, content=("metadata",)):
+        names = [(f, "field_{0}".format(f)) for f in range(0, self.field_count)]
+        if field_names is not None:
+            names = [(f, name) for f, name in names if name in field_names]
+
+        def fields(prefix):
+            return "".join([_item_field.format(uuid="2b6e0a3c-{0:04d}-4c1e-9b0a-6f1d2c3b4a5e".format(f), change=n,
+                                               name=prefix + name, value="value {0} of item {1}".format(f, n))
+                            for f, name in names])
+        parts = []
+        if "metadata" in content:
+            parts.append(_metadata_template.format(n=n, rev=n+1, fields=fields(""), groupfields=fields("asset_")))
+        if "shape" in content:
+            parts += ["<shape>{0}</shape>".format(self._shape_xml(n, s)) for s in range(0, len(_shape_tags))]
+        if "thumbnail" in content:
+            parts.append("<thumbnails>{0}</thumbnails>".format("".join(
+                ["<uri>{0}/{1}@PAL</uri>".format(self._thumbnail_resource(n), t) for t in range(0, _thumbnail_count)])))
+        return _item_template.format(id="VX-{0}".format(n), content="".join(parts))
+
+    def _shape_xml(self, n, s):
+        """
+        :return: the content of the ShapeDocument for shape s (an index into _shape_tags) of item n
+        """
+        shape_number = n * len(_shape_tags) + s
+        filepath = "media_{0}_{1}.mxf".format(n, _shape_tags[s])
+        file_xml = _file_template.format(id="VX-{0}".format(shape_number), path=filepath, size=self.file_size,
+                                         hash=self.file_hash, storage=self.storage, item="")
+        return _shape_template.format(id="VX-{0}".format(shape_number), tag=_shape_tags[s], file=file_xml)
+
+    def _thumbnail_resource(self, n):
+        return "http://{0}:{1}/API/thumbnail/VX-1/VX-{2}".format(self.host, self.port, n)
+
+    def _item_number(self, entity_id):
+        """
+        :return: the number of the item with the given ID, or None if there is no such item
+        """
+        n = self._number(entity_id)
+        if n is None or n < 1 or n > self.item_count:
+            return None
+        return n
+
+    def _item_shapes(self, entity_id):
+        n = self._item_number(entity_id)
+        if n is None:
+            return 404, "<ExceptionDocument xmlns=\"{0}\"/>".format(NS), {}
+        return 200, "<URIListDocument xmlns=\"{0}\">{1}</URIListDocument>".format(
+            NS, "".join(["<uri>VX-{0}</uri>".format(n * len(_shape_tags) + s) for s in range(0, len(_shape_tags))])), {}
+
+    def _item_shape(self, entity_id, shape_id):
+        n = self._item_number(entity_id)
+        shape_number = self._number(shape_id)
+        if n is None or shape_number is None or shape_number // len(_shape_tags) != n:
+            return 404, "<ExceptionDocument xmlns=\"{0}\"/>".format(NS), {}
+        return 200, "<ShapeDocument xmlns=\"{0}\">{1}</ShapeDocument>".format(
+            NS, self._shape_xml(n, shape_number % len(_shape_tags))), {}
+
+    def _item_thumbnail_resources(self, entity_id):
+        n = self._item_number(entity_id)
+        if n is None:
+            return 404, "<ExceptionDocument xmlns=\"{0}\"/>".format(NS), {}
+        return 200, "<URIListDocument xmlns=\"{0}\"><uri>{1}</uri></URIListDocument>".format(
+            NS, self._thumbnail_resource(n)), {}
+
+    def _item_metadata(self, entity_id, matrix):
+        n = self._item_number(entity_id)
+        if n is None:
+            return 404, "<ExceptionDocument xmlns=\"{0}\"/>".format(NS), {}
+        field_names = matrix['field'].split(',') if 'field' in matrix else None
+        return 200, "<MetadataListDocument xmlns=\"{0}\">{1}</MetadataListDocument>".format(
+            NS, self._item_xml(n, field_names)), {}
+
+    def _item_search(self, matrix, query, body):
+        first = int(matrix.get('first', 1))
+        number = int(matrix.get('number', 100))
+        content = query['content'].split(',') if query.get('content') else []
+        field_names = query['field'].split(',') if 'field' in query else None
+
+        ids = None
+        if body:
+            try:
+                doc = ET.fromstring(body)
+                for field in doc.iter('{{{0}}}field'.format(NS)):
+                    name = field.find('{{{0}}}name'.format(NS))
+                    if name is not None and name.text == "itemId":
+                        ids = [v.text for v in field.findall('{{{0}}}value'.format(NS))]
+            except ET.ParseError:
+                pass
+
+        if ids is not None:
+            numbers = [n for n in [self._number(i) for i in ids] if n is not None and 1 <= n <= self.item_count]
+            hits = len(numbers)
+            numbers = numbers[0:number]
+        else:
+            hits = self.item_count
+            numbers = range(first, min(first + number, self.item_count + 1))
+
+        if content:
+            entries = "".join([self._item_xml(n, field_names, content) for n in numbers])
+        else:
+            entries = "".join(['<item id="VX-{0}" start="-INF" end="+INF"/>'.format(n) for n in numbers])
+        return "<ItemListDocument xmlns=\"{0}\"><hits>{1}</hits>{2}</ItemListDocument>".format(NS, hits, entries)
+
+    def _file_list(self, matrix, query):
+        start = int(matrix.get('start', 0))
+        number = int(matrix.get('number', 100))
+        include_item = 'includeItem' in matrix and matrix['includeItem'] != 'false'
+        path = query.get('path', '/').strip('/')
+        digest = self.file_hash
+        entries = []
+        for n in range(start, min(start + number, self.file_count)):
+            item = "<item><id>VX-{0}</id></item>".format(n % self.item_count + 1) if include_item else ""
+            filepath = "{0}/media_{1}.mxf".format(path, n).lstrip('/')
+            entries.append(_file_template.format(id="VX-{0}".format(n + 1), path=filepath, size=self.file_size,
+                                                 hash=digest, storage=self.storage, item=item))
+        return "<FileListDocument xmlns=\"{0}\"><hits>{1}</hits>{2}</FileListDocument>".format(
+            NS, self.file_count, "".join(entries))
+
+    def _file_data_response(self, headers):
+        data = self.file_data
+        m = re.match(r'^bytes=(\d+)-(\d*)$', headers.get('Range', '') or '')
+        if m is None:
+            return 200, data, {'Content-Type': 'application/octet-stream', 'Accept-Ranges': 'bytes'}
+        start = int(m.group(1))
+        end = int(m.group(2)) + 1 if m.group(2) else len(data)
+        end = min(end, len(data))
+        if start >= len(data):
+            return 416, b"", {'Content-Range': 'bytes */{0}'.format(len(data))}
+        return 206, data[start:end], {'Content-Type': 'application/octet-stream',
+                                      'Content-Range': 'bytes {0}-{1}/{2}'.format(start, end - 1, len(data))}
+
+    def _job_xml(self, n):
+        return _job_template.format(id="VX-{0}".format(n), status=self._job_status(n),
+                                    type=_job_types[n % len(_job_types)], item=n % self.item_count + 1)
+
+    def _job_list(self, matrix):
+        first = int(matrix.get('first', 0))
+        number = int(matrix.get('number', 100))
+        jobs = range(1, self.job_count + 1)
+        if 'state' in matrix:
+            states = matrix['state'].split(",")
+            jobs = [n for n in jobs if self._job_status(n) in states]
+        entries = "".join([self._job_xml(n) for n in jobs[first:first + number]])
+        return "<JobListDocument xmlns=\"{0}\"><hits>{1}</hits>{2}</JobListDocument>".format(NS, len(jobs), entries)
+
+    def _job(self, job_id):
+        n = self._number(job_id)
+        if n is None or n < 1 or n > self.job_count:
+            return 404, "<ExceptionDocument xmlns=\"{0}\"/>".format(NS), {}
+        job = self._job_xml(n).replace("<job>", "<JobDocument xmlns=\"{0}\">".format(NS)).replace("</job>", "</JobDocument>")
+        return 200, job, {}
+
+    def _upload_chunk(self, item_id, query, body, headers):
+        transfer_id = query.get('transferId')
+        total = int(headers.get('size', len(body)))
+        index = int(headers.get('index', 0))
+        with self._lock:
+            transfer = self._transfers.get(transfer_id)
+            if transfer is None:
+                transfer = {'data': bytearray(total), 'chunks': {}}
+                self._transfers[transfer_id] = transfer
+            transfer['data'][index:index + len(body)] = body
+            #a chunk may be sent more than once if it is retried
+            transfer['chunks'][index] = len(body)
+            complete = sum(transfer['chunks'].values()) >= total
+            if complete:
+                self.uploads[item_id] = bytes(transfer['data'])
+                del self._transfers[transfer_id]
+        if complete:
+            return 200, "<JobDocument xmlns=\"{0}\"><jobId>VX-{1}</jobId><status>READY</status><type>RAW_IMPORT</type>" \
+                        "</JobDocument>".format(NS, self.job_count + 1), {}
+        return 200, "", {}
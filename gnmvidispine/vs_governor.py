@@ -0,0 +1,311 @@
+"""
+Client-side limits on how hard the library drives a Vidispine server.
+
+VSRequestGovernor holds each request until it is within a token-bucket rate limit and a maximum number of requests in
+flight, for its host and its endpoint class, so that many threads and processes' worth of workers can be run flat out
+without overloading the server:
+
+governor = VSRequestGovernor(limits={'search': VSLimit(rate=5, burst=10, concurrency=2),
+                                     'metadata_write': VSLimit(rate=20, concurrency=4),
+                                     'file_data': VSLimit(concurrency=4)},
+                             total=VSLimit(concurrency=16),
+                             hosts={'vs-archive.example.com': {'file_data': VSLimit(concurrency=1)}})
+VSApi.governor = governor           #every object from now on, or:
+item = VSItem(host,port,user,passwd,governor=governor)      #just this one
+
+Requests are sorted into classes by classify(): search (searches of items, collections and libraries), metadata_write
+(PUT or POST to metadata), file_data (file contents, imports and uploads) or default.  Override classify() in a subclass,
+or pass classify=, to sort them differently.  Each host and port gets its own limits, from limits updated with anything
+given for that host in hosts, and every request to it also counts towards total.  A request is counted as in flight
+from when it is sent until its response has been read, except that stream_request() and download() responses only
+count until their headers have arrived, as the caller may make other requests while it reads the rest.
+
+acquire() blocks the calling thread; the asyncio API (see vs_async) uses acquire_async() instead, which waits on the
+event loop and holds nothing if the waiting task is cancelled.
+
+stats() gives, for each host and class, the number of requests in flight and waiting, and the total and longest time
+spent waiting.  If instrumentation is set (see vs_metrics), each request's wait is also recorded as its queue_time.
+"""
+import asyncio
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class VSGovernorTimeout(Exception):
+    """
+    Raised if a request could not be let through within its limit's timeout
+    """
+    pass
+
+
+class VSLimit(object):
+    """
+    Limits for one class of request to one host.  Anything left as None is not limited.
+    """
+    def __init__(self, rate=None, burst=None, concurrency=None, timeout=None):
+        """
+        :param rate: average number of requests per second
+        :param burst: number of requests that can be made at once after a quiet period; defaults to rate (or 1 if rate is
+        less than 1)
+        :param concurrency: maximum number of requests in flight at once
+        :param timeout: longest time a request waits before VSGovernorTimeout is raised, or None to wait as long as it takes
+        """
+        if rate is not None and rate <= 0:
+            raise ValueError("rate must be more than 0")
+        if concurrency is not None and concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.rate = rate
+        self.burst = burst if burst is not None else (max(1, rate) if rate is not None else None)
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+
+class _Gate(object):
+    """
+    The token bucket and in-flight count for one class of request to one host
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.tokens = float(limit.burst) if limit.rate is not None else 0.0
+        self.updated = time.time()
+        self.in_flight = 0
+        self.waiting = 0
+        self.requests = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self._condition = threading.Condition()
+
+    def _wait_needed(self, now):
+        """
+        Internal method returning 0 if a request can go now, the number of seconds until it can, or None if it has to wait
+        for another request to finish.  Must be called with the condition held.
+        """
+        limit = self.limit
+        if limit.concurrency is not None and self.in_flight >= limit.concurrency:
+            return None
+        if limit.rate is not None:
+            self.tokens = min(float(limit.burst), self.tokens + (now - self.updated) * limit.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return (1 - self.tokens) / limit.rate
+        return 0
+
+    def enter(self):
+        """
+        Blocks until a request may be sent
+        :return: number of seconds waited
+        """
+        started = time.time()
+        deadline = started + self.limit.timeout if self.limit.timeout is not None else None
+        with self._condition:
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.time()
+                    wait = self._wait_needed(now)
+                    if wait == 0:
+                        break
+                    if deadline is not None:
+                        if now >= deadline:
+                            raise VSGovernorTimeout("Waited {0}s to send a request".format(self.limit.timeout))
+                        wait = deadline - now if wait is None else min(wait, deadline - now)
+                    self._condition.wait(wait)
+            finally:
+                self.waiting -= 1
+            return self._admit(started)
+
+    async def enter_async(self, poll_interval):
+        """
+        Waits on the event loop until a request may be sent.  Nothing is held if the wait is cancelled.
+        :param poll_interval: how often to check whether another request has finished, in seconds
+        :return: number of seconds waited
+        """
+        started = time.time()
+        deadline = started + self.limit.timeout if self.limit.timeout is not None else None
+        with self._condition:
+            self.waiting += 1
+        try:
+            while True:
+                with self._condition:
+                    now = time.time()
+                    wait = self._wait_needed(now)
+                    if wait == 0:
+                        return self._admit(started)
+                if wait is None:
+                    wait = poll_interval
+                if deadline is not None:
+                    if now >= deadline:
+                        raise VSGovernorTimeout("Waited {0}s to send a request".format(self.limit.timeout))
+                    wait = min(wait, deadline - now)
+                await asyncio.sleep(wait)
+        finally:
+            with self._condition:
+                self.waiting -= 1
+
+    def _admit(self, started):
+        """
+        Internal method counting a request in once it may be sent.  Must be called with the condition held.
+        :return: number of seconds it waited
+        """
+        if self.limit.rate is not None:
+            self.tokens -= 1
+        self.in_flight += 1
+        waited = time.time() - started
+        self.requests += 1
+        self.wait_time += waited
+        self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    def leave(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            return {'in_flight': self.in_flight, 'waiting': self.waiting, 'requests': self.requests,
+                    'wait_time': self.wait_time, 'max_wait': self.max_wait}
+
+
+class VSGovernorSlot(object):
+    """
+    Permission for one request to be in flight. release() it once the response has been read.
+    """
+    def __init__(self, gates, waited):
+        self.gates = gates
+        self.waited = waited
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        for gate in self.gates:
+            gate.leave()
+
+
+class VSRequestGovernor(object):
+    """
+    Rate and concurrency limits on the requests made to each Vidispine host.  See the module documentation.
+    """
+    classes = ("search", "metadata_write", "file_data", "default")
+
+    #how often acquire_async() checks whether a request it is waiting behind has finished, in seconds
+    async_poll_interval = 0.01
+
+    _search_path = re.compile(r'^/API/(item|collection|library|search)/?$')
+    _file_data_path = re.compile(r'/(data|raw|import|upload)(/|$)')
+
+    def __init__(self, limits=None, total=None, hosts=None, classify=None):
+        """
+        :param limits: dictionary of request class to VSLimit, applied to each host separately
+        :param total: VSLimit applied to all of the requests to each host together, or None
+        :param hosts: dictionary of host name (or "host:port") to a dictionary of request class to VSLimit, overriding
+        limits for that host. The key "total" overrides total.
+        :param classify: function taking (method, url) and returning the class of a request, in place of classify()
+        """
+        self.limits = dict(limits or {})
+        self.total = total
+        self.hosts = dict(hosts or {})
+        if classify is not None:
+            self.classify = classify
+        self._gates = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def classify(cls, method, url):
+        """
+        Returns the class of a request
+        :param method: HTTP method
+        :param url: URL path, starting /API, with any matrix and query parameters
+        :return: search, metadata_write, file_data or default
+        """
+        path = "/".join([segment.split(';', 1)[0] for segment in url.split('?', 1)[0].split('/')])
+        if cls._file_data_path.search(path):
+            return "file_data"
+        if method in ("PUT", "POST"):
+            if cls._search_path.match(path):
+                return "search"
+            if "/metadata" in path:
+                return "metadata_write"
+        return "default"
+
+    def _limits_for(self, host, port):
+        overrides = self.hosts.get("{0}:{1}".format(host, port), self.hosts.get(host, {}))
+        limits = dict(self.limits)
+        limits.update(overrides)
+        return limits
+
+    def _gate(self, host, port, request_class):
+        """
+        Internal method returning the _Gate for a host and class, or None if it is not limited
+        """
+        key = (host, str(port), request_class)
+        with self._lock:
+            if key not in self._gates:
+                limits = self._limits_for(host, port)
+                limit = limits.get("total", self.total) if request_class == "total" else limits.get(request_class)
+                self._gates[key] = _Gate(limit) if limit is not None else None
+            return self._gates[key]
+
+    def acquire(self, host, port, method, url):
+        """
+        Blocks until a request may be sent to the given host.  Raises VSGovernorTimeout if a limit's timeout expires.
+        :return: VSGovernorSlot, to be released once the response has been read
+        """
+        gates = []
+        waited = 0
+        try:
+            for request_class in (self.classify(method, url), "total"):
+                gate = self._gate(host, port, request_class)
+                if gate is not None:
+                    waited += gate.enter()
+                    gates.append(gate)
+        except Exception:
+            VSGovernorSlot(gates, waited).release()
+            raise
+        if waited > 0.1:
+            logger.debug("Waited {0:.2f}s to send {1} {2}".format(waited, method, url))
+        return VSGovernorSlot(gates, waited)
+
+    async def acquire_async(self, host, port, method, url):
+        """
+        Coroutine version of acquire(), which waits on the event loop rather than blocking a thread.  If the task is
+        cancelled while it waits, anything it had already been let through is given back.
+        :return: VSGovernorSlot, to be released once the response has been read
+        """
+        gates = []
+        waited = 0
+        try:
+            for request_class in (self.classify(method, url), "total"):
+                gate = self._gate(host, port, request_class)
+                if gate is not None:
+                    waited += await gate.enter_async(self.async_poll_interval)
+                    gates.append(gate)
+        except BaseException:
+            VSGovernorSlot(gates, waited).release()
+            raise
+        if waited > 0.1:
+            logger.debug("Waited {0:.2f}s to send {1} {2}".format(waited, method, url))
+        return VSGovernorSlot(gates, waited)
+
+    def stats(self):
+        """
+        :return: dictionary of (host, port, class) to a dictionary of in_flight, waiting, requests, wait_time and max_wait.
+        The class "total" covers every request to the host.
+        """
+        with self._lock:
+            gates = [(k, g) for k, g in self._gates.items() if g is not None]
+        return dict([(k, g.stats()) for k, g in gates])
+
+    def queue_depth(self, host=None, port=None):
+        """
+        :return: number of requests waiting, to the given host or to any
+        """
+        #a request waits at one gate at a time, so this counts each of them once
+        return sum([s['waiting'] for k, s in self.stats().items()
+                    if host is None or (k[0] == host and (port is None or k[1] == str(port)))])
@@ -2,18 +2,20 @@ from __future__ import print_function
 import xml.etree.cElementTree as ET
 from .vidispine_api import InvalidData, VSBadRequest
 from .vs_job import VSJob, VSJobFailed
+from .vs_job_watcher import job_watcher
 from .vs_shape import VSShape
 from .vs_acl import VSAcl
 from .vs_thumbnail import VSThumbnailCollection
 import os.path
 from pprint import pprint
-from time import sleep
 import logging
 import re
+import json
 
-from .vidispine_api import HTTPError, VSApi, VSException, VSNotFound, always_string
+from .vidispine_api import HTTPError, VSApi, VSException, VSNotFound, always_string, json_list, json_text
+from . import vs_xml
 from .vs_storage_rule import VSStorageRule
-import io
+from .vs_upload import VSChunkedUpload
 
 
 class VSTranscodeError(VSException):
@@ -61,14 +63,134 @@ class VSItem(VSApi):
     rule = i.storageRule('shape_tag') #convenience method to get the storage rule for a specific shape
 
     builder = i.get_metadata_builder() #Return a VSMetadataBuilder object to help construct complex metadata sets
+
+    To avoid re-loading metadata that has not changed, set a VSItemCache (see vs_cache) either for every item and
+    collection by setting VSItem.cache, or for a single object with the cache= argument to the constructor.
     """
+    cache = None
+
     def __init__(self, *args, **kwargs):
+        cache = kwargs.pop('cache', None)
         super(VSItem, self).__init__(*args, **kwargs)
+        if cache is not None:
+            self.cache = cache
         self.dataContent = None
         self.name = "INVALIDNAME"
         self.type="item"
         self.contentDict = {}
         self._shapeListContent = None
+        #shapes and thumbnail URIs that came with the item in a search result, if they were asked for
+        self._inlineShapes = None
+        self._inlineThumbnailURIs = None
+
+    @property
+    def contentDict(self):
+        """
+        Dictionary of field name to value (or list of values) for the metadata that has been loaded.  Metadata loaded
+        by fromXML() or fromJSON() is only decoded into this when it is first used; get() decodes just the fields that
+        are asked for, so reading a few fields from a large item does not need the whole dictionary.
+        """
+        if self._pending_content is not None:
+            nodes, is_json = self._pending_content
+            self._pending_content = None
+            self._field_index = None
+            for node in nodes:
+                if is_json:
+                    self.makeContentDictJSON(node)
+                else:
+                    self.makeContentDict(node)
+        return self._contentDict
+
+    @contentDict.setter
+    def contentDict(self, value):
+        self._contentDict = value
+        self._pending_content = None
+        self._field_index = None
+
+    def _defer_content(self, nodes, is_json=False):
+        """
+        Internal method to hold timespans (or other nodes containing fields and groups) to be decoded into contentDict
+        when they are needed, rather than straight away
+        :param nodes: list of timespan elements, or decoded JSON timespan objects
+        :param is_json: True if the nodes are from a JSON document
+        """
+        if self._pending_content is None and len(self._contentDict) == 0:
+            self._pending_content = (nodes, is_json)
+            self._field_index = None
+        else:
+            #already has some content, which the new values are added to; keep the order by decoding now
+            self.contentDict
+            for node in nodes:
+                if is_json:
+                    self.makeContentDictJSON(node)
+                else:
+                    self.makeContentDict(node)
+
+    def _index_fields(self, node, is_json, index):
+        """
+        Internal method to add the field nodes in a timespan or group, and its subgroups, to index, which maps field
+        name to a list of field nodes.  Only the field names are read.
+        """
+        if is_json:
+            for field in json_list(node.get('field')):
+                key = json_text(field['name']) if 'name' in field else ""
+                index.setdefault(key, []).append(field)
+            for group in json_list(node.get('group')):
+                if isinstance(group, dict):
+                    self._index_fields(group, is_json, index)
+            return
+
+        name_tag = self.xmlns + "name"
+        for child in node:
+            tag = child.tag
+            if not isinstance(tag, str):
+                continue
+            if tag.endswith("field"):
+                key = ""
+                for subnode in child:
+                    if subnode.tag == name_tag:
+                        key = subnode.text
+                        break
+                index.setdefault(key, []).append(child)
+            elif tag.endswith("group"):
+                self._index_fields(child, is_json, index)
+
+    def _content_value(self, fieldname):
+        """
+        Internal method returning what contentDict[fieldname] is, or would be once it is decoded, without decoding any
+        other fields.  Raises KeyError if there is no value for the field.
+        """
+        if self._pending_content is None:
+            return self._contentDict[fieldname]
+
+        nodes, is_json = self._pending_content
+        if self._field_index is None:
+            index = {}
+            for node in nodes:
+                self._index_fields(node, is_json, index)
+            self._field_index = index
+
+        entry = self._field_index[fieldname]
+        if isinstance(entry, tuple):   #already decoded, as (value, whether there were any values)
+            if not entry[1]:
+                raise KeyError(fieldname)
+            return entry[0]
+
+        if is_json:
+            values = [json_text(val) for field in entry for val in json_list(field.get('value'))]
+        else:
+            value_tag = self.xmlns + "value"
+            values = [subnode.text for field in entry for subnode in field if subnode.tag == value_tag]
+        if len(values) == 0:
+            value = None
+        elif len(values) == 1:
+            value = values[0]
+        else:
+            value = values
+        self._field_index[fieldname] = (value, len(values) > 0)
+        if len(values) == 0:
+            raise KeyError(fieldname)
+        return value
 
     def path(self):
         """
@@ -129,7 +251,7 @@ class VSItem(VSApi):
         Returns a reconstructed XML document for the metadata of this item.
         :return: XML string
         """
-        return ET.tostring(self.dataContent,encoding)
+        return vs_xml.tostring(self.dataContent,encoding)
 
     def fromXML(self, xmldata=None, objectClass="item"):
         """
@@ -140,7 +262,7 @@ class VSItem(VSApi):
         :return: self
         """
         if isinstance(xmldata,str):
-            self.dataContent = ET.fromstring(xmldata)
+            self.dataContent = vs_xml.fromstring(xmldata)
         else:
             self.dataContent = xmldata
 
@@ -158,24 +280,95 @@ class VSItem(VSApi):
             else:
                 self.name = node.attrib['id']
 
+        #the timespans are only decoded into contentDict when it is used
         if self.type == "item":
-            for x in self.dataContent.findall('{0}item/{0}metadata/{0}timespan'.format(namespace)):
-                self.makeContentDict(x)
+            self._defer_content(self.dataContent.findall('{0}item/{0}metadata/{0}timespan'.format(namespace)))
         elif self.type == "itemdocument":
             self.type = "item"
-            for x in self.dataContent.findall('{0}metadata/{0}timespan'.format(namespace)):
-                self.makeContentDict(x)
+            self._defer_content(self.dataContent.findall('{0}metadata/{0}timespan'.format(namespace)))
         elif self.type == "collection":
-            for x in self.dataContent.findall('{0}timespan'.format(namespace)):
-                self.makeContentDict(x)
+            self._defer_content(self.dataContent.findall('{0}timespan'.format(namespace)))
             try:
-                self.name = self.contentDict['collectionId']
+                self.name = self._content_value('collectionId')
             except KeyError:
                 self.name = "INVALIDNAME"
         else:
             raise TypeError("item populate() called on something not identifying an item or collection")
         return self
 
+    def fromJSON(self, jsondata=None, objectClass="item"):
+        """
+        populate this item from the given JSON document, as returned by Vidispine for a metadata request with
+        accept=application/json.  contentDict and name end up the same as they would from the XML equivalent.
+        raises InvalidSourceError if the document does not contain what we need.
+        :param jsondata: decoded JSON document, or a string of JSON to decode
+        :param objectClass: is this an item or collection
+        :return: self
+        """
+        if isinstance(jsondata,(str,bytes)):
+            jsondata = json.loads(always_string(jsondata))
+        self.dataContent = jsondata
+        self.type=objectClass
+
+        if self.type == "item":
+            items = json_list(self.dataContent.get('item'))
+            if len(items) > 0:
+                node = items[0]
+            elif 'id' in self.dataContent and 'metadata' in self.dataContent:
+                node = self.dataContent     #ItemDocument
+            else:
+                raise InvalidSourceError("VSItem::fromJSON - declared as item but source document does not have an item or ItemDocument")
+            self.name = node['id']
+            self._defer_content(json_list(node.get('metadata', {}).get('timespan')), is_json=True)
+        elif self.type == "collection":
+            self._defer_content(json_list(self.dataContent.get('timespan')), is_json=True)
+            try:
+                self.name = self._content_value('collectionId')
+            except KeyError:
+                self.name = "INVALIDNAME"
+        else:
+            raise TypeError("item populate() called on something not identifying an item or collection")
+        return self
+
+    def fromSearchResult(self, node, content=None):
+        """
+        Populates this item from an item in a search result, as returned by a search with content options (see
+        VSSearch.setContent) so that no further requests are needed for what was included: the metadata, the shapes
+        (which shapes() and get_shape() then return) and the thumbnail URIs (which thumbnails() then returns).
+        :param node: item element from the search result, or the decoded JSON object for it
+        :param content: list of the content options that the search asked for. If None, whatever is in node is used.
+        :return: self
+        """
+        if isinstance(node, dict):
+            self.name = node['id']
+            has_metadata = node.get('metadata') is not None
+            shape_nodes = json_list(node.get('shape'))
+            thumbnails = node.get('thumbnails')
+            thumbnail_uris = [json_text(uri) for uri in json_list(thumbnails.get('uri'))] \
+                if isinstance(thumbnails, dict) else None
+            if has_metadata:
+                self.fromJSON({'item': [node]})
+        else:
+            self.name = node.attrib['id']
+            has_metadata = node.find('{0}metadata'.format(self.xmlns)) is not None
+            shape_nodes = node.findall('{0}shape'.format(self.xmlns))
+            thumbnails = node.find('{0}thumbnails'.format(self.xmlns))
+            thumbnail_uris = [uri.text for uri in thumbnails.findall('{0}uri'.format(self.xmlns))] \
+                if thumbnails is not None else None
+            if has_metadata:
+                #wrap the item in its own document, so that dataContent looks the same as it does after populate()
+                doc = node.makeelement('{0}MetadataListDocument'.format(self.xmlns), {})
+                doc.append(node)
+                self.fromXML(doc)
+
+        if len(shape_nodes) > 0 or (content is not None and "shape" in content):
+            self._inlineShapes = [VSShape(host=self.host, port=self.port, user=self.user, passwd=self.passwd,
+                                          transport=self.transport).fromResponse(self.name, shape_node)
+                                  for shape_node in shape_nodes]
+        if thumbnail_uris is not None or (content is not None and "thumbnail" in content):
+            self._inlineThumbnailURIs = thumbnail_uris if thumbnail_uris is not None else []
+        return self
+
     def populate(self, entity_id=None, type="item", specificFields=None):
         """
         Loads metadata about the item from Vidispine.
@@ -187,16 +380,130 @@ class VSItem(VSApi):
         Only loading the fields you need can significantly speed up your program
         :return: self
         """
+        if self.cache is not None:
+            if entity_id is None:
+                entity_id = self.name
+            if self.cache.lookup(self, entity_id, type, specificFields):
+                return self
+
+        content = self._request_document(self._metadata_path(entity_id, type, specificFields), method="GET")
+
+        if isinstance(content, dict):
+            rtn = self.fromJSON(content,objectClass=type)
+        else:
+            rtn = self.fromXML(content,objectClass=type)
+        self._after_populate()
+        if self.cache is not None:
+            self.cache.store(self, entity_id, type, specificFields)
+        return rtn
+
+    def _after_populate(self):
+        """
+        Internal method called once metadata has been loaded from the server by populate(), for subclasses that need to
+        load more information at the same time
+        """
+        pass
+
+    def _cache_extra(self):
+        """
+        Internal method returning a dictionary of any extra information set by _after_populate() that VSItemCache should
+        store along with the metadata
+        """
+        return {}
+
+    def _restore_cache_extra(self, extra):
+        """
+        Internal method to set the information returned by _cache_extra() when loading from a VSItemCache
+        """
+        pass
+
+    def _metadata_path(self, entity_id=None, type="item", specificFields=None):
+        """
+        Internal method returning the URL path to load metadata for populate()
+        """
         if entity_id is None:
             entity_id = self.name
 
         if isinstance(specificFields,list) or isinstance(specificFields,tuple):
+            if type == "collection" and "collectionId" not in specificFields:
+                #fromXML() takes the name of a collection from this field
+                specificFields = list(specificFields) + ["collectionId"]
             fields=",".join(specificFields)
-            content = self.request("/{t}/{i}/metadata;field={f}".format(t=type,i=entity_id,f=fields, method="GET"))
+            return "/{t}/{i}/metadata;field={f}".format(t=type,i=entity_id,f=fields)
         else:
-            content = self.request("/%s/%s/metadata" % (type, entity_id), method="GET")
+            return "/%s/%s/metadata" % (type, entity_id)
+
+    def populate_many(self, ids, specificFields=None, batchSize=100):
+        """
+        Loads metadata for many items at once.  Rather than one request per item as with populate(), this makes a single
+        itemId search with content=metadata for every batchSize items.
+        i = VSItem(host,port,user,password)
+        for item in i.populate_many(['VX-1','VX-2','VX-3'],specificFields=('title',)):
+            print(item.get('title'))
+        :param ids: list of item IDs to load, or of VSItem objects which will be populated in place
+        :param specificFields: list or tuple of specific field names to load. If this is None (default), then load everything.
+        :param batchSize: maximum number of items to ask for in one request
+        :return: list of populated VSItem objects, in the same order as ids.  Any item that was not returned by the search
+        is loaded individually with populate(), so this raises VSNotFound if an item does not exist.
+        If a cache is set, items found in it are not requested.
+        """
+        items = []
+        for entry in ids:
+            if isinstance(entry, VSItem):
+                items.append(entry)
+            else:
+                newitem = VSItem(self.host,self.port,self.user,self.passwd,transport=self.transport,cache=self.cache)
+                newitem.name = entry
+                items.append(newitem)
 
-        return self.fromXML(content,objectClass=type)
+        if self.cache is not None:
+            to_load = [i for i in items if not self.cache.lookup(i, i.name, "item", specificFields)]
+        else:
+            to_load = items
+
+        for n in range(0, len(to_load), batchSize):
+            batch = to_load[n:n+batchSize]
+            query = {'content': 'metadata'}
+            if isinstance(specificFields,list) or isinstance(specificFields,tuple):
+                query['field'] = ",".join(specificFields)
+            response = self._request_document("/item", method="PUT", matrix={'number': len(batch)}, query=query,
+                                              body=self._id_search_document([i.name for i in batch]))
+
+            nodes = {}
+            if isinstance(response, dict):
+                for node in json_list(response.get('item')):
+                    nodes[node['id']] = node
+            else:
+                for node in response.findall('{0}item'.format(self.xmlns)):
+                    nodes[node.attrib['id']] = node
+
+            for item in batch:
+                node = nodes.get(item.name)
+                if node is None:
+                    logging.debug("{0} was not returned by bulk populate, loading individually".format(item.name))
+                    item.populate(item.name, specificFields=specificFields)
+                elif isinstance(node, dict):
+                    item.fromJSON({'item': [node]})
+                else:
+                    #wrap each item in its own document, so that dataContent looks the same as it does after populate()
+                    doc = node.makeelement('{0}MetadataListDocument'.format(self.xmlns), {})
+                    doc.append(node)
+                    item.fromXML(doc)
+                if node is not None and self.cache is not None:
+                    self.cache.store(item, item.name, "item", specificFields)
+        return items
+
+    @staticmethod
+    def _id_search_document(ids):
+        """
+        Internal method returning an ItemSearchDocument that matches the given item IDs
+        """
+        root = ET.Element("ItemSearchDocument", xmlns="http://xml.vidispine.com/schema/vidispine")
+        field = ET.SubElement(root, "field")
+        ET.SubElement(field, "name").text = "itemId"
+        for entity_id in ids:
+            ET.SubElement(field, "value").text = entity_id
+        return ET.tostring(root, encoding="UTF-8")
 
     def importSidecar(self, filepath):
         """
@@ -216,6 +523,11 @@ class VSItem(VSApi):
         Return the name of the master group associated with the item, if any
         :return: string
         """
+        if isinstance(self.dataContent, dict):
+            for item in json_list(self.dataContent.get('item')):
+                groups = json_list(item.get('metadata', {}).get('group'))
+                return json_text(groups[0]) if len(groups) > 0 else None
+            return None
         try:
             group_node = self.dataContent.find('{0}item/{0}metadata/{0}group'.format(self.xmlns))
             if group_node is not None:
@@ -232,48 +544,75 @@ class VSItem(VSApi):
         :return:
         """
 
+        #each field is walked once, comparing tags, rather than searched for name and value; this is considerably
+        #quicker than find()/findall() with lxml and no slower with ElementTree
+        name_tag = ns + "name"
+        value_tag = ns + "value"
+        #per-value debug logging costs more than the extraction itself, so check for it once
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+
         if parent_key is not None:
-            logging.debug("makeContentDict: parent key {0}".format(parent_key))
-        logging.debug("makeContentDict: on {0}".format(node.tag))
+            logging.debug("makeContentDict: parent key %s", parent_key)
+        logging.debug("makeContentDict: on %s", node.tag)
         for child in node:
             # print "%s" % child.tag
+            tag = child.tag
+            if not isinstance(tag, str):    #comments and processing instructions
+                continue
 
-            if child.tag.endswith("field"):
-                try:
-                    key = child.find('{0}name'.format(ns)).text
-                except AttributeError:
-                    key = ""
-                try:
-                    logging.debug("key is {0}".format(key))
-                except UnicodeEncodeError:
-                    logging.debug(u"key is {0}".format(key))
-                for valNode in child.findall('{0}value'.format(ns)):
-                    try:
-                        val = valNode.text
-                    except AttributeError:
-                        val = ""
-                    try:
-                        logging.debug("got {0} for {1}".format(val, key))
-                    except UnicodeEncodeError:
-                        logging.debug(u"got {0} for {1}".format(val, key))
-                    if key in self.contentDict:
-                        #raise Exception("contentDict already has a value %s for %s, trying to insert new value %s\n" % (self.contentDict[key],key,val))
-                        if isinstance(self.contentDict[key],list):
-                            self.contentDict[key].append(val)
-                        else:
-                            self.contentDict[key] = [ self.contentDict[key], val ]
-
-                        #self.contentDict[key] = "%s|%s" % (self.contentDict[key], val)
-                    else:
-                        self.contentDict[key] = val
-                        #print "debug: item::makeContentDict: key=%s val=%s\n" % (key,val)
-            elif child.tag.endswith("group"):
-                key = child.find('{0}name'.format(ns)).text
-                logging.debug("makeContentDict: recursing into {0}".format(key))
+            if tag.endswith("field"):
+                key = ""
+                values = []
+                for subnode in child:
+                    if subnode.tag == name_tag:
+                        key = subnode.text
+                    elif subnode.tag == value_tag:
+                        values.append(subnode.text)
+                if debug:
+                    logging.debug("key is %s, values %s", key, values)
+                for val in values:
+                    self._addContentValue(key, val)
+            elif tag.endswith("group"):
+                key = child.findtext(name_tag)
+                logging.debug("makeContentDict: recursing into %s", key)
                 #print "group: %s" % key
                 self.makeContentDict(child, parent_key=key)
         return
 
+    def makeContentDictJSON(self, node, parent_key=None):
+        """
+        Internal private method, equivalent to makeContentDict for a timespan or group from a JSON document
+        :param node: decoded timespan or group object
+        :param parent_key: name of the group that node is, if any
+        :return:
+        """
+        if parent_key is not None:
+            logging.debug("makeContentDictJSON: parent key %s", parent_key)
+        for field in json_list(node.get('field')):
+            key = json_text(field['name']) if 'name' in field else ""
+            for val in json_list(field.get('value')):
+                self._addContentValue(key, json_text(val))
+        for group in json_list(node.get('group')):
+            if isinstance(group, dict):     #in a MetadataDocument, group can also be a plain list of group names
+                self.makeContentDictJSON(group, parent_key=json_text(group.get('name')))
+
+    def _addContentValue(self, key, val):
+        """
+        Internal method to add a value to contentDict, turning the entry into a list if there is already a value
+        """
+        content = self.contentDict
+        if key in content:
+            #raise Exception("contentDict already has a value %s for %s, trying to insert new value %s\n" % (self.contentDict[key],key,val))
+            if isinstance(content[key],list):
+                content[key].append(val)
+            else:
+                content[key] = [ content[key], val ]
+
+            #self.contentDict[key] = "%s|%s" % (self.contentDict[key], val)
+        else:
+            content[key] = val
+            #print "debug: item::makeContentDict: key=%s val=%s\n" % (key,val)
+
     def dump_text(self, *fields):
         """
         Debugging method to output text information about the item to stdout
@@ -304,7 +643,7 @@ class VSItem(VSApi):
         Returns an XML of the item's MetadataDocument as a string
         :return: string of xml
         """
-        print(ET.tostring(self.dataContent))
+        print(vs_xml.tostring(self.dataContent))
 
     def delete(self, keepShapeTagMedia=None, keepShapeTagStorage=None):
         """
@@ -349,25 +688,26 @@ class VSItem(VSApi):
         will be returned with the values delimited by a |
         :return: list or string
         """
-        if fieldname in self.contentDict:
-            if isinstance(self.contentDict[fieldname],list):
-                if allowArray==True:
-                    return self.contentDict[fieldname]
-                elif self.contentDict[fieldname] is not None:
+        try:
+            value = self._content_value(fieldname)
+        except KeyError:
+            return None
+
+        if isinstance(value,list):
+            if allowArray==True:
+                return value
+            try:
+                return '|'.join(value) #default, old behaviour
+            except TypeError:
+                #if join fails cos of bad data, then do it the crap way but catching excaptions as we go
+                str=""
+                for x in value:
                     try:
-                        return '|'.join(self.contentDict[fieldname]) #default, old behaviour
-                    except TypeError:
-                        #if join fails cos of bad data, then do it the crap way but catching excaptions as we go
-                        str=""
-                        for x in self.contentDict[fieldname]:
-                            try:
-                                str += str(x) + '|'
-                            except Exception:
-                                pass
-                        return str[0:-2]
-            return self.contentDict[fieldname]
-
-        return None
+                        str += str(x) + '|'
+                    except Exception:
+                        pass
+                return str[0:-2]
+        return value
 
     def _get_timespans(self):
         if self.type == "item":
@@ -572,6 +912,12 @@ class VSItem(VSApi):
         ns = "{http://xml.vidispine.com/schema/vidispine}"
         path = "/item/%s/shape" % self.name
 
+        if self._inlineShapes is not None:
+            for shape in self._inlineShapes:
+                if shape.tag() == shapetag:
+                    return shape
+            raise VSNotFound("No shape matching %s could be found" % shapetag)
+
         if self._shapeListContent is None:
             self._shapeListContent = self.request(path)
 
@@ -581,7 +927,7 @@ class VSItem(VSApi):
             if self.debug:
                 logging.debug("got shape id %s" % node.text)
 
-            shape = VSShape(host=self.host, port=self.port, user=self.user, passwd=self.passwd)
+            shape = VSShape(host=self.host, port=self.port, user=self.user, passwd=self.passwd, transport=self.transport)
             shape.populate(self.name, node.text)
             if self.debug:
                 logging.debug("shape tag %s" % shape.tag())
@@ -599,6 +945,11 @@ class VSItem(VSApi):
         """
         path = "/item/%s/shape" % self.name
 
+        if self._inlineShapes is not None:
+            for shape in self._inlineShapes:
+                yield shape
+            return
+
         if self._shapeListContent is None:
             self._shapeListContent = self.request(path)
 
@@ -606,7 +957,7 @@ class VSItem(VSApi):
             if self.debug:
                 logging.debug("got shape id %s" % node.text)
 
-            shape = VSShape(host=self.host, port=self.port, user=self.user, passwd=self.passwd)
+            shape = VSShape(host=self.host, port=self.port, user=self.user, passwd=self.passwd, transport=self.transport)
             shape.populate(self.name, node.text)
             if self.debug:
                 logging.debug("shape tag %s" % shape.tag())
@@ -637,6 +988,8 @@ class VSItem(VSApi):
         :param shapetag: shape tag to transcode to
         :param priority: job priority
         :param wait: if True (default), do not return until the job completes.  VSTranscodeError is raised if the transcode fails.
+        The job is followed by the VSJobWatcher shared by this server and user (see vs_job_watcher.job_watcher), so
+        pass any job notifications you receive to its notify() to find out about completion sooner.
         :param allow_object: if False (default) and wait=False, return the job ID for the transcode job. If True, return a
         VSJob object.
         :param create_thumbnails: if True, tell vidispine to create thumbnails as well as the transcode
@@ -644,18 +997,10 @@ class VSItem(VSApi):
         :return: the job ID of the transcode job, or a populated VSJob object (if wait=False) or None (if wait=True)
         """
         ns = "{http://xml.vidispine.com/schema/vidispine}"
-        if job_metadata is not None:
-            extra_args = {'jobmetadata': ["{0}={1}".format(k_v[0],k_v[1]) for k_v in list(job_metadata.items())]}
-        else:
-            extra_args = {}
-
         path = "/item/{id}/transcode".format(id=self.name)
 
         jobDocument = self.request(path, method="POST",
-                                   query={'priority': priority,
-                                          'tag': shapetag.replace(' ', '%20'),
-                                          'createThumbnails': "true" if create_thumbnails else "false",
-                                          **extra_args})
+                                   query=self._transcode_query(shapetag, priority, create_thumbnails, job_metadata))
 
         jobID = jobDocument.find("{0}jobId".format(ns)).text
         logging.debug("Transcode job ID is %s" % jobID)
@@ -668,19 +1013,27 @@ class VSItem(VSApi):
             else:
                 return jobID
 
-        while True:
-            job = VSJob(host=self.host, port=self.port, user=self.user, passwd=self.passwd)
-            job.populate(jobID)
-
-            if job.status() == "FINISHED":
-                break
+        job = job_watcher(self).wait(jobID)
+        #any other end state, including DISAPPEARED, means there is no new shape
+        if not (job.status() or "").startswith("FINISHED"):
+            raise VSTranscodeError(job)
 
-            if job.status() == "FAILED" or job.status() == "FAILED_TOTAL":
-                raise VSTranscodeError(job)
+        return
 
-            sleep(5)
+    @staticmethod
+    def _transcode_query(shapetag, priority, create_thumbnails, job_metadata):
+        """
+        Internal method returning the query parameters for a transcode request
+        """
+        if job_metadata is not None:
+            extra_args = {'jobmetadata': ["{0}={1}".format(k_v[0],k_v[1]) for k_v in list(job_metadata.items())]}
+        else:
+            extra_args = {}
 
-        return
+        return {'priority': priority,
+                'tag': shapetag.replace(' ', '%20'),
+                'createThumbnails': "true" if create_thumbnails else "false",
+                **extra_args}
 
     def export(self, shapetag, output_path, metadata_projection=None, use_media_filename=True, media_extension=None):
         """
@@ -715,20 +1068,12 @@ class VSItem(VSApi):
         jobID = jobDocument.find("{0}jobId".format(ns)).text
         logging.info("Export job ID is %s" % jobID)
 
-        while True:
-            job = VSJob(host=self.host, port=self.port, user=self.user, passwd=self.passwd)
-            job.populate(jobID)
+        job = job_watcher(self).wait(jobID)
+        logging.info("Job %s has status %s" % (job.name, job.status()))
+        if not (job.status() or "").startswith("FINISHED"):
+            raise VSJobFailed(job)
 
-            logging.info("Job %s has status %s" % (job.name, job.status()))
-            if job.status() == "FINISHED":
-                break
-
-            if job.status() == "FAILED" or job.status() == "ABORTED":
-                raise VSJobFailed(job)
-
-            sleep(5)
-
-            #tag=h264%20Mezzanine&uri=file:/media/sanwatchers/&metadata=true&projection=inmeta_V3&useOriginalFileName=1"
+        #tag=h264%20Mezzanine&uri=file:/media/sanwatchers/&metadata=true&projection=inmeta_V3&useOriginalFileName=1"
 
     def storageRule(self,shapeTag='original'):
         """
@@ -839,10 +1184,17 @@ class VSItem(VSApi):
         rtn.update(extra_args)
         return rtn
         
-    def streaming_import_to_shape(self, filename, transferPriority=500, throttle=True, rename=None, **kwargs):
-        """
-        Attempts a streaming import from an open local stream to Vidispine
-        :param input_io: Open file object
+    def streaming_import_to_shape(self, filename, transferPriority=500, throttle=True, rename=None, threads=4,
+                                  chunk_size=None, journal=None, **kwargs):
+        """
+        Attempts a streaming import from a local file to Vidispine.  The file is sent in chunks, several at once; see
+        vs_upload.VSChunkedUpload.
+        :param filename: local file to upload
+        :param rename: file name to give Vidispine, if not the base name of filename
+        :param threads: number of chunks to send at once
+        :param chunk_size: fixed chunk size in bytes. If None (default) it is adjusted to the measured throughput
+        :param journal: filename to record progress in. If the upload is interrupted, calling this again with the same
+        journal only sends what is missing.
         :param shape_tag: shape tag to assign to the file, Specify an array to assign multiple tags.
         :param priority: job priority
         :param essence: is this an essence version import? True or false
@@ -853,10 +1205,10 @@ class VSItem(VSApi):
         
         url = "/item/{0}/shape/raw"
         if rename is None: rename=os.path.basename(filename)
-        
-        self.chunked_upload_request(io.FileIO(filename),os.path.getsize(filename),chunk_size=1024*1024,
-                                    path=url.format(self.name).format(self.name),filename=rename,
-                                    transferPriority=transferPriority,throttle=throttle,query=args,method="POST")
+
+        VSChunkedUpload(self, url.format(self.name), filename, method="POST", query=args, upload_filename=rename,
+                        transferPriority=transferPriority, throttle=throttle, threads=threads,
+                        chunk_size=chunk_size, journal=journal).run()
 
     def add_placeholder_shape(self, shape_tag='original'):
         """
@@ -916,6 +1268,8 @@ class VSItem(VSApi):
         :return: VSThumbnailCollection
         """
         th = VSThumbnailCollection(self.host,self.port,self.user,self.passwd)
+        if self._inlineThumbnailURIs is not None:
+            return th.fromURIs(self, self._inlineThumbnailURIs)
         th.populate(self)
         return th
 
@@ -927,11 +1281,12 @@ class VSItem(VSApi):
         """
         return int(self.contentDict['__collection_size'])
 
-    def parent_collections(self, shouldPopulate=False):
+    def parent_collections(self, shouldPopulate=False, fields=None):
         """
         Generator that yields VSCollection objects for each collection that the item belongs to.
         The item does NOT need to be populated with metadata for this to work.
         :param: shouldPopulate - (default False) - if set to True, this will pre-load the metadata of the collection for you
+        :param: fields - list or tuple of field names to load when populating. If None (default), load everything.
         :return: yields VSCollection objects
         """
         from .vs_collection import VSCollection
@@ -940,7 +1295,7 @@ class VSItem(VSApi):
         for uri_entry in response.findall('{0}uri'.format(self.xmlns)):
             cref = VSCollection(host=self.host,port=self.port,user=self.user,passwd=self.passwd)
             if shouldPopulate:
-                cref.populate(uri_entry.text)
+                cref.populate(uri_entry.text, specificFields=fields)
             else:
                 cref.name = uri_entry.text
             yield cref
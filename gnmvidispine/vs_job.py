@@ -1,10 +1,13 @@
 __author__ = 'Andy Gallagher <andy.gallagher@theguardian.com>'
 
-from .vidispine_api import VSApi,VSException
+from .vidispine_api import VSApi,VSException,json_list,json_text,document_value
+from .vs_xml import vs_path
 import re
 import datetime
 import xml.etree.ElementTree as ET
 import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 
@@ -27,7 +30,8 @@ class VSJobFailed(VSException):
 from pprint import pprint
 
 
-def VSFindJobs(status=None,jobtype=None,connection=None,sort=None,metadata=False,onlyuser=False):
+def VSFindJobs(status=None,jobtype=None,connection=None,sort=None,metadata=False,onlyuser=False,deep=False,
+               pageSize=100,prefetch=True):
     """
     Generator that searches Vidispine for jobs matching the given spec and returns them as initialised VSJob instances.
      If no specification is given, then will return all jobs.
@@ -41,9 +45,13 @@ def VSFindJobs(status=None,jobtype=None,connection=None,sort=None,metadata=False
     :param connection: Initialised VSApi object (or any other Vidispine base object) that contains connection details
     to communicate with Vidispine
     :param sort: Sort by this fieldname.  Ignored if set to None or not present
-    :param metadata: Find jobs with metadata matching this specification, provided as a dict.  Consult Vidispine
-    documentation for more information on this function.  Ignored if set to None or not present
+    :param metadata: If True, include each job's metadata (its data key/values) in the results
     :param onlyuser: Only return jobs for the logged in user identified in connection. True/false parameter.
+    :param deep: If True, request each job again individually, as older versions did.  By default the jobs are
+    populated from the listing itself, which needs one request per page rather than one per job.
+    :param pageSize: number of jobs to request at once
+    :param prefetch: If True (default), request the next page of jobs on a background thread while the current one is
+    being read.  If False, each page is streamed and parsed as it arrives instead.
     :return: Generator of VSJob objects.
     """
     if not isinstance(connection,VSApi):
@@ -58,33 +66,87 @@ def VSFindJobs(status=None,jobtype=None,connection=None,sort=None,metadata=False
         urlstring += ";sort={0}".format(sort)
     if not onlyuser:
         urlstring += ";user=false"  #by default, user=true => only return jobs by current user.
+    urlstring += ";number={0}".format(pageSize)
 
-    #if metadata:
-    #    urlstring += "?metadata=true"
+    query = {'metadata': 'true'} if metadata else None
 
     logger.debug("URL is {0}".format(urlstring))
+    if prefetch:
+        jobnodes = _prefetched_job_nodes(connection, urlstring, query)
+    else:
+        jobnodes = _streamed_job_nodes(connection, urlstring, query)
+
+    for jobnode in jobnodes:
+        jobid = document_value(jobnode, 'jobId')
+        if jobid is None:
+            logger.error("Did not get a <jobId> node")
+            continue
+        logger.debug("got job ID {0}".format(jobid))
+        jobinfo = VSJob(host=connection.host,port=connection.port,user=connection.user,passwd=connection.passwd,
+                        transport=connection.transport)
+        if deep:
+            jobinfo.populate(jobid,metadata=metadata)
+        else:
+            jobinfo.fromResponse(jobnode)
+        yield jobinfo
+
+
+def _streamed_job_nodes(connection, urlstring, query):
+    """
+    Internal generator for VSFindJobs that yields each job element of the listing, requesting one page at a time and
+    parsing it as it arrives, so jobs are yielded before the whole page has been downloaded
+    """
     n = 0
     hits = 100
+    ns = "{http://xml.vidispine.com/schema/vidispine}"
     while n<hits:
         request = urlstring + ";first={0}".format(n)
-        response = connection.request(request, method="GET")
-        ns = "{http://xml.vidispine.com/schema/vidispine}"
-        hits = int(response.find('{0}hits'.format(ns)).text)
-        logger.debug("Got {0} hits".format(hits))
-
-        for jobnode in response.findall('{0}job'.format(ns)):
-            #pprint(jobnode.__dict__)
-            idnode = jobnode.find('{0}jobId'.format(ns))
-            if idnode is not None:
-                #pprint(idnode.__dict__)
-                #print "VSFindJobs: got job ID %s" % idnode.text
-                logger.debug("got job ID {0}".format(idnode.text))
-                jobinfo = VSJob(host=connection.host,port=connection.port,user=connection.user,passwd=connection.passwd)
-                jobinfo.populate(idnode.text,metadata=metadata)
-                yield jobinfo
-            else:
-                logger.error("Did not get a <jobId> node")
+        start_n = n
+        for jobnode in connection.stream_request(request, method="GET", query=query):
+            if jobnode.tag == '{0}hits'.format(ns):
+                hits = int(jobnode.text)
+                logger.debug("Got {0} hits".format(hits))
+                continue
+            elif jobnode.tag != '{0}job'.format(ns):
+                continue
+            yield jobnode
             n += 1
+        if n == start_n:    #no jobs returned => we got to the end
+            break
+
+
+def _prefetched_job_nodes(connection, urlstring, query):
+    """
+    Internal generator for VSFindJobs that yields each job element (or JSON object) of the listing.  Each page is
+    requested whole on a background thread, with a connection of its own, while the one before it is being read.
+    """
+    fetcher = VSApi(**connection._child_args())
+
+    def fetch_page(first):
+        doc = fetcher._request_document(urlstring + ";first={0}".format(first), method="GET", query=query)
+        if isinstance(doc, dict):
+            return int(doc.get('hits', 0)), json_list(doc.get('job'))
+        hits = document_value(doc, 'hits')
+        return int(hits) if hits is not None else 0, vs_path("vs:job").findall(doc)
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    pending = executor.submit(fetch_page, 0)
+    n = 0
+    try:
+        while pending is not None:
+            hits, jobnodes = pending.result()
+            logger.debug("Got {0} hits".format(hits))
+            n += len(jobnodes)
+            if len(jobnodes) > 0 and n < hits:
+                pending = executor.submit(fetch_page, n)
+            else:
+                pending = None
+            for jobnode in jobnodes:
+                yield jobnode
+    finally:
+        if pending is not None:
+            pending.cancel()
+        executor.shutdown(wait=False)
 
 
 class VSJob(VSApi):
@@ -98,19 +160,41 @@ class VSJob(VSApi):
         self.dataContent=responsedoc
         ns = "{http://xml.vidispine.com/schema/vidispine}"
 
-        self.name=self.dataContent.find('{0}jobId'.format(ns)).text
+        if isinstance(self.dataContent, dict):
+            self.name=self.dataContent['jobId']
+        else:
+            self.name=self.dataContent.find('{0}jobId'.format(ns)).text
 
 
         self._populateInternal()
 
     def update(self,noraise=True):
-        self.dataContent = self.request("/job/%s" % self.name)
+        self.dataContent = self._request_document("/job/%s" % self.name)
         self._populateInternal()
 
         if not noraise:
             if self.didFail():
                 raise VSJobFailed(self)
 
+    @staticmethod
+    def update_many(jobs, pageSize=100):
+        """
+        Refreshes many jobs at once, reading the ones that are still running from a single job listing rather than
+        requesting each one; see VSJobSet.  Raises the error for the first job that could not be read, if any, once the
+        others have been updated.
+        :param jobs: list of VSJob objects. They are updated in place, using the connection details of the first one.
+        :param pageSize: number of jobs to request at once from the listing
+        :return: list of the jobs that have changed (status, current step or data values such as progress)
+        """
+        if len(jobs) == 0:
+            return []
+        job_set = VSJobSet(jobs[0], jobs, pageSize=pageSize)
+        changed = job_set.update()
+        for job in jobs:
+            if job.name in job_set.errors:
+                raise job_set.errors[job.name]
+        return changed
+
     def didFail(self):
         if 'status' in self.contentDict:
             if self.contentDict['status'].startswith("FAILED"):
@@ -128,47 +212,69 @@ class VSJob(VSApi):
     def populate(self,id,metadata=False):
         self.name = id
         if metadata:
-            self.dataContent = self.request("/job/%s?metadata=true" % id)
+            self.dataContent = self._request_document("/job/%s?metadata=true" % id)
 
         else:
-            self.dataContent = self.request("/job/%s" % id)
+            self.dataContent = self._request_document("/job/%s" % id)
 
         self._populateInternal()
 
+    _field_paths = [(key, vs_path("vs:" + key)) for key in ['jobId','user','status','type','priority']]
+    _data_path = vs_path("vs:data")
+    _key_path = vs_path("vs:key")
+    _value_path = vs_path("vs:value")
+    _started_path = vs_path("vs:started")
+
     def _populateInternal(self):
-        ns = "{http://xml.vidispine.com/schema/vidispine}"
         #ET.dump(self.dataContent)
+        if isinstance(self.dataContent, dict):
+            self._populateFromJSON()
+            return
+
+        for key, path in self._field_paths:
+            node = path.find(self.dataContent)
+            if node is not None:
+                self.contentDict[key] = node.text
 
-        for key in ['jobId','user','status','type','priority']:
-            nodename = "{0}%s" % key
+        for node in self._data_path.findall(self.dataContent):
             try:
-                self.contentDict[key] = self.dataContent.find(nodename.format(ns)).text
+                self._setDataValue(self._key_path.find(node).text, self._value_path.find(node).text)
             except:
                 pass
 
-        for node in self.dataContent.findall("{0}data".format(ns)):
-            try:
-                key = node.find("{0}key".format(ns)).text
-                value = node.find("{0}value".format(ns)).text
-                if isinstance(value,datetime.datetime):
-                    self.contentDict[key] = value
-
-                try:
-                    self.contentDict[key] = int(value)
-                except:
-                    try:
-                        self.contentDict[key] = float(value)
-                    except:
-                        self.contentDict[key] = value
+        startTimeNode = self._started_path.find(self.dataContent)
+        if startTimeNode is not None:
+            self._setStarted(startTimeNode.text)
+
+    def _populateFromJSON(self):
+        """
+        Internal method equivalent to _populateInternal for a JobDocument received as JSON
+        """
+        for key, path in self._field_paths:
+            if key in self.dataContent:
+                self.contentDict[key] = json_text(self.dataContent[key])
+
+        for entry in json_list(self.dataContent.get('data')):
+            if 'key' in entry:
+                self._setDataValue(json_text(entry['key']), json_text(entry.get('value')))
+
+        if self.dataContent.get('started') is not None:
+            self._setStarted(json_text(self.dataContent['started']))
 
+    def _setDataValue(self, key, value):
+        try:
+            self.contentDict[key] = int(value)
+        except:
+            try:
+                self.contentDict[key] = float(value)
             except:
-                pass
+                self.contentDict[key] = value
 
-        startTimeNode = self.dataContent.find("{0}started".format(ns))
-        if startTimeNode is not None:
+    def _setStarted(self, value):
+        if value is not None:
             try:
                 #remove microseconds from the time string. Ugly but it should work.
-                timeString=re.sub('\.\d+','',startTimeNode.text)
+                timeString=re.sub('\.\d+','',value)
                 self.contentDict['started'] = datetime.datetime.strptime(timeString,"%Y-%m-%dT%H:%M:%SZ")
             except ValueError as e: #if the date doesn't parse
                 logger.error("ERROR: %s" % e)
@@ -180,6 +286,12 @@ class VSJob(VSApi):
         if not self.dataContent:
             raise ValueError("Job object not initialised yet")
 
+        if isinstance(self.dataContent, dict):
+            for entry in json_list(self.dataContent.get('data')):
+                if json_text(entry.get('key')) == "errorMessage":
+                    return json_text(entry.get('value'))
+            return "No error"
+
         for node in self.dataContent.findall("{0}data".format(ns)):
             keynode = node.find("{0}key".format(ns))
             if keynode.text is not None and keynode.text == "errorMessage":
@@ -190,36 +302,24 @@ class VSJob(VSApi):
 
     @property
     def type(self):
-        ns = "{http://xml.vidispine.com/schema/vidispine}"
         if self.dataContent is None:
             raise ValueError("Job object not initialised yet")
 
-        try:
-            return self.dataContent.find('{0}type'.format(ns)).text
-        except AttributeError:
-            return None
+        return document_value(self.dataContent, 'type')
 
     @property
     def priority(self):
-        ns = "{http://xml.vidispine.com/schema/vidispine}"
         if self.dataContent is None:
             raise ValueError("Job object not initialised yet")
 
-        try:
-            return self.dataContent.find('{0}priority'.format(ns)).text
-        except AttributeError:
-            return None
+        return document_value(self.dataContent, 'priority')
 
     @property
     def total_steps(self):
-        ns = "{http://xml.vidispine.com/schema/vidispine}"
         if self.dataContent is None:
             raise ValueError("Job object not initialised yet")
 
-        try:
-            return self.dataContent.find('{0}totalSteps'.format(ns)).text
-        except AttributeError:
-            return None
+        return document_value(self.dataContent, 'totalSteps')
 
     @property
     def current_step(self):
@@ -227,7 +327,10 @@ class VSJob(VSApi):
         if self.dataContent is None:
             raise ValueError("Job object not initialised yet")
 
-        node = self.dataContent.find('{0}currentStep'.format(ns))
+        if isinstance(self.dataContent, dict):
+            node = self.dataContent.get('currentStep')
+        else:
+            node = self.dataContent.find('{0}currentStep'.format(ns))
         if node is not None:
             return VSJobStep(node)
         else:
@@ -235,6 +338,10 @@ class VSJob(VSApi):
 
     @property
     def log(self):
+        if isinstance(self.dataContent, dict):
+            for task in json_list(self.dataContent.get('log', {}).get('task')):
+                yield VSJobTask(task)
+            return
         for subnode in self.dataContent.find('{0}log'.format(self.xmlns)):
             yield VSJobTask(subnode)
 
@@ -273,6 +380,176 @@ class VSJob(VSApi):
         self.request("/job/{0}".format(self.name),method="DELETE")
 
 
+class VSJobSet(object):
+    """
+    A set of jobs whose status is refreshed together.  update() reads every job in the set that is still running from a
+    listing of the running jobs, which needs one request per page of running jobs on the server rather than one per job,
+    and returns only the jobs that have changed since the previous update.  A job that has dropped out of the listing has
+    ended, and is read individually, once, to find out how.  If there are so many jobs running on the server that the
+    listing would take more requests than reading the jobs individually, they are read individually instead.
+
+    jobs = VSJobSet(connection, ["VX-1", "VX-2", "VX-3"])
+    while not jobs.finished():
+        for job in jobs.update():
+            print(job.name, job.status(), job.contentDict.get('transcodeProgress'))
+        sleep(5)
+    """
+
+    #statuses that a job does not move on from
+    terminal_states = ("FINISHED", "FINISHED_WARNING", "FAILED", "FAILED_TOTAL", "FAILED_FATAL", "ABORTED", "DISAPPEARED")
+
+    #statuses that the listing is filtered on
+    active_states = ("NONE", "READY", "STARTED", "STARTED_ASYNCHRONOUS", "STARTED_PARALLEL",
+                     "STARTED_PARALLEL_ASYNCHRONOUS", "STARTED_SUBTASKS", "WAITING", "PAUSED", "ABORTED_PENDING",
+                     "FAILED_RETRY")
+
+    def __init__(self, connection, jobs=None, pageSize=100):
+        """
+        :param connection: Initialised VSApi object (or any other Vidispine base object) to make the requests with
+        :param jobs: optional list of VSJob objects or job IDs to start with
+        :param pageSize: number of jobs to request at once from the listing
+        """
+        self.connection = connection
+        self.pageSize = pageSize
+        #exceptions for the jobs that could not be read in the last update, by job ID. Those jobs are removed from the set
+        self.errors = {}
+        self._jobs = OrderedDict()
+        self._snapshots = {}
+        self._active_hits = None
+        for job in (jobs or []):
+            self.add(job)
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def __iter__(self):
+        return iter(list(self._jobs.values()))
+
+    def __contains__(self, job_id):
+        return job_id in self._jobs
+
+    def __getitem__(self, job_id):
+        return self._jobs[job_id]
+
+    def add(self, job):
+        """
+        Adds a job to the set
+        :param job: VSJob, or a job ID
+        :return: the VSJob
+        """
+        if not isinstance(job, VSJob):
+            job_id = job
+            job = VSJob(**self.connection._child_args())
+            job.name = job_id
+        self._jobs[job.name] = job
+        if job.dataContent is not None:
+            self._snapshots[job.name] = self._snapshot(job)
+        return job
+
+    def remove(self, job_id):
+        """
+        Removes a job from the set, if it is there
+        """
+        self._jobs.pop(job_id, None)
+        self._snapshots.pop(job_id, None)
+
+    def pending(self):
+        """
+        :return: list of the jobs that have not reached an end state (including any that have not been read yet)
+        """
+        return [job for job in self._jobs.values() if job.status() not in self.terminal_states]
+
+    def finished(self):
+        """
+        :return: True if every job in the set has reached an end state
+        """
+        return len(self.pending()) == 0
+
+    @staticmethod
+    def _snapshot(job):
+        """
+        Internal method returning what is compared to see whether a job has changed
+        """
+        step = job.current_step if job.dataContent is not None else None
+        step_state = (step.number, step.status, step.description) if step is not None else None
+        return dict(job.contentDict), step_state
+
+    def update(self):
+        """
+        Refreshes every job in the set that has not reached an end state.  Jobs that can't be read (e.g. because they
+        no longer exist) are removed from the set, with their exceptions in errors.
+        :return: list of the jobs that have changed since the last update (status, current step or data values such as
+        progress), in the order they were added
+        """
+        self.errors = {}
+        pending = OrderedDict([(job.name, job) for job in self.pending()])
+        if len(pending) == 0:
+            return []
+
+        seen = self._update_from_listing(pending) if self._use_listing(len(pending)) else set()
+        for job_id, job in pending.items():
+            if job_id in seen:
+                continue
+            try:
+                job.update()
+            except Exception as e:
+                logger.warning("Could not read job {0}: {1}".format(job_id, e))
+                self.errors[job_id] = e
+                self.remove(job_id)
+
+        changed = []
+        for job_id, job in pending.items():
+            if job_id in self.errors:
+                continue
+            snapshot = self._snapshot(job)
+            if snapshot != self._snapshots.get(job_id):
+                self._snapshots[job_id] = snapshot
+                changed.append(job)
+        return changed
+
+    def _use_listing(self, count):
+        """
+        Internal method deciding whether reading count jobs from the listing takes fewer requests than reading them
+        individually, going by the number of running jobs there were last time
+        """
+        if self._active_hits is None:
+            return count > 1
+        pages = max(1, (self._active_hits + self.pageSize - 1) // self.pageSize)
+        return pages < count
+
+    def _update_from_listing(self, pending):
+        """
+        Internal method that updates the pending jobs found in the listing of running jobs
+        :param pending: dictionary of job ID to VSJob
+        :return: set of the IDs of the jobs that were found
+        """
+        urlstring = "/job;state={0};user=false;number={1}".format(",".join(self.active_states), self.pageSize)
+        seen = set()
+        first = 0
+        hits = 0
+        while True:
+            doc = self.connection._request_document(urlstring + ";first={0}".format(first), method="GET")
+            if isinstance(doc, dict):
+                hits = int(doc.get('hits', 0))
+                jobnodes = json_list(doc.get('job'))
+            else:
+                hits = int(document_value(doc, 'hits') or 0)
+                jobnodes = vs_path("vs:job").findall(doc)
+
+            for jobnode in jobnodes:
+                job = pending.get(document_value(jobnode, 'jobId'))
+                if job is not None:
+                    job.fromResponse(jobnode)
+                    seen.add(job.name)
+
+            first += len(jobnodes)
+            if len(jobnodes) == 0 or first >= hits or len(seen) == len(pending):
+                break
+        self._active_hits = hits
+        logger.debug("Found {0} of {1} jobs in the listing of {2} running jobs".format(len(seen), len(pending), hits))
+        return seen
+
+
 class XMLPropMixin(object):
     ns = "{http://xml.vidispine.com/schema/vidispine}"
 
@@ -284,10 +561,7 @@ class XMLPropMixin(object):
         if self.dataContent is None:
             raise ValueError("Job object not initialised yet")
 
-        try:
-            return self.dataContent.find('{0}{1}'.format(self.ns, propname)).text
-        except AttributeError:
-            return None
+        return document_value(self.dataContent, propname)
 
 
 class VSJobStep(XMLPropMixin):
@@ -334,6 +608,8 @@ class VSJobTask(XMLPropMixin):
     @property
     def task_id(self):
         try:
+            if isinstance(self.dataContent, dict):
+                return int(self.dataContent['id'])
             return int(self.dataContent.attrib['id'])
         except ValueError: #it's not an integer
             return None
@@ -373,7 +649,11 @@ class VSJobTask(XMLPropMixin):
 
     @property
     def sub_steps(self):
-        for node in self.dataContent.findall('{0}subStep'.format(self.ns)):
+        if isinstance(self.dataContent, dict):
+            nodes = json_list(self.dataContent.get('subStep'))
+        else:
+            nodes = self.dataContent.findall('{0}subStep'.format(self.ns))
+        for node in nodes:
             yield VSJobStep(node)
 
     def __unicode__(self):
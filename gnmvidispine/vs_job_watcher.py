@@ -0,0 +1,272 @@
+import threading
+import logging
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from .vs_job import VSJob, VSJobSet
+
+logger = logging.getLogger(__name__)
+
+
+class VSJobWatcher(object):
+    """
+    Waits for any number of Vidispine jobs to complete, from a single background thread.
+
+    Each watched job is polled (re-using one VSJob object per job) at most batch_size jobs per round.  Rounds start at
+    min_interval apart; each round in which no job changes state lengthens the gap by a factor of backoff, up to
+    max_interval, and any change shortens it to min_interval again.  Once bulk_threshold or more jobs are being watched,
+    each round instead refreshes all of them together through a VSJobSet, which reads the running jobs from one listing.  If you receive job notifications from Vidispine,
+    pass them to notify() and the job is checked straight away rather than at the next round.
+
+    watcher = VSJobWatcher(connection)
+    future = watcher.watch("VX-1234", callback=lambda job: print(job.status()))
+    job = watcher.wait("VX-1235", timeout=3600)   #blocks until the job has finished, failed or been aborted
+
+    Futures are concurrent.futures.Future objects whose result is the populated VSJob, in whichever end state it reached.
+    If the job can't be read (e.g. it does not exist), the future's exception is set instead.  The background thread
+    only runs while there are jobs to watch.
+    """
+
+    #statuses that a job does not move on from
+    terminal_states = ("FINISHED", "FINISHED_WARNING", "FAILED", "FAILED_TOTAL", "FAILED_FATAL", "ABORTED", "DISAPPEARED")
+
+    class _Watch(object):
+        def __init__(self, job):
+            self.job = job
+            self.future = Future()
+            self.last_status = None
+
+    def __init__(self, connection, min_interval=0.5, max_interval=5, backoff=1.5, batch_size=50, bulk_threshold=10):
+        """
+        Initialise a new watcher
+        :param connection: Initialised VSApi object (or any other Vidispine base object) with the connection details to use
+        :param min_interval: shortest time between polling rounds, in seconds
+        :param max_interval: longest time between polling rounds, in seconds
+        :param backoff: factor to lengthen the interval by after each round where nothing changed
+        :param batch_size: maximum number of jobs to poll in one round
+        :param bulk_threshold: number of watched jobs from which to poll them all together from the job listing rather
+        than one at a time
+        """
+        self.connection = connection
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.batch_size = batch_size
+        self.bulk_threshold = bulk_threshold
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._watches = OrderedDict()
+        self._queue = deque()
+        self._urgent = []
+        self._thread = None
+        #only used on the polling thread
+        self._job_set = VSJobSet(connection)
+        self.polls = 0
+
+    def __len__(self):
+        return len(self._watches)
+
+    def watch(self, job_id, callback=None):
+        """
+        Starts watching the given job, if it is not being watched already
+        :param job_id: Vidispine job ID
+        :param callback: optional function to call with the VSJob when it reaches an end state.  It is called on the
+        watcher's thread, or immediately if the job has already completed.
+        :return: Future
+        """
+        with self._lock:
+            watch = self._watches.get(job_id)
+            if watch is None:
+                job = VSJob(**self.connection._child_args())
+                job.name = job_id
+                watch = self._Watch(job)
+                self._watches[job_id] = watch
+                self._queue.append(job_id)
+                self._urgent.append(job_id)
+                self._start()
+        if callback is not None:
+            watch.future.add_done_callback(lambda f: f.exception() is None and callback(f.result()))
+        self._wake.set()
+        return watch.future
+
+    def wait(self, job_id, timeout=None):
+        """
+        Blocks until the given job reaches an end state
+        :param job_id: Vidispine job ID
+        :param timeout: maximum number of seconds to wait, or None to wait for ever
+        :return: populated VSJob. Raises concurrent.futures.TimeoutError if the timeout expires first, or VSException
+        subclasses if the job can't be read.
+        """
+        return self.watch(job_id).result(timeout)
+
+    def notify(self, job_id, status=None):
+        """
+        Tells the watcher that a job has changed, e.g. on receiving a notification from Vidispine, so that it is checked
+        immediately.  Jobs that are not being watched are ignored.
+        :param job_id: Vidispine job ID
+        :param status: new status of the job, if known. This is only used for logging; the job is always re-read.
+        """
+        with self._lock:
+            if job_id not in self._watches:
+                return
+            logger.debug("Notified of change to {0} (status {1})".format(job_id, status))
+            self._urgent.append(job_id)
+        self._wake.set()
+
+    def _start(self):
+        """
+        Internal method to start the polling thread if it is not running. Must be called with the lock held.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="VSJobWatcher")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _next_batch(self):
+        """
+        Internal method returning the watches to poll in the next round. Must be called with the lock held.
+        """
+        batch = []
+        for job_id in self._urgent:
+            if job_id in self._watches and self._watches[job_id] not in batch:
+                batch.append(self._watches[job_id])
+        self._urgent = []
+
+        for n in range(0, min(len(self._queue), self.batch_size)):
+            job_id = self._queue.popleft()
+            if job_id not in self._watches:
+                continue
+            self._queue.append(job_id)
+            if len(batch) < self.batch_size and self._watches[job_id] not in batch:
+                batch.append(self._watches[job_id])
+        return batch
+
+    def _finish(self, watch, result=None, exception=None):
+        with self._lock:
+            self._watches.pop(watch.job.name, None)
+        self._job_set.remove(watch.job.name)
+        if exception is not None:
+            watch.future.set_exception(exception)
+        else:
+            watch.future.set_result(result)
+
+    def _poll(self, watch):
+        """
+        Internal method to update one job
+        :return: True if its status changed
+        """
+        self.polls += 1
+        try:
+            watch.job.update()
+        except Exception as e:
+            logger.warning("Could not read job {0}: {1}".format(watch.job.name, e))
+            self._finish(watch, exception=e)
+            return True
+        return self._check(watch)
+
+    def _poll_all(self, watches):
+        """
+        Internal method to update all of the given jobs together
+        :return: True if any of their statuses changed
+        """
+        for watch in watches:
+            if watch.job.name not in self._job_set:
+                self._job_set.add(watch.job)
+        self.polls += len(watches)
+        try:
+            self._job_set.update()
+        except Exception as e:
+            #e.g. a 5xx or a dropped connection while reading the listing; try them all again next round
+            logger.warning("Could not read the job listing: {0}".format(e))
+            return False
+
+        changed = False
+        for watch in watches:
+            error = self._job_set.errors.get(watch.job.name)
+            if error is not None:
+                self._finish(watch, exception=error)
+                changed = True
+            elif self._check(watch):
+                changed = True
+        return changed
+
+    def _check(self, watch):
+        """
+        Internal method to act on the status of a job that has just been updated
+        :return: True if its status changed
+        """
+        status = watch.job.status()
+        changed = status != watch.last_status
+        watch.last_status = status
+        if status in self.terminal_states:
+            logger.debug("Job {0} completed with status {1}".format(watch.job.name, status))
+            self._finish(watch, result=watch.job)
+        return changed
+
+    def _run(self):
+        try:
+            self._poll_rounds()
+        except Exception as e:
+            #don't leave anyone waiting for ever on a watcher that has stopped
+            logger.exception("Job watcher failed, failing the jobs it was watching")
+            with self._lock:
+                watches = list(self._watches.values())
+            for watch in watches:
+                self._finish(watch, exception=e)
+        finally:
+            with self._lock:
+                self._thread = None
+                #anything watched since the failure needs a thread of its own
+                if len(self._watches) > 0:
+                    self._start()
+
+    def _poll_rounds(self):
+        """
+        Internal method that polls the watched jobs until there are none left
+        """
+        interval = self.min_interval
+        while True:
+            with self._lock:
+                if len(self._watches) == 0:
+                    return
+                self._wake.clear()
+                bulk = len(self._watches) >= self.bulk_threshold
+                if bulk:
+                    batch = list(self._watches.values())
+                    self._urgent = []
+                else:
+                    batch = self._next_batch()
+
+            changed = False
+            if bulk:
+                changed = self._poll_all(batch)
+            else:
+                for watch in batch:
+                    if self._poll(watch):
+                        changed = True
+
+            if changed:
+                interval = self.min_interval
+            else:
+                interval = min(interval * self.backoff, self.max_interval)
+            self._wake.wait(interval)
+
+
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+
+def job_watcher(connection):
+    """
+    Returns the VSJobWatcher shared by everything using the same server, scheme and credentials as connection, creating it if
+    necessary
+    :param connection: Initialised VSApi object (or any other Vidispine base object)
+    :return: VSJobWatcher
+    """
+    key = (connection.host, str(connection.port), bool(connection.https), connection.user, connection.passwd,
+           connection.run_as, connection.transport)
+    with _watchers_lock:
+        watcher = _watchers.get(key)
+        if watcher is None:
+            watcher = VSJobWatcher(connection)
+            _watchers[key] = watcher
+        return watcher
@@ -64,12 +64,7 @@ class VSLibrary(VSApi, list):
         logging.debug("Got new library %s with %d items" % (self.name, self.hits))
 
         if not noyield:
-            namespace = "{http://xml.vidispine.com/schema/vidispine}"
-            for item in self.dataContent.findall('{0}item'.format(namespace)):
-                newitem = VSItem(host=self.host, port=self.port, user=self.user, passwd=self.passwd)
-                #print "\tGot item with ID %s\n" % item.attrib['id']
-                newitem.populate(item.attrib['id'])
-                self.append(newitem)
+            self.extend(self._populated_items())
 
     def refresh(self):
         if self.name=="":
@@ -81,17 +76,28 @@ class VSLibrary(VSApi, list):
         self.hits = int(self.dataContent.find("{0}hits".format(namespace)).text)
 
     #generator to get individual items out
-    def items(self):
+    def items(self, fields=None):
+        """
+        Generator yielding a populated VSItem for each item in the library
+        :param fields: list or tuple of the names of the fields to load. If None (default), load every field.
+        """
         if self.dataContent is None:
             self.refresh()
 
-        namespace = "{http://xml.vidispine.com/schema/vidispine}"
-        for item in self.dataContent.findall('{0}item'.format(namespace)):
-            newitem = VSItem(host=self.host, port=self.port, user=self.user, passwd=self.passwd)
-            #print "\tGot item with ID %s\n" % item.attrib['id']
-            newitem.populate(item.attrib['id'])
+        for newitem in self._populated_items(fields=fields):
             yield newitem
 
+    def _populated_items(self, fields=None):
+        """
+        Internal method that loads the metadata for every item in dataContent with a single bulk request
+        :param fields: list or tuple of the names of the fields to load, or None for all of them
+        :return: list of populated VSItem objects
+        """
+        namespace = "{http://xml.vidispine.com/schema/vidispine}"
+        item_ids = [item.attrib['id'] for item in self.dataContent.findall('{0}item'.format(namespace))]
+        loader = VSItem(host=self.host, port=self.port, user=self.user, passwd=self.passwd)
+        return loader.populate_many(item_ids, specificFields=fields)
+
     def settingsXML(self):
         namespace = "{http://xml.vidispine.com/schema/vidispine}"
         if self.settings is None:
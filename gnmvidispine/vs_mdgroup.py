@@ -1,5 +1,6 @@
 from .vidispine_api import VSApi,VSException,VSNotFound
 from .vs_field import VSField
+from . import vs_xml
 import xml.etree.ElementTree as ET
 
 
@@ -145,7 +146,7 @@ class VSMDGroup(VSApi):
             #except Exception as e:
 
     def commitXML(self):
-        self.request("/metadata-field/field-group/%s" % self.name,method="PUT",body=ET.tostring(self.dataContent))
+        self.request("/metadata-field/field-group/%s" % self.name,method="PUT",body=vs_xml.tostring(self.dataContent))
 
     def dump_text(self, *fields):
         print("Metadata Group:")
@@ -0,0 +1,346 @@
+"""
+Request metrics for Vidispine API calls.
+
+Set VSApi.instrumentation (or pass instrumentation= to an individual object) to a VSInstrumentation and every HTTP
+request that object makes, including those made by the async objects in vs_async, is described by a VSRequestRecord:
+method, URL template (the path with IDs replaced, so that requests for different items are counted together), status,
+bytes sent and received, time to connect, time to first byte, total time, the number of times it was re-sent, the time
+taken to parse the response, and the time it was held back by a VSRequestGovernor before being sent.  With no
+instrumentation set (the default) none of this is measured.  Async responses are read whole, so their time to first
+byte includes the body, and their connection time is not measured separately.
+
+VSMetricsCollector keeps counts and latency histograms in memory; VSPrometheusInstrumentation and
+VSOpenTelemetryInstrumentation export to prometheus_client and OpenTelemetry, if they are installed.  To send to more
+than one, use VSInstrumentationGroup:
+
+VSApi.instrumentation = VSInstrumentationGroup(VSPrometheusInstrumentation(), VSOpenTelemetryInstrumentation())
+
+To collect something else, subclass VSInstrumentation and override the methods you need.
+"""
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+
+try:
+    import prometheus_client as _prometheus
+except ImportError:
+    _prometheus = None
+
+try:
+    from opentelemetry import trace as _otel_trace
+except ImportError:
+    _otel_trace = None
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentationUnavailable(Exception):
+    """
+    Raised if an instrumentation is requested whose library is not installed
+    """
+    pass
+
+
+#Vidispine IDs (VX-1234), UUIDs and plain numbers
+_id_patterns = [
+    (re.compile(r'^[A-Za-z]{2,}-\d+$'), '{id}'),
+    (re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$'), '{uuid}'),
+    (re.compile(r'^\d+$'), '{n}'),
+]
+
+
+def url_template(url):
+    """
+    Reduces a request URL to a template suitable for labelling metrics, by removing the query and matrix parameters and
+    replacing Vidispine IDs, UUIDs and numbers in the path
+    :param url: request URL, e.g. /API/item/VX-1234/shape/VX-99;content=metadata?tag=original
+    :return: string, e.g. /API/item/{id}/shape/{id}
+    """
+    path = url.split('?', 1)[0]
+    segments = []
+    for segment in path.split('/'):
+        segment = segment.split(';', 1)[0]
+        for pattern, replacement in _id_patterns:
+            if pattern.match(segment):
+                segment = replacement
+                break
+        segments.append(segment)
+    return "/".join(segments)
+
+
+class VSRequestRecord(object):
+    """
+    Describes one HTTP request made to Vidispine.  Times are in seconds; any that were not measured are None.
+    """
+    __slots__ = ('method', 'url', 'template', 'status', 'bytes_out', 'bytes_in', 'connect_time', 'ttfb', 'total_time',
+                 'retries', 'parse_time', 'queue_time', 'error', 'started', 'context')
+
+    def __init__(self, method, url, template):
+        self.method = method
+        self.url = url
+        self.template = template
+        self.status = None
+        self.bytes_out = 0
+        self.bytes_in = None
+        self.connect_time = None
+        self.ttfb = None
+        self.total_time = None
+        self.retries = 0
+        self.parse_time = None
+        #time spent waiting for a VSRequestGovernor before the request was sent
+        self.queue_time = None
+        self.error = None
+        self.started = time.time()
+        #whatever the instrumentation's request_started() returned, e.g. a tracing span
+        self.context = None
+
+    def __repr__(self):
+        return "VSRequestRecord({0} {1} -> {2}, {3}s)".format(self.method, self.template, self.status, self.total_time)
+
+
+class VSInstrumentation(object):
+    """
+    Base class for request instrumentation.  Each method does nothing; override the ones you need.
+    """
+    def url_template(self, url):
+        """
+        Returns the template that a request URL is labelled with. Override this to group URLs differently.
+        """
+        return url_template(url)
+
+    def request_started(self, record):
+        """
+        Called before a request is sent.  record.method, url and template are filled in.
+        :return: anything you want to keep with the record until it is finished; it is stored as record.context
+        """
+        return None
+
+    def request_finished(self, record):
+        """
+        Called once the response to a request has been read, or the request has failed (record.error is then set).
+        Responses that are handed back to the caller unread, such as downloads, finish when their headers arrive.
+        """
+        pass
+
+    def response_parsed(self, record):
+        """
+        Called after request() has parsed the response body, with record.parse_time set.  This is after
+        request_finished().
+        """
+        pass
+
+
+class VSInstrumentationGroup(VSInstrumentation):
+    """
+    Passes every event on to each of a number of instrumentations
+    """
+    def __init__(self, *instrumentations):
+        self.instrumentations = list(instrumentations)
+
+    def request_started(self, record):
+        return [i.request_started(record) for i in self.instrumentations]
+
+    def _each(self, record, method):
+        contexts = record.context
+        try:
+            for i, context in zip(self.instrumentations, contexts):
+                record.context = context
+                getattr(i, method)(record)
+        finally:
+            record.context = contexts
+
+    def request_finished(self, record):
+        self._each(record, 'request_finished')
+
+    def response_parsed(self, record):
+        self._each(record, 'response_parsed')
+
+
+class VSMetricsCollector(VSInstrumentation):
+    """
+    Keeps request counts, bytes and latency histograms in memory, by method, URL template and status
+
+    collector = VSMetricsCollector()
+    VSApi.instrumentation = collector
+    ...
+    for key, stats in collector.snapshot().items():
+        print(key, stats['count'], stats['total_time']['sum'])
+    """
+    default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    class _Histogram(object):
+        def __init__(self, buckets):
+            self.buckets = buckets
+            self.counts = [0] * (len(buckets) + 1)
+            self.sum = 0.0
+            self.count = 0
+
+        def observe(self, value):
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+        def as_dict(self):
+            return {'buckets': list(zip(list(self.buckets) + [float('inf')], self.counts)), 'sum': self.sum,
+                    'count': self.count}
+
+    def __init__(self, buckets=None):
+        """
+        :param buckets: upper bounds of the latency histogram buckets, in seconds
+        """
+        self.buckets = tuple(buckets) if buckets is not None else self.default_buckets
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _entry(self, record):
+        key = (record.method, record.template, record.status)
+        entry = self._stats.get(key)
+        if entry is None:
+            entry = {'count': 0, 'errors': 0, 'retries': 0, 'bytes_in': 0, 'bytes_out': 0,
+                     'connect_time': self._Histogram(self.buckets), 'ttfb': self._Histogram(self.buckets),
+                     'total_time': self._Histogram(self.buckets), 'parse_time': self._Histogram(self.buckets),
+                     'queue_time': self._Histogram(self.buckets)}
+            self._stats[key] = entry
+        return entry
+
+    def request_finished(self, record):
+        with self._lock:
+            entry = self._entry(record)
+            entry['count'] += 1
+            entry['retries'] += record.retries
+            entry['bytes_out'] += record.bytes_out
+            if record.error is not None:
+                entry['errors'] += 1
+            if record.bytes_in is not None:
+                entry['bytes_in'] += record.bytes_in
+            for name in ('connect_time', 'ttfb', 'total_time', 'queue_time'):
+                value = getattr(record, name)
+                if value is not None:
+                    entry[name].observe(value)
+
+    def response_parsed(self, record):
+        with self._lock:
+            self._entry(record)['parse_time'].observe(record.parse_time)
+
+    def snapshot(self):
+        """
+        :return: dictionary of (method, template, status) => dictionary of counts and histograms
+        """
+        with self._lock:
+            result = {}
+            for key, entry in self._stats.items():
+                result[key] = dict([(k, v.as_dict() if isinstance(v, self._Histogram) else v)
+                                    for k, v in entry.items()])
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+
+class VSPrometheusInstrumentation(VSInstrumentation):
+    """
+    Exports request metrics through prometheus_client:
+    {prefix}_requests_total, {prefix}_request_errors_total, {prefix}_request_retries_total (counters by method,
+    template and status), {prefix}_request_bytes_total (by method, template and direction) and
+    {prefix}_request_seconds, {prefix}_ttfb_seconds, {prefix}_connect_seconds, {prefix}_parse_seconds and
+    {prefix}_queue_seconds (histograms)
+    """
+    def __init__(self, registry=None, prefix="vidispine", buckets=None):
+        """
+        :param registry: prometheus_client CollectorRegistry to register with; defaults to the global registry
+        :param prefix: prefix for metric names
+        :param buckets: histogram bucket bounds in seconds, or None for prometheus_client's default
+        """
+        if _prometheus is None:
+            raise InstrumentationUnavailable("prometheus_client is not installed")
+        kwargs = {'registry': registry} if registry is not None else {}
+        hist_kwargs = dict(kwargs)
+        if buckets is not None:
+            hist_kwargs['buckets'] = buckets
+        labels = ['method', 'template', 'status']
+        self.requests = _prometheus.Counter(prefix + "_requests_total", "Requests made to Vidispine", labels, **kwargs)
+        self.errors = _prometheus.Counter(prefix + "_request_errors_total", "Requests that failed without a response",
+                                          labels, **kwargs)
+        self.retries = _prometheus.Counter(prefix + "_request_retries_total", "Times requests were re-sent", labels,
+                                           **kwargs)
+        self.bytes = _prometheus.Counter(prefix + "_request_bytes_total", "Bytes sent to and received from Vidispine",
+                                         ['method', 'template', 'direction'], **kwargs)
+        self.total_time = _prometheus.Histogram(prefix + "_request_seconds", "Total request time", labels, **hist_kwargs)
+        self.ttfb = _prometheus.Histogram(prefix + "_ttfb_seconds", "Time to response headers", labels, **hist_kwargs)
+        self.connect_time = _prometheus.Histogram(prefix + "_connect_seconds", "Time to open a connection",
+                                                  ['method', 'template'], **hist_kwargs)
+        self.parse_time = _prometheus.Histogram(prefix + "_parse_seconds", "Time to parse responses",
+                                                ['method', 'template'], **hist_kwargs)
+        self.queue_time = _prometheus.Histogram(prefix + "_queue_seconds", "Time held back by the request governor",
+                                                ['method', 'template'], **hist_kwargs)
+
+    def request_finished(self, record):
+        labels = (record.method, record.template, str(record.status))
+        self.requests.labels(*labels).inc()
+        if record.error is not None:
+            self.errors.labels(*labels).inc()
+        if record.retries:
+            self.retries.labels(*labels).inc(record.retries)
+        self.bytes.labels(record.method, record.template, "out").inc(record.bytes_out)
+        if record.bytes_in is not None:
+            self.bytes.labels(record.method, record.template, "in").inc(record.bytes_in)
+        if record.total_time is not None:
+            self.total_time.labels(*labels).observe(record.total_time)
+        if record.ttfb is not None:
+            self.ttfb.labels(*labels).observe(record.ttfb)
+        if record.connect_time is not None:
+            self.connect_time.labels(record.method, record.template).observe(record.connect_time)
+        if record.queue_time is not None:
+            self.queue_time.labels(record.method, record.template).observe(record.queue_time)
+
+    def response_parsed(self, record):
+        self.parse_time.labels(record.method, record.template).observe(record.parse_time)
+
+
+class VSOpenTelemetryInstrumentation(VSInstrumentation):
+    """
+    Creates an OpenTelemetry client span for every request, and one for parsing each response
+    """
+    def __init__(self, tracer=None):
+        """
+        :param tracer: opentelemetry Tracer to use; defaults to one from the global tracer provider
+        """
+        if _otel_trace is None:
+            raise InstrumentationUnavailable("opentelemetry-api is not installed")
+        self.tracer = tracer if tracer is not None else _otel_trace.get_tracer(__name__)
+
+    def request_started(self, record):
+        return self.tracer.start_span("{0} {1}".format(record.method, record.template),
+                                      kind=_otel_trace.SpanKind.CLIENT,
+                                      attributes={'http.method': record.method, 'http.url': record.url,
+                                                  'http.route': record.template})
+
+    def request_finished(self, record):
+        span = record.context
+        if span is None:
+            return
+        if record.status is not None:
+            span.set_attribute('http.status_code', record.status)
+        span.set_attribute('vidispine.retries', record.retries)
+        span.set_attribute('http.request_content_length', record.bytes_out)
+        if record.bytes_in is not None:
+            span.set_attribute('http.response_content_length', record.bytes_in)
+        if record.ttfb is not None:
+            span.set_attribute('vidispine.ttfb', record.ttfb)
+        if record.connect_time is not None:
+            span.set_attribute('vidispine.connect_time', record.connect_time)
+        if record.error is not None:
+            span.record_exception(record.error)
+            span.set_status(_otel_trace.Status(_otel_trace.StatusCode.ERROR))
+        span.end()
+
+    def response_parsed(self, record):
+        end = time.time_ns()
+        parent = _otel_trace.set_span_in_context(record.context) if record.context is not None else None
+        span = self.tracer.start_span("parse {0}".format(record.template), context=parent,
+                                      start_time=end - int(record.parse_time*1e9),
+                                      attributes={'http.route': record.template})
+        span.end(end_time=end)
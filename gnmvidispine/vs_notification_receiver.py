@@ -0,0 +1,433 @@
+"""
+Receiving Vidispine HTTP notifications, so that changes to items, jobs, storages, files and metadata are pushed to you
+instead of having to be polled for.
+
+VSNotificationReceiver runs a small multi-threaded HTTP server.  When it starts it registers a VSNotification for each
+entity type and action that you have asked for, pointing at itself, and when it stops it deletes them again.  Each
+notification that arrives is parsed into an event object (VSJobEvent, VSMetadataEvent etc.) and put on the queue of
+every subscriber that wants it.
+
+receiver = VSNotificationReceiver(connection, public_url="http://this-host.example.com:8123", port=8123)
+receiver.register("job", ["update", "stop"])
+receiver.register("metadata", ["modify"])
+events = receiver.subscribe(["job"])
+receiver.feed_job_watcher(job_watcher(connection))      #VSJobWatcher re-checks a job as soon as it changes
+receiver.feed_cache(VSItem.cache)                       #cached items are dropped as soon as their metadata changes
+with receiver:
+    while True:
+        event = events.get()
+        print(event.entity_id, event.action, event.status)
+
+The receiver listens on the address that public_url's host name resolves to, unless told otherwise with host=.  Each
+notification is registered with a URL that includes a random secret token, as /{token}/{entity type}/{action} under
+public_url, and anything posted without the token is refused with 403, so that only Vidispine (or whoever can read the
+notification definitions) can feed it events.
+
+Vidispine retries a notification until it gets a successful response, so:
+ - if any subscriber's queue that an event should go on is full, the receiver answers 503 and puts it on none of them;
+   Vidispine sends it again later, by when the subscriber has hopefully caught up
+ - the receiver remembers the last few thousand notifications it has accepted, and acknowledges a repeat of one of them
+   without passing it on again, so that subscribers see each notification once even if Vidispine never saw the
+   response to the first delivery.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import socket
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from queue import Queue
+from socketserver import ThreadingMixIn
+from urllib.parse import urlsplit
+
+from . import vs_xml
+from .vidispine_api import VSNotFound, always_string, json_list, json_text
+from .vs_notifications import VSNotification, VSTriggerEntry
+from .vs_xml import vs_path
+
+logger = logging.getLogger(__name__)
+
+
+class VSNotificationEvent(object):
+    """
+    A notification received from Vidispine.  data is a dictionary of the key/value pairs that it carried.
+    """
+    entity_type = None
+    #key in data holding the ID of the entity that the notification is about
+    id_key = None
+
+    def __init__(self, action, data):
+        """
+        :param action: action that triggered the notification, e.g. create, modify, stop
+        :param data: dictionary of the values in the notification
+        """
+        self.action = action
+        self.data = data
+
+    def __repr__(self):
+        return "{0}({1} {2})".format(self.__class__.__name__, self.action, self.entity_id)
+
+    @property
+    def entity_id(self):
+        return self.data.get(self.id_key)
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    @staticmethod
+    def parse_body(body, content_type="application/xml"):
+        """
+        Reads the key/value pairs out of a notification, which Vidispine sends as a SimpleMetadataDocument in XML or
+        JSON. If a key appears more than once the first value is used.
+        :param body: raw request body
+        :param content_type: value of the Content-Type header
+        :return: dictionary
+        """
+        data = {}
+        if "json" in (content_type or ""):
+            doc = json.loads(always_string(body))
+            for field in json_list(doc.get('field')):
+                key = json_text(field.get('key'))
+                if key is not None and key not in data:
+                    data[key] = json_text(field.get('value'))
+        else:
+            doc = vs_xml.fromstring(body)
+            for field in vs_path("vs:field").findall(doc):
+                key = vs_path("vs:key").text(field)
+                if key is not None and key not in data:
+                    data[key] = vs_path("vs:value").text(field)
+        return data
+
+
+class VSItemEvent(VSNotificationEvent):
+    entity_type = "item"
+    id_key = "itemId"
+
+
+class VSJobEvent(VSNotificationEvent):
+    entity_type = "job"
+    id_key = "jobId"
+
+    @property
+    def status(self):
+        return self.data.get('status')
+
+    @property
+    def job_type(self):
+        return self.data.get('type')
+
+    @property
+    def item_id(self):
+        return self.data.get('itemId')
+
+
+class VSStorageEvent(VSNotificationEvent):
+    entity_type = "storage"
+    id_key = "storageId"
+
+
+class VSFileEvent(VSNotificationEvent):
+    entity_type = "file"
+    id_key = "fileId"
+
+    @property
+    def storage_id(self):
+        return self.data.get('storageId')
+
+
+class VSMetadataEvent(VSNotificationEvent):
+    entity_type = "metadata"
+
+    @property
+    def target_type(self):
+        """
+        :return: "item" or "collection", whichever the changed metadata belongs to
+        """
+        return "collection" if self.data.get('itemId') is None and self.data.get('collectionId') is not None else "item"
+
+    @property
+    def entity_id(self):
+        return self.data.get('itemId') or self.data.get('collectionId')
+
+    @property
+    def changeset(self):
+        return self.data.get('changeSetId')
+
+
+class _Subscription(object):
+    def __init__(self, target, entity_types=None, actions=None):
+        self.target = target
+        self.entity_types = set(entity_types) if entity_types is not None else None
+        self.actions = set(actions) if actions is not None else None
+
+    def matches(self, event):
+        return (self.entity_types is None or event.entity_type in self.entity_types) and \
+               (self.actions is None or event.action in self.actions)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s" % (self.address_string(), format % args))
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length', 0) or 0)
+        body = self.rfile.read(length) if length > 0 else b""
+        #notifications are registered with URLs ending /{token}/{entity type}/{action}
+        parts = [p for p in urlsplit(self.path).path.split("/") if p != ""]
+        if len(parts) < 3 or not hmac.compare_digest(parts[-3].encode("UTF-8"), self.server.receiver.token.encode("UTF-8")):
+            logger.warning("Refusing notification to {0} from {1} without the receiver's token".format(
+                "/".join(parts[-2:]), self.address_string()))
+            status = 403
+        else:
+            status = self.server.receiver.receive(parts[-2], parts[-1], body, self.headers.get('Content-Type'))
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_POST = _handle
+    do_PUT = _handle
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class VSNotificationReceiver(object):
+    """
+    Receives Vidispine HTTP notifications and passes them on to subscribers.  See the module documentation.
+    """
+    event_types = dict([(cls.entity_type, cls) for cls in (VSItemEvent, VSJobEvent, VSStorageEvent, VSFileEvent,
+                                                            VSMetadataEvent)])
+
+    #path that each entity type's notifications are registered under, relative to /API
+    notification_classes = {'item': 'item', 'job': 'job', 'storage': 'storage', 'file': 'storage/file',
+                            'metadata': 'metadata'}
+
+    def __init__(self, connection, public_url=None, host=None, port=0, remember=10000, token=None):
+        """
+        :param connection: Initialised VSApi object (or any other Vidispine base object) used to register the
+        notifications
+        :param public_url: base URL at which Vidispine can reach this receiver, e.g. http://this-host.example.com:8123. If
+        not given, this machine's fully qualified domain name and the port being listened on are used.
+        :param host: address to listen on. By default this is the address that the host name in public_url (or this
+        machine's fully qualified domain name) resolves to; pass "" to listen on all of them
+        :param port: port to listen on; the default of 0 picks a free one
+        :param remember: number of accepted notifications to remember, so that repeated deliveries of them are ignored
+        :param token: secret that must be in the path of every notification. A random one is made if not given.
+        """
+        self.connection = connection
+        self.public_url = public_url
+        self.host = host
+        self.port = port
+        self.remember = remember
+        self.token = token if token is not None else secrets.token_urlsafe(24)
+        self.received = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self._registrations = []
+        self._notifications = []
+        self._subscriptions = []
+        self._listeners = []
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def url(self):
+        """
+        Base URL that the notifications are sent to
+        """
+        if self.public_url is not None:
+            return self.public_url.rstrip("/")
+        return "http://{0}:{1}".format(socket.getfqdn(), self.port)
+
+    def _listen_address(self):
+        """
+        Internal method returning the address to listen on: host if it was given, otherwise the address that the receiver's
+        public host name resolves to
+        """
+        if self.host is not None:
+            return self.host
+        name = urlsplit(self.public_url).hostname if self.public_url is not None else socket.getfqdn()
+        return socket.gethostbyname(name)
+
+    def register(self, entity_type, actions, filter=None):
+        """
+        Asks for notifications of the given actions on an entity type, to be registered with Vidispine when the receiver
+        starts
+        :param entity_type: one of item, job, storage, file or metadata
+        :param actions: list of actions to be notified of, e.g. ["create", "modify", "delete"] or ["update", "stop"]
+        :param filter: optional dictionary of filter terms for the trigger; see VSTriggerEntry
+        :return: self
+        """
+        if entity_type not in self.event_types:
+            raise ValueError("Can't receive notifications for {0}".format(entity_type))
+        if not isinstance(actions, list):
+            actions = [actions]
+        for action in actions:
+            self._registrations.append((entity_type, action, filter))
+        return self
+
+    def subscribe(self, entity_types=None, actions=None, maxsize=1000):
+        """
+        Returns a queue that receives the events of the given entity types and actions
+        :param entity_types: list of entity types to receive, or None for all
+        :param actions: list of actions to receive, or None for all
+        :param maxsize: number of events the queue can hold. While it is full, notifications that should go on it are
+        refused, and Vidispine re-sends them later.
+        :return: queue.Queue of VSNotificationEvent objects
+        """
+        events = Queue(maxsize)
+        with self._lock:
+            self._subscriptions.append(_Subscription(events, entity_types, actions))
+        return events
+
+    def unsubscribe(self, events):
+        """
+        Stops putting events on a queue returned by subscribe()
+        """
+        with self._lock:
+            self._subscriptions = [s for s in self._subscriptions if s.target is not events]
+
+    def add_listener(self, callback, entity_types=None, actions=None):
+        """
+        Calls callback with each event of the given entity types and actions as it arrives, on the thread that received
+        it. Callbacks should return quickly; use subscribe() for anything slow.
+        """
+        with self._lock:
+            self._listeners.append(_Subscription(callback, entity_types, actions))
+
+    def feed_job_watcher(self, watcher):
+        """
+        Tells a VSJobWatcher about each job notification, so that it checks the job straight away
+        """
+        self.add_listener(lambda event: watcher.notify(event.entity_id, event.status), ["job"])
+
+    def feed_cache(self, cache):
+        """
+        Keeps a VSItemCache up to date: entries are dropped when metadata notifications show a newer changeset, or when
+        the item is modified or deleted
+        """
+        def on_event(event):
+            if event.entity_id is None:
+                return
+            if event.entity_type == "metadata" and event.changeset is not None:
+                cache.note_change(self.connection, event.entity_id, event.changeset, entity_type=event.target_type)
+            elif event.entity_type == "metadata" or event.action in ("modify", "delete"):
+                cache.invalidate(event.entity_id, entity_type=getattr(event, 'target_type', 'item'),
+                                 conn=self.connection)
+        self.add_listener(on_event, ["item", "metadata"])
+
+    def receive(self, entity_type, action, body, content_type="application/xml"):
+        """
+        Handles one notification; called by the HTTP server
+        :return: HTTP status code to answer with
+        """
+        event_class = self.event_types.get(entity_type)
+        if event_class is None:
+            return 404
+        try:
+            event = event_class(action, VSNotificationEvent.parse_body(body, content_type))
+        except Exception as e:
+            logger.warning("Could not read {0} {1} notification: {2}".format(entity_type, action, e))
+            return 400
+
+        key = hashlib.sha1(entity_type.encode("UTF-8") + b"/" + action.encode("UTF-8") + b"\n" + body).hexdigest()
+        with self._lock:
+            if key in self._seen:
+                self.duplicates += 1
+                return 200
+            subscriptions = [s for s in self._subscriptions if s.matches(event)]
+            if any([s.target.full() for s in subscriptions]):
+                self.rejected += 1
+                logger.debug("Refusing {0} while a subscriber's queue is full".format(event))
+                return 503
+            #nothing else puts on the queues, so none can have filled up since they were checked
+            for s in subscriptions:
+                s.target.put_nowait(event)
+            self._seen[key] = True
+            while len(self._seen) > self.remember:
+                self._seen.popitem(last=False)
+            self.received += 1
+            listeners = [s for s in self._listeners if s.matches(event)]
+
+        for listener in listeners:
+            try:
+                listener.target(event)
+            except Exception:
+                logger.exception("Notification listener failed on {0}".format(event))
+        return 200
+
+    def start(self):
+        """
+        Starts listening on a background thread and registers the notifications with Vidispine
+        :return: self
+        """
+        self._httpd = _ThreadingHTTPServer((self._listen_address(), self.port), _Handler)
+        self._httpd.receiver = self
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="VSNotificationReceiver")
+        self._thread.daemon = True
+        self._thread.start()
+        try:
+            for entity_type, action, filter in self._registrations:
+                self._notifications.append(self._save_notification(entity_type, action, filter))
+        except Exception:
+            self.stop()
+            raise
+        return self
+
+    def stop(self):
+        """
+        Deletes the notifications that were registered and stops listening
+        """
+        for notification in self._notifications:
+            try:
+                notification.delete()
+            except VSNotFound:
+                pass
+            except Exception as e:
+                logger.warning("Could not delete notification {0}: {1}".format(notification.name, e))
+        self._notifications = []
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._thread.join()
+            self._httpd = None
+            self._thread = None
+
+    def _save_notification(self, entity_type, action, filter):
+        """
+        Internal method to register one notification pointing at this receiver
+        :return: the saved VSNotification
+        """
+        c = self.connection
+        #same scheme as the connection, as the body carries the receiver's secret token
+        notification = VSNotification(**c._child_args())
+        notification.objectclass = self.notification_classes[entity_type]
+        http = next(notification.actions)
+        http.url = "{0}/{1}/{2}/{3}".format(self.url, self.token, entity_type, action)
+        http.method = "POST"
+        http.contentType = "application/json" if c.transport == "json" else "application/xml"
+
+        trigger = VSTriggerEntry(None)
+        trigger.trigger_class = entity_type
+        trigger.action = action
+        trigger.filter = filter or {}
+        notification.trigger = trigger
+        notification.save()
+        logger.debug("Registered notification {0} for {1} {2}".format(notification.name, entity_type, action))
+        return notification
@@ -39,7 +39,7 @@ class NotificationBase(object):
         Sets the value of the node identified by xpath to newval, or if the parent= parameter is set to an ElementTree
         node will attempt to create it if it does not already exist.
         """
-        from xml.etree.cElementTree import SubElement
+        from .vs_xml import SubElement
         if parent is None:
             parent = self.dataContent
         if not isinstance(newval,str):
@@ -224,9 +224,8 @@ class VSNotification(VSApi):
         will change
         :return: None
         """
-        from xml.etree.cElementTree import tostring
-        from .vidispine_api import VSNotFound
-        from pprint import pprint
+        import re
+        from .vidispine_api import VSNotFound, always_string
         
         try:
             self.delete()
@@ -235,13 +234,15 @@ class VSNotification(VSApi):
             
         url = "/{cls}/notification".format(cls=self.objectclass)
         content = self.as_xml()
-        response_content = self.request(url, method="POST", body=content)
-        pprint(response_content)
-        #FIXME: need to update the name property from the reply
-        #raise StandardError("testing")
+        #the reply is the new notification's ID, or a document containing it
+        response_content = self.request(url, method="POST", body=content, accept="text/plain,application/xml")
+        if response_content != "Success":
+            found = re.search(r'\b(\w{2}-\d+)\b', always_string(response_content))
+            if found:
+                self.name = found.group(1)
 
     def as_xml(self):
-        from xml.etree.cElementTree import tostring
+        from .vs_xml import tostring
         import re
         
         #strip_attributes(self.dataContent, 'xmlns', 'xmlns:ns0')
@@ -276,7 +277,7 @@ class VSNotification(VSApi):
         Generator that yields objects for every action associated with this notification
         :return: yields HttpNotification or similar subclass
         """
-        from xml.etree.cElementTree import SubElement
+        from .vs_xml import SubElement
         action_node = self.dataContent.find('{0}action'.format(self.xmlns))
         if action_node is None:
             action_node = SubElement(self.dataContent,'{0}action'.format(self.xmlns))
@@ -296,7 +297,7 @@ class VSNotification(VSApi):
         :param act: Action to add.  This should be a NotificationBase subclass, e.g. HttpNotification
         :return:
         """
-        from xml.etree.cElementTree import SubElement
+        from .vs_xml import SubElement, append
         if not isinstance(act,NotificationBase):
             raise TypeError("add_action must be given a notification action")
 
@@ -304,7 +305,7 @@ class VSNotification(VSApi):
         if action_node is None:
             action_node = SubElement(self.dataContent,'{0}action'.format(self.xmlns))
 
-        action_node.append(act.dataContent)
+        append(action_node, act.dataContent)
 
         return self
 
@@ -331,7 +332,7 @@ class VSNotification(VSApi):
         Sets a new trigger value
         :param newval: Populated VSTriggerEntry representing the trigger value
         """
-        from xml.etree.cElementTree import SubElement
+        from .vs_xml import append
         if not isinstance(newval,VSTriggerEntry):
             raise ValueError("trigger must be a VSTriggerEntry")
 
@@ -344,7 +345,7 @@ class VSNotification(VSApi):
           del node.attrib['xmlns:ns0']
         except KeyError:
           pass          
-        self.dataContent.append(node)
+        append(self.dataContent, node)
 
 
 class VSNotificationCollection(VSApi):
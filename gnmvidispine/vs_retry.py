@@ -0,0 +1,261 @@
+"""
+A policy for retrying failed requests that is shared by every object talking to the same Vidispine server.
+
+policy = VSRetryPolicy(max_attempts=6, deadline=120, rules={503: VSRetryRule(base_delay=2), 502: None})
+VSApi.retry_policy = policy         #every object from now on, or:
+item = VSItem(host,port,user,passwd,retry_policy=policy)     #just this one
+
+Without a policy, VSApi retries as it always has: 503 responses every retry_delay seconds up to retry_attempts times,
+504 responses after a delay that doubles for each object, and connection errors every second up to 10 times.  With
+one:
+ - every request is retried in the same way, whether it is made by request(), stream_request(), a download or an
+   upload
+ - each status has a VSRetryRule giving how many attempts to make and the base and maximum delay between them.
+   Statuses without a rule (including all 4xx) are not retried.  Connection errors (socket errors, bad status lines,
+   connections that can't be re-used) use the rule for CONNECTION_ERROR.
+ - the delay grows exponentially with the number of consecutive failures from the host, counting every object that uses
+   the policy, and is jittered so that many clients backing off from the same server don't all come back at once
+ - a request is given up once the next delay would take it past its deadline, however many attempts it has left
+ - after failure_threshold consecutive failures from a host, its circuit opens: requests to it raise VSCircuitOpen
+   straight away, without being sent, for reset_timeout seconds.  Then a single trial request is let through, and the
+   circuit closes again if it succeeds or stays open for another reset_timeout if it fails.
+"""
+import logging
+import random
+import threading
+import time
+
+from .vidispine_api import VSException
+
+logger = logging.getLogger(__name__)
+
+#key in VSRetryPolicy.rules for failures to connect or to read a response, rather than error statuses
+CONNECTION_ERROR = "error"
+
+
+class VSCircuitOpen(VSException):
+    """
+    Raised instead of sending a request to a server that has been failing, while its circuit breaker is open
+    """
+    def __init__(self, host, port, retry_at):
+        super(VSCircuitOpen, self).__init__()
+        self.host = host
+        self.port = port
+        self.retry_at = retry_at
+
+    def __str__(self):
+        return "Requests to {0}:{1} are failing; not trying again for {2:.1f}s".format(self.host, self.port,
+                                                                                       max(0, self.retry_at - time.time()))
+
+
+class VSRetryRule(object):
+    """
+    How to retry one kind of failure.  Anything left as None is taken from the policy.
+    """
+    def __init__(self, max_attempts=None, base_delay=None, max_delay=None):
+        """
+        :param max_attempts: total number of attempts to make, including the first
+        :param base_delay: delay before the first retry, in seconds
+        :param max_delay: longest delay between attempts, in seconds
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+
+class _HostState(object):
+    def __init__(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = None
+
+
+class VSRetryPolicy(object):
+    """
+    Decides whether and when to retry failed requests, and when to stop sending them to a server altogether.  See the
+    module documentation.  It is thread-safe, and keeps its state per host and port.
+    """
+    def __init__(self, rules=None, max_attempts=5, base_delay=0.5, max_delay=30, multiplier=2, jitter="full",
+                 deadline=300, failure_threshold=10, reset_timeout=30, seed=None):
+        """
+        :param rules: dictionary of HTTP status (or CONNECTION_ERROR) to VSRetryRule, or to None to not retry it. These
+        are added to the default rules, which retry 502, 503, 504 and connection errors.
+        :param max_attempts: default total number of attempts for each request, including the first
+        :param base_delay: default delay before the first retry, in seconds
+        :param max_delay: default longest delay between attempts, in seconds
+        :param multiplier: factor the delay grows by with each consecutive failure
+        :param jitter: "full" to wait a random time up to the delay, "equal" for between half of it and all of it, or None
+        to wait exactly the delay
+        :param deadline: number of seconds after a request starts that it must have succeeded by, or None for no limit
+        :param failure_threshold: number of consecutive failures from a host that opens its circuit, or None never to
+        :param reset_timeout: number of seconds a circuit stays open before a trial request is allowed
+        :param seed: seed for the jitter, so that runs can be repeated
+        """
+        if jitter not in ("full", "equal", None):
+            raise ValueError("jitter must be full, equal or None, not {0}".format(jitter))
+        self.rules = {502: VSRetryRule(), 503: VSRetryRule(), 504: VSRetryRule(), CONNECTION_ERROR: VSRetryRule()}
+        self.rules.update(rules or {})
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.retries = 0
+        self.rejected = 0
+        self._random = random.Random(seed)
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(host, port):
+        try:
+            port = int(port)
+        except (TypeError, ValueError):
+            pass
+        return host, port
+
+    def _host(self, key):
+        """
+        Internal method returning the state for a host. Must be called with the lock held.
+        """
+        state = self._hosts.get(key)
+        if state is None:
+            state = _HostState()
+            self._hosts[key] = state
+        return state
+
+    def begin(self, host, port):
+        """
+        Starts a request to the given server
+        :return: VSRetryState to report the outcome of each attempt to
+        """
+        return VSRetryState(self, host, port)
+
+    def is_open(self, host, port):
+        """
+        :return: True if requests to the given server are currently being refused
+        """
+        with self._lock:
+            state = self._hosts.get(self._key(host, port))
+            return state is not None and state.opened_at is not None and \
+                time.time() < state.opened_at + self.reset_timeout
+
+    def reset(self):
+        """
+        Forgets all failures, closing every circuit
+        """
+        with self._lock:
+            self._hosts = {}
+
+    def _allow(self, key):
+        """
+        Internal method raising VSCircuitOpen if a request may not be sent to the given host now
+        """
+        with self._lock:
+            state = self._host(key)
+            if state.opened_at is None:
+                return
+            now = time.time()
+            retry_at = max(state.opened_at, state.trial_started or 0) + self.reset_timeout
+            if now >= retry_at:
+                #half-open: let one request through to see whether the server has recovered
+                state.trial_started = now
+                return
+            self.rejected += 1
+        raise VSCircuitOpen(key[0], key[1], retry_at)
+
+    def _succeeded(self, key):
+        with self._lock:
+            state = self._host(key)
+            if state.opened_at is not None:
+                logger.info("{0}:{1} has recovered, closing its circuit".format(key[0], key[1]))
+            state.failures = 0
+            state.opened_at = None
+            state.trial_started = None
+
+    def _failed(self, key):
+        """
+        Internal method recording a failure from a host
+        :return: number of consecutive failures from it
+        """
+        with self._lock:
+            state = self._host(key)
+            state.failures += 1
+            if self.failure_threshold is not None and \
+                    (state.trial_started is not None or
+                     (state.opened_at is None and state.failures >= self.failure_threshold)):
+                logger.warning("{0} consecutive failures from {1}:{2}, failing requests to it for {3}s".format(
+                    state.failures, key[0], key[1], self.reset_timeout))
+                state.opened_at = time.time()
+                state.trial_started = None
+            return state.failures
+
+    def _delay(self, rule, exponent):
+        """
+        Internal method returning the jittered delay before a retry
+        """
+        base_delay = rule.base_delay if rule.base_delay is not None else self.base_delay
+        max_delay = rule.max_delay if rule.max_delay is not None else self.max_delay
+        delay = min(max_delay, base_delay * (self.multiplier ** exponent))
+        if self.jitter == "full":
+            return self._random.uniform(0, delay)
+        elif self.jitter == "equal":
+            return self._random.uniform(delay / 2.0, delay)
+        return delay
+
+
+class VSRetryState(object):
+    """
+    The progress of one request under a VSRetryPolicy.  Call check() before each attempt, then succeeded() or failed().
+    """
+    def __init__(self, policy, host, port):
+        self.policy = policy
+        self.key = policy._key(host, port)
+        self.attempts = 0
+        self.started = time.time()
+
+    def check(self):
+        """
+        Raises VSCircuitOpen if the request may not be sent now
+        """
+        self.policy._allow(self.key)
+        self.attempts += 1
+
+    def succeeded(self):
+        """
+        Records that the server answered, whether or not it was with a success status
+        """
+        self.policy._succeeded(self.key)
+
+    def failed(self, status=None):
+        """
+        Records a failed attempt
+        :param status: HTTP status that was returned, or None if no response was received
+        :return: number of seconds to wait before the next attempt, or None to give up
+        """
+        policy = self.policy
+        rule_key = CONNECTION_ERROR if status is None else status
+        if rule_key not in policy.rules:
+            #the server answered, just not with what was wanted, so it counts as healthy
+            self.succeeded()
+            return None
+        rule = policy.rules[rule_key]
+        failures = policy._failed(self.key)
+        if rule is None:
+            return None
+
+        max_attempts = rule.max_attempts if rule.max_attempts is not None else policy.max_attempts
+        if self.attempts >= max_attempts:
+            logger.error("Did not work after {0} attempts, giving up".format(self.attempts))
+            return None
+        delay = policy._delay(rule, max(self.attempts, failures) - 1)
+        if policy.deadline is not None and time.time() + delay > self.started + policy.deadline:
+            logger.error("Giving up after {0} attempts, as retrying would pass the {1}s deadline".format(
+                self.attempts, policy.deadline))
+            return None
+        with policy._lock:
+            policy.retries += 1
+        return delay
@@ -1,6 +1,7 @@
 __author__ = 'Andy Gallagher <andy.gallagher@theguardian.com>'
 
-from .vidispine_api import VSApi,VSBadRequest,VSException,VSNotFound, always_string
+from .vidispine_api import VSApi,VSBadRequest,VSException,VSNotFound, always_string, json_list, json_text
+from . import vs_xml
 from .vs_timecode import VSTimecode
 from .vs_item import VSItem
 from .vs_collection import VSCollection
@@ -8,6 +9,9 @@ from .vs_collection import VSCollection
 import xml.etree.ElementTree as ET
 import logging
 import datetime
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 
@@ -109,7 +113,8 @@ class VSFacet(object):
 
 
 class VSSearchResult(VSApi):
-    def __init__(self, search_url="", body="",searchType="",debug=False, pageSize=100, *args,**kwargs):
+    def __init__(self, search_url="", body="",searchType="",debug=False, pageSize=100, content=None, fields=None,
+                 *args,**kwargs):
         super(VSSearchResult, self).__init__(*args,**kwargs)
         self.searchURL = search_url
         #self.searchParam = urllib.pathname2url(body.replace('/','%2F'))
@@ -120,35 +125,98 @@ class VSSearchResult(VSApi):
         self.debug = debug
         self.cachedData = None
         self.searchType = searchType
-
-    def _nextPage(self, page_number=-1):
-        #ns = "{http://xml.vidispine.com/schema/vidispine}"
+        #content options (e.g. ['metadata','shape','thumbnail']) for the server to include with each result
+        self.content = content
+        self.fields = fields
+
+    def _page_query(self):
+        """
+        Internal method returning the query parameters for a page request, or None if there are none
+        """
+        if not self.content:
+            return None
+        q = {'content': ",".join(self.content)}
+        if self.fields:
+            q['field'] = ",".join(self.fields)
+        return q
+
+    def _page_matrix(self, page_number=-1):
+        """
+        Internal method returning the matrix parameters to request the given page, or the next page if page_number is -1
+        """
         start_at = self.itemsRetrieved+1
         if page_number>=0:
             start_at = page_number*self.pageSize
             if start_at<1:
                 start_at=1
-        if self.searchType == "search":
-            xmlData = self.request(self.searchURL,method="PUT",
-                                   matrix={'first': start_at, 'number': self.pageSize},
-                                   body=self.searchParam
-                                   )
-        else:
+        if self.searchType != "search":
             logger.debug("VSSearchResult::_nextPage: url is {0} first is {1} number is {2} method is PUT body is {3}".format(
                 self.searchURL,start_at,self.pageSize,self.searchParam
             ))
-            xmlData = self.request(self.searchURL,method="PUT",
-                         matrix={'first': start_at, 'number': self.pageSize },
-                         #query={'q': self.searchParam }
-                        body=self.searchParam,
-            )
+        return {'first': start_at, 'number': self.pageSize}
+
+    def _nextPage(self, page_number=-1):
+        xmlData = self._request_document(self.searchURL,method="PUT",
+                                         matrix=self._page_matrix(page_number),
+                                         query=self._page_query(),
+                                         body=self.searchParam
+                                         )
+        return self._check_page(xmlData)
+
+    def _pageAt(self, first):
+        """
+        Internal method to request the page of results starting at the given (1-based) position
+        """
+        xmlData = self._request_document(self.searchURL,method="PUT",
+                                         matrix={'first': first, 'number': self.pageSize},
+                                         query=self._page_query(),
+                                         body=self.searchParam
+                                         )
+        return self._check_page(xmlData)
+
+    def _fetchPage(self, page_number=-1):
+        """
+        Internal method to get a page of results after the first. XML pages are streamed; JSON can't be decoded
+        incrementally, so JSON pages are requested whole.
+        """
+        if self.transport == "json":
+            return self._nextPage(page_number)
+        return self._streamPage(page_number)
+
+    def _streamPage(self, page_number=-1):
+        """
+        Internal generator that requests a page of results and yields each node of it as it is received, picking up
+        the total number of hits on the way
+        """
+        got_hits = False
+        for node in self.stream_request(self.searchURL,method="PUT",
+                                        matrix=self._page_matrix(page_number),
+                                        query=self._page_query(),
+                                        body=self.searchParam):
+            if node.tag == '{0}hits'.format(self.xmlns):
+                self.totalItems = int(node.text)
+                got_hits = True
+            yield node
+        if not got_hits:
+            raise AssertionError("Invalid XML returned from search request (no hits node)")
+
+    def _check_page(self, xmlData):
+        """
+        Internal method to validate a page of results and pick up the total number of hits from it
+        """
+        if isinstance(xmlData, dict):
+            if xmlData.get('hits') is None:
+                logger.debug(xmlData)
+                raise AssertionError("Invalid JSON returned from search request (no hits)")
+            self.totalItems = int(xmlData['hits'])
+            return xmlData
 
         hitsNode = xmlData.find('{0}hits'.format(self.xmlns))
         if hitsNode is not None:
             self.totalItems = int(hitsNode.text)
             #self.itemsRetrieved += self.pageSize
         else:
-            logger.debug(ET.tostring(xmlData))
+            logger.debug(vs_xml.tostring(xmlData))
             raise AssertionError("Invalid XML returned from search request (no hits node)")
 
         return xmlData
@@ -166,6 +234,16 @@ class VSSearchResult(VSApi):
             pageData = self._nextPage()
             self.cachedData = pageData
 
+        if isinstance(pageData, dict):
+            for node in json_list(pageData.get('facet')):
+                rtn={}
+                for count in json_list(node.get('count')):
+                    rtn[count['fieldValue']] = int(count['value'])
+                if node.get('field') is not None:
+                    rtn['facet_field_name']=json_text(node['field'])
+                yield rtn
+            return
+
         for node in pageData.findall('{0}facet'.format(self.xmlns)):
             rtn={}
             for countNode in node.findall('{0}count'.format(self.xmlns)):
@@ -179,8 +257,18 @@ class VSSearchResult(VSApi):
     def _namedChildNode(self,parent,child_name):
         return parent.find('{0}{1}'.format(self.xmlns,child_name))
 
-    def _page_node_generator(self,pageDataRoot,shouldPopulate=False):
-        rtn=None
+    def _page_node_refs(self,pageDataRoot,item_nodes=None):
+        """
+        Internal generator that yields an (entity type, id) tuple for each item or collection in a page of results,
+        where entity type is "item" or "collection"
+        :param item_nodes: if given, a dictionary that the node for each item is put into (keyed by id) before it is
+        yielded
+        """
+        if isinstance(pageDataRoot, dict):
+            for ref in self._json_page_node_refs(pageDataRoot,item_nodes=item_nodes):
+                yield ref
+            return
+
         for childnode in pageDataRoot:
             # pprint(childnode)
             if childnode.tag.endswith('hits'):
@@ -194,69 +282,178 @@ class VSSearchResult(VSApi):
                 itemstart = childnode.attrib['start']
                 itemend = childnode.attrib['end']
                 logger.debug("Item: {0} ({1} -> {2})".format(itemid, itemstart, itemend))
-                rtn = VSItem(self.host,self.port,self.user,self.passwd)
-                if shouldPopulate:
-                    rtn.populate(itemid)
-                else:
-                    rtn.name = itemid
+                if item_nodes is not None:
+                    item_nodes[itemid] = childnode
+                yield ("item", itemid)
             elif childnode.tag.endswith('collection'):
-                rtn = VSCollection(self.host,self.port,self.user,self.passwd)
-                try:
-                    if shouldPopulate:
-                        rtn.populate(childnode.attrib['id'])
-                    else:
-                        rtn.name = childnode.attrib['id']
-                except KeyError:  # no attrib['id'], so look for the id as a subnode
+                if 'id' in childnode.attrib:
+                    yield ("collection", childnode.attrib['id'])
+                else:  # no attrib['id'], so look for the id as a subnode
                     node = self._namedChildNode(childnode, 'id')
                     if node is not None:
-                        if shouldPopulate:
-                            rtn.populate(node.text)
-                        else:
-                            rtn.name = node.text
+                        yield ("collection", node.text)
                     else:  # no <id> node either
                         logger.error("Invalid data received - no <id> attribute or node for <collection>")
             elif childnode.tag.endswith('entry'):
                 if childnode.attrib['type']=="Collection":
-                    rtn = VSCollection(self.host,self.port,self.user,self.passwd)
-                    if shouldPopulate:
-                        rtn.populate(childnode.attrib['id'])
-                    else:
-                        rtn.name = childnode.attrib['id']
+                    yield ("collection", childnode.attrib['id'])
                 elif childnode.attrib['type']=="Item":
-                    rtn = VSItem(self.host,self.port,self.user,self.passwd)
-                    if shouldPopulate:
-                        rtn.populate(childnode.attrib['id'])
-                    else:
-                        rtn.name = childnode.attrib['id']
+                    yield ("item", childnode.attrib['id'])
             elif childnode.tag.endswith('facet'):
                 pass
             else:
                 raise AssertionError("Unexpected node type in document: {0}".format(childnode.tag))
-            # if rtn is None:
-            #     raise AssertionError("Search type is not item, collection, etc.")
-            if rtn is not None:
-                self.itemsRetrieved += 1
-                yield rtn
 
-    def results(self,shouldPopulate=True):
+    def _json_page_node_refs(self,pageData,item_nodes=None):
+        """
+        Internal generator equivalent to _page_node_refs for a page of results received as JSON
+        """
+        nhits = int(pageData['hits'])
+        logger.debug("Hits: {0}".format(nhits))
+        if self.totalItems<0:
+            self.totalItems = nhits
+        for itemnode in json_list(pageData.get('item')):
+            logger.debug("Item: {0} ({1} -> {2})".format(itemnode['id'], itemnode.get('start'), itemnode.get('end')))
+            if item_nodes is not None:
+                item_nodes[itemnode['id']] = itemnode
+            yield ("item", itemnode['id'])
+        for collectionnode in json_list(pageData.get('collection')):
+            if collectionnode.get('id') is not None:
+                yield ("collection", collectionnode['id'])
+            else:
+                logger.error("Invalid data received - no id for collection")
+        for entry in json_list(pageData.get('entry')):
+            if entry['type']=="Collection":
+                yield ("collection", entry['id'])
+            elif entry['type']=="Item":
+                yield ("item", entry['id'])
+
+    def _page_node_generator(self,pageDataRoot,shouldPopulate=False,fields=None):
+        item_nodes = {} if self.content else None
+        refs = self._page_node_refs(pageDataRoot,item_nodes=item_nodes)
+        if self.content and "metadata" in self.content:
+            #the results already have their metadata, so there is nothing to populate
+            shouldPopulate = False
+        if shouldPopulate:
+            #load all of the items on the page in one request, rather than one request each
+            refs = list(refs)
+            item_ids = [entity_id for entity_type, entity_id in refs if entity_type=="item"]
+            populated_items = iter(VSItem(self.host,self.port,self.user,self.passwd,transport=self.transport).populate_many(item_ids, specificFields=fields))
+
+        for entity_type, entity_id in refs:
+            if entity_type=="collection":
+                rtn = VSCollection(self.host,self.port,self.user,self.passwd,transport=self.transport)
+                if shouldPopulate:
+                    rtn.populate(entity_id, specificFields=fields)
+                else:
+                    rtn.name = entity_id
+            elif shouldPopulate:
+                rtn = next(populated_items)
+            else:
+                rtn = VSItem(self.host,self.port,self.user,self.passwd,transport=self.transport)
+                rtn.name = entity_id
+            if entity_type=="item" and item_nodes is not None and entity_id in item_nodes:
+                rtn.fromSearchResult(item_nodes.pop(entity_id), content=self.content)
+            self.itemsRetrieved += 1
+            yield rtn
+
+    def results(self,shouldPopulate=True,prefetch=0,threads=None,fields=None):
+        """
+        Generator yielding a VSItem or VSCollection for each search result
+        :param shouldPopulate: if True (default), load the metadata of each result before yielding it
+        :param fields: list or tuple of the names of the fields to load when populating. If None (default), load every
+        field.  Asking for only the fields that are needed makes the responses much smaller.
+        :param prefetch: number of pages to request in the background, ahead of the one that is being read.  If 0
+        (default), each page is only requested once the previous one has been read.  At most this many pages are held
+        in memory besides the current one, and results are always yielded in order.
+        :param threads: number of pages to request (and populate) at once when prefetching. Defaults to prefetch.
+        """
+        if prefetch>0:
+            for i in self._prefetched_results(shouldPopulate, prefetch, threads if threads is not None else prefetch,
+                                              fields):
+                yield i
+            return
+
         while(self.totalItems<0 or self.itemsRetrieved<self.totalItems):
             if self.cachedData is not None:
                 pageData = self.cachedData
                 self.cachedData = None
             else:
                 logger.debug("getting next page of results...")
-                pageData = self._nextPage()
+                pageData = self._fetchPage()
 
-            for i in self._page_node_generator(pageData,shouldPopulate=shouldPopulate):
+            retrieved_before = self.itemsRetrieved
+            for i in self._page_node_generator(pageData,shouldPopulate=shouldPopulate,fields=fields):
                 yield i
-
-    def results_page(self,page_number,shouldPopulate=True):
+            if self.itemsRetrieved == retrieved_before:  #no results returned => we got to the end
+                break
+
+    def _page_fetcher(self):
+        """
+        Internal method returning a copy of this search with its own connection, so pages can be requested from
+        several threads at once
+        """
+        return self.__class__(search_url=self.searchURL, body=self.searchParam, searchType=self.searchType,
+                              debug=self.debug, pageSize=self.pageSize, content=self.content, fields=self.fields,
+                              **self._child_args())
+
+    def _prefetched_results(self, shouldPopulate, prefetch, threads, fields=None):
+        """
+        Internal generator for results() when prefetching.  The first page is requested here, to find out the number
+        of hits; the remaining pages have fixed offsets from then on, so up to prefetch of them are requested (and
+        populated) on a thread pool while earlier ones are being read.
+        """
+        base = self.itemsRetrieved
+        if self.cachedData is not None:
+            first_page = self.cachedData
+            self.cachedData = None
+        else:
+            first_page = self._pageAt(base+1)
+        page_count = (self.totalItems - base + self.pageSize - 1) // self.pageSize
+
+        fetchers = threading.local()
+
+        def fetch_page(first):
+            fetcher = getattr(fetchers, 'search', None)
+            if fetcher is None:
+                fetcher = self._page_fetcher()
+                fetchers.search = fetcher
+            return list(fetcher._page_node_generator(fetcher._pageAt(first), shouldPopulate=shouldPopulate,
+                                                     fields=fields))
+
+        executor = ThreadPoolExecutor(max_workers=threads)
+        pending = deque()
+        next_page = [1]
+
+        def fill_window():
+            while len(pending)<prefetch and next_page[0]<page_count:
+                pending.append(executor.submit(fetch_page, base + next_page[0]*self.pageSize + 1))
+                next_page[0] += 1
+
+        try:
+            fill_window()
+            for i in self._page_node_generator(first_page, shouldPopulate=shouldPopulate, fields=fields):
+                yield i
+            while len(pending)>0:
+                entities = pending.popleft().result()
+                fill_window()
+                if len(entities)==0:    #no results returned => the search has shrunk since it started
+                    break
+                for i in entities:
+                    self.itemsRetrieved += 1
+                    yield i
+        finally:
+            for f in pending:
+                f.cancel()
+            executor.shutdown(wait=False)
+
+    def results_page(self,page_number,shouldPopulate=True,fields=None):
         if self.cachedData is not None:
             pageData = self.cachedData
             self.cachedData = None
         else:
-            pageData = self._nextPage(page_number)
-        for i in self._page_node_generator(pageData,shouldPopulate=shouldPopulate):
+            pageData = self._fetchPage(page_number)
+        for i in self._page_node_generator(pageData,shouldPopulate=shouldPopulate,fields=fields):
             yield i
 
 
@@ -271,6 +468,8 @@ class VSSearch(VSApi):
         self.sorts = []
         self.group = None
         self.container = None
+        self.content = None
+        self.contentFields = None
         if searchType is None:
             raise AssertionError("SearchType must identify a type of search")
         self.searchType = searchType
@@ -296,6 +495,19 @@ class VSSearch(VSApi):
     def setMasterGroup(self,grp):
         self.group = grp
 
+    def setContent(self,content,fields=None):
+        """
+        Asks for each result to come with the given content, so that it does not have to be requested separately for
+        each one.  With 'metadata', the results are populated VSItems; with 'shape', their shapes() and get_shape()
+        return the shapes from the search; with 'thumbnail', thumbnails() returns the thumbnails from the search.
+        :param content: list of content options, e.g. ['metadata','shape','thumbnail'], or a comma-separated string
+        :param fields: list of the metadata fields to include. If None (default), every field is included.
+        """
+        if isinstance(content,str):
+            content = content.split(',')
+        self.content = list(content) if content else None
+        self.contentFields = list(fields) if fields else None
+
     def _makeXML(self):
         vs = "{http://xml.vidispine.com/schema/vidispine}"
         root = ET.Element('ItemSearchDocument')
@@ -335,6 +547,15 @@ class VSSearch(VSApi):
 
         return ET.tostring(root)
 
+    def _search_url(self):
+        """
+        Internal method returning the URL path to send the search to
+        """
+        if self.container is None:
+            return "/{type}".format(type=self.searchType)
+        else:
+            return "/{type}/{container}/item".format(type=self.searchType,container=self.container)
+
     def execute(self,page_number=-1):
         xmlBody = self._makeXML()
         logger.debug("VSSearch::execute - request body is %s" % xmlBody)
@@ -343,16 +564,14 @@ class VSSearch(VSApi):
         #if self.debug:
         #    print xmlBody
 
-        if self.container is None:
-            url = "/{type}".format(type=self.searchType)
-        else:
-            url = "/{type}/{container}/item".format(type=self.searchType,container=self.container)
-
+        url = self._search_url()
         logger.debug("VSSearch::execute - url is %s" % url)
 
         #call to .setup retrieves the first page of results and with it information like total number of hits
         rtn= VSSearchResult(host=self.host,port=self.port,user=self.user,passwd=self.passwd,
-                        search_url=url,body=xmlBody,searchType=self.searchType,debug=self.debug,pageSize=self.pageSize).setup(page_number=page_number)
+                        search_url=url,body=xmlBody,searchType=self.searchType,debug=self.debug,pageSize=self.pageSize,
+                        content=self.content,fields=self.contentFields,
+                        transport=self.transport).setup(page_number=page_number)
         rtn.pageSize = self.pageSize
         return rtn
 
@@ -1,5 +1,6 @@
-from .vidispine_api import VSApi,VSException,HTTPError, VSNotFound
+from .vidispine_api import VSApi,VSException,HTTPError, VSNotFound, json_list, document_value
 from .vs_storage_rule import VSStorageRule,VSStorageRuleCollection
+from .vs_xml import vs_path
 import logging
 import xml.etree.cElementTree as ET
 
@@ -11,17 +12,41 @@ class VSShape(VSApi):
         self.contentDict = {}
 
     def populate(self,itemid,id):
-        ns = "{http://xml.vidispine.com/schema/vidispine}"
         self.name = id
-        self.dataContent = self.request("/item/%s/shape/%s" % (itemid,id))
+        self.fromResponse(itemid, self._request_document("/item/%s/shape/%s" % (itemid,id)))
+
+    def fromResponse(self, itemid, response):
+        """
+        Populates this object from a ShapeDocument (or a shape element of another document, such as an item in search
+        results requested with content=shape) that has already been received, rather than requesting it
+        :param itemid: ID of the item that the shape belongs to
+        :param response: parsed XML element or decoded JSON object for the shape
+        :return: self
+        """
+        self.dataContent = response
         self.itemid = itemid
 
         for key in ['id','essenceVersion','tag','mimeType']:
-            nodeName = "{0}%s" % key
-            node = self.dataContent.find(nodeName.format(ns))
+            if isinstance(self.dataContent, dict):
+                if key in self.dataContent:
+                    self.contentDict[key] = document_value(self.dataContent, key)
+                continue
+            node = vs_path("vs:" + key).find(self.dataContent)
 
             if node is not None:
                 self.contentDict[key] = node.text
+        if self.name == "INVALIDNAME" and 'id' in self.contentDict:
+            self.name = self.contentDict['id']
+        return self
+
+    def _component_files(self, componentType='containerComponent'):
+        """
+        Internal method returning the file nodes of the given component type, from either an XML or a JSON document
+        """
+        if isinstance(self.dataContent, dict):
+            return [filenode for component in json_list(self.dataContent.get(componentType))
+                    for filenode in json_list(component.get('file'))]
+        return vs_path("vs:{0}/vs:file".format(componentType)).findall(self.dataContent)
 
     def tag(self):
         return self.contentDict['tag']
@@ -32,14 +57,13 @@ class VSShape(VSApi):
     def fileURIs(self):
         #logging.debug("in fileURIs")
         if self.dataContent is not None:
-            ns = "{http://xml.vidispine.com/schema/vidispine}"
             #logging.debug("got dataContent")
-            for node in self.dataContent.findall("{0}containerComponent/{0}file".format(ns)):
+            for node in self._component_files():
                 #logging.debug("got file element")
-                n = node.find("{0}uri".format(ns))
-                if n is not None:
+                uri = document_value(node, 'uri')
+                if uri is not None:
                     #logging.debug("got uri")
-                    yield n.text
+                    yield uri
 
     def files(self):
         """
@@ -48,9 +72,8 @@ class VSShape(VSApi):
         """
         from .vs_storage import VSFile
         if self.dataContent is not None:
-            ns = "{http://xml.vidispine.com/schema/vidispine}"
             #logging.debug("got dataContent")
-            for node in self.dataContent.findall("{0}containerComponent/{0}file".format(ns)):
+            for node in self._component_files():
                 f = VSFile(None,node,conn=self)
                 yield f
 
@@ -59,6 +82,46 @@ class VSShape(VSApi):
         Initiate download of a file
         :return: HTTPResponse object. Call .read() on this to get the data
         """
+        node, response = self._download_file()
+        return response
+
+    def download_to(self, sink, buffer_size=1024*1024, verify=True, progress=None):
+        """
+        Streams the shape's file into a file-like object (or a file of the given name), through a fixed size buffer so
+        that memory use does not depend on the size of the file; see VSFile.download_to
+        :param sink: object with a write() method, or the name of a file to write to
+        :param buffer_size: size of the buffer to copy through, in bytes
+        :param verify: if True (default) check the data against the hash Vidispine has for the file. Raises
+        vs_download.VSHashMismatch if it does not match, after the data has been written
+        :param progress: optional function called with the number of bytes copied each time the buffer is written
+        :return: the hex SHA-1 digest of the data
+        """
+        from .vs_download import copy_response, VSHashMismatch
+
+        node, response = self._download_file()
+        if response is None:
+            raise VSNotFound("Shape {0} has no files to download".format(self.name))
+        try:
+            if isinstance(sink, str):
+                with open(sink, "wb") as f:
+                    nbytes, digest = copy_response(response, f, buffer_size=buffer_size, hash_algorithm="sha1",
+                                                   progress=progress)
+            else:
+                nbytes, digest = copy_response(response, sink, buffer_size=buffer_size, hash_algorithm="sha1",
+                                               progress=progress)
+        finally:
+            response.close()
+
+        expected = document_value(node, 'hash')
+        if verify and expected is not None and expected.lower() != digest:
+            raise VSHashMismatch(sink if isinstance(sink, str) else repr(sink), expected, digest)
+        return digest
+
+    def _download_file(self):
+        """
+        Internal method to start downloading the first file of the shape that can be read
+        :return: tuple of (file node, HTTPResponse), or (None, None) if there is no such file
+        """
         import http.client
         #import xml.etree.cElementTree as ET
         from pprint import pprint
@@ -67,36 +130,70 @@ class VSShape(VSApi):
             raise ValueError("You must populate a shape before calling download()")
 
         for componentType in ['containerComponent','binaryComponent']:
-            for node in self.dataContent.findall("{0}{1}/{0}file".format(self.xmlns,componentType)):
+            for node in self._component_files(componentType):
                 try:
                     #logging.debug(ET.tostring(node))
-                    fileId = node.find('{0}id'.format(self.xmlns)).text
-                    storageId = node.find('{0}storage'.format(self.xmlns)).text
+                    fileId = document_value(node, 'id')
+                    storageId = document_value(node, 'storage')
+                    if fileId is None or storageId is None:
+                        raise AttributeError("file in {0} has no id or storage".format(componentType))
 
                     logging.debug("trying to download {0} from storage {1}".format(fileId,storageId))
 
                     response = self.sendAuthorized('GET','/API/storage/file/{0}/data'.format(fileId),'',{'Accept': '*'})
                     if response.status < 200 or response.status > 299:
                         pprint(response.msg.__dict__)
-                        raise HTTPError(response.status,'GET','/API/storage/file/{0}/data'.format(fileId),response.status,response.reason,response.read()).to_VSException(method='GET',url='/storage/file/{0}/data'.format(fileId),body="")
+                        error_body = response.read()
+                        self.release_response(response)
+                        raise HTTPError(response.status,'GET','/API/storage/file/{0}/data'.format(fileId),response.status,response.reason,error_body).to_VSException(method='GET',url='/storage/file/{0}/data'.format(fileId),body="")
 
-                    return response
+                    self.release_response(response, reuse=False)
+                    return node, response
                 except TypeError as e:
                     logging.warning(e)
                 except AttributeError as e:
                     logging.warning(e)
                 except VSNotFound as e:
                     logging.warning(e)
+        return None, None
+
+    def download_parallel(self, destination, threads=4, chunk_size=8*1024*1024, journal=None, progress=None,
+                          verify=True):
+        """
+        Downloads the shape's file to a local file using several Range requests at once; see
+        vs_download.VSRangedDownload and VSFile.download_parallel
+        :param destination: local file name to write to
+        :param threads: number of ranges to fetch at once
+        :param chunk_size: size of each range in bytes
+        :param journal: filename to record progress in, so that an interrupted download can be resumed
+        :param progress: optional function called as progress(bytes_done, total_size, bytes_per_second)
+        :param verify: if True (default) check the downloaded file against the hash Vidispine has for it
+        :return: the VSRangedDownload, which holds the transfer statistics
+        """
+        from .vs_download import VSRangedDownload
+
+        if self.dataContent is None:
+            raise ValueError("You must populate a shape before calling download_parallel()")
+
+        for componentType in ['containerComponent','binaryComponent']:
+            for node in self._component_files(componentType):
+                fileId = document_value(node, 'id')
+                if fileId is None:
+                    continue
+                download = VSRangedDownload(self, fileId, destination, size=document_value(node, 'size'),
+                                            expected_hash=document_value(node, 'hash') if verify else None,
+                                            threads=threads, chunk_size=chunk_size, journal=journal,
+                                            progress=progress)
+                download.run()
+                return download
+        raise VSNotFound("Shape {0} has no files to download".format(self.name))
 
     @property
     def mime_type(self):
         if self.dataContent is None:
             raise ValueError("You must populate a shape before calling mime_type")
 
-        try:
-            return self.dataContent.find('{0}mimeType'.format(self.xmlns)).text
-        except AttributeError:
-            return None
+        return document_value(self.dataContent, 'mimeType')
 
     @property
     def essence_version(self):
@@ -104,10 +201,10 @@ class VSShape(VSApi):
             raise ValueError("You must populate a shape before calling essence_version")
 
         try:
-            return int(self.dataContent.find('{0}essenceVersion'.format(self.xmlns)).text)
+            return int(document_value(self.dataContent, 'essenceVersion'))
         except ValueError:
             return None
-        except AttributeError:
+        except TypeError:
             return None
 
     def storageRuleXML(self):
@@ -131,7 +228,7 @@ class VSShape(VSApi):
 
     def add_storage_rule(self, newrule):
         from .vs_storage_rule import VSStorageRuleNew
-        from xml.etree.cElementTree import tostring
+        from .vs_xml import tostring
         if not isinstance(newrule,VSStorageRuleNew): raise TypeError("add() accepts only a VSStorageRuleNew object")
         newrule.assert_populated()
         
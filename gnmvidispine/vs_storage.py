@@ -13,8 +13,11 @@ import urllib.request, urllib.parse, urllib.error
 from time import sleep
 import logging
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-from .vidispine_api import HTTPError, VSApi, VSException, VSNotFound, always_string
+from .vidispine_api import HTTPError, VSApi, VSException, VSNotFound, always_string, json_list, json_text, document_value
+from .vs_xml import vs_path
 
 
 class FileAlreadyImportedError(Exception):
@@ -41,35 +44,31 @@ class VSFile(object):
         self.refreshFlag = self._valueOrNone('refreshFlag')
         self.storageName = self._valueOrNone('storage')
 
-        namespace = "{http://xml.vidispine.com/schema/vidispine}"
-
         if self.parent is None:
-            self.parent = VSStorage(host=conn.host,port=conn.port,user=conn.user,passwd=conn.passwd)
+            self.parent = VSStorage(host=conn.host,port=conn.port,user=conn.user,passwd=conn.passwd,
+                                    transport=conn.transport)
             self.parent.populate(self.storageName)
 
         self.memberOfItem = None
-        node = self.dataContent.find('{0}item'.format(namespace))
+        if isinstance(self.dataContent, dict):
+            items = json_list(self.dataContent.get('item'))
+            node = items[0] if len(items) > 0 else None
+        else:
+            node = vs_path("vs:item").find(self.dataContent)
         if node is not None:
-            idNode = node.find('{0}id'.format(namespace))
-            if id is not None:
-                host = self.parent.host
-                port = self.parent.port
-                user = self.parent.user
-                passwd = self.parent.passwd
+            host = self.parent.host
+            port = self.parent.port
+            user = self.parent.user
+            passwd = self.parent.passwd
 
-                self.memberOfItem = VSItem(host=host, port=port, user=user, passwd=passwd)
-                self.memberOfItem.name = idNode.text
+            self.memberOfItem = VSItem(host=host, port=port, user=user, passwd=passwd, transport=self.parent.transport)
+            self.memberOfItem.name = document_value(node, 'id')
 
     def __unicode__(self):
         return 'Vidispine file {0}: {1} on storage {2}'.format(self.name,self.path,self.storageName)
 
     def _valueOrNone(self, path):
-        namespace = "{http://xml.vidispine.com/schema/vidispine}"
-
-        node = self.dataContent.find('{0}{1}'.format(namespace, path))
-        if node is not None:
-            return node.text
-        return None
+        return document_value(self.dataContent, path)
 
     def json_data(self):
         rtn = {
@@ -129,12 +128,12 @@ class VSFile(object):
                 q['tag']+=t + ','
             q['tag']=q['tag'][:-1]
 
-        response = self.parent.request("/storage/{0}/file/{1}/import".format(self.parent.name, self.name),
-                                       method="POST",
-                                       query=q,
-                                       body=mdtext)
+        response = self.parent._request_document("/storage/{0}/file/{1}/import".format(self.parent.name, self.name),
+                                                 method="POST",
+                                                 query=q,
+                                                 body=mdtext)
         import_job = VSJob(host=self.parent.host, port=self.parent.port, user=self.parent.user,
-                           passwd=self.parent.passwd)
+                           passwd=self.parent.passwd, transport=self.parent.transport)
         import_job.fromResponse(response)
         return import_job
 
@@ -172,9 +171,9 @@ class VSFile(object):
                 raise TypeError("storage parameter must be either a VSStorage or a string identifying the storage")
 
         #should raise a VSException if it fails, or return a FileDocument if it succeeds
-        response = self.parent.request("/storage/{0}/file/{1}/path".format(self.parent.name,self.name),
-                                       method="POST",
-                                       query=q)
+        response = self.parent._request_document("/storage/{0}/file/{1}/path".format(self.parent.name,self.name),
+                                                 method="POST",
+                                                 query=q)
         self.refreshNewData(response)
 
     def download(self):
@@ -189,10 +188,64 @@ class VSFile(object):
         response = self.parent.sendAuthorized('GET','/API/storage/file/{0}/data'.format(self.name),'',{'Accept': '*'})
         if response.status < 200 or response.status > 299:
             pprint(response.msg.__dict__)
-            raise HTTPError(response.status,'GET','/API/storage/file/{0}/data'.format(self.name),response.status,response.reason,response.read()).to_VSException(method='GET',url='/storage/file/{0}/data'.format(self.name),body="")
+            error_body = response.read()
+            self.parent.release_response(response)
+            raise HTTPError(response.status,'GET','/API/storage/file/{0}/data'.format(self.name),response.status,response.reason,error_body).to_VSException(method='GET',url='/storage/file/{0}/data'.format(self.name),body="")
 
+        self.parent.release_response(response, reuse=False)
         return response
 
+    def download_to(self, sink, buffer_size=1024*1024, verify=True, progress=None):
+        """
+        Streams the file into a file-like object (or a file of the given name), through a fixed size buffer so that
+        memory use does not depend on the size of the file.  The data is hashed as it is copied.
+        :param sink: object with a write() method (an open file, a pipe, a socket file...), or the name of a file to
+        write to
+        :param buffer_size: size of the buffer to copy through, in bytes
+        :param verify: if True (default) check the data against the hash Vidispine has for the file. Raises
+        vs_download.VSHashMismatch if it does not match, after the data has been written
+        :param progress: optional function called with the number of bytes copied each time the buffer is written
+        :return: the hex SHA-1 digest of the data
+        """
+        from .vs_download import copy_response, VSHashMismatch
+
+        response = self.download()
+        try:
+            if isinstance(sink, str):
+                with open(sink, "wb") as f:
+                    nbytes, digest = copy_response(response, f, buffer_size=buffer_size, hash_algorithm="sha1",
+                                                   progress=progress)
+            else:
+                nbytes, digest = copy_response(response, sink, buffer_size=buffer_size, hash_algorithm="sha1",
+                                               progress=progress)
+        finally:
+            response.close()
+
+        if verify and self.hash is not None and self.hash.lower() != digest:
+            raise VSHashMismatch(sink if isinstance(sink, str) else repr(sink), self.hash, digest)
+        return digest
+
+    def download_parallel(self, destination, threads=4, chunk_size=8*1024*1024, journal=None, progress=None,
+                          verify=True):
+        """
+        Downloads the file to a local file using several Range requests at once; see vs_download.VSRangedDownload
+        :param destination: local file name to write to
+        :param threads: number of ranges to fetch at once
+        :param chunk_size: size of each range in bytes
+        :param journal: filename to record progress in. If the download is interrupted, calling this again with the same
+        journal only fetches what is missing.
+        :param progress: optional function called as progress(bytes_done, total_size, bytes_per_second)
+        :param verify: if True (default) check the downloaded file against the hash Vidispine has for it. Raises
+        vs_download.VSHashMismatch if it does not match
+        :return: the VSRangedDownload, which holds the transfer statistics
+        """
+        from .vs_download import VSRangedDownload
+        download = VSRangedDownload(self.parent, self.name, destination, size=self.size,
+                                    expected_hash=self.hash if verify else None, threads=threads,
+                                    chunk_size=chunk_size, journal=journal, progress=progress)
+        download.run()
+        return download
+
     def move(self, storage):
         """
         Move the file to another storage
@@ -217,6 +270,107 @@ class VSFile(object):
         self.parent.request("/storage/{0}/file/{1}/state/{2}".format(self.parent.name, self.name, newstate), method="PUT")
 
 
+class VSFileRecord(object):
+    """
+    Compact, read-only representation of a file from a storage listing, for scanning storages with very many files.
+    The fields are picked out of the file element in a single pass over its children and the element is not kept, and
+    the VSItem (memberOfItem) and VSStorage (parent) are only created if they are asked for.  Supports the same
+    operations as VSFile apart from those that change the path; use VSStorage.files(compact=True) to get these.
+    """
+    __slots__ = ('name', 'path', 'uri', 'state', 'size', 'hash', 'timestamp', 'refreshFlag', 'storageName', 'itemId',
+                 '_parent', '_conn', '_item')
+
+    #maps the child element names of a file to the attribute that holds them
+    _fields = {
+        'id': 'name',
+        'path': 'path',
+        'uri': 'uri',
+        'state': 'state',
+        'size': 'size',
+        'hash': 'hash',
+        'timestamp': 'timestamp',
+        'refreshFlag': 'refreshFlag',
+        'storage': 'storageName',
+    }
+
+    def __init__(self, parent_storage, parsed_data, conn=None):
+        """
+        :param parent_storage: VSStorage that the file is on, or None to look it up (using conn) when it is needed
+        :param parsed_data: file element from a FileDocument or FileListDocument, or the equivalent JSON object
+        :param conn: VSApi object to take connection details from if parent_storage is None
+        """
+        self._parent = parent_storage
+        self._conn = conn
+        self._item = None
+        for attr in self._fields.values():
+            setattr(self, attr, None)
+        self.itemId = None
+
+        if isinstance(parsed_data, dict):
+            for key, attr in self._fields.items():
+                setattr(self, attr, json_text(parsed_data.get(key)))
+            items = json_list(parsed_data.get('item'))
+            if len(items) > 0:
+                self.itemId = document_value(items[0], 'id')
+            return
+
+        prefix_len = len(VSApi.xmlns)
+        seen = set()
+        for child in parsed_data:
+            tag = child.tag
+            if not isinstance(tag, str) or not tag.startswith(VSApi.xmlns):  #comments etc. under lxml
+                continue
+            key = tag[prefix_len:]
+            if key in seen:     #repeated elements like uri: keep the first, as find() would
+                continue
+            seen.add(key)
+            if key == 'item':
+                self.itemId = document_value(child, 'id')
+            elif key in self._fields:
+                setattr(self, self._fields[key], child.text)
+
+    @property
+    def parent(self):
+        """
+        VSStorage that the file is on
+        """
+        if self._parent is None:
+            conn = self._conn
+            self._parent = VSStorage(host=conn.host, port=conn.port, user=conn.user, passwd=conn.passwd,
+                                     transport=conn.transport)
+            self._parent.populate(self.storageName)
+        return self._parent
+
+    @property
+    def memberOfItem(self):
+        """
+        VSItem that the file belongs to (not populated), or None if it is not part of an item
+        """
+        if self._item is None and self.itemId is not None:
+            parent = self.parent
+            self._item = VSItem(host=parent.host, port=parent.port, user=parent.user, passwd=parent.passwd,
+                                transport=parent.transport)
+            self._item.name = self.itemId
+        return self._item
+
+    def dump(self):
+        pprint(dict((attr, getattr(self, attr)) for attr in self.__slots__ if not attr.startswith('_')))
+
+    def __repr__(self):
+        return "VSFileRecord({0}: {1} on {2})".format(self.name, self.path, self.storageName)
+
+    __unicode__ = VSFile.__unicode__
+    json_data = VSFile.json_data
+    to_json = VSFile.to_json
+    importToItem = VSFile.importToItem
+    delete = VSFile.delete
+    download = VSFile.download
+    download_to = VSFile.download_to
+    download_parallel = VSFile.download_parallel
+    move = VSFile.move
+    setState = VSFile.setState
+
+
 class VSStorageMethod(object):
     def __init__(self, parent_storage, parsed_data):
         self.contentDict = {}
@@ -234,12 +388,7 @@ class VSStorageMethod(object):
         self.type = self._valueOrNone('type')
 
     def _valueOrNone(self, path):
-        namespace = "{http://xml.vidispine.com/schema/vidispine}"
-
-        node = self.dataContent.find('{0}{1}'.format(namespace, path))
-        if node is not None:
-            return node.text
-        return None
+        return document_value(self.dataContent, path)
 
     def dump(self):
         pprint(self.__dict__)
@@ -253,13 +402,8 @@ class VSStorage(VSApi):
         self.contentDict = {}
 
     def _valueOrNone(self, path):
-        namespace = "{http://xml.vidispine.com/schema/vidispine}"
-
-        node = self.dataContent.find('{0}{1}'.format(namespace, path))
-        if node is not None:
-            return node.text
         #raise StandardError("Value not found for %s" % path)
-        return None
+        return document_value(self.dataContent, path)
 
     def create_file_entity(self,filepath,createOnly=True):
         """
@@ -273,16 +417,16 @@ class VSStorage(VSApi):
         else:
           create_flag='false'
 
-        data = self.request("/storage/{0}/file".format(self.name),
-                            method="POST",
-                            query={'path': self.stripOwnPath(filepath), 'createOnly': create_flag}
-                            )
+        data = self._request_document("/storage/{0}/file".format(self.name),
+                                      method="POST",
+                                      query={'path': self.stripOwnPath(filepath), 'createOnly': create_flag}
+                                      )
         
         return VSFile(parent_storage=self,parsed_data=data)
         
     def populate(self, vsid):
         if vsid is not None:
-            self.dataContent = self.request("/storage/%s" % vsid, method="GET")
+            self.dataContent = self._request_document("/storage/%s" % vsid, method="GET")
 
         #logging.debug("VSStorage::populate")
         #pprint(self.dataContent)
@@ -295,6 +439,14 @@ class VSStorage(VSApi):
         self.timestamp = self._valueOrNone('timestamp')
 
         self.methods = []
+        if isinstance(self.dataContent, dict):
+            for field in json_list(self.dataContent.get('metadata', {}).get('field')):
+                if 'key' in field and 'value' in field:
+                    self.contentDict[document_value(field, 'key')] = document_value(field, 'value')
+            for n in json_list(self.dataContent.get('method')):
+                self.methods.append(VSStorageMethod(self, n))
+            return
+
         namespace = "{http://xml.vidispine.com/schema/vidispine}"
         node = self.dataContent.find('{0}metadata'.format(namespace))
         if node is not None:
@@ -342,10 +494,10 @@ class VSStorage(VSApi):
     def fileForPath(self, path):
         path = self.stripOwnPath(path)
         logging.debug("VSStorage::fileForPath - actually looking for %s" % path)
-        response = self.request("/storage/{storage}/file/byURI".format(storage=self.name),
-                                method="GET",
-                                matrix={'includeItem': 'True',
-                                        'path': path})
+        response = self._request_document("/storage/{storage}/file/byURI".format(storage=self.name),
+                                          method="GET",
+                                          matrix={'includeItem': 'True',
+                                                  'path': path})
         return VSFile(self, response)
 
     def fileForID(self, vsid):
@@ -354,15 +506,15 @@ class VSStorage(VSApi):
         :param vsid: vidispine ID of a file
         :return: populated VSFile object
         """
-        response = self.request("/storage/{storage}/file/{fileid}?includeItem=true".format(storage=self.name,fileid=vsid))
+        response = self._request_document("/storage/{storage}/file/{fileid}?includeItem=true".format(storage=self.name,fileid=vsid))
         return VSFile(self, response)
 
     @property
     def fileCount(self):
-        response = self.request("/storage/{0}/file".format(self.name),method="GET",matrix={'number': 0})
+        response = self._request_document("/storage/{0}/file".format(self.name),method="GET",matrix={'number': 0})
         
         try:
-            return int(response.find('{0}hits'.format(self.xmlns)).text)
+            return int(self._hits(response))
         except AttributeError:
             logging.error("storage::fileCount - unable to get hits from returned storage document")
             raise
@@ -375,6 +527,30 @@ class VSStorage(VSApi):
         internal method to make storage-file request to server
         :return:
         """
+        mtx, q = self._file_request_params(path, got_files, pageSize, state, include_item)
+        return self._request_document("/storage/{storage}/file".format(storage=self.name),
+                                      method="GET",
+                                      matrix=mtx,
+                                      query=q
+                                      )
+
+    def _hits(self, response):
+        """
+        internal method returning the hits value from a FileListDocument as a string
+        :raises AttributeError: if there is no hits value
+        """
+        if isinstance(response, dict):
+            if response.get('hits') is None:
+                raise AttributeError("no hits in file list")
+            return response['hits']
+        return response.find('{0}hits'.format(self.xmlns)).text
+
+    @staticmethod
+    def _file_request_params(path, got_files, pageSize, state, include_item):
+        """
+        internal method returning the (matrix, query) parameters for a storage-file request
+        :return: tuple of two dictionaries
+        """
         q = {
             'path': path
         }
@@ -388,11 +564,7 @@ class VSStorage(VSApi):
         if include_item:
             mtx['includeItem'] = True
 
-        return self.request("/storage/{storage}/file".format(storage=self.name),
-                                method="GET",
-                                matrix=mtx,
-                                query=q
-                                )
+        return mtx, q
 
     def file_count(self, path='/', include_item=True, state=None):
         """
@@ -405,7 +577,7 @@ class VSStorage(VSApi):
         response = self._file_request(path, 0, 0, state=state, include_item=include_item)
 
         try:
-            return int(response.find('{0}hits'.format(self.xmlns)).text)
+            return int(self._hits(response))
         except AttributeError:
             logging.error("storage::fileCount - unable to get hits from returned storage document")
             raise
@@ -413,36 +585,222 @@ class VSStorage(VSApi):
             logging.error("storage::fileCount - entry in <hits> was not an integer")
             raise
 
-    def files(self, path='/', include_item=True, state=None):
+    def files(self, path='/', include_item=True, state=None, compact=False):
         """
         Generator that yields VSFile objects for each file on the storage
         :param path: Subpath to search. Defaults to "/"
         :param include_item: Boolean indicating whether to return item information in the data. Defaults to True
         :param state: Only return files in a specific State (OPEN, CLOSED, LOST, etc. - http://apidoc.vidispine.com/latest/storage/storage.html#file-states)
-        :return: yields VSFile objects
+        :param compact: if True, yield VSFileRecord objects instead, which use far less memory when a large number of
+        files are being kept
+        :return: yields VSFile (or VSFileRecord) objects
         """
+        file_class = VSFileRecord if compact else VSFile
         got_files = 0
         total_hits = -1
         pageSize = 100
 
         while True:
-            response = self._file_request(path, got_files, pageSize, state, include_item)
-            if total_hits == -1:
-                total_hits = int(response.find("{0}hits".format(self.xmlns)).text)
-                logging.debug("Got {0} hits".format(total_hits))
-
+            if self.transport == "json":
+                #JSON can't be decoded incrementally, so each page is requested whole
+                start_num_files = got_files
+                for filenode in json_list(self._file_request(path, got_files, pageSize, state, include_item).get('file')):
+                    got_files += 1
+                    yield file_class(self,filenode)
+                if got_files == start_num_files:
+                    break
+                continue
+
+            #each page is parsed as it arrives, so files are yielded before the whole page has been downloaded
+            mtx, q = self._file_request_params(path, got_files, pageSize, state, include_item)
             start_num_files = got_files
-            for filenode in response.findall("{0}file".format(self.xmlns)):
-                got_files += 1
-                yield VSFile(self,filenode)
+            for node in self.stream_request("/storage/{storage}/file".format(storage=self.name), method="GET",
+                                            matrix=mtx, query=q):
+                if node.tag == "{0}hits".format(self.xmlns):
+                    if total_hits == -1:
+                        total_hits = int(node.text)
+                        logging.debug("Got {0} hits".format(total_hits))
+                elif node.tag == "{0}file".format(self.xmlns):
+                    got_files += 1
+                    yield file_class(self,node)
 
             if got_files == start_num_files: #no files returned => we got to the end
                 break
 
+    def files_parallel(self, path='/', include_item=True, state=None, pageSize=500, threads=4, paths=None,
+                       checkpoint=None, compact=False):
+        """
+        Generator that yields VSFile objects for each file on the storage, like files(), but requesting several pages
+        at once.  The number of files is found first, and the listing is then split into pages at fixed offsets which are
+        requested on a pool of threads.  Files are yielded as each page arrives, so they are NOT in listing order.
+        Because pages are found by offset, files that are added or removed while the listing runs may be missed or
+        returned twice, just as with files().
+        :param path: Subpath to search. Defaults to "/"
+        :param include_item: Boolean indicating whether to return item information in the data. Defaults to True
+        :param state: Only return files in a specific State (OPEN, CLOSED, LOST, etc.)
+        :param pageSize: number of files to request at once
+        :param threads: number of pages to request at once
+        :param paths: list of subpaths to list separately, instead of path.  Splitting a large storage by its top-level
+        directories keeps each listing small.
+        :param checkpoint: a VSFileListCheckpoint (or a filename for one) recording which pages have been completely
+        yielded.  If the listing is interrupted, pass the same checkpoint to the same call to carry on where it left off;
+        files from the page that was being read at the time are yielded again.
+        :param compact: if True, yield VSFileRecord objects instead of VSFile objects, as for files()
+        :return: yields VSFile (or VSFileRecord) objects
+        """
+        file_class = VSFileRecord if compact else VSFile
+        if paths is None:
+            paths = [path]
+        if checkpoint is not None and not isinstance(checkpoint, VSFileListCheckpoint):
+            checkpoint = VSFileListCheckpoint(checkpoint)
+        if checkpoint is not None:
+            checkpoint.begin({'storage': self.name, 'paths': paths, 'state': state, 'includeItem': include_item,
+                              'pageSize': pageSize})
+
+        listers = threading.local()
+
+        def fetch_page(page_path, start):
+            lister = getattr(listers, 'storage', None)
+            if lister is None:
+                lister = VSStorage(**self._child_args())
+                lister.name = self.name
+                listers.storage = lister
+            response = lister._file_request(page_path, start, pageSize, state, include_item)
+            if isinstance(response, dict):
+                return json_list(response.get('file'))
+            return response.findall("{0}file".format(self.xmlns))
+
+        #pages are (path, start) pairs; each path is listed up to the count found when the listing started, and then
+        #onwards for as long as full pages keep coming back
+        pages = []
+        last_start = {}
+        for page_path in paths:
+            count = self.file_count(path=page_path, include_item=False, state=state)
+            last_start[page_path] = max(0, ((count - 1) // pageSize) * pageSize)
+            pages += [(page_path, start) for start in range(0, last_start[page_path] + 1, pageSize)]
+        if checkpoint is not None:
+            pages = [p for p in pages if not checkpoint.is_done(*p)]
+            for page_path in paths:
+                #if the listing had already gone past the original end, carry on from where it got to
+                if checkpoint.is_done(page_path, last_start[page_path]):
+                    last_start[page_path] = checkpoint.last_done(page_path) + pageSize
+                    pages.append((page_path, last_start[page_path]))
+        pages.reverse()
+
+        executor = ThreadPoolExecutor(max_workers=threads)
+        running = {}
+        try:
+            while len(pages) > 0 or len(running) > 0:
+                while len(pages) > 0 and len(running) < threads:
+                    page = pages.pop()
+                    running[executor.submit(fetch_page, *page)] = page
+                done, not_done = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    page_path, start = running.pop(future)
+                    nodes = future.result()
+                    if len(nodes) == pageSize and start >= last_start[page_path]:
+                        last_start[page_path] = start + pageSize
+                        pages.append((page_path, start + pageSize))
+                    for node in nodes:
+                        yield file_class(self, node)
+                    if checkpoint is not None:
+                        checkpoint.done(page_path, start)
+            if checkpoint is not None:
+                checkpoint.finish()
+                checkpoint = None
+        finally:
+            for future in running:
+                future.cancel()
+            executor.shutdown(wait=False)
+            if checkpoint is not None:
+                checkpoint.compact()
+
     def rescan(self):
         self.request("/storage/{0}/rescan".format(self.name),method="POST")
 
 
+class VSFileListCheckpoint(object):
+    """
+    Records progress through VSStorage.files_parallel() in a JSON file, so that an interrupted listing can be resumed.
+    Each completed page is appended to a journal alongside it (filename + ".journal"), which is folded back into the
+    JSON file when the listing is interrupted or resumed.  Both are removed when the listing finishes.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.journal_filename = filename + ".journal"
+        self.spec = None
+        self._done = set()
+        self._journal = None
+        self._lock = threading.Lock()
+
+    def begin(self, spec):
+        """
+        Loads any progress saved for a listing with the given parameters
+        :param spec: dictionary of the listing parameters
+        :raises ValueError: if the checkpoint file is for a listing with different parameters
+        """
+        self.spec = spec
+        self._done = set()
+        if os.path.exists(self.filename):
+            with open(self.filename) as f:
+                saved = json.load(f)
+            if saved['spec'] != spec:
+                raise ValueError("Checkpoint {0} is for a different listing: {1}".format(self.filename, saved['spec']))
+            self._done = set([(p, s) for p, s in saved['done']])
+            if os.path.exists(self.journal_filename):
+                with open(self.journal_filename) as f:
+                    for line in f:
+                        try:
+                            page_path, start = json.loads(line)
+                        except ValueError:  #the last line may be incomplete if the process was killed
+                            continue
+                        self._done.add((page_path, start))
+            logging.info("Resuming file listing of {0} with {1} pages already done".format(spec['storage'], len(self._done)))
+        self.compact()
+
+    def is_done(self, path, start):
+        return (path, start) in self._done
+
+    def last_done(self, path):
+        """
+        Returns the highest start position that has been done for path, or -1
+        """
+        return max([s for p, s in self._done if p == path] + [-1])
+
+    def done(self, path, start):
+        with self._lock:
+            self._done.add((path, start))
+            if self._journal is None:
+                self._journal = open(self.journal_filename, "a")
+            self._journal.write(json.dumps([path, start]) + "\n")
+            self._journal.flush()
+
+    def _close_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def compact(self):
+        """
+        Rewrites the JSON file (atomically) with every page done so far, and empties the journal
+        """
+        with self._lock:
+            self._close_journal()
+            tmpname = self.filename + ".tmp"
+            with open(tmpname, "w") as f:
+                json.dump({'spec': self.spec, 'done': sorted(self._done)}, f)
+            os.replace(tmpname, self.filename)
+            if os.path.exists(self.journal_filename):
+                os.unlink(self.journal_filename)
+
+    def finish(self):
+        with self._lock:
+            self._close_journal()
+            for filename in (self.filename, self.journal_filename):
+                if os.path.exists(filename):
+                    os.unlink(filename)
+
+
 def VSStoragePathMap(uriType=None,stripType=False,*args,**kwargs):
     """
     This function will return a hash in the form of uri=>VSStorage
@@ -485,6 +843,6 @@ def VSFileById(fileId,conn=None,*args,**kwargs):
     else:
         api = conn
 
-    xmldoc = api.request("/storage/file/{0}".format(fileId),method="GET")
+    xmldoc = api._request_document("/storage/file/{0}".format(fileId),method="GET")
     ns = "{http://xml.vidispine.com/schema/vidispine}"
     return VSFile(None,xmldoc,conn=conn)
@@ -1,5 +1,6 @@
 import xml.etree.ElementTree as ET
 from .vidispine_api import VSApi,VSException,VSNotFound
+from . import vs_xml
 import json
 import sys
 import os.path
@@ -52,7 +53,8 @@ def serializeXML(info,parentNode,ns=""):
 class VSTaskDefinition(VSApi):
     def populate(self,vsid):
         ns = "{http://xml.vidispine.com/schema/vidispine}"
-        self.dataContent = self.request("/task-definition/{0}".format(vsid))
+        #store() relies on ElementTree-specific serialisation, so always work on an ElementTree copy
+        self.dataContent = ET.fromstring(vs_xml.tostring(self.request("/task-definition/{0}".format(vsid))))
 
         self.id=vsid
         self.contentDict = {}
@@ -28,6 +28,24 @@ class VSThumbnailCollection(VSApi):
         logging.debug("DEBUG: got resource list {0}".format(self._resource_list))
         self.thumbnail_urls = []
 
+    def fromURIs(self, item, uris):
+        """
+        Sets up this object with thumbnail URIs that have already been received, e.g. from a search requested with
+        content=thumbnail, rather than requesting the thumbnail resources of the item
+        :param item: VSItem that the thumbnails belong to
+        :param uris: list of thumbnail URIs
+        :return: self
+        """
+        self.parent_item = item
+        self._resource_list = []
+        self.thumbnail_urls = []
+        for uri in uris:
+            try:
+                self.thumbnail_urls.append(self._abs_to_relative_url(uri))
+            except URLError:
+                self.thumbnail_urls.append(uri)
+        return self
+
     @staticmethod
     def _abs_to_relative_url(url):
         """
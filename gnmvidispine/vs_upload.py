@@ -0,0 +1,343 @@
+"""
+Parallel, resumable chunked uploads to Vidispine.
+
+Vidispine's passive chunked upload takes a file in pieces, each sent with the same transferId and an index header
+giving its byte offset, so pieces can be sent in any order and several at once.  VSChunkedUpload does this from a pool
+of threads, each with its own connection (or one from the registered VSConnectionPool):
+
+upload = VSChunkedUpload(item, "/item/VX-1234/shape/raw", "/path/to/media.mxf", query={'tag': 'original'},
+                         threads=4, journal="/path/to/media.mxf.upload")
+upload.run()
+
+Chunks are sent directly from a memory map of the file where possible, or otherwise read into one re-used buffer per
+thread, so no per-chunk copies are made.  Unless a fixed chunk_size is given, the chunk size is adjusted from the
+measured throughput so that each chunk takes about target_seconds to send.
+
+If a journal filename is given, the transfer ID and every acknowledged byte range are recorded in it as the upload
+progresses.  Running the same upload again after an interruption re-uses the transfer ID and only sends what is missing.
+The journal is removed when the upload completes.
+"""
+import io
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+from uuid import uuid4
+
+from .vidispine_api import VSApi, HTTPError
+
+logger = logging.getLogger(__name__)
+
+
+class VSUploadJournal(object):
+    """
+    Records the progress of a chunked upload in a JSON file, so that it can be resumed
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.transfer_id = None
+        self.done = []
+        self._spec = None
+
+    def begin(self, spec):
+        """
+        Loads saved progress for an upload with the given description, if there is any
+        :param spec: dictionary identifying the upload (source file, size, modification time and destination)
+        :return: True if progress was loaded, False if this is a new upload
+        """
+        self._spec = spec
+        if os.path.exists(self.filename):
+            try:
+                with open(self.filename) as f:
+                    saved = json.load(f)
+            except ValueError:
+                logger.warning("Upload journal {0} is unreadable, starting again".format(self.filename))
+                saved = None
+            if saved is not None and saved.get('spec') == spec:
+                self.transfer_id = saved['transferId']
+                self.done = [tuple(r) for r in saved['done']]
+                return True
+            logger.info("Upload journal {0} is for a different upload, starting again".format(self.filename))
+        self.transfer_id = None
+        self.done = []
+        return False
+
+    def save(self, transfer_id, done):
+        self.transfer_id = transfer_id
+        self.done = done
+        tmpname = self.filename + ".tmp"
+        with open(tmpname, "w") as f:
+            json.dump({'spec': self._spec, 'transferId': transfer_id, 'done': done}, f)
+        os.replace(tmpname, self.filename)
+
+    def finish(self):
+        if os.path.exists(self.filename):
+            os.unlink(self.filename)
+
+
+def _add_range(ranges, start, end):
+    """
+    Adds [start, end) to a sorted list of non-overlapping (start, end) ranges, merging where they touch
+    :return: new list
+    """
+    result = []
+    for r in sorted(ranges + [(start, end)]):
+        if result and r[0] <= result[-1][1]:
+            result[-1] = (result[-1][0], max(result[-1][1], r[1]))
+        else:
+            result.append(r)
+    return result
+
+
+def _missing_ranges(ranges, total_size):
+    """
+    Returns the (start, end) ranges of [0, total_size) that are not covered by ranges
+    """
+    missing = []
+    position = 0
+    for start, end in sorted(ranges):
+        if start > position:
+            missing.append((position, start))
+        position = max(position, end)
+    if position < total_size:
+        missing.append((position, total_size))
+    return missing
+
+
+class VSChunkedUpload(object):
+    """
+    Uploads a local file to Vidispine in chunks, several at once.  See the module documentation.
+    """
+    chunk_granularity = 64*1024
+
+    def __init__(self, connection, path, filename, method="POST", query=None, matrix=None, upload_filename=None,
+                 transferPriority=500, throttle=True, threads=4, chunk_size=None, min_chunk_size=1024*1024,
+                 max_chunk_size=64*1024*1024, initial_chunk_size=4*1024*1024, target_seconds=2.0, retries=3,
+                 journal=None):
+        """
+        Prepare a new upload
+        :param connection: Initialised VSApi object (or any other Vidispine base object) with the connection details to use
+        :param path: URL path to upload to, e.g. /item/{id}/shape/raw
+        :param filename: local file to upload
+        :param method: HTTP method to use. Defaults to POST
+        :param query: dictionary of extra query parameters to send with each chunk
+        :param matrix: dictionary of matrix parameters to send with each chunk
+        :param upload_filename: file name to tell Vidispine. Defaults to the base name of filename
+        :param transferPriority: Vidispine transfer priority
+        :param throttle: whether Vidispine should throttle the transfer
+        :param threads: number of chunks to send at once
+        :param chunk_size: fixed chunk size in bytes. If None (default) the chunk size is adjusted to the throughput
+        :param min_chunk_size: smallest chunk to use when adjusting
+        :param max_chunk_size: largest chunk to use when adjusting
+        :param initial_chunk_size: chunk size to start with when adjusting
+        :param target_seconds: time each chunk should take to send, when adjusting
+        :param retries: number of times to retry a chunk that fails before giving up
+        :param journal: filename to record progress in so that the upload can be resumed, or a VSUploadJournal, or None
+        """
+        self.connection = connection
+        self.path = path
+        self.filename = filename
+        self.method = method
+        self.query = query
+        self.matrix = matrix
+        self.upload_filename = upload_filename if upload_filename is not None else os.path.basename(filename)
+        self.transferPriority = transferPriority
+        self.throttle = throttle
+        self.threads = threads
+        self.fixed_chunk_size = chunk_size
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size if chunk_size is None else chunk_size
+        self.chunk_size = chunk_size if chunk_size is not None else initial_chunk_size
+        self.target_seconds = target_seconds
+        self.retries = retries
+        if journal is not None and not isinstance(journal, VSUploadJournal):
+            journal = VSUploadJournal(journal)
+        self.journal = journal
+
+        self.total_size = os.path.getsize(filename)
+        self.transfer_id = None
+        self.response = None
+        self.bytes_sent = 0
+        self.chunks_sent = 0
+        self._done = []
+        self._pending = []
+        self._lock = threading.Lock()
+        self._error = None
+        self._throughput = None
+        self._local = threading.local()
+        self._mmap = None
+
+    def _spec(self):
+        stat = os.stat(self.filename)
+        return {'file': os.path.abspath(self.filename), 'size': stat.st_size, 'mtime': stat.st_mtime,
+                'path': self.path, 'filename': self.upload_filename}
+
+    def _query_params(self):
+        query_params = {
+            'transferId': self.transfer_id,
+            'transferPriority': self.transferPriority,
+            'throttle': self.throttle,
+            'filename': self.upload_filename,
+        }
+        if self.query is not None:
+            query_params.update(self.query)
+        return query_params
+
+    def _sender(self):
+        """
+        Internal method returning the VSApi that the current thread sends chunks with
+        """
+        sender = getattr(self._local, 'sender', None)
+        if sender is None:
+            #same scheme, governor, retry policy and instrumentation as the connection it was given
+            sender = VSApi(**self.connection._child_args())
+            self._local.sender = sender
+        return sender
+
+    def _next_chunk(self):
+        """
+        Internal method returning the (start, end) of the next chunk to send, or None if there is nothing left
+        """
+        with self._lock:
+            if self._error is not None or len(self._pending) == 0:
+                return None
+            start, end = self._pending[0]
+            chunk_end = min(end, start + self.chunk_size)
+            if chunk_end == end:
+                self._pending.pop(0)
+            else:
+                self._pending[0] = (chunk_end, end)
+            return start, chunk_end
+
+    def _adjust_chunk_size(self, nbytes, seconds):
+        """
+        Internal method to update the throughput estimate from a chunk that has been sent, and the chunk size from it.
+        Must be called with the lock held.
+        """
+        if self.fixed_chunk_size is not None or seconds <= 0:
+            return
+        #the estimate is of the throughput of each connection, as that is what determines how long one chunk takes
+        rate = nbytes/seconds
+        self._throughput = rate if self._throughput is None else 0.7*self._throughput + 0.3*rate
+        size = int(self._throughput * self.target_seconds)
+        size = max(self.min_chunk_size, min(self.max_chunk_size, size))
+        self.chunk_size = max(self.chunk_granularity, size - size % self.chunk_granularity)
+
+    def _chunk_body(self, start, end):
+        """
+        Internal method returning the data for a chunk, as a memoryview onto either the memory map or a re-used buffer
+        """
+        if self._mmap is not None:
+            return memoryview(self._mmap)[start:end]
+
+        buf = getattr(self._local, 'buffer', None)
+        if buf is None or len(buf) < self.max_chunk_size:
+            buf = bytearray(self.max_chunk_size)
+            self._local.buffer = buf
+            self._local.file = io.FileIO(self.filename, "r")
+        view = memoryview(buf)[:end-start]
+        self._local.file.seek(start, os.SEEK_SET)
+        got = 0
+        while got < end-start:
+            n = self._local.file.readinto(view[got:])
+            if not n:
+                raise IOError("{0} is shorter than expected".format(self.filename))
+            got += n
+        return view
+
+    def _send_chunk(self, start, end):
+        headers = {
+            'size': self.total_size,
+            'index': start
+        }
+        attempt = 0
+        while True:
+            body = self._chunk_body(start, end)
+            try:
+                started = time.time()
+                response = self._sender().raw_request(self.path, method=self.method, matrix=self.matrix,
+                                                      query=self._query_params(), body=body,
+                                                      content_type='application/octet-stream', rawData=True,
+                                                      extra_headers=headers)
+                return response, time.time()-started
+            except (HTTPError, IOError, OSError) as e:
+                attempt += 1
+                if attempt > self.retries or (isinstance(e, HTTPError) and e.code < 500):
+                    raise
+                logger.warning("Chunk at {0} of {1} failed ({2}), retrying".format(start, self.filename, e))
+                time.sleep(min(2**attempt, 30))
+            finally:
+                body.release()
+
+    def _worker(self):
+        try:
+            while True:
+                chunk = self._next_chunk()
+                if chunk is None:
+                    return
+                start, end = chunk
+                response, seconds = self._send_chunk(start, end)
+                with self._lock:
+                    self._done = _add_range(self._done, start, end)
+                    self.bytes_sent += end-start
+                    self.chunks_sent += 1
+                    self._adjust_chunk_size(end-start, seconds)
+                    if response:
+                        self.response = response
+                    if self.journal is not None:
+                        self.journal.save(self.transfer_id, self._done)
+                logger.debug("Uploaded {0} bytes of {1} at {2}".format(end-start, self.filename, start))
+        except Exception as e:
+            with self._lock:
+                if self._error is None:
+                    self._error = e
+        finally:
+            f = getattr(self._local, 'file', None)
+            if f is not None:
+                f.close()
+
+    def run(self):
+        """
+        Performs the upload, blocking until it is complete
+        :return: the body of the last response from Vidispine. Raises the first error encountered if a chunk could not
+        be sent after retrying; the journal, if any, then holds everything that was sent successfully.
+        """
+        if self.journal is not None and self.journal.begin(self._spec()):
+            self.transfer_id = self.journal.transfer_id
+            self._done = list(self.journal.done)
+            logger.info("Resuming upload of {0} with transfer ID {1}".format(self.filename, self.transfer_id))
+        else:
+            self.transfer_id = uuid4().hex
+            self._done = []
+        self._pending = _missing_ranges(self._done, self.total_size)
+        if self.total_size == 0 and len(self._done) == 0:
+            #an empty file still needs one (empty) chunk to create it
+            self._pending = [(0, 0)]
+
+        if self.total_size > 0:
+            try:
+                with open(self.filename, "rb") as f:
+                    self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError) as e:
+                logger.debug("Can't map {0} ({1}), reading it instead".format(self.filename, e))
+                self._mmap = None
+
+        try:
+            workers = [threading.Thread(target=self._worker, name="VSChunkedUpload-{0}".format(n))
+                       for n in range(0, min(self.threads, max(1, len(self._pending))))]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+        finally:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+
+        if self._error is not None:
+            raise self._error
+        if self.journal is not None:
+            self.journal.finish()
+        return self.response
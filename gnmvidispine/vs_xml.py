@@ -0,0 +1,214 @@
+"""
+Selects the XML library that is used to parse responses from Vidispine.
+
+The standard library's ElementTree is used unless you choose otherwise.  lxml parses considerably faster and lets the
+lookups that are run on every item, job, file and shape be compiled once into XPath expressions, so if it is installed
+you can opt in by calling set_backend("lxml") (or set_backend("auto"), which uses lxml if it is installed and stdlib
+otherwise), or by setting the GNMVIDISPINE_XML_BACKEND environment variable to lxml, stdlib or auto before importing
+the package.
+
+Documents parsed by lxml serialise with their original namespace prefixes (e.g. xmlns="..." rather than ns0:), so
+anything that compares the output of toXML(), as_xml() or tostring() byte for byte should stay on stdlib.
+
+Both kinds of element support the find()/findall()/attrib/text interface that the rest of this package relies on.
+The helpers here (tostring, SubElement, VSPath) accept either kind, so documents parsed before a backend change, or
+built by hand with xml.etree.ElementTree, still work.
+"""
+import logging
+import os
+import xml.etree.ElementTree as _stdlib_etree
+from xml.parsers.expat import ExpatError
+
+try:
+    from lxml import etree as _lxml_etree
+except ImportError:
+    _lxml_etree = None
+
+logger = logging.getLogger(__name__)
+
+VIDISPINE_NS = "http://xml.vidispine.com/schema/vidispine"
+
+_backend = None
+
+
+class XMLBackendError(Exception):
+    """
+    Raised if an XML backend is requested that is not available
+    """
+    pass
+
+
+def lxml_available():
+    """
+    :return: True if lxml can be used
+    """
+    return _lxml_etree is not None
+
+
+def set_backend(name):
+    """
+    Selects the XML library used to parse responses from now on
+    :param name: "stdlib" (the default), "lxml" or "auto" (lxml if it is installed, otherwise stdlib)
+    :return: the name of the backend now in use, "lxml" or "stdlib"
+    """
+    global _backend
+    if name == "auto":
+        name = "lxml" if _lxml_etree is not None else "stdlib"
+    if name == "lxml":
+        if _lxml_etree is None:
+            raise XMLBackendError("lxml backend requested but lxml is not installed")
+    elif name != "stdlib":
+        raise ValueError("XML backend must be lxml, stdlib or auto, not {0}".format(name))
+    _backend = name
+    logger.debug("Using {0} XML backend".format(name))
+    return name
+
+
+def backend():
+    """
+    :return: the name of the backend currently in use, "lxml" or "stdlib"
+    """
+    return _backend
+
+
+def _using_lxml():
+    return _backend == "lxml"
+
+
+def is_lxml_element(elem):
+    return _lxml_etree is not None and isinstance(elem, _lxml_etree._Element)
+
+
+#errors that can be raised by fromstring() and the pull parser, whichever backend is in use
+if _lxml_etree is not None:
+    PARSE_ERRORS = (ExpatError, _stdlib_etree.ParseError, _lxml_etree.XMLSyntaxError)
+else:
+    PARSE_ERRORS = (ExpatError, _stdlib_etree.ParseError)
+
+
+def fromstring(data):
+    """
+    Parses an XML document with the current backend
+    :param data: bytes or string
+    :return: root element
+    """
+    if _using_lxml():
+        if isinstance(data, str):
+            #lxml refuses unicode strings that carry an encoding declaration
+            data = data.encode("UTF-8")
+        return _lxml_etree.fromstring(data)
+    return _stdlib_etree.fromstring(data)
+
+
+def pull_parser(events=("start", "end")):
+    """
+    Returns an incremental parser from the current backend, with the XMLPullParser feed()/read_events()/close() interface
+    """
+    if _using_lxml():
+        return _lxml_etree.XMLPullParser(events=events)
+    return _stdlib_etree.XMLPullParser(events=events)
+
+
+def tostring(elem, encoding=None, **kwargs):
+    """
+    Serialises an element of either kind, with the same arguments as xml.etree.ElementTree.tostring
+    """
+    if is_lxml_element(elem):
+        if encoding is None:
+            encoding = "us-ascii"
+        kwargs.pop('short_empty_elements', None)
+        #ElementTree adds a declaration for any encoding other than these, so do the same
+        kwargs.setdefault('xml_declaration', encoding.lower() not in ("utf-8", "us-ascii", "unicode"))
+        return _lxml_etree.tostring(elem, encoding=encoding, **kwargs)
+    return _stdlib_etree.tostring(elem, encoding, **kwargs)
+
+
+def SubElement(parent, tag, attrib={}, **extra):
+    """
+    Creates a child element of the same kind as parent, with the same arguments as xml.etree.ElementTree.SubElement
+    """
+    if is_lxml_element(parent):
+        return _lxml_etree.SubElement(parent, tag, attrib, **extra)
+    return _stdlib_etree.SubElement(parent, tag, attrib, **extra)
+
+
+def append(parent, child):
+    """
+    Appends child to parent, converting it to the same kind of element as parent first if necessary (e.g. when adding
+    a hand-built ElementTree element to a document parsed by lxml)
+    :return: the element that was appended, which is a copy of child if it had to be converted
+    """
+    if is_lxml_element(parent) != is_lxml_element(child):
+        if is_lxml_element(parent):
+            child = _lxml_etree.fromstring(_stdlib_etree.tostring(child))
+        else:
+            child = _stdlib_etree.fromstring(_lxml_etree.tostring(child))
+    parent.append(child)
+    return child
+
+
+class VSPath(object):
+    """
+    A lookup path that is prepared once and can then be evaluated against elements from either backend.  Paths use the
+    "vs:" prefix for the namespace (the Vidispine one unless another is given) and the ElementPath subset of XPath,
+    e.g. VSPath("vs:item/vs:metadata").  With lxml the path is compiled to an XPath expression; with ElementTree the
+    namespace-qualified path string is built once rather than formatted on every call.
+    """
+    def __init__(self, path, namespace=VIDISPINE_NS):
+        self.path = path
+        self.etree_path = path.replace("vs:", "{%s}" % namespace)
+        if _lxml_etree is not None:
+            self._xpath = _lxml_etree.XPath(path, namespaces={'vs': namespace})
+        else:
+            self._xpath = None
+
+    def __repr__(self):
+        return "VSPath({0!r})".format(self.path)
+
+    def findall(self, elem):
+        """
+        :return: list of all matching elements
+        """
+        if self._xpath is not None and isinstance(elem, _lxml_etree._Element):
+            return self._xpath(elem)
+        return elem.findall(self.etree_path)
+
+    def find(self, elem):
+        """
+        :return: the first matching element, or None
+        """
+        if self._xpath is not None and isinstance(elem, _lxml_etree._Element):
+            result = self._xpath(elem)
+            return result[0] if result else None
+        return elem.find(self.etree_path)
+
+    def text(self, elem, default=None):
+        """
+        :return: the text of the first matching element, or default if there is no match.  Unlike findtext(), an
+        element with no text gives None.
+        """
+        node = self.find(elem)
+        if node is None:
+            return default
+        return node.text
+
+
+_path_cache = {}
+
+
+def vs_path(path, namespace=VIDISPINE_NS):
+    """
+    Returns a VSPath for the given path, re-using one that was prepared earlier if possible
+    :param path: path using the vs: prefix, e.g. "vs:item/vs:metadata"
+    :param namespace: namespace for the vs: prefix, either bare or in {braces}
+    """
+    namespace = namespace.strip("{}")
+    try:
+        return _path_cache[(path, namespace)]
+    except KeyError:
+        compiled = VSPath(path, namespace)
+        _path_cache[(path, namespace)] = compiled
+        return compiled
+
+
+set_backend(os.environ.get("GNMVIDISPINE_XML_BACKEND") or "stdlib")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Times parsing and field extraction of an ItemDocument with each of the available XML backends, against the
+find()/findall() lookups that VSItem used previously.
+Usage: parsebenchmark.py [itemdocument.xml] [iterations]
+If no document is given, a synthetic one with 200 metadata fields (and a group repeating them) is used.
+"""
+import logging
+import sys
+import timeit
+import xml.etree.ElementTree as ET
+from gnmvidispine import vs_xml
+from gnmvidispine.vs_item import VSItem
+
+
+def synthetic_document(fieldcount=200):
+    #fields carry the same change-tracking attributes that Vidispine returns
+    fieldtemplate = """<field uuid="2b6e0a3c-{0:04d}-4c1e-9b0a-6f1d2c3b4a5e" user="admin" timestamp="2017-05-04T12:34:56.789+01:00" change="VX-{0}">
+<name>field_{0}</name>
+<value uuid="7c1d9e2f-{0:04d}-4a3b-8c2d-1e0f9a8b7c6d" user="admin" timestamp="2017-05-04T12:34:56.789+01:00" change="VX-{0}">value {0}</value>
+<value uuid="8d2e0f3a-{0:04d}-4b4c-9d3e-2f1a0b9c8d7e" user="admin" timestamp="2017-05-04T12:34:56.789+01:00" change="VX-{0}">other {0}</value>
+</field>"""
+    fields = "".join([fieldtemplate.format(n) for n in range(0, fieldcount)])
+    return """<?xml version="1.0" encoding="UTF-8"?>
+<ItemDocument xmlns="http://xml.vidispine.com/schema/vidispine" id="VX-1">
+<metadata><revision>VX-1,VX-2</revision><timespan start="-INF" end="+INF">{0}
+<group><name>Asset</name>{0}</group></timespan></metadata></ItemDocument>""".format(fields).encode("UTF-8")
+
+
+def legacy_extract(node, contentDict, ns="{http://xml.vidispine.com/schema/vidispine}"):
+    """
+    the lookups that VSItem.makeContentDict did before, for comparison
+    """
+    for child in node:
+        if child.tag.endswith("field"):
+            try:
+                key = child.find('{0}name'.format(ns)).text
+            except AttributeError:
+                key = ""
+            logging.debug("key is {0}".format(key))
+            for valNode in child.findall('{0}value'.format(ns)):
+                val = valNode.text
+                logging.debug("got {0} for {1}".format(val, key))
+                if key in contentDict:
+                    if isinstance(contentDict[key], list):
+                        contentDict[key].append(val)
+                    else:
+                        contentDict[key] = [contentDict[key], val]
+                else:
+                    contentDict[key] = val
+        elif child.tag.endswith("group"):
+            legacy_extract(child, contentDict, ns)
+    return contentDict
+
+
+def legacy_parse_and_extract(data):
+    item = VSItem()
+    root = ET.fromstring(data)
+    for x in root.findall('{0}metadata/{0}timespan'.format("{http://xml.vidispine.com/schema/vidispine}")):
+        legacy_extract(x, item.contentDict)
+    return item.contentDict
+
+
+def parse_and_extract(data):
+    item = VSItem()
+    item.fromXML(vs_xml.fromstring(data))
+    return item.contentDict
+
+
+def best_time(fn, iterations):
+    #the garbage collector is left on, as it is in real use; it is a large part of the cost of building ElementTree trees
+    return min(timeit.repeat(fn, setup="gc.enable()", number=iterations, repeat=3)) * 1000 / iterations
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as f:
+            doc = f.read()
+    else:
+        doc = synthetic_document()
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+
+    baseline = best_time(lambda: legacy_parse_and_extract(doc), iterations)
+    print("previous find/findall lookups (stdlib): {0:.3f}ms per document".format(baseline))
+
+    backends = ["stdlib"]
+    if vs_xml.lxml_available():
+        backends.append("lxml")
+
+    for name in backends:
+        vs_xml.set_backend(name)
+        parse = best_time(lambda: vs_xml.fromstring(doc), iterations)
+        total = best_time(lambda: parse_and_extract(doc), iterations)
+        print("{0}: parse {1:.3f}ms, parse and extract {2:.3f}ms per document ({3:.2f}x previous)".format(
+            name, parse, total, baseline / total))
@@ -0,0 +1,341 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+import json
+from mock import patch
+import datetime
+
+
+class TestJSONTransportParity(unittest2.TestCase):
+    """
+    Runs the same documents through the xml and json transports and checks that the entity classes give identical
+    public results from both
+    """
+    fake_host = 'localhost'
+    fake_port = 8080
+    fake_user = 'username'
+    fake_passwd = 'password'
+
+    item_xml = """<?xml version="1.0" encoding="UTF-8"?>
+<MetadataListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <item id="VX-1">
+    <metadata>
+      <revision>VX-3,VX-2</revision>
+      <timespan start="-INF" end="+INF">
+        <field uuid="9a2f5d3e-1" user="admin" timestamp="2017-05-04T12:34:56.789+01:00" change="VX-3">
+          <name>title</name>
+          <value uuid="9a2f5d3e-2" user="admin" timestamp="2017-05-04T12:34:56.789+01:00" change="VX-3">Test item</value>
+        </field>
+        <field><name>gnm_asset_category</name><value>Rushes</value><value>Master</value></field>
+        <field><name>durationSeconds</name><value>12.5</value></field>
+        <field><name>empty_field</name><value></value></field>
+        <group>
+          <name>Asset</name>
+          <field><name>gnm_asset_owner</name><value>fred</value></field>
+          <group><name>Rights</name><field><name>rights_holder</name><value>GNM</value></field></group>
+        </group>
+      </timespan>
+      <group>Asset</group>
+    </metadata>
+  </item>
+</MetadataListDocument>"""
+
+    item_json = {"item": [{"id": "VX-1", "metadata": {
+        "revision": "VX-3,VX-2",
+        "timespan": [{"start": "-INF", "end": "+INF",
+                      "field": [
+                          {"name": "title", "uuid": "9a2f5d3e-1", "user": "admin",
+                           "timestamp": "2017-05-04T12:34:56.789+01:00", "change": "VX-3",
+                           "value": [{"value": "Test item", "uuid": "9a2f5d3e-2", "user": "admin",
+                                      "timestamp": "2017-05-04T12:34:56.789+01:00", "change": "VX-3"}]},
+                          {"name": "gnm_asset_category", "value": [{"value": "Rushes"}, {"value": "Master"}]},
+                          {"name": "durationSeconds", "value": [{"value": "12.5"}]},
+                          {"name": "empty_field", "value": [{"value": ""}]}],
+                      "group": [{"name": "Asset",
+                                 "field": [{"name": "gnm_asset_owner", "value": [{"value": "fred"}]}],
+                                 "group": [{"name": "Rights",
+                                            "field": [{"name": "rights_holder", "value": [{"value": "GNM"}]}]}]}]}],
+        "group": ["Asset"]}}]}
+
+    second_item_xml = """<item xmlns="http://xml.vidispine.com/schema/vidispine" id="VX-2" start="-INF" end="+INF">
+    <metadata><timespan start="-INF" end="+INF"><field><name>title</name><value>Second item</value></field></timespan></metadata>
+    </item>"""
+
+    second_item_json = {"id": "VX-2", "start": "-INF", "end": "+INF", "metadata": {
+        "timespan": [{"start": "-INF", "end": "+INF", "field": [{"name": "title", "value": [{"value": "Second item"}]}]}]}}
+
+    job_xml = """<?xml version="1.0" encoding="UTF-8"?>
+<JobDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <jobId>VX-100</jobId>
+  <user>admin</user>
+  <started>2017-05-04T12:34:56.789Z</started>
+  <status>FAILED_TOTAL</status>
+  <type>TRANSCODE</type>
+  <priority>MEDIUM</priority>
+  <currentStep>
+    <description>Transcoding</description><number>2</number><status>FAILED</status>
+    <timestamp>2017-05-04T12:36:00.000Z</timestamp>
+  </currentStep>
+  <data><key>item</key><value>VX-1</value></data>
+  <data><key>errorMessage</key><value>Transcoder failed</value></data>
+  <data><key>progress</key><value>42</value></data>
+  <data><key>ratio</key><value>0.5</value></data>
+  <log>
+    <task id="1"><step>1</step><attempts>1</attempts><status>FINISHED</status>
+      <timestamp>2017-05-04T12:35:00.000Z</timestamp><description>Setup</description></task>
+    <task id="2"><step>2</step><attempts>3</attempts><status>FAILED</status>
+      <timestamp>2017-05-04T12:36:00.000Z</timestamp><description>Transcoding</description>
+      <subStep><description>Waiting for transcoder</description><number>1</number><status>FINISHED</status></subStep>
+    </task>
+  </log>
+  <totalSteps>3</totalSteps>
+</JobDocument>"""
+
+    job_json = {"jobId": "VX-100", "user": "admin", "started": "2017-05-04T12:34:56.789Z", "status": "FAILED_TOTAL",
+                "type": "TRANSCODE", "priority": "MEDIUM",
+                "currentStep": {"description": "Transcoding", "number": 2, "status": "FAILED",
+                                "timestamp": "2017-05-04T12:36:00.000Z"},
+                "data": [{"key": "item", "value": "VX-1"}, {"key": "errorMessage", "value": "Transcoder failed"},
+                         {"key": "progress", "value": "42"}, {"key": "ratio", "value": "0.5"}],
+                "log": {"task": [
+                    {"id": 1, "step": 1, "attempts": 1, "status": "FINISHED",
+                     "timestamp": "2017-05-04T12:35:00.000Z", "description": "Setup"},
+                    {"id": 2, "step": 2, "attempts": 3, "status": "FAILED",
+                     "timestamp": "2017-05-04T12:36:00.000Z", "description": "Transcoding",
+                     "subStep": [{"description": "Waiting for transcoder", "number": 1, "status": "FINISHED"}]}]},
+                "totalSteps": 3}
+
+    file_xml_template = """<{root} xmlns="http://xml.vidispine.com/schema/vidispine">
+    <id>{id}</id><path>media/{id}.mp4</path><uri>file:///srv/media/media/{id}.mp4</uri><state>CLOSED</state>
+    <size>123456</size><hash>6f1d2c3b4a5e</hash><timestamp>2017-05-04T12:34:56.789+01:00</timestamp>
+    <refreshFlag>1</refreshFlag><storage>VX-2</storage><metadata/>
+    <item><id>VX-1</id><shape><id>VX-20</id></shape></item>
+    </{root}>"""
+
+    @staticmethod
+    def file_json(fileid):
+        return {"id": fileid, "path": "media/{0}.mp4".format(fileid), "uri": ["file:///srv/media/media/{0}.mp4".format(fileid)],
+                "state": "CLOSED", "size": 123456, "hash": "6f1d2c3b4a5e", "timestamp": "2017-05-04T12:34:56.789+01:00",
+                "refreshFlag": 1, "storage": "VX-2", "metadata": {}, "item": [{"id": "VX-1", "shape": [{"id": "VX-20"}]}]}
+
+    storage_xml = """<?xml version="1.0" encoding="UTF-8"?>
+<StorageDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <id>VX-2</id><state>NONE</state><type>LOCAL</type><capacity>1000000</capacity><freeCapacity>500000</freeCapacity>
+  <timestamp>2017-05-04T12:34:56.789+01:00</timestamp>
+  <method><id>VX-5</id><uri>file:///srv/media/</uri><read>true</read><write>true</write><browse>true</browse>
+    <lastSuccess>2017-05-04T12:34:56.789+01:00</lastSuccess><type>NONE</type></method>
+  <metadata><field><key>name</key><value>Media</value></field></metadata>
+</StorageDocument>"""
+
+    storage_json = {"id": "VX-2", "state": "NONE", "type": "LOCAL", "capacity": 1000000, "freeCapacity": 500000,
+                    "timestamp": "2017-05-04T12:34:56.789+01:00",
+                    "method": [{"id": "VX-5", "uri": "file:///srv/media/", "read": True, "write": True, "browse": True,
+                                "lastSuccess": "2017-05-04T12:34:56.789+01:00", "type": "NONE"}],
+                    "metadata": {"field": [{"key": "name", "value": "Media"}]}}
+
+    shape_xml = """<?xml version="1.0" encoding="UTF-8"?>
+<ShapeDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <id>VX-20</id><essenceVersion>0</essenceVersion><tag>original</tag><mimeType>video/mp4</mimeType>
+  <containerComponent><id>VX-30</id>{file}</containerComponent>
+</ShapeDocument>"""
+
+    search_xml = """<?xml version="1.0" encoding="UTF-8"?>
+<ItemListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <hits>2</hits>
+  <item id="VX-1" start="-INF" end="+INF"/>
+  <item id="VX-2" start="-INF" end="+INF"/>
+  <facet><field>gnm_asset_category</field><count fieldValue="Rushes">1</count><count fieldValue="Master">1</count></facet>
+</ItemListDocument>"""
+
+    search_json = {"hits": 2, "item": [{"id": "VX-1", "start": "-INF", "end": "+INF"},
+                                       {"id": "VX-2", "start": "-INF", "end": "+INF"}],
+                   "facet": [{"field": "gnm_asset_category",
+                              "count": [{"fieldValue": "Rushes", "value": 1}, {"fieldValue": "Master", "value": 1}]}]}
+
+    def _documents(self, path, method, matrix, query):
+        """
+        returns (xml string, json object) for the given request
+        """
+        ns = 'xmlns="http://xml.vidispine.com/schema/vidispine"'
+        if path.startswith("/item/VX-1/metadata"):
+            return self.item_xml, self.item_json
+        if path == "/job/VX-100":
+            return self.job_xml, self.job_json
+        if path == "/storage/VX-2":
+            return self.storage_xml, self.storage_json
+        if path.startswith("/storage/VX-2/file/VX-10"):
+            return self.file_xml_template.format(root="FileDocument", id="VX-10"), self.file_json("VX-10")
+        if path == "/storage/VX-2/file":
+            if matrix.get('number') == 0 or matrix.get('start', 0) > 0:
+                return "<FileListDocument {0}><hits>2</hits></FileListDocument>".format(ns), {"hits": 2}
+            files = "".join([self.file_xml_template.format(root="file", id=i) for i in ("VX-10", "VX-11")])
+            return "<FileListDocument {0}><hits>2</hits>{1}</FileListDocument>".format(ns, files), \
+                   {"hits": 2, "file": [self.file_json("VX-10"), self.file_json("VX-11")]}
+        if path == "/item/VX-1/shape/VX-20":
+            return self.shape_xml.format(file=self.file_xml_template.format(root="file", id="VX-10")), \
+                   {"id": "VX-20", "essenceVersion": 0, "tag": ["original"], "mimeType": ["video/mp4"],
+                    "containerComponent": {"id": "VX-30", "file": [self.file_json("VX-10")]}}
+        if path == "/item" and query is not None and query.get('content') == 'metadata':
+            item_node = self.item_xml.split("<item id=\"VX-1\">")[1].split("</item>")[0]
+            return "<ItemListDocument {0}><hits>2</hits><item id=\"VX-1\" start=\"-INF\" end=\"+INF\">{1}</item>{2}</ItemListDocument>".format(
+                       ns, item_node, self.second_item_xml), \
+                   {"hits": 2, "item": [dict(self.item_json['item'][0], start="-INF", end="+INF"), self.second_item_json]}
+        if path == "/item":
+            return self.search_xml, self.search_json
+        raise AssertionError("unexpected request for {0} {1}".format(method, path))
+
+    def _fake_request(self, path, method="GET", matrix=None, query=None, body=None, accept='application/xml'):
+        from gnmvidispine.vidispine_api import VSApi
+        xml_doc, json_doc = self._documents(path, method, matrix or {}, query)
+        self.requested_types.append(accept)
+        if accept == 'application/json':
+            return VSApi._parse_response_body(json.dumps(json_doc).encode("UTF-8"), accept)
+        return VSApi._parse_response_body(xml_doc.encode("UTF-8"), accept)
+
+    def _fake_stream_request(self, path, method="GET", matrix=None, query=None, body=None, chunk_size=65536):
+        for node in self._fake_request(path, method, matrix, query, body):
+            yield node
+
+    def _in_both_modes(self, fn):
+        """
+        calls fn(transport) with requests served from the fixtures above, for each transport
+        :return: tuple of (result from xml, result from json)
+        """
+        results = []
+        for transport in ("xml", "json"):
+            self.requested_types = []
+            with patch("gnmvidispine.vidispine_api.VSApi.request", side_effect=self._fake_request, autospec=False):
+                with patch("gnmvidispine.vidispine_api.VSApi.stream_request", side_effect=self._fake_stream_request):
+                    results.append(fn(transport))
+            expected_type = 'application/json' if transport == "json" else 'application/xml'
+            self.assertTrue(len(self.requested_types) > 0)
+            self.assertTrue(all([t == expected_type for t in self.requested_types]),
+                            "{0} mode requested {1}".format(transport, self.requested_types))
+        return results
+
+    def _args(self, transport):
+        return {'host': self.fake_host, 'port': self.fake_port, 'user': self.fake_user, 'passwd': self.fake_passwd,
+                'transport': transport}
+
+    def test_invalid_transport(self):
+        from gnmvidispine.vidispine_api import VSApi
+        with self.assertRaises(ValueError):
+            VSApi(host=self.fake_host, transport="yaml")
+
+    def test_item(self):
+        from gnmvidispine.vs_item import VSItem
+
+        def load(transport):
+            i = VSItem(**self._args(transport))
+            i.populate("VX-1")
+            return {
+                'name': i.name,
+                'contentDict': i.contentDict,
+                'title': i.get("title"),
+                'category': i.get("gnm_asset_category"),
+                'category_list': i.get("gnm_asset_category", allowArray=True),
+                'master_group': i.master_group,
+            }
+
+        from_xml, from_json = self._in_both_modes(load)
+        self.assertEqual(from_xml, from_json)
+        self.assertEqual(from_xml['contentDict'], {'title': 'Test item', 'gnm_asset_category': ['Rushes', 'Master'],
+                                                   'durationSeconds': '12.5', 'empty_field': None,
+                                                   'gnm_asset_owner': 'fred', 'rights_holder': 'GNM'})
+        self.assertEqual(from_xml['category'], "Rushes|Master")
+        self.assertEqual(from_xml['master_group'], "Asset")
+
+    def test_job(self):
+        from gnmvidispine.vs_job import VSJob
+
+        def load(transport):
+            j = VSJob(**self._args(transport))
+            j.populate("VX-100")
+            step = j.current_step
+            return {
+                'contentDict': j.contentDict,
+                'type': j.type,
+                'priority': j.priority,
+                'total_steps': j.total_steps,
+                'errorMessage': j.errorMessage,
+                'started': j.started(),
+                'didFail': j.didFail(),
+                'step': (step.description, step.number, step.status, step.timestamp),
+                'log': [(t.task_id, t.step, t.attempts, t.status, t.description, t.timestamp,
+                         [(s.description, s.number, s.status) for s in t.sub_steps]) for t in j.log],
+            }
+
+        from_xml, from_json = self._in_both_modes(load)
+        self.assertEqual(from_xml, from_json)
+        self.assertEqual(from_xml['contentDict']['progress'], 42)
+        self.assertEqual(from_xml['contentDict']['ratio'], 0.5)
+        self.assertEqual(from_xml['started'], datetime.datetime(2017, 5, 4, 12, 34, 56))
+        self.assertEqual(from_xml['total_steps'], "3")
+        self.assertEqual(from_xml['errorMessage'], "Transcoder failed")
+        self.assertEqual(from_xml['log'][1][6], [("Waiting for transcoder", 1, "FINISHED")])
+
+    def test_storage(self):
+        from gnmvidispine.vs_storage import VSStorage
+
+        def load(transport):
+            s = VSStorage(**self._args(transport))
+            s.populate("VX-2")
+            return {
+                'attributes': (s.name, s.state, s.type, s.capacity, s.freeCapacity, s.timestamp),
+                'contentDict': s.contentDict,
+                'methods': [(m.name, m.uri, m.read, m.write, m.browse, m.lastSuccess, m.type) for m in s.methods],
+                'fileCount': s.fileCount,
+                'file_count': s.file_count(),
+                'files': [f.json_data() for f in s.files()],
+                'file': s.fileForID("VX-10").json_data(),
+            }
+
+        from_xml, from_json = self._in_both_modes(load)
+        self.assertEqual(from_xml, from_json)
+        self.assertEqual(from_xml['methods'][0][2], "true")
+        self.assertEqual(from_xml['fileCount'], 2)
+        self.assertEqual([f['id'] for f in from_xml['files']], ["VX-10", "VX-11"])
+        self.assertEqual(from_xml['file']['size'], "123456")
+        self.assertEqual(from_xml['file']['memberOfItem'], "VX-1")
+
+    def test_shape(self):
+        from gnmvidispine.vs_shape import VSShape
+
+        def load(transport):
+            s = VSShape(**self._args(transport))
+            s.populate("VX-1", "VX-20")
+            return {
+                'contentDict': s.contentDict,
+                'tag': s.tag(),
+                'mimeType': s.mimeType(),
+                'mime_type': s.mime_type,
+                'essence_version': s.essence_version,
+                'uris': list(s.fileURIs()),
+                'files': [f.json_data() for f in s.files()],
+            }
+
+        from_xml, from_json = self._in_both_modes(load)
+        self.assertEqual(from_xml, from_json)
+        self.assertEqual(from_xml['essence_version'], 0)
+        self.assertEqual(from_xml['uris'], ["file:///srv/media/media/VX-10.mp4"])
+
+    def test_search_result(self):
+        from gnmvidispine.vs_search import VSItemSearch
+
+        def load(transport):
+            s = VSItemSearch(**self._args(transport))
+            s.addCriterion({'title': 'test'})
+            unpopulated = s.execute()
+            populated = s.execute()
+            facets = s.execute()
+            return {
+                'totalItems': unpopulated.totalItems,
+                'names': [i.name for i in unpopulated.results(shouldPopulate=False)],
+                'populated': [(i.name, i.contentDict) for i in populated.results(shouldPopulate=True)],
+                'facets': list(facets.facets()),
+            }
+
+        from_xml, from_json = self._in_both_modes(load)
+        self.assertEqual(from_xml, from_json)
+        self.assertEqual(from_xml['names'], ["VX-1", "VX-2"])
+        self.assertEqual(from_xml['populated'][1], ("VX-2", {'title': 'Second item'}))
+        self.assertEqual(from_xml['facets'], [{'Rushes': 1, 'Master': 1, 'facet_field_name': 'gnm_asset_category'}])
@@ -263,8 +263,7 @@ class TestVSApi(unittest2.TestCase):
             """
             mock object to return a known id. used via mock.patch below.
             """
-            def get_hex(self):
-                return 'fa6032d61c7b4db19425c6404ea7b822'
+            hex = 'fa6032d61c7b4db19425c6404ea7b822'
             
         with tempfile.TemporaryFile() as f:
             filecontent = bytes(urandom(testfilesize))
@@ -548,3 +547,60 @@ class TestVSApi(unittest2.TestCase):
         """
         from gnmvidispine.vidispine_api import VSApi
         api = VSApi(user=self.fake_user, passwd=self.fake_passwd, https=True)
+
+    def test_stream_request(self):
+        """
+        stream_request should yield each child of the root as it is parsed, reading the response a chunk at a time,
+        and should leave the object with a fresh dedicated connection
+        """
+        from gnmvidispine.vidispine_api import VSApi
+        import io
+        sample_returned_xml = b"""<?xml version="1.0"?>
+        <FileListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+          <hits>3</hits>
+          <file><id>VX-1</id></file>
+          <file><id>VX-2</id></file>
+          <file><id>VX-3</id></file>
+        </FileListDocument>"""
+
+        response = MagicMock()
+        response.status = 200
+        stream = io.BytesIO(sample_returned_xml)
+        response.read = MagicMock(side_effect=lambda amt=None: stream.read(amt))
+
+        api = VSApi(user=self.fake_user,passwd=self.fake_passwd)
+        original_conn = api._conn
+        original_conn.close = MagicMock()
+        api.sendAuthorized = MagicMock(return_value=response)
+
+        gen = api.stream_request("/storage/VX-1/file", matrix={'number': 3}, chunk_size=64)
+        hits = next(gen)
+        self.assertEqual(hits.tag, "{http://xml.vidispine.com/schema/vidispine}hits")
+        self.assertEqual(hits.text, "3")
+        self.assertLess(stream.tell(), len(sample_returned_xml))   #should not have needed to read the whole document yet
+        self.assertNotEqual(api._conn, original_conn)
+
+        ids = [node.find("{http://xml.vidispine.com/schema/vidispine}id").text for node in gen]
+        self.assertEqual(ids, ["VX-1", "VX-2", "VX-3"])
+        api.sendAuthorized.assert_called_once_with('GET', '/API/storage/VX-1/file;number=3', None, {'Accept': 'application/xml'})
+        original_conn.close.assert_called_once_with()
+
+    def test_stream_request_error(self):
+        """
+        errors should be raised from stream_request in the same way as from request
+        """
+        from gnmvidispine.vidispine_api import VSApi, VSNotFound
+        exception_response = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<ExceptionDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <notFound>
+    <type>Item</type>
+    <id>SD-46362</id>
+  </notFound>
+</ExceptionDocument>"""
+
+        api = VSApi(user=self.fake_user,passwd=self.fake_passwd)
+        api.sendAuthorized = MagicMock(return_value=self.MockedResponse(404, exception_response, reason="Test 404 failure"))
+
+        with self.assertRaises(VSNotFound) as ex:
+            list(api.stream_request("/item/SD-46362/metadata"))
+        self.assertEqual("SD-46362",ex.exception.exceptionID)
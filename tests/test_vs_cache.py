@@ -0,0 +1,260 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+import os
+import tempfile
+import json
+from mock import patch
+import xml.etree.ElementTree as ET
+
+
+class TestVSCacheBackends(unittest2.TestCase):
+    def _check_backend(self, backend):
+        self.assertIsNone(backend.get("localhost:8080/item/VX-1"))
+        backend.set("localhost:8080/item/VX-1", b"first")
+        backend.set("localhost:8080/item/VX-2", b"second")
+        self.assertEqual(backend.get("localhost:8080/item/VX-1"), b"first")
+        backend.delete("localhost:8080/item/VX-1")
+        self.assertIsNone(backend.get("localhost:8080/item/VX-1"))
+        backend.set("localhost:8080/item/VX-3", b"expired", expire=-1)
+        self.assertIsNone(backend.get("localhost:8080/item/VX-3"))
+        backend.clear()
+        self.assertIsNone(backend.get("localhost:8080/item/VX-2"))
+
+    def _check_eviction(self, backend):
+        #maxsize is 2; VX-1 is used after VX-2 is stored so VX-2 is the least recently used when VX-3 is added
+        backend.set("VX-1", b"1")
+        backend.set("VX-2", b"2")
+        backend.get("VX-1")
+        backend.set("VX-3", b"3")
+        self.assertEqual(backend.get("VX-1"), b"1")
+        self.assertIsNone(backend.get("VX-2"))
+        self.assertEqual(backend.get("VX-3"), b"3")
+
+    def test_lru(self):
+        from gnmvidispine.vs_cache import VSLRUCacheBackend
+        self._check_backend(VSLRUCacheBackend())
+        self._check_eviction(VSLRUCacheBackend(maxsize=2))
+
+    def test_sqlite(self):
+        from gnmvidispine.vs_cache import VSSQLiteCacheBackend
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        try:
+            backend = VSSQLiteCacheBackend(path)
+            self._check_backend(backend)
+            backend.set("VX-1", b"persisted")
+            backend.close()
+            self.assertEqual(VSSQLiteCacheBackend(path).get("VX-1"), b"persisted")
+            self._check_eviction(VSSQLiteCacheBackend(":memory:", maxsize=2))
+        finally:
+            os.unlink(path)
+
+    def test_memcache(self):
+        from gnmvidispine.vs_cache import VSMemcacheCacheBackend, VSLocalMemcacheClient
+        self._check_backend(VSMemcacheCacheBackend())
+        self._check_eviction(VSMemcacheCacheBackend(VSLocalMemcacheClient(maxsize=2)))
+
+        client = VSLocalMemcacheClient()
+        backend = VSMemcacheCacheBackend(client)
+        longkey = "localhost:8080/item/VX-1/" + "x" * 300
+        backend.set(longkey, b"value")
+        self.assertEqual(backend.get(longkey), b"value")
+        self.assertTrue(all([len(k) <= 250 for k in client._store._entries.keys()]))
+
+
+class TestVSItemCache(unittest2.TestCase):
+    fake_host = 'localhost'
+    fake_port = 8080
+    fake_user = 'username'
+    fake_passwd = 'password'
+
+    item_xml = """<?xml version="1.0" encoding="UTF-8"?>
+<MetadataListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <item id="VX-1">
+    <metadata>
+      <revision>VX-3,VX-12</revision>
+      <timespan start="-INF" end="+INF">
+        <field><name>title</name><value>Test item</value></field>
+        <field><name>gnm_asset_category</name><value>Rushes</value><value>Master</value></field>
+      </timespan>
+    </metadata>
+  </item>
+</MetadataListDocument>"""
+
+    changes_xml = """<?xml version="1.0" encoding="UTF-8"?>
+<MetadataChangeSetDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <changeSet><id>VX-3</id></changeSet>
+  <changeSet><id>{0}</id></changeSet>
+</MetadataChangeSetDocument>"""
+
+    collection_xml = """<?xml version="1.0" encoding="UTF-8"?>
+<CollectionDocument xmlns="http://xml.vidispine.com/schema/vidispine" id="VX-5">
+  <content><id>VX-1</id><type>item</type></content>
+  <content><id>VX-2</id><type>item</type></content>
+</CollectionDocument>"""
+
+    def _fake_request(self, latest_change="VX-12"):
+        def request(path, method="GET", matrix=None, query=None, body=None, accept='application/xml'):
+            if path.endswith("/metadata/changes"):
+                return ET.fromstring(self.changes_xml.format(latest_change))
+            if path.startswith("/collection/") and not path.endswith("/metadata"):
+                return ET.fromstring(self.collection_xml)
+            return ET.fromstring(self.item_xml)
+        return request
+
+    def _item(self, cache, cls=None):
+        from gnmvidispine.vs_item import VSItem
+        if cls is None:
+            cls = VSItem
+        return cls(self.fake_host, self.fake_port, self.fake_user, self.fake_passwd, cache=cache)
+
+    def test_repeated_populate(self):
+        from gnmvidispine.vs_cache import VSItemCache
+        from gnmvidispine.vs_xml import vs_path
+        cache = VSItemCache(ttl=300)
+        with patch("gnmvidispine.vs_item.VSItem.request", side_effect=self._fake_request()) as mock_request:
+            first = self._item(cache).populate("VX-1")
+            second = self._item(cache)
+            second.populate("VX-1")
+            self.assertEqual(mock_request.call_count, 1)
+            self.assertEqual(second.name, "VX-1")
+            self.assertEqual(second.get("title"), "Test item")
+            self.assertEqual(second.get("gnm_asset_category", allowArray=True), ["Rushes", "Master"])
+            self.assertEqual(second.contentDict, first.contentDict)
+            self.assertEqual(vs_path("vs:item").find(second.dataContent).attrib, {'id': 'VX-1'})
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+            #a different field selection is cached separately
+            self._item(cache).populate("VX-1", specificFields=["title"])
+            self.assertEqual(mock_request.call_count, 2)
+
+    def test_users(self):
+        from gnmvidispine.vs_cache import VSItemCache
+        from gnmvidispine.vs_item import VSItem
+        cache = VSItemCache()
+        with patch("gnmvidispine.vs_item.VSItem.request", side_effect=self._fake_request()) as mock_request:
+            self._item(cache).populate("VX-1")
+            VSItem(self.fake_host, self.fake_port, "otheruser", self.fake_passwd, cache=cache).populate("VX-1")
+            VSItem(self.fake_host, self.fake_port, self.fake_user, self.fake_passwd, run_as="guest",
+                   cache=cache).populate("VX-1")
+            self.assertEqual(mock_request.call_count, 3)
+            self._item(cache).populate("VX-1")
+            self.assertEqual(mock_request.call_count, 3)
+
+            #a change drops the copies for every user
+            cache.invalidate("VX-1", host=self.fake_host, port=self.fake_port)
+            VSItem(self.fake_host, self.fake_port, "otheruser", self.fake_passwd, cache=cache).populate("VX-1")
+            self.assertEqual(mock_request.call_count, 4)
+
+    def test_stored_as_json(self):
+        import pickle
+        from gnmvidispine.vs_cache import VSItemCache, VSLRUCacheBackend
+        backend = VSLRUCacheBackend()
+        cache = VSItemCache(backend=backend)
+        key = "{0}:{1}/item/VX-1".format(self.fake_host, self.fake_port)
+        with patch("gnmvidispine.vs_item.VSItem.request", side_effect=self._fake_request()) as mock_request:
+            self._item(cache).populate("VX-1")
+            record = list(json.loads(backend.get(key).decode("UTF-8")).values())[0]
+            self.assertEqual(record['name'], "VX-1")
+            self.assertEqual(record['format'], "xml")
+
+            #anything else in the backend is discarded, never unpickled
+            backend.set(key, pickle.dumps({'anything': 'else'}))
+            self._item(cache).populate("VX-1")
+            self.assertEqual(mock_request.call_count, 2)
+
+    def test_no_cache(self):
+        from gnmvidispine.vs_item import VSItem
+        with patch("gnmvidispine.vs_item.VSItem.request", side_effect=self._fake_request()) as mock_request:
+            VSItem(self.fake_host, self.fake_port, self.fake_user, self.fake_passwd).populate("VX-1")
+            VSItem(self.fake_host, self.fake_port, self.fake_user, self.fake_passwd).populate("VX-1")
+            self.assertEqual(mock_request.call_count, 2)
+
+    def test_revalidate_unchanged(self):
+        from gnmvidispine.vs_cache import VSItemCache
+        cache = VSItemCache(ttl=-1)
+        with patch("gnmvidispine.vs_item.VSItem.request", side_effect=self._fake_request("VX-12")) as mock_request:
+            self._item(cache).populate("VX-1")
+            item = self._item(cache)
+            item.populate("VX-1")
+            self.assertEqual(mock_request.call_count, 2)
+            mock_request.assert_called_with("/item/VX-1/metadata/changes")
+            self.assertEqual(item.get("title"), "Test item")
+            self.assertEqual(cache.revalidations, 1)
+
+    def test_revalidate_changed(self):
+        from gnmvidispine.vs_cache import VSItemCache
+        cache = VSItemCache(ttl=-1)
+        with patch("gnmvidispine.vs_item.VSItem.request", side_effect=self._fake_request("VX-13")) as mock_request:
+            self._item(cache).populate("VX-1")
+            self._item(cache).populate("VX-1")
+            self.assertEqual([c[0][0] for c in mock_request.call_args_list],
+                             ["/item/VX-1/metadata", "/item/VX-1/metadata/changes", "/item/VX-1/metadata"])
+            self.assertEqual(cache.revalidations, 0)
+
+    def test_invalidate(self):
+        from gnmvidispine.vs_cache import VSItemCache
+        cache = VSItemCache()
+        with patch("gnmvidispine.vs_item.VSItem.request", side_effect=self._fake_request()) as mock_request:
+            item = self._item(cache).populate("VX-1")
+
+            cache.note_change(item, "VX-1", "VX-12")
+            self._item(cache).populate("VX-1")
+            self.assertEqual(mock_request.call_count, 1)
+
+            cache.note_change(item, "VX-1", "VX-20")
+            self._item(cache).populate("VX-1")
+            self.assertEqual(mock_request.call_count, 2)
+
+            cache.invalidate("VX-1", host=self.fake_host, port=self.fake_port)
+            self._item(cache).populate("VX-1")
+            self.assertEqual(mock_request.call_count, 3)
+
+    def test_collection(self):
+        from gnmvidispine.vs_cache import VSItemCache
+        from gnmvidispine.vs_collection import VSCollection
+        cache = VSItemCache(ttls={'collection': 60})
+        self.assertEqual(cache.ttl_for("collection"), 60)
+        with patch("gnmvidispine.vs_item.VSItem.request", side_effect=self._fake_request()) as mock_request:
+            self._item(cache, VSCollection).populate("VX-5")
+            self.assertEqual(mock_request.call_count, 2)
+            collection = self._item(cache, VSCollection)
+            collection.populate("VX-5")
+            self.assertEqual(mock_request.call_count, 2)
+            self.assertEqual(collection.itemCount, 2)
+            self.assertEqual(collection.type, "collection")
+
+    def test_populate_many(self):
+        from gnmvidispine.vs_cache import VSItemCache
+        from gnmvidispine.vs_item import VSItem
+        cache = VSItemCache()
+        with patch("gnmvidispine.vs_item.VSItem.request", side_effect=self._fake_request()) as mock_request:
+            items = VSItem(self.fake_host, self.fake_port, self.fake_user, self.fake_passwd, cache=cache).populate_many(["VX-1"])
+            self.assertEqual(mock_request.call_count, 1)
+            self.assertEqual(items[0].get("title"), "Test item")
+
+            items = VSItem(self.fake_host, self.fake_port, self.fake_user, self.fake_passwd, cache=cache).populate_many(["VX-1"])
+            self.assertEqual(mock_request.call_count, 1)
+            self.assertEqual(items[0].get("title"), "Test item")
+
+    def test_json(self):
+        from gnmvidispine.vs_cache import VSItemCache
+        from gnmvidispine.vs_item import VSItem
+        doc = {"item": [{"id": "VX-1", "metadata": {"revision": "VX-3,VX-12", "timespan": [
+            {"start": "-INF", "end": "+INF", "field": [{"name": "title", "value": [{"value": "Test item"}]}]}]}}]}
+        self.assertEqual(VSItemCache.document_changeset(doc), "VX-12")
+
+        cache = VSItemCache(backend=None)
+        with patch("gnmvidispine.vs_item.VSItem.request", return_value=json.loads(json.dumps(doc))) as mock_request:
+            VSItem(self.fake_host, self.fake_port, self.fake_user, self.fake_passwd, transport="json", cache=cache).populate("VX-1")
+            item = VSItem(self.fake_host, self.fake_port, self.fake_user, self.fake_passwd, transport="json", cache=cache)
+            item.populate("VX-1")
+            self.assertEqual(mock_request.call_count, 1)
+            self.assertEqual(item.get("title"), "Test item")
+            self.assertEqual(item.dataContent, doc)
+
+    def test_latest_changeset(self):
+        from gnmvidispine.vs_cache import latest_changeset, VSItemCache
+        self.assertEqual(latest_changeset(["VX-9", "VX-10", " VX-2"]), "VX-10")
+        self.assertIsNone(latest_changeset(["", None]))
+        self.assertEqual(VSItemCache.document_changeset(ET.fromstring(self.item_xml)), "VX-12")
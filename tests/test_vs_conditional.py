@@ -0,0 +1,122 @@
+# *-* coding: UTF-8 --*
+import unittest2
+from mock import MagicMock
+import http.client
+
+
+class TestVSConditionalCache(unittest2.TestCase):
+    fake_user = 'username'
+    fake_passwd = 'password'
+
+    sample_xml = """<?xml version="1.0"?>
+<StorageDocument xmlns="http://xml.vidispine.com/schema/vidispine"><id>VX-1</id><state>READY</state></StorageDocument>"""
+
+    class MockedResponse(object):
+        def __init__(self, status_code, content, headers=None, reason=""):
+            self.status = status_code
+            self.body = content
+            self.reason = reason
+            self.headers = headers if headers is not None else []
+
+        def read(self):
+            return self.body
+
+        def getheaders(self):
+            return self.headers
+
+    def _api(self, responses, cache):
+        from gnmvidispine.vidispine_api import VSApi
+        conn = http.client.HTTPConnection(host='localhost', port=8080)
+        conn.request = MagicMock()
+        conn.getresponse = MagicMock(side_effect=responses)
+        return VSApi(user=self.fake_user, passwd=self.fake_passwd, conn=conn, conditional_cache=cache), conn
+
+    def test_not_modified(self):
+        from gnmvidispine.vs_conditional import VSConditionalCache
+        cache = VSConditionalCache()
+        api, conn = self._api([self.MockedResponse(200, self.sample_xml, [('ETag', '"abc"'), ('Last-Modified', 'Tue, 01 May 2018 10:00:00 GMT')]),
+                               self.MockedResponse(304, b"")], cache)
+
+        first = api.request("/storage/VX-1")
+        headers = conn.request.call_args[0][3]
+        self.assertNotIn('If-None-Match', headers)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+        second = api.request("/storage/VX-1")
+        headers = conn.request.call_args[0][3]
+        self.assertEqual(headers['If-None-Match'], '"abc"')
+        self.assertEqual(headers['If-Modified-Since'], 'Tue, 01 May 2018 10:00:00 GMT')
+        self.assertEqual(second.find("{http://xml.vidispine.com/schema/vidispine}state").text, "READY")
+        self.assertIsNot(second, first)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_modified(self):
+        from gnmvidispine.vs_conditional import VSConditionalCache
+        cache = VSConditionalCache()
+        changed = self.sample_xml.replace("READY", "OFFLINE")
+        api, conn = self._api([self.MockedResponse(200, self.sample_xml, [('ETag', '"abc"')]),
+                               self.MockedResponse(200, changed, [('ETag', '"def"')])], cache)
+        api.request("/storage/VX-1")
+        result = api.request("/storage/VX-1")
+        self.assertEqual(result.find("{http://xml.vidispine.com/schema/vidispine}state").text, "OFFLINE")
+        self.assertEqual(cache.validators(cache.make_key(api, "/API/storage/VX-1", "application/xml")),
+                         {'If-None-Match': '"def"'})
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+    def test_no_validators(self):
+        from gnmvidispine.vs_conditional import VSConditionalCache
+        cache = VSConditionalCache()
+        api, conn = self._api([self.MockedResponse(200, self.sample_xml), self.MockedResponse(200, self.sample_xml)], cache)
+        api.request("/storage/VX-1")
+        api.request("/storage/VX-1")
+        self.assertNotIn('If-None-Match', conn.request.call_args[0][3])
+        self.assertEqual(len(cache), 0)
+
+    def test_write_discards(self):
+        from gnmvidispine.vs_conditional import VSConditionalCache
+        cache = VSConditionalCache()
+        api, conn = self._api([self.MockedResponse(200, self.sample_xml, [('ETag', '"abc"')]),
+                               self.MockedResponse(200, self.sample_xml, [('ETag', '"abc"')]),
+                               self.MockedResponse(200, b""),
+                               self.MockedResponse(200, self.sample_xml, [('ETag', '"abc"')])], cache)
+        api.request("/storage/VX-1")
+        api.request("/storage/VX-10")
+        #writing beneath /storage/VX-1 changes its document, but not that of VX-10
+        api.request("/storage/VX-1/metadata", method="PUT", body="<SimpleMetadataDocument/>")
+        self.assertEqual(len(cache), 1)
+        api.request("/storage/VX-1")
+        self.assertNotIn('If-None-Match', conn.request.call_args[0][3])
+
+    def test_bounded(self):
+        from gnmvidispine.vs_conditional import VSConditionalCache
+        cache = VSConditionalCache(maxsize=2)
+        api, conn = self._api([self.MockedResponse(200, self.sample_xml, [('ETag', '"{0}"'.format(n))]) for n in range(3)], cache)
+        for n in range(3):
+            api.request("/storage/VX-{0}".format(n))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.validators(cache.make_key(api, "/API/storage/VX-0", "application/xml")), {})
+
+    def test_evicted_before_304(self):
+        from gnmvidispine.vs_conditional import VSConditionalCache
+        cache = VSConditionalCache()
+        api, conn = self._api([self.MockedResponse(200, self.sample_xml, [('ETag', '"abc"')]),
+                               self.MockedResponse(304, b""),
+                               self.MockedResponse(200, self.sample_xml, [('ETag', '"abc"')])], cache)
+        api.request("/storage/VX-1")
+        cache.validators = MagicMock(return_value={'If-None-Match': '"abc"'})
+        cache.clear()
+        result = api.request("/storage/VX-1")
+        self.assertEqual(conn.request.call_count, 3)
+        self.assertNotIn('If-None-Match', conn.request.call_args[0][3])
+        self.assertEqual(result.find("{http://xml.vidispine.com/schema/vidispine}id").text, "VX-1")
+
+    def test_json(self):
+        from gnmvidispine.vs_conditional import VSConditionalCache
+        cache = VSConditionalCache()
+        api, conn = self._api([self.MockedResponse(200, b'{"id": "VX-1"}', [('ETag', '"abc"')]),
+                               self.MockedResponse(304, b"")], cache)
+        api.request("/storage/VX-1", accept="application/json")
+        result = api.request("/storage/VX-1", accept="application/json")
+        self.assertEqual(result, {"id": "VX-1"})
+        self.assertEqual(cache.hits, 1)
@@ -0,0 +1,214 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+from mock import MagicMock, patch
+import threading
+
+
+class TestVSConnectionPool(unittest2.TestCase):
+    fake_host = 'localhost'
+    fake_port = 8080
+    fake_user = 'username'
+    fake_passwd = 'password'
+
+    sample_returned_xml = """<?xml version="1.0"?>
+        <root xmlns="http://xml.vidispine.com/schema/vidispine">
+          <element>string</element>
+        </root>"""
+
+    class MockedResponse(object):
+        def __init__(self, status_code, content, reason=""):
+            self.status = status_code
+            self.body = content
+            self.reason = reason
+
+        def read(self):
+            return self.body
+
+    def tearDown(self):
+        from gnmvidispine.vs_connection_pool import register_pool
+        register_pool(None, self.fake_host, self.fake_port, self.fake_user, self.fake_passwd)
+
+    def test_reuse(self):
+        """
+        a released connection should be handed out again rather than a new one being made
+        """
+        from gnmvidispine.vs_connection_pool import VSConnectionPool
+        p = VSConnectionPool(maxsize=2)
+        key = VSConnectionPool.make_key(self.fake_host, self.fake_port, False, self.fake_user, self.fake_passwd)
+
+        conn = p.acquire(key)
+        p.release(key, conn)
+        self.assertEqual(p.idle_count(key), 1)
+        self.assertEqual(p.acquire(key), conn)
+        self.assertEqual(p.created, 1)
+        self.assertEqual(p.reused, 1)
+
+    def test_keys(self):
+        """
+        connections for different credentials or schemes must not be shared
+        """
+        from gnmvidispine.vs_connection_pool import VSConnectionPool
+        import http.client
+        p = VSConnectionPool()
+        key_one = VSConnectionPool.make_key(self.fake_host, self.fake_port, False, self.fake_user, self.fake_passwd)
+        key_two = VSConnectionPool.make_key(self.fake_host, "8080", True, self.fake_user, self.fake_passwd)
+        key_three = VSConnectionPool.make_key(self.fake_host, self.fake_port, False, "otheruser", self.fake_passwd)
+
+        conn = p.acquire(key_one)
+        p.release(key_one, conn)
+        self.assertNotEqual(p.acquire(key_two), conn)
+        self.assertIsInstance(p.acquire(key_two), http.client.HTTPSConnection)
+        self.assertNotEqual(p.acquire(key_three), conn)
+
+    def test_bounded_idle(self):
+        """
+        connections returned beyond maxsize should be closed rather than kept
+        """
+        from gnmvidispine.vs_connection_pool import VSConnectionPool
+        p = VSConnectionPool(maxsize=1)
+        key = VSConnectionPool.make_key(self.fake_host, self.fake_port, False, self.fake_user, self.fake_passwd)
+
+        conn_one = p.acquire(key)
+        conn_two = p.acquire(key)
+        conn_two.close = MagicMock()
+        p.release(key, conn_one)
+        p.release(key, conn_two)
+        self.assertEqual(p.idle_count(key), 1)
+        conn_two.close.assert_called_once_with()
+
+    def test_block_timeout(self):
+        """
+        a blocking pool should not hand out more than maxsize connections at once
+        """
+        from gnmvidispine.vs_connection_pool import VSConnectionPool, PoolTimeout
+        p = VSConnectionPool(maxsize=1, block=True, timeout=0.01)
+        key = VSConnectionPool.make_key(self.fake_host, self.fake_port, False, self.fake_user, self.fake_passwd)
+
+        conn = p.acquire(key)
+        with self.assertRaises(PoolTimeout):
+            p.acquire(key)
+        p.release(key, conn)
+        self.assertEqual(p.acquire(key), conn)
+
+    def test_threaded(self):
+        """
+        many threads acquiring and releasing should never share a connection at the same time
+        """
+        from gnmvidispine.vs_connection_pool import VSConnectionPool
+        p = VSConnectionPool(maxsize=4, block=True)
+        key = VSConnectionPool.make_key(self.fake_host, self.fake_port, False, self.fake_user, self.fake_passwd)
+        in_use = set()
+        lock = threading.Lock()
+        errors = []
+
+        def worker():
+            for n in range(0, 200):
+                conn = p.acquire(key)
+                with lock:
+                    if id(conn) in in_use:
+                        errors.append(conn)
+                    in_use.add(id(conn))
+                with lock:
+                    in_use.discard(id(conn))
+                p.release(key, conn)
+
+        threads = [threading.Thread(target=worker) for n in range(0, 8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        self.assertLessEqual(p.created, 4)
+
+    def test_inherited(self):
+        """
+        objects created for the same server and user as a pooled object should use the same pool
+        """
+        from gnmvidispine.vs_connection_pool import VSConnectionPool
+        from gnmvidispine.vidispine_api import VSApi
+        from gnmvidispine.vs_item import VSItem
+        p = VSConnectionPool()
+
+        parent = VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd, pool=p)
+        self.assertEqual(parent._pool, p)
+        self.assertIsNone(parent._conn)
+
+        child = VSItem(self.fake_host, self.fake_port, self.fake_user, self.fake_passwd)
+        self.assertEqual(child._pool, p)
+
+        other = VSItem(self.fake_host, self.fake_port, "otheruser", self.fake_passwd)
+        self.assertIsNone(other._pool)
+
+    def test_scheme(self):
+        """
+        an object that asks for https must not pick up a pool registered for http, and vice versa
+        """
+        from gnmvidispine.vs_connection_pool import VSConnectionPool
+        from gnmvidispine.vidispine_api import VSApi
+        import http.client
+        p = VSConnectionPool()
+        VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd, pool=p)
+
+        secure = VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd, https=True)
+        self.assertIsNone(secure._pool)
+        self.assertIsInstance(secure._conn, http.client.HTTPSConnection)
+        secure.reset_http()
+        self.assertIsInstance(secure._conn, http.client.HTTPSConnection)
+
+        secure_pool = VSConnectionPool()
+        VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd, pool=secure_pool,
+              https=True)
+        child = VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        self.assertEqual((child._pool, child.https), (secure_pool, True))
+        plain = VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd, https=False)
+        self.assertEqual((plain._pool, plain.https), (p, False))
+
+    def test_request_releases(self):
+        """
+        a pooled request should send on a pooled connection and hand it back once the body has been read
+        """
+        from gnmvidispine.vs_connection_pool import VSConnectionPool
+        from gnmvidispine.vidispine_api import VSApi
+        p = VSConnectionPool()
+        key = VSConnectionPool.make_key(self.fake_host, self.fake_port, False, self.fake_user, self.fake_passwd)
+
+        conn = p.acquire(key)
+        conn.request = MagicMock()
+        conn.getresponse = MagicMock(return_value=self.MockedResponse(200, self.sample_returned_xml))
+        p.release(key, conn)
+
+        api = VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd, pool=p)
+        parsed_xml = api.request("/path/to/endpoint")
+        self.assertEqual(parsed_xml.find('{http://xml.vidispine.com/schema/vidispine}element').text, "string")
+        conn.request.assert_called_once()
+        self.assertEqual(p.idle_count(key), 1)
+
+        api.request("/path/to/endpoint")
+        self.assertEqual(conn.request.call_count, 2)
+        self.assertEqual(p.created, 1)
+
+    def test_stale_connection(self):
+        """
+        if an idle pooled connection has been closed by the server, the request should be retried on a new connection
+        """
+        from gnmvidispine.vs_connection_pool import VSConnectionPool
+        from gnmvidispine.vidispine_api import VSApi
+        import http.client
+        p = VSConnectionPool()
+        key = VSConnectionPool.make_key(self.fake_host, self.fake_port, False, self.fake_user, self.fake_passwd)
+
+        stale_conn = p.acquire(key)
+        stale_conn.request = MagicMock()
+        stale_conn.getresponse = MagicMock(side_effect=http.client.RemoteDisconnected("closed"))
+        p.release(key, stale_conn)
+
+        fresh_conn = MagicMock()
+        fresh_conn.getresponse = MagicMock(return_value=self.MockedResponse(200, self.sample_returned_xml))
+        with patch('http.client.HTTPConnection', return_value=fresh_conn):
+            api = VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd, pool=p)
+            api.request("/path/to/endpoint")
+
+        fresh_conn.request.assert_called_once()
+        self.assertEqual(p.discarded, 1)
+        self.assertEqual(p.idle_count(key), 1)
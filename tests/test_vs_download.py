@@ -0,0 +1,274 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+from mock import patch
+
+
+class TestVSRangedDownload(unittest2.TestCase):
+    fake_host = 'localhost'
+    fake_port = 8080
+    fake_user = 'username'
+    fake_passwd = 'password'
+
+    class FakeResponse(object):
+        def __init__(self, status, content, reason="OK"):
+            self.status = status
+            self.reason = reason
+            self._body = io.BytesIO(content)
+
+        def read(self):
+            return self._body.read()
+
+        def readinto(self, b):
+            return self._body.readinto(b)
+
+        def close(self):
+            pass
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.destination = os.path.join(self.tmpdir, "media.dat")
+        self.content = bytes(bytearray([n % 253 for n in range(0, 100000)]))
+        self.sha1 = hashlib.sha1(self.content).hexdigest()
+
+    def tearDown(self):
+        for name in os.listdir(self.tmpdir):
+            os.unlink(os.path.join(self.tmpdir, name))
+        os.rmdir(self.tmpdir)
+
+    def _connection(self):
+        from gnmvidispine.vidispine_api import VSApi
+        return VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+
+    def _fake_server(self, requested, ranges=True, fail_at=None):
+        """
+        returns a sendAuthorized() replacement serving self.content, recording the ranges requested.  If fail_at is
+        given, the request for the range starting there fails with a 403.
+        """
+        lock = threading.Lock()
+
+        def sendAuthorized(method, url, body, headers, rawData=False):
+            m = re.match(r'^bytes=(\d+)-(\d+)$', headers.get('Range', ''))
+            if m is None or not ranges:
+                with lock:
+                    requested.append(None)
+                return self.FakeResponse(200, self.content)
+            start, end = int(m.group(1)), int(m.group(2))+1
+            with lock:
+                requested.append(start)
+            if fail_at is not None and start == fail_at:
+                return self.FakeResponse(403, b"", reason="Forbidden")
+            return self.FakeResponse(206, self.content[start:end], reason="Partial Content")
+        return sendAuthorized
+
+    def _read_destination(self):
+        with open(self.destination, "rb") as f:
+            return f.read()
+
+    def test_parallel(self):
+        from gnmvidispine.vs_download import VSRangedDownload
+        requested = []
+        progress = []
+        with patch("gnmvidispine.vs_download.VSApi.sendAuthorized", side_effect=self._fake_server(requested)):
+            download = VSRangedDownload(self._connection(), "VX-1", self.destination, size="100000",
+                                        expected_hash=self.sha1, threads=4, chunk_size=7000,
+                                        progress=lambda done, total, rate: progress.append((done, total)))
+            self.assertEqual(download.run(), self.destination)
+        self.assertEqual(sorted(requested), list(range(0, 100000, 7000)))
+        self.assertEqual(self._read_destination(), self.content)
+        self.assertEqual(download.hash, self.sha1)
+        self.assertEqual(download.bytes_done, 100000)
+        self.assertEqual(download.ranges_fetched, 15)
+        self.assertEqual(len(progress), 15)
+        self.assertEqual(max(progress), (100000, 100000))
+
+    def test_sender_settings(self):
+        import http.client
+        from gnmvidispine.vidispine_api import VSApi
+        from gnmvidispine.vs_download import VSRangedDownload
+        from gnmvidispine.vs_retry import VSRetryPolicy
+        policy = VSRetryPolicy()
+        connection = VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd,
+                           https=True, retry_policy=policy)
+        sender = VSRangedDownload(connection, "VX-1", self.destination, size=len(self.content))._sender()
+        self.assertIsInstance(sender._conn, http.client.HTTPSConnection)
+        self.assertIs(sender.retry_policy, policy)
+
+    def test_hash_mismatch(self):
+        from gnmvidispine.vs_download import VSRangedDownload, VSHashMismatch
+        with patch("gnmvidispine.vs_download.VSApi.sendAuthorized", side_effect=self._fake_server([])):
+            download = VSRangedDownload(self._connection(), "VX-1", self.destination, size=100000,
+                                        expected_hash="0"*40, chunk_size=30000)
+            with self.assertRaises(VSHashMismatch) as cm:
+                download.run()
+        self.assertEqual(cm.exception.actual, self.sha1)
+
+    def test_resume(self):
+        from gnmvidispine.vs_download import VSRangedDownload
+        from gnmvidispine.vidispine_api import HTTPError
+        journal = os.path.join(self.tmpdir, "media.dat.download")
+        first = []
+        with patch("gnmvidispine.vs_download.VSApi.sendAuthorized",
+                   side_effect=self._fake_server(first, fail_at=40000)):
+            with self.assertRaises(HTTPError):
+                VSRangedDownload(self._connection(), "VX-1", self.destination, size=100000, expected_hash=self.sha1,
+                                 threads=1, chunk_size=10000, journal=journal).run()
+        self.assertTrue(os.path.exists(journal))
+        self.assertEqual(first, [0, 10000, 20000, 30000, 40000])
+
+        second = []
+        with patch("gnmvidispine.vs_download.VSApi.sendAuthorized", side_effect=self._fake_server(second)):
+            download = VSRangedDownload(self._connection(), "VX-1", self.destination, size=100000,
+                                        expected_hash=self.sha1, threads=2, chunk_size=10000, journal=journal)
+            download.run()
+        self.assertEqual(sorted(second), list(range(40000, 100000, 10000)))
+        self.assertEqual(self._read_destination(), self.content)
+        self.assertFalse(os.path.exists(journal))
+
+    def test_no_ranges(self):
+        from gnmvidispine.vs_download import VSRangedDownload
+        requested = []
+        with patch("gnmvidispine.vs_download.VSApi.sendAuthorized",
+                   side_effect=self._fake_server(requested, ranges=False)):
+            download = VSRangedDownload(self._connection(), "VX-1", self.destination, size=100000,
+                                        expected_hash=self.sha1, threads=1, chunk_size=10000)
+            download.run()
+        self.assertEqual(requested, [None, None])
+        self.assertEqual(self._read_destination(), self.content)
+
+    def test_unknown_size(self):
+        from gnmvidispine.vs_download import VSRangedDownload
+        requested = []
+        with patch("gnmvidispine.vs_download.VSApi.sendAuthorized", side_effect=self._fake_server(requested)):
+            download = VSRangedDownload(self._connection(), "VX-1", self.destination, expected_hash=self.sha1)
+            download.run()
+        self.assertEqual(requested, [None])
+        self.assertEqual(self._read_destination(), self.content)
+        self.assertEqual(download.bytes_done, 100000)
+
+    def test_empty(self):
+        from gnmvidispine.vs_download import VSRangedDownload
+        self.content = b""
+        with patch("gnmvidispine.vs_download.VSApi.sendAuthorized", side_effect=self._fake_server([])):
+            VSRangedDownload(self._connection(), "VX-1", self.destination, size=0,
+                             expected_hash=hashlib.sha1(b"").hexdigest()).run()
+        self.assertEqual(self._read_destination(), b"")
+
+    def test_shape(self):
+        from gnmvidispine.vs_shape import VSShape
+        import xml.etree.ElementTree as ET
+        shape = VSShape(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        shape.dataContent = ET.fromstring("""<ShapeDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+            <id>VX-10</id><containerComponent><file><id>VX-1</id><storage>VX-2</storage><size>100000</size>
+            <hash>{0}</hash></file></containerComponent></ShapeDocument>""".format(self.sha1))
+        requested = []
+        with patch("gnmvidispine.vs_download.VSApi.sendAuthorized", side_effect=self._fake_server(requested)):
+            download = shape.download_parallel(self.destination, chunk_size=50000)
+        self.assertEqual(download.file_id, "VX-1")
+        self.assertEqual(sorted(requested), [0, 50000])
+        self.assertEqual(self._read_destination(), self.content)
+
+
+class TestDownloadTo(unittest2.TestCase):
+    fake_host = 'localhost'
+    fake_port = 8080
+    fake_user = 'username'
+    fake_passwd = 'password'
+
+    content = bytes(bytearray([n % 249 for n in range(0, 50000)]))
+
+    file_doc = """<FileDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+        <id>VX-1</id><path>media.dat</path><state>CLOSED</state><size>50000</size><hash>{0}</hash>
+        <storage>VX-2</storage></FileDocument>"""
+
+    class ReadOnlyResponse(object):
+        """
+        a response without readinto()
+        """
+        def __init__(self, content):
+            self.status = 200
+            self._body = io.BytesIO(content)
+            self.closed = False
+
+        def read(self, amt=None):
+            return self._body.read(amt)
+
+        def close(self):
+            self.closed = True
+
+    class CountingSink(object):
+        def __init__(self):
+            self.data = bytearray()
+            self.largest = 0
+
+        def write(self, b):
+            self.largest = max(self.largest, len(b))
+            self.data += b
+
+    def test_copy_response(self):
+        from gnmvidispine.vs_download import copy_response
+        sink = self.CountingSink()
+        progress = []
+        nbytes, digest = copy_response(TestVSRangedDownload.FakeResponse(200, self.content), sink, buffer_size=4096,
+                                       hash_algorithm="md5", progress=progress.append)
+        self.assertEqual(nbytes, 50000)
+        self.assertEqual(digest, hashlib.md5(self.content).hexdigest())
+        self.assertEqual(bytes(sink.data), self.content)
+        self.assertEqual(sink.largest, 4096)
+        self.assertEqual(sum(progress), 50000)
+
+    def test_copy_read_only(self):
+        from gnmvidispine.vs_download import copy_response
+        sink = io.BytesIO()
+        nbytes, digest = copy_response(self.ReadOnlyResponse(self.content), sink, buffer_size=3000)
+        self.assertEqual(sink.getvalue(), self.content)
+        self.assertIsNone(digest)
+
+    def _file(self, file_hash):
+        from gnmvidispine.vs_storage import VSFile, VSStorage
+        import xml.etree.ElementTree as ET
+        s = VSStorage(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        return VSFile(parent_storage=s, parsed_data=ET.fromstring(self.file_doc.format(file_hash)))
+
+    def test_file_download_to(self):
+        sha1 = hashlib.sha1(self.content).hexdigest()
+        response = self.ReadOnlyResponse(self.content)
+        with patch("gnmvidispine.vs_storage.VSStorage.sendAuthorized", return_value=response) as mock_send:
+            sink = io.BytesIO()
+            self.assertEqual(self._file(sha1.upper()).download_to(sink, buffer_size=1024), sha1)
+        mock_send.assert_called_once_with('GET', '/API/storage/file/VX-1/data', '', {'Accept': '*'})
+        self.assertEqual(sink.getvalue(), self.content)
+        self.assertTrue(response.closed)
+
+    def test_file_download_to_mismatch(self):
+        from gnmvidispine.vs_download import VSHashMismatch
+        with patch("gnmvidispine.vs_storage.VSStorage.sendAuthorized",
+                   return_value=self.ReadOnlyResponse(self.content)):
+            with self.assertRaises(VSHashMismatch):
+                self._file("0"*40).download_to(io.BytesIO())
+        with patch("gnmvidispine.vs_storage.VSStorage.sendAuthorized",
+                   return_value=self.ReadOnlyResponse(self.content)):
+            self._file("0"*40).download_to(io.BytesIO(), verify=False)
+
+    def test_shape_download_to(self):
+        from gnmvidispine.vs_shape import VSShape
+        import xml.etree.ElementTree as ET
+        tmpdir = tempfile.mkdtemp()
+        destination = os.path.join(tmpdir, "media.dat")
+        shape = VSShape(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        shape.dataContent = ET.fromstring("""<ShapeDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+            <id>VX-10</id><containerComponent><file><id>VX-1</id><storage>VX-2</storage><size>50000</size>
+            <hash>{0}</hash></file></containerComponent></ShapeDocument>""".format(hashlib.sha1(self.content).hexdigest()))
+        try:
+            with patch("gnmvidispine.vs_shape.VSShape.sendAuthorized", return_value=self.ReadOnlyResponse(self.content)):
+                shape.download_to(destination)
+            with open(destination, "rb") as f:
+                self.assertEqual(f.read(), self.content)
+        finally:
+            os.unlink(destination)
+            os.rmdir(tmpdir)
@@ -0,0 +1,247 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+import hashlib
+import io
+import os
+import tempfile
+from mock import patch
+
+
+class TestVSFakeServer(unittest2.TestCase):
+    """
+    runs the library against the fake server over real HTTP connections
+    """
+    @classmethod
+    def setUpClass(cls):
+        from gnmvidispine.vs_fake_server import VSFakeServer
+        cls.server = VSFakeServer(items=250, files=230, jobs=120, fields=5, file_size=300000).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def _kwargs(self):
+        return dict(host=self.server.host, port=self.server.port, user="admin", passwd="admin")
+
+    def test_populate(self):
+        from gnmvidispine.vs_item import VSItem
+        item = VSItem(**self._kwargs())
+        item.populate("VX-10")
+        self.assertEqual(item.name, "VX-10")
+        self.assertEqual(item.get("field_1"), "value 1 of item 10")
+        self.assertEqual(item.get("asset_field_4"), "value 4 of item 10")
+
+        item = VSItem(**self._kwargs())
+        item.populate("VX-11", specificFields=["field_2"])
+        self.assertEqual(item.get("field_2"), "value 2 of item 11")
+        self.assertIsNone(item.get("field_1"))
+
+    def test_search(self):
+        from gnmvidispine.vs_search import VSItemSearch
+        search = VSItemSearch(**self._kwargs())
+        search.addCriterion({'title': 'anything'})
+        result = search.execute()
+        self.assertEqual(result.totalItems, 250)
+        names = [i.name for i in result.results(shouldPopulate=False)]
+        self.assertEqual(names, ["VX-{0}".format(n) for n in range(1, 251)])
+
+        titles = [i.get("field_0") for i in search.execute().results(shouldPopulate=True)]
+        self.assertEqual(titles[-1], "value 0 of item 250")
+
+    def test_search_content(self):
+        from gnmvidispine.vs_search import VSItemSearch
+        from gnmvidispine.vs_item import VSItem
+        search = VSItemSearch(**self._kwargs())
+        search.addCriterion({'title': 'anything'})
+        search.pageSize = 20
+        search.setContent(["metadata", "shape", "thumbnail"], fields=["field_1"])
+
+        before = sum(self.server.requests.values())
+        items = list(search.execute().results())
+        self.assertEqual(len(items), 250)
+        item = items[9]
+        self.assertEqual(item.get("field_1"), "value 1 of item 10")
+        self.assertIsNone(item.get("field_2"))
+        self.assertEqual([s.tag() for s in item.shapes()], ["original", "lowres"])
+        self.assertEqual(list(item.get_shape("lowres").fileURIs()), ["file:///srv/media/media_10_lowres.mxf"])
+        self.assertEqual(item.thumbnails().count(), 3)
+        #one request per page of results, and none for the items themselves
+        self.assertEqual(sum(self.server.requests.values()) - before, 13)
+
+        #the same as loading each part separately
+        separate = VSItem(**self._kwargs())
+        separate.populate("VX-10")
+        self.assertEqual([s.name for s in separate.shapes()], [s.name for s in item.shapes()])
+        thumbnails = separate.thumbnails()
+        self.assertEqual(thumbnails.count(), 3)
+        self.assertEqual(thumbnails.thumbnail_urls, item.thumbnails().thumbnail_urls)
+
+    def test_files(self):
+        from gnmvidispine.vs_storage import VSStorage
+        storage = VSStorage(**self._kwargs())
+        storage.populate("VX-1")
+        files = list(storage.files())
+        self.assertEqual(len(files), 230)
+        self.assertEqual(files[0].memberOfItem.name, "VX-1")
+        self.assertEqual(storage.file_count(), 230)
+        self.assertEqual(len(set([f.name for f in storage.files_parallel(pageSize=50, threads=3)])), 230)
+
+    def test_find_jobs(self):
+        from gnmvidispine.vs_job import VSFindJobs
+        from gnmvidispine.vidispine_api import VSApi
+        jobs = list(VSFindJobs(connection=VSApi(**self._kwargs())))
+        self.assertEqual(len(jobs), 120)
+        self.assertEqual(jobs[0].name, "VX-1")
+        self.assertEqual(jobs[0].status(), "FINISHED")
+
+    def test_find_jobs_listing(self):
+        from gnmvidispine.vs_job import VSFindJobs
+        from gnmvidispine.vidispine_api import VSApi
+        connection = VSApi(**self._kwargs())
+        for prefetch in (True, False):
+            before = self.server.requests[("GET", "/API/job/{id}")]
+            listings = self.server.requests[("GET", "/API/job")]
+            jobs = list(VSFindJobs(connection=connection, pageSize=25, prefetch=prefetch))
+            self.assertEqual([j.name for j in jobs], ["VX-{0}".format(n) for n in range(1, 121)])
+            self.assertEqual(jobs[2].status(), "STARTED")
+            self.assertEqual(jobs[0].contentDict['itemId'], "VX-2")
+            self.assertIsNotNone(jobs[0].started())
+            #jobs come from the listing, five pages of 25, with no request for each job
+            self.assertEqual(self.server.requests[("GET", "/API/job/{id}")], before)
+            self.assertEqual(self.server.requests[("GET", "/API/job")] - listings, 5)
+
+        before = self.server.requests[("GET", "/API/job/{id}")]
+        deep = list(VSFindJobs(connection=connection, pageSize=50, deep=True))
+        self.assertEqual(self.server.requests[("GET", "/API/job/{id}")] - before, 120)
+        self.assertEqual([j.contentDict for j in deep], [j.contentDict for j in jobs])
+
+    def test_find_jobs_settings(self):
+        import http.client
+        from gnmvidispine.vs_job import VSFindJobs
+        from gnmvidispine.vidispine_api import VSApi
+        from gnmvidispine.vs_governor import VSRequestGovernor
+        governor = VSRequestGovernor()
+        connection = VSApi(https=True, governor=governor, **self._kwargs())
+        fetchers = []
+
+        def request_document(fetcher, path, **kwargs):
+            fetchers.append(fetcher)
+            return {'hits': 0}
+
+        #the prefetching connection must keep the caller's scheme, rather than sending credentials over plain http
+        with patch.object(VSApi, '_request_document', request_document):
+            self.assertEqual(list(VSFindJobs(connection=connection)), [])
+        self.assertEqual(len(fetchers), 1)
+        self.assertIsNot(fetchers[0], connection)
+        self.assertIsInstance(fetchers[0]._conn, http.client.HTTPSConnection)
+        self.assertIs(fetchers[0].governor, governor)
+
+    def test_job_set(self):
+        from gnmvidispine.vs_job import VSJobSet, VSJob
+        from gnmvidispine.vidispine_api import VSApi, VSNotFound
+        connection = VSApi(**self._kwargs())
+        job_set = VSJobSet(connection, ["VX-3", "VX-9", "VX-15", "VX-1", "VX-999"], pageSize=10)
+
+        def requests():
+            return self.server.requests[("GET", "/API/job")], self.server.requests[("GET", "/API/job/{id}")]
+
+        try:
+            #20 of the jobs are running, so two pages of the listing to find that VX-1 is not among them
+            before = requests()
+            changed = job_set.update()
+            self.assertEqual([j.name for j in changed], ["VX-3", "VX-9", "VX-15", "VX-1"])
+            self.assertEqual(job_set["VX-1"].status(), "FINISHED")
+            self.assertEqual(job_set["VX-3"].status(), "STARTED")
+            self.assertEqual(job_set["VX-9"].contentDict['transcodeProgress'], 100)
+            self.assertIsInstance(job_set.errors["VX-999"], VSNotFound)
+            self.assertNotIn("VX-999", job_set)
+            self.assertEqual(len(job_set), 4)
+            after = requests()
+            self.assertEqual((after[0] - before[0], after[1] - before[1]), (2, 2))
+
+            #nothing has changed, and the running jobs are all on the first page
+            before = after
+            self.assertEqual(job_set.update(), [])
+            after = requests()
+            self.assertEqual((after[0] - before[0], after[1] - before[1]), (1, 0))
+
+            self.server.set_job_status("VX-9", "FINISHED")
+            self.assertEqual([j.name for j in job_set.update()], ["VX-9"])
+            self.assertEqual(job_set["VX-9"].status(), "FINISHED")
+            self.assertFalse(job_set.finished())
+            self.assertEqual([j.name for j in job_set.pending()], ["VX-3", "VX-15"])
+
+            jobs = [job_set["VX-3"], job_set["VX-15"]]
+            self.server.set_job_status("VX-15", "ABORTED")
+            self.assertEqual(VSJob.update_many(jobs), [jobs[1]])
+            self.assertEqual(jobs[1].status(), "ABORTED")
+        finally:
+            self.server.job_statuses.clear()
+
+    def test_job_watcher_bulk(self):
+        from gnmvidispine.vs_job_watcher import VSJobWatcher
+        from gnmvidispine.vidispine_api import VSApi
+        watcher = VSJobWatcher(VSApi(**self._kwargs()), min_interval=0.01, max_interval=0.05, bulk_threshold=2)
+        before = self.server.requests[("GET", "/API/job")]
+        try:
+            running = [watcher.watch("VX-3"), watcher.watch("VX-9")]
+            self.assertEqual(watcher.wait("VX-4", timeout=5).status(), "FAILED_TOTAL")
+            self.assertFalse(any([f.done() for f in running]))
+            self.server.set_job_status("VX-3", "FINISHED")
+            self.server.set_job_status("VX-9", "FINISHED")
+            self.assertEqual([f.result(5).status() for f in running], ["FINISHED", "FINISHED"])
+        finally:
+            self.server.job_statuses.clear()
+        self.assertGreater(self.server.requests[("GET", "/API/job")], before)
+        self.assertEqual(len(watcher), 0)
+
+    def test_upload(self):
+        from gnmvidispine.vs_item import VSItem
+        content = os.urandom(200000)
+        tmpdir = tempfile.mkdtemp()
+        filename = os.path.join(tmpdir, "upload.dat")
+        try:
+            with open(filename, "wb") as f:
+                f.write(content)
+            item = VSItem(**self._kwargs())
+            item.name = "VX-7"
+            item.streaming_import_to_shape(filename, threads=3, chunk_size=30000)
+        finally:
+            os.unlink(filename)
+            os.rmdir(tmpdir)
+        self.assertEqual(self.server.uploads["VX-7"], content)
+
+    def test_download(self):
+        from gnmvidispine.vs_storage import VSStorage
+        storage = VSStorage(**self._kwargs())
+        storage.populate("VX-1")
+        f = next(storage.files())
+
+        sink = io.BytesIO()
+        self.assertEqual(f.download_to(sink, buffer_size=65536), hashlib.sha1(self.server.file_data).hexdigest())
+        self.assertEqual(sink.getvalue(), self.server.file_data)
+
+        tmpdir = tempfile.mkdtemp()
+        destination = os.path.join(tmpdir, "download.dat")
+        try:
+            download = f.download_parallel(destination, threads=3, chunk_size=50000)
+            self.assertEqual(download.ranges_fetched, 6)
+            with open(destination, "rb") as data:
+                self.assertEqual(data.read(), self.server.file_data)
+        finally:
+            os.unlink(destination)
+            os.rmdir(tmpdir)
+
+    def test_errors(self):
+        from gnmvidispine.vs_item import VSItem
+        from gnmvidispine.vidispine_api import VSApi, VSNotFound
+        with patch.object(VSApi, "retry_delay", 0):
+            with patch("gnmvidispine.vidispine_api.VSApi._gateway_timeout_delay", return_value=0):
+                self.server.fail_next(503)
+                self.server.fail_next(504)
+                item = VSItem(**self._kwargs())
+                item.populate("VX-12")
+                self.assertEqual(item.get("field_0"), "value 0 of item 12")
+
+        with self.assertRaises(VSNotFound):
+            VSItem(**self._kwargs()).populate("VX-999")
@@ -0,0 +1,216 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+import io
+import threading
+import time
+
+
+class TestVSRequestGovernor(unittest2.TestCase):
+    def test_classify(self):
+        from gnmvidispine.vs_governor import VSRequestGovernor
+        classify = VSRequestGovernor.classify
+        self.assertEqual(classify("PUT", "/API/item;first=1;number=100?content=metadata"), "search")
+        self.assertEqual(classify("PUT", "/API/collection"), "search")
+        self.assertEqual(classify("PUT", "/API/item/VX-1/metadata"), "metadata_write")
+        self.assertEqual(classify("POST", "/API/collection/VX-2/metadata;revision=VX-3"), "metadata_write")
+        self.assertEqual(classify("GET", "/API/item/VX-1/metadata"), "default")
+        self.assertEqual(classify("GET", "/API/storage/file/VX-10/data"), "file_data")
+        self.assertEqual(classify("POST", "/API/import/raw?filename=a.mxf"), "file_data")
+        self.assertEqual(classify("GET", "/API/item"), "default")
+
+        governor = VSRequestGovernor(classify=lambda method, url: "search")
+        self.assertEqual(governor.classify("GET", "/API/job"), "search")
+
+    def test_rate(self):
+        from gnmvidispine.vs_governor import VSRequestGovernor, VSLimit
+        governor = VSRequestGovernor(limits={'default': VSLimit(rate=50, burst=2)})
+        started = time.time()
+        for n in range(0, 7):
+            governor.acquire("vshost", 8080, "GET", "/API/item/VX-1").release()
+        #the first two go straight away, then one every 1/50s
+        self.assertGreaterEqual(time.time() - started, 0.09)
+        stats = governor.stats()[("vshost", "8080", "default")]
+        self.assertEqual(stats['requests'], 7)
+        self.assertEqual(stats['in_flight'], 0)
+        self.assertGreater(stats['max_wait'], 0)
+
+        #other classes are not held back, and other hosts have buckets of their own
+        started = time.time()
+        for n in range(0, 5):
+            governor.acquire("vshost", 8080, "PUT", "/API/item").release()
+        for n in range(0, 2):
+            governor.acquire("otherhost", 8080, "GET", "/API/item/VX-1").release()
+        self.assertLess(time.time() - started, 0.015)
+
+    def test_concurrency(self):
+        from gnmvidispine.vs_governor import VSRequestGovernor, VSLimit
+        governor = VSRequestGovernor(limits={'file_data': VSLimit(concurrency=2)}, total=VSLimit(concurrency=3))
+        slots = [governor.acquire("vshost", 8080, "GET", "/API/storage/file/VX-{0}/data".format(n)) for n in (1, 2)]
+        other = governor.acquire("vshost", 8080, "GET", "/API/job")
+
+        acquired = threading.Event()
+        waiter = threading.Thread(target=lambda: (governor.acquire("vshost", 8080, "GET", "/API/storage/file/VX-3/data"),
+                                                  acquired.set()))
+        waiter.start()
+        while governor.queue_depth() == 0:
+            time.sleep(0.005)
+        self.assertFalse(acquired.is_set())
+        self.assertEqual(governor.queue_depth("vshost", 8080), 1)
+        self.assertEqual(governor.queue_depth("otherhost"), 0)
+
+        slots[0].release()
+        slots[0].release()      #releasing twice does nothing
+        self.assertTrue(acquired.wait(5))
+        waiter.join()
+        stats = governor.stats()
+        self.assertEqual(stats[("vshost", "8080", "file_data")]['in_flight'], 2)
+        self.assertEqual(stats[("vshost", "8080", "total")]['in_flight'], 3)
+        other.release()
+
+    def test_timeout(self):
+        from gnmvidispine.vs_governor import VSRequestGovernor, VSLimit, VSGovernorTimeout
+        governor = VSRequestGovernor(total=VSLimit(concurrency=1, timeout=0.05),
+                                     hosts={'vshost:8080': {'search': VSLimit(concurrency=1, timeout=0.05)},
+                                            'otherhost': {'total': VSLimit(concurrency=2)}})
+        slot = governor.acquire("vshost", 8080, "PUT", "/API/item")
+        with self.assertRaises(VSGovernorTimeout):
+            governor.acquire("vshost", 8080, "PUT", "/API/item")
+        with self.assertRaises(VSGovernorTimeout):
+            governor.acquire("vshost", 8080, "GET", "/API/item/VX-1")
+        slot.release()
+        stats = governor.stats()
+        self.assertEqual(stats[("vshost", "8080", "search")], {'in_flight': 0, 'waiting': 0, 'requests': 1,
+                                                               'wait_time': stats[("vshost", "8080", "search")]['wait_time'],
+                                                               'max_wait': stats[("vshost", "8080", "search")]['max_wait']})
+        self.assertEqual(stats[("vshost", "8080", "total")]['in_flight'], 0)
+
+        slots = [governor.acquire("otherhost", 8080, "PUT", "/API/item") for n in range(0, 2)]
+        self.assertNotIn(("otherhost", "8080", "search"), stats)
+        for s in slots:
+            s.release()
+
+    def test_acquire_async(self):
+        import asyncio
+        from gnmvidispine.vs_governor import VSRequestGovernor, VSLimit, VSGovernorTimeout
+        governor = VSRequestGovernor(limits={'default': VSLimit(concurrency=1)}, total=VSLimit(concurrency=1))
+        other = governor.acquire("vshost", 8080, "PUT", "/API/item")
+
+        async def test():
+            #let through by its class but cancelled while waiting for total, so it must give its class slot back
+            waiter = asyncio.ensure_future(governor.acquire_async("vshost", 8080, "GET", "/API/item/VX-2"))
+            await asyncio.sleep(0.05)
+            self.assertEqual(governor.queue_depth("vshost"), 1)
+            self.assertEqual(governor.stats()[("vshost", "8080", "default")]['in_flight'], 1)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            self.assertEqual(governor.stats()[("vshost", "8080", "default")]['in_flight'], 0)
+
+            #waits on the event loop for a slot freed by another thread
+            waiter = asyncio.ensure_future(governor.acquire_async("vshost", 8080, "GET", "/API/item/VX-3"))
+            await asyncio.sleep(0.05)
+            self.assertFalse(waiter.done())
+            asyncio.get_running_loop().call_soon(other.release)
+            slot = await asyncio.wait_for(waiter, 5)
+            self.assertEqual(governor.stats()[("vshost", "8080", "total")]['in_flight'], 1)
+            slot.release()
+
+            timed = VSRequestGovernor(total=VSLimit(concurrency=1, timeout=0.05))
+            blocked = timed.acquire("vshost", 8080, "GET", "/API/item/VX-4")
+            with self.assertRaises(VSGovernorTimeout):
+                await timed.acquire_async("vshost", 8080, "GET", "/API/item/VX-5")
+            blocked.release()
+            self.assertEqual(timed.stats()[("vshost", "8080", "total")]['in_flight'], 0)
+
+        asyncio.run(test())
+        stats = governor.stats()
+        self.assertEqual(governor.queue_depth(), 0)
+        self.assertEqual(stats[("vshost", "8080", "default")]['in_flight'], 0)
+        self.assertEqual(stats[("vshost", "8080", "total")]['in_flight'], 0)
+
+
+class TestVSApiGovernor(unittest2.TestCase):
+    """
+    runs requests through a governor against the fake server
+    """
+    @classmethod
+    def setUpClass(cls):
+        from gnmvidispine.vs_fake_server import VSFakeServer
+        cls.server = VSFakeServer(items=50, files=10, jobs=10, fields=3, file_size=100000, latency=0.02).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def _kwargs(self, **kwargs):
+        kwargs.update(dict(host=self.server.host, port=self.server.port, user="admin", passwd="admin"))
+        return kwargs
+
+    def test_concurrent_requests(self):
+        from gnmvidispine.vs_governor import VSRequestGovernor, VSLimit
+        from gnmvidispine.vs_item import VSItem
+        from gnmvidispine.vs_connection_pool import VSConnectionPool
+        governor = VSRequestGovernor(limits={'default': VSLimit(concurrency=2)})
+        pool = VSConnectionPool(maxsize=8)
+        peak = [0]
+        stop = threading.Event()
+
+        def watch():
+            while not stop.is_set():
+                stats = governor.stats().get((self.server.host, str(self.server.port), "default"))
+                if stats is not None:
+                    peak[0] = max(peak[0], stats['in_flight'])
+                time.sleep(0.002)
+        watcher = threading.Thread(target=watch)
+        watcher.start()
+
+        def populate(n):
+            item = VSItem(pool=pool, governor=governor, **self._kwargs())
+            item.populate("VX-{0}".format(n))
+        threads = [threading.Thread(target=populate, args=(n,)) for n in range(1, 9)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stop.set()
+        watcher.join()
+
+        stats = governor.stats()[(self.server.host, str(self.server.port), "default")]
+        self.assertEqual(stats['requests'], 8)
+        self.assertEqual(stats['in_flight'], 0)
+        self.assertEqual(peak[0], 2)
+        self.assertGreater(stats['wait_time'], 0)
+
+    def test_nested_stream(self):
+        from gnmvidispine.vs_governor import VSRequestGovernor, VSLimit
+        from gnmvidispine.vs_storage import VSStorage
+        governor = VSRequestGovernor(total=VSLimit(concurrency=1, timeout=5))
+        storage = VSStorage(**self._kwargs(governor=governor))
+        storage.populate("VX-1")
+        #the file list is streamed; populating the storage while reading it must not wait for the stream's slot
+        count = 0
+        for f in storage.files():
+            storage.populate("VX-1")
+            count += 1
+        self.assertEqual(count, 10)
+        self.assertEqual(governor.stats()[(self.server.host, str(self.server.port), "total")]['in_flight'], 0)
+
+    def test_download_and_metrics(self):
+        from gnmvidispine.vs_governor import VSRequestGovernor, VSLimit
+        from gnmvidispine.vs_metrics import VSMetricsCollector
+        from gnmvidispine.vs_storage import VSStorage
+        governor = VSRequestGovernor(limits={'file_data': VSLimit(concurrency=1), 'default': VSLimit(rate=1000)})
+        collector = VSMetricsCollector()
+        storage = VSStorage(**self._kwargs(governor=governor, instrumentation=collector))
+        storage.populate("VX-1")
+        f = next(storage.files())
+        f.download_to(io.BytesIO())
+        f.download_to(io.BytesIO())
+
+        stats = governor.stats()
+        key = (self.server.host, str(self.server.port))
+        self.assertEqual(stats[key + ("file_data",)]['requests'], 2)
+        self.assertEqual(stats[key + ("file_data",)]['in_flight'], 0)
+        self.assertEqual(stats[key + ("default",)]['in_flight'], 0)
+        queue_times = [entry['queue_time']['count'] for entry in collector.snapshot().values()]
+        self.assertEqual(sum(queue_times), sum([s['requests'] for s in stats.values()]))
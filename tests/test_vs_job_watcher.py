@@ -0,0 +1,137 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+import threading
+from mock import patch
+import xml.etree.ElementTree as ET
+
+
+class TestVSJobWatcher(unittest2.TestCase):
+    fake_host = 'localhost'
+    fake_port = 8080
+    fake_user = 'username'
+    fake_passwd = 'password'
+
+    job_template = """<JobDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+            <jobId>{0}</jobId>
+            <status>{1}</status>
+            <type>TRANSCODE</type>
+        </JobDocument>"""
+
+    def _connection(self):
+        from gnmvidispine.vidispine_api import VSApi
+        return VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+
+    def _fake_jobs(self, statuses):
+        """
+        returns a request() replacement giving each job the next status in its list on every poll
+        """
+        remaining = dict([(k, list(v)) for k, v in statuses.items()])
+        lock = threading.Lock()
+
+        def request(path, **kwargs):
+            job_id = path.split("/")[2]
+            with lock:
+                status = remaining[job_id].pop(0) if len(remaining[job_id]) > 1 else remaining[job_id][0]
+            return ET.fromstring(self.job_template.format(job_id, status))
+        return request
+
+    def test_wait(self):
+        from gnmvidispine.vs_job_watcher import VSJobWatcher
+        statuses = {'VX-1': ["STARTED", "STARTED", "FINISHED"], 'VX-2': ["FAILED_TOTAL"]}
+        with patch("gnmvidispine.vs_job.VSJob.request", side_effect=self._fake_jobs(statuses)) as mock_request:
+            watcher = VSJobWatcher(self._connection(), min_interval=0.01, max_interval=0.05)
+            callback_results = []
+            done = threading.Event()
+            watcher.watch("VX-1", callback=lambda job: (callback_results.append(job.status()), done.set()))
+            failed = watcher.wait("VX-2", timeout=5)
+            self.assertEqual(failed.status(), "FAILED_TOTAL")
+            self.assertTrue(failed.didFail())
+
+            finished = watcher.wait("VX-1", timeout=5)
+            self.assertEqual(finished.name, "VX-1")
+            self.assertEqual(finished.status(), "FINISHED")
+            self.assertTrue(done.wait(5))
+            self.assertEqual(callback_results, ["FINISHED"])
+            self.assertEqual(mock_request.call_count, 4)
+            self.assertEqual(len(watcher), 0)
+
+    def test_same_future(self):
+        from gnmvidispine.vs_job_watcher import VSJobWatcher
+        with patch("gnmvidispine.vs_job.VSJob.request", side_effect=self._fake_jobs({'VX-1': ["STARTED", "FINISHED"]})):
+            watcher = VSJobWatcher(self._connection(), min_interval=60, max_interval=60)
+            future = watcher.watch("VX-1")
+            self.assertIs(watcher.watch("VX-1"), future)
+            self.assertEqual(len(watcher), 1)
+            while watcher.polls == 0:
+                threading.Event().wait(0.01)
+            watcher.notify("VX-1")
+            self.assertEqual(future.result(5).status(), "FINISHED")
+
+    def test_notify(self):
+        from gnmvidispine.vs_job_watcher import VSJobWatcher
+        statuses = {'VX-1': ["STARTED", "FINISHED"]}
+        with patch("gnmvidispine.vs_job.VSJob.request", side_effect=self._fake_jobs(statuses)):
+            #with a long interval the job would not be polled again within the timeout unless notify() is called
+            watcher = VSJobWatcher(self._connection(), min_interval=60, max_interval=60)
+            future = watcher.watch("VX-1")
+            polled = threading.Event()
+            while watcher.polls == 0:
+                polled.wait(0.01)
+            self.assertFalse(future.done())
+            watcher.notify("VX-1", "FINISHED")
+            self.assertEqual(future.result(5).status(), "FINISHED")
+            watcher.notify("VX-1", "FINISHED")   #no longer watched, so ignored
+
+    def test_error(self):
+        from gnmvidispine.vs_job_watcher import VSJobWatcher
+        from gnmvidispine.vidispine_api import VSNotFound
+        with patch("gnmvidispine.vs_job.VSJob.request", side_effect=VSNotFound()):
+            watcher = VSJobWatcher(self._connection(), min_interval=0.01)
+            with self.assertRaises(VSNotFound):
+                watcher.wait("VX-404", timeout=5)
+
+    def test_bulk_error(self):
+        import socket
+        from gnmvidispine.vs_job import VSJobSet
+        from gnmvidispine.vs_job_watcher import VSJobWatcher
+        update = VSJobSet.update
+        calls = []
+
+        def fail_once(job_set):
+            calls.append(job_set)
+            if len(calls) == 1:
+                raise socket.error("Connection reset by peer")
+            return update(job_set)
+
+        statuses = {'VX-1': ["STARTED", "FINISHED"]}
+        with patch("gnmvidispine.vs_job.VSJob.request", side_effect=self._fake_jobs(statuses)), \
+                patch.object(VSJobSet, 'update', fail_once):
+            watcher = VSJobWatcher(self._connection(), min_interval=0.01, max_interval=0.05, bulk_threshold=1)
+            self.assertEqual(watcher.wait("VX-1", timeout=5).status(), "FINISHED")
+        self.assertGreater(len(calls), 1)
+
+    def test_thread_failure(self):
+        from gnmvidispine.vs_job_watcher import VSJobWatcher
+        with patch("gnmvidispine.vs_job_watcher.VSJobWatcher._poll", side_effect=RuntimeError("broken")):
+            watcher = VSJobWatcher(self._connection(), min_interval=0.01)
+            with self.assertRaises(RuntimeError):
+                watcher.wait("VX-1", timeout=5)
+        #a new thread is started for the jobs watched afterwards
+        with patch("gnmvidispine.vs_job.VSJob.request", side_effect=self._fake_jobs({'VX-2': ["FINISHED"]})):
+            self.assertEqual(watcher.wait("VX-2", timeout=5).status(), "FINISHED")
+
+    def test_shared(self):
+        from gnmvidispine.vs_job_watcher import job_watcher
+        self.assertIs(job_watcher(self._connection()), job_watcher(self._connection()))
+
+    def test_https(self):
+        import http.client
+        from gnmvidispine.vidispine_api import VSApi
+        from gnmvidispine.vs_job_watcher import VSJobWatcher, job_watcher
+        connection = VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd,
+                           https=True)
+        self.assertIsNot(job_watcher(connection), job_watcher(self._connection()))
+        watcher = VSJobWatcher(connection, min_interval=60)
+        with patch("gnmvidispine.vs_job_watcher.VSJobWatcher._start"):
+            watcher.watch("VX-1")
+        self.assertIsInstance(watcher._watches["VX-1"].job._conn, http.client.HTTPSConnection)
@@ -0,0 +1,169 @@
+# *-* coding: UTF-8 --*
+import unittest2
+from mock import MagicMock, patch
+import http.client
+
+
+class TestUrlTemplate(unittest2.TestCase):
+    def test_template(self):
+        from gnmvidispine.vs_metrics import url_template
+        self.assertEqual(url_template("/API/item/VX-1234/shape/VX-99;content=metadata?tag=original"),
+                         "/API/item/{id}/shape/{id}")
+        self.assertEqual(url_template("/API/item;first=1;number=100"), "/API/item")
+        self.assertEqual(url_template("/API/job/VX-5/step/3"), "/API/job/{id}/step/{n}")
+        self.assertEqual(url_template("/API/metadata-field/gnm_asset_category"), "/API/metadata-field/gnm_asset_category")
+        self.assertEqual(url_template("/API/item/VX-1/metadata/changeset/f81d4fae-7dec-11d0-a765-00a0c91e6bf6"),
+                         "/API/item/{id}/metadata/changeset/{uuid}")
+
+
+class TestInstrumentation(unittest2.TestCase):
+    fake_user = 'username'
+    fake_passwd = 'password'
+
+    sample_xml = """<?xml version="1.0"?>
+<StorageDocument xmlns="http://xml.vidispine.com/schema/vidispine"><id>VX-1</id><state>READY</state></StorageDocument>"""
+
+    class MockedResponse(object):
+        def __init__(self, status_code, content, headers=None, reason=""):
+            self.status = status_code
+            self.body = content
+            self.reason = reason
+            self.headers = headers if headers is not None else []
+
+        def read(self):
+            return self.body
+
+        def getheaders(self):
+            return self.headers
+
+        def getheader(self, name, default=None):
+            for k, v in self.headers:
+                if k.lower() == name.lower():
+                    return v
+            return default
+
+    def _api(self, responses, instrumentation):
+        from gnmvidispine.vidispine_api import VSApi
+        conn = http.client.HTTPConnection(host='localhost', port=8080)
+        conn.connect = MagicMock()
+        conn.request = MagicMock()
+        conn.getresponse = MagicMock(side_effect=responses)
+        return VSApi(user=self.fake_user, passwd=self.fake_passwd, conn=conn, instrumentation=instrumentation), conn
+
+    def test_collector(self):
+        from gnmvidispine.vs_metrics import VSMetricsCollector
+        collector = VSMetricsCollector()
+        api, conn = self._api([self.MockedResponse(200, self.sample_xml), self.MockedResponse(200, self.sample_xml)],
+                              collector)
+        api.request("/storage/VX-1")
+        api.request("/storage/VX-2", method="PUT", body="<StorageDocument/>")
+
+        stats = collector.snapshot()
+        self.assertEqual(set(stats.keys()), set([("GET", "/API/storage/{id}", 200), ("PUT", "/API/storage/{id}", 200)]))
+        get = stats[("GET", "/API/storage/{id}", 200)]
+        self.assertEqual(get['count'], 1)
+        self.assertEqual(get['bytes_in'], len(self.sample_xml))
+        self.assertEqual(get['bytes_out'], 0)
+        self.assertEqual(get['total_time']['count'], 1)
+        self.assertEqual(get['ttfb']['count'], 1)
+        self.assertEqual(get['parse_time']['count'], 1)
+        #the connection had not been opened, so opening it was timed
+        self.assertEqual(get['connect_time']['count'], 1)
+        self.assertEqual(conn.connect.call_count, 2)
+        self.assertEqual(stats[("PUT", "/API/storage/{id}", 200)]['bytes_out'], len("<StorageDocument/>"))
+
+        collector.reset()
+        self.assertEqual(collector.snapshot(), {})
+
+    def test_error_status(self):
+        from gnmvidispine.vs_metrics import VSMetricsCollector
+        from gnmvidispine.vidispine_api import HTTPError
+        collector = VSMetricsCollector()
+        api, conn = self._api([self.MockedResponse(403, b"forbidden")], collector)
+        with self.assertRaises(HTTPError):
+            api.request("/item/VX-403")
+        stats = collector.snapshot()[("GET", "/API/item/{id}", 403)]
+        self.assertEqual(stats['count'], 1)
+        self.assertEqual(stats['errors'], 0)
+        self.assertEqual(stats['parse_time']['count'], 0)
+
+    def test_failure(self):
+        from gnmvidispine.vs_metrics import VSMetricsCollector
+        collector = VSMetricsCollector()
+        api, conn = self._api(ValueError("broken"), collector)
+        with self.assertRaises(ValueError):
+            api.request("/item/VX-1")
+        stats = collector.snapshot()[("GET", "/API/item/{id}", None)]
+        self.assertEqual(stats['count'], 1)
+        self.assertEqual(stats['errors'], 1)
+
+    def test_group(self):
+        from gnmvidispine.vs_metrics import VSMetricsCollector, VSInstrumentationGroup, VSInstrumentation
+        contexts = []
+
+        class Recorder(VSInstrumentation):
+            def request_started(self, record):
+                return "context"
+
+            def request_finished(self, record):
+                contexts.append(record.context)
+
+        first = VSMetricsCollector()
+        second = VSMetricsCollector()
+        api, conn = self._api([self.MockedResponse(200, self.sample_xml)],
+                              VSInstrumentationGroup(first, Recorder(), second))
+        api.request("/storage/VX-1")
+        self.assertEqual(first.snapshot(), second.snapshot())
+        self.assertEqual(len(first.snapshot()), 1)
+        self.assertEqual(contexts, ["context"])
+
+    def test_parse_record(self):
+        from gnmvidispine.vs_metrics import VSInstrumentation
+        from gnmvidispine.vidispine_api import VSApi
+        parsed = []
+
+        class Recorder(VSInstrumentation):
+            def response_parsed(self, record):
+                parsed.append(record.url)
+
+        api, conn = self._api([self.MockedResponse(200, self.sample_xml), self.MockedResponse(200, self.sample_xml)],
+                              Recorder())
+        raw_request = VSApi.raw_request
+
+        def raw_request_then_other(self, path, **kwargs):
+            body = raw_request(self, path, **kwargs)
+            #another request on the same object, e.g. from another thread, finishes before this response is parsed
+            raw_request(self, "/storage/VX-2")
+            return body
+
+        with patch.object(VSApi, 'raw_request', raw_request_then_other):
+            api.request("/storage/VX-1")
+        self.assertEqual(parsed, ["/API/storage/VX-1"])
+
+    def test_broken_instrumentation(self):
+        from gnmvidispine.vs_metrics import VSInstrumentation
+
+        class Broken(VSInstrumentation):
+            def request_finished(self, record):
+                raise RuntimeError("oops")
+
+        api, conn = self._api([self.MockedResponse(200, self.sample_xml)], Broken())
+        result = api.request("/storage/VX-1")
+        self.assertEqual(result.find("{http://xml.vidispine.com/schema/vidispine}id").text, "VX-1")
+
+    def test_disabled(self):
+        response = self.MockedResponse(200, self.sample_xml)
+        api, conn = self._api([response], None)
+        api.request("/storage/VX-1")
+        self.assertFalse(hasattr(response, '_vs_record'))
+        conn.connect.assert_not_called()
+
+    def test_unavailable(self):
+        from gnmvidispine.vs_metrics import VSPrometheusInstrumentation, VSOpenTelemetryInstrumentation, \
+            InstrumentationUnavailable
+        with patch("gnmvidispine.vs_metrics._prometheus", None):
+            with self.assertRaises(InstrumentationUnavailable):
+                VSPrometheusInstrumentation()
+        with patch("gnmvidispine.vs_metrics._otel_trace", None):
+            with self.assertRaises(InstrumentationUnavailable):
+                VSOpenTelemetryInstrumentation()
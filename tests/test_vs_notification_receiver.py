@@ -0,0 +1,202 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+import http.client
+import json
+from mock import patch, MagicMock
+
+
+class TestVSNotificationReceiver(unittest2.TestCase):
+    fake_host = 'localhost'
+    fake_port = 8080
+    fake_user = 'username'
+    fake_passwd = 'password'
+
+    job_notification = """<SimpleMetadataDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+        <field><key>jobId</key><value>{0}</value></field>
+        <field><key>status</key><value>{1}</value></field>
+        <field><key>type</key><value>TRANSCODE</value></field>
+    </SimpleMetadataDocument>"""
+
+    def _receiver(self, **kwargs):
+        from gnmvidispine.vidispine_api import VSApi
+        from gnmvidispine.vs_notification_receiver import VSNotificationReceiver
+        connection = VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        kwargs.setdefault('host', "localhost")
+        return VSNotificationReceiver(connection, public_url="http://receiver.example.com:8123/", token="s3cret",
+                                      **kwargs)
+
+    def _job(self, job_id, status):
+        return self.job_notification.format(job_id, status).encode("UTF-8")
+
+    @staticmethod
+    def _post(conn, path, body, content_type="application/xml"):
+        conn.request("POST", path, body=body, headers={'Content-Type': content_type})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+
+    def test_parse_body(self):
+        from gnmvidispine.vs_notification_receiver import VSNotificationEvent
+        self.assertEqual(VSNotificationEvent.parse_body(self._job("VX-1", "STARTED")),
+                         {'jobId': 'VX-1', 'status': 'STARTED', 'type': 'TRANSCODE'})
+        body = json.dumps({'field': [{'key': 'itemId', 'value': 'VX-2'}, {'key': 'changeSetId', 'value': 'VX-40'}]})
+        self.assertEqual(VSNotificationEvent.parse_body(body.encode("UTF-8"), "application/json; charset=UTF-8"),
+                         {'itemId': 'VX-2', 'changeSetId': 'VX-40'})
+
+    def test_receive(self):
+        from gnmvidispine.vs_notification_receiver import VSJobEvent
+        receiver = self._receiver()
+        jobs = receiver.subscribe(["job"])
+        everything = receiver.subscribe()
+        with receiver:
+            conn = http.client.HTTPConnection("localhost", receiver.port)
+            self.assertEqual(self._post(conn, "/s3cret/job/stop", self._job("VX-1", "FINISHED")), 200)
+            event = jobs.get(timeout=5)
+            self.assertIsInstance(event, VSJobEvent)
+            self.assertEqual((event.entity_id, event.action, event.status, event.job_type),
+                             ("VX-1", "stop", "FINISHED", "TRANSCODE"))
+            self.assertIs(everything.get(timeout=5), event)
+
+            self.assertEqual(self._post(conn, "/s3cret/job/stop", b"<not xml"), 400)
+            self.assertEqual(self._post(conn, "/s3cret/group/modify", b""), 404)
+
+            #anything posted without the token is refused
+            self.assertEqual(self._post(conn, "/job/stop", self._job("VX-2", "FINISHED")), 403)
+            self.assertEqual(self._post(conn, "/wrong/job/stop", self._job("VX-2", "FINISHED")), 403)
+            self.assertEqual(self._post(conn, "/s3cret/stop", self._job("VX-2", "FINISHED")), 403)
+            self.assertTrue(jobs.empty())
+            conn.close()
+
+        self.assertEqual(receiver.receive("item", "create", b'{"field": {"key": "itemId", "value": "VX-3"}}',
+                                          "application/json"), 200)
+        self.assertEqual(everything.get_nowait().entity_id, "VX-3")
+        self.assertTrue(jobs.empty())
+
+    def test_redelivery(self):
+        receiver = self._receiver()
+        events = receiver.subscribe()
+        for n in range(0, 3):
+            self.assertEqual(receiver.receive("job", "update", self._job("VX-1", "STARTED")), 200)
+        self.assertEqual(receiver.receive("job", "update", self._job("VX-1", "FINISHED")), 200)
+        self.assertEqual([e.status for e in [events.get_nowait(), events.get_nowait()]], ["STARTED", "FINISHED"])
+        self.assertTrue(events.empty())
+        self.assertEqual((receiver.received, receiver.duplicates), (2, 2))
+
+        #only the most recent are remembered
+        receiver = self._receiver(remember=1)
+        events = receiver.subscribe()
+        receiver.receive("job", "update", self._job("VX-1", "STARTED"))
+        receiver.receive("job", "update", self._job("VX-2", "STARTED"))
+        receiver.receive("job", "update", self._job("VX-1", "STARTED"))
+        self.assertEqual(events.qsize(), 3)
+
+    def test_backpressure(self):
+        receiver = self._receiver()
+        small = receiver.subscribe(maxsize=1)
+        large = receiver.subscribe()
+        self.assertEqual(receiver.receive("job", "update", self._job("VX-1", "STARTED")), 200)
+        #refused for every subscriber while one of them is full, so that a redelivery reaches each of them once
+        self.assertEqual(receiver.receive("job", "update", self._job("VX-2", "STARTED")), 503)
+        self.assertEqual(large.qsize(), 1)
+        self.assertEqual(receiver.rejected, 1)
+
+        self.assertEqual(small.get_nowait().entity_id, "VX-1")
+        self.assertEqual(receiver.receive("job", "update", self._job("VX-2", "STARTED")), 200)
+        self.assertEqual(small.get_nowait().entity_id, "VX-2")
+        self.assertEqual([large.get_nowait().entity_id for n in range(0, 2)], ["VX-1", "VX-2"])
+
+        receiver.unsubscribe(small)
+        receiver.receive("job", "update", self._job("VX-3", "STARTED"))
+        receiver.receive("job", "update", self._job("VX-4", "STARTED"))
+        self.assertTrue(small.empty())
+        self.assertEqual(large.qsize(), 2)
+
+    def test_register(self):
+        from gnmvidispine.vidispine_api import VSNotFound
+        receiver = self._receiver()
+        receiver.register("job", ["update", "stop"], filter={'type': 'TRANSCODE'})
+        receiver.register("file", "create")
+        with self.assertRaises(ValueError):
+            receiver.register("group", "create")
+
+        responses = iter([b"VX-11", b"VX-12", b"<NotificationDocument><id>VX-13</id></NotificationDocument>"])
+
+        def request(path, method="GET", **kwargs):
+            if method == "POST":
+                return next(responses)
+            if path.endswith("VX-12"):
+                raise VSNotFound()
+            return "Success"
+
+        with patch("gnmvidispine.vs_notifications.VSNotification.request", side_effect=request) as mock_request:
+            with receiver:
+                posts = [c for c in mock_request.call_args_list if c[1]['method'] == "POST"]
+                self.assertEqual([c[0][0] for c in posts], ["/job/notification", "/job/notification",
+                                                            "/storage/file/notification"])
+                self.assertIn("<url>http://receiver.example.com:8123/s3cret/job/update</url>", posts[0][1]['body'])
+                self.assertIn("<stop />", posts[1][1]['body'])
+                self.assertIn("<filter><type>TRANSCODE</type></filter>", posts[1][1]['body'])
+                self.assertIn("<file><create /></file>", posts[2][1]['body'])
+            deletes = [c[0][0] for c in mock_request.call_args_list if c[1]['method'] == "DELETE"]
+            self.assertEqual(deletes, ["/job/notification/VX-11", "/job/notification/VX-12",
+                                       "/storage/file/notification/VX-13"])
+
+    def test_register_https(self):
+        import http.client
+        from gnmvidispine.vidispine_api import VSApi
+        from gnmvidispine.vs_notification_receiver import VSNotificationReceiver
+        connection = VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd,
+                           https=True)
+        receiver = VSNotificationReceiver(connection, public_url="https://receiver.example.com:8123/")
+        with patch("gnmvidispine.vs_notifications.VSNotification.request", return_value=b"VX-11"):
+            notification = receiver._save_notification("job", "stop", None)
+        self.assertIsInstance(notification._conn, http.client.HTTPSConnection)
+
+    def test_defaults(self):
+        from gnmvidispine.vidispine_api import VSApi
+        from gnmvidispine.vs_notification_receiver import VSNotificationReceiver
+        connection = VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        receiver = VSNotificationReceiver(connection, public_url="http://localhost:8123/")
+        other = VSNotificationReceiver(connection, public_url="http://localhost:8123/")
+        self.assertGreaterEqual(len(receiver.token), 32)
+        self.assertNotEqual(receiver.token, other.token)
+
+        #listens only on the address of the public host name, not on every interface
+        with receiver:
+            self.assertEqual(receiver._httpd.server_address[0], "127.0.0.1")
+            conn = http.client.HTTPConnection("127.0.0.1", receiver.port)
+            self.assertEqual(self._post(conn, "/{0}/job/stop".format(receiver.token), self._job("VX-1", "FINISHED")), 200)
+            conn.close()
+        self.assertEqual(receiver.received, 1)
+
+    def test_feeds(self):
+        receiver = self._receiver()
+        watcher = MagicMock()
+        cache = MagicMock()
+        receiver.feed_job_watcher(watcher)
+        receiver.feed_cache(cache)
+
+        receiver.receive("job", "stop", self._job("VX-5", "FAILED_TOTAL"))
+        watcher.notify.assert_called_once_with("VX-5", "FAILED_TOTAL")
+
+        metadata = """<SimpleMetadataDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+            <field><key>collectionId</key><value>VX-9</value></field>
+            <field><key>changeSetId</key><value>VX-40</value></field>
+        </SimpleMetadataDocument>""".encode("UTF-8")
+        receiver.receive("metadata", "modify", metadata)
+        cache.note_change.assert_called_once_with(receiver.connection, "VX-9", "VX-40", entity_type="collection")
+
+        receiver.receive("item", "delete", b'{"field": [{"key": "itemId", "value": "VX-3"}]}', "application/json")
+        cache.invalidate.assert_called_once_with("VX-3", entity_type="item", conn=receiver.connection)
+        self.assertEqual(watcher.notify.call_count, 1)
+
+    def test_save_name(self):
+        from gnmvidispine.vs_notifications import VSNotification
+        notification = VSNotification(host=self.fake_host, port=self.fake_port, user=self.fake_user,
+                                      passwd=self.fake_passwd)
+        notification.objectclass = "item"
+        with patch("gnmvidispine.vs_notifications.VSNotification.request", return_value=b"VX-77") as mock_request:
+            notification.save()
+            self.assertEqual(notification.name, "VX-77")
+            notification.save()
+            mock_request.assert_any_call("/item/notification/VX-77", method="DELETE")
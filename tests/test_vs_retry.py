@@ -0,0 +1,213 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+from mock import patch
+
+
+class TestVSRetryPolicy(unittest2.TestCase):
+    def test_backoff(self):
+        from gnmvidispine.vs_retry import VSRetryPolicy
+        policy = VSRetryPolicy(base_delay=1, max_delay=10, jitter=None, max_attempts=10, failure_threshold=None)
+        retry = policy.begin("vshost", 8080)
+        delays = []
+        for n in range(0, 6):
+            retry.check()
+            delays.append(retry.failed(status=503))
+        self.assertEqual(delays, [1, 2, 4, 8, 10, 10])
+
+        policy = VSRetryPolicy(base_delay=1, max_delay=10, jitter="full", max_attempts=10, seed=3)
+        retry = policy.begin("vshost", 8080)
+        for n in range(0, 5):
+            retry.check()
+            delay = retry.failed(status=503)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(10, 2 ** n))
+
+    def test_shared_per_host(self):
+        from gnmvidispine.vs_retry import VSRetryPolicy
+        policy = VSRetryPolicy(base_delay=1, max_delay=100, jitter=None, failure_threshold=None)
+        for n in range(0, 3):
+            retry = policy.begin("vshost", "8080")
+            retry.check()
+            retry.failed(status=503)
+
+        #a new request to the same host starts from the host's backoff, one to another host doesn't
+        retry = policy.begin("vshost", 8080)
+        retry.check()
+        self.assertEqual(retry.failed(status=503), 8)
+        other = policy.begin("otherhost", 8080)
+        other.check()
+        self.assertEqual(other.failed(status=503), 1)
+
+        other.succeeded()
+        retry = policy.begin("vshost", 8080)
+        retry.check()
+        self.assertEqual(retry.failed(status=503), 16)
+        retry.succeeded()
+        retry = policy.begin("vshost", 8080)
+        retry.check()
+        self.assertEqual(retry.failed(status=503), 1)
+
+    def test_rules(self):
+        from gnmvidispine.vs_retry import VSRetryPolicy, VSRetryRule, CONNECTION_ERROR
+        policy = VSRetryPolicy(jitter=None, base_delay=1, max_attempts=3,
+                               rules={503: VSRetryRule(max_attempts=2, base_delay=5), 502: None})
+        retry = policy.begin("vshost", 8080)
+        retry.check()
+        self.assertIsNone(retry.failed(status=404))
+        self.assertEqual(retry.failed(status=503), 5)
+        retry.check()
+        self.assertIsNone(retry.failed(status=503))
+        self.assertIsNone(policy.begin("vshost", 8080).failed(status=502))
+
+        retry = policy.begin("vshost", 8080)
+        for n in range(0, 2):
+            retry.check()
+            self.assertIsNotNone(retry.failed(status=None))
+        retry.check()
+        self.assertIsNone(retry.failed(status=None))
+        self.assertIn(CONNECTION_ERROR, policy.rules)
+
+    def test_deadline(self):
+        from gnmvidispine.vs_retry import VSRetryPolicy
+        now = [1000.0]
+        with patch("gnmvidispine.vs_retry.time.time", side_effect=lambda: now[0]):
+            policy = VSRetryPolicy(jitter=None, base_delay=4, max_attempts=10, deadline=10, failure_threshold=None)
+            retry = policy.begin("vshost", 8080)
+            retry.check()
+            self.assertEqual(retry.failed(status=504), 4)
+            now[0] += 4
+            retry.check()
+            #another 8s would be past the deadline
+            self.assertIsNone(retry.failed(status=504))
+
+    def test_circuit_breaker(self):
+        from gnmvidispine.vs_retry import VSRetryPolicy, VSCircuitOpen
+        from gnmvidispine.vidispine_api import VSException
+        now = [1000.0]
+        with patch("gnmvidispine.vs_retry.time.time", side_effect=lambda: now[0]):
+            policy = VSRetryPolicy(failure_threshold=3, reset_timeout=30, deadline=None)
+            for n in range(0, 3):
+                retry = policy.begin("vshost", 8080)
+                retry.check()
+                retry.failed(status=503)
+            self.assertTrue(policy.is_open("vshost", 8080))
+            with self.assertRaises(VSCircuitOpen) as cm:
+                policy.begin("vshost", 8080).check()
+            self.assertIsInstance(cm.exception, VSException)
+            self.assertEqual(cm.exception.retry_at, 1030.0)
+            policy.begin("otherhost", 8080).check()
+
+            #one trial request once the timeout has passed; it fails, so the circuit stays open
+            now[0] = 1031.0
+            trial = policy.begin("vshost", 8080)
+            trial.check()
+            with self.assertRaises(VSCircuitOpen):
+                policy.begin("vshost", 8080).check()
+            trial.failed(status=503)
+            with self.assertRaises(VSCircuitOpen):
+                policy.begin("vshost", 8080).check()
+            self.assertEqual(policy.rejected, 3)
+
+            now[0] = 1062.0
+            trial = policy.begin("vshost", 8080)
+            trial.check()
+            trial.succeeded()
+            self.assertFalse(policy.is_open("vshost", 8080))
+            policy.begin("vshost", 8080).check()
+
+
+class TestVSApiRetryPolicy(unittest2.TestCase):
+    """
+    runs requests with a retry policy against the fake server
+    """
+    @classmethod
+    def setUpClass(cls):
+        from gnmvidispine.vs_fake_server import VSFakeServer
+        cls.server = VSFakeServer(items=20, files=10, jobs=10, fields=3).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def _item(self, policy):
+        from gnmvidispine.vs_item import VSItem
+        return VSItem(host=self.server.host, port=self.server.port, user="admin", passwd="admin", retry_policy=policy)
+
+    def test_retries(self):
+        from gnmvidispine.vs_retry import VSRetryPolicy
+        from gnmvidispine.vidispine_api import VSApi
+        policy = VSRetryPolicy(base_delay=0, max_attempts=4)
+        with patch("gnmvidispine.vidispine_api.VSApi._gateway_timeout_delay") as mock_delay:
+            self.server.fail_next(503)
+            self.server.fail_next(504)
+            item = self._item(policy)
+            item.populate("VX-2")
+            mock_delay.assert_not_called()
+        self.assertEqual(item.get("field_0"), "value 0 of item 2")
+        self.assertEqual(policy.retries, 2)
+        self.assertIsNone(VSApi.retry_policy)
+
+        from gnmvidispine.vidispine_api import HTTPError
+        self.server.fail_next(503, count=4)
+        with self.assertRaises(HTTPError) as cm:
+            self._item(policy).populate("VX-3")
+        self.assertEqual(cm.exception.code, 503)
+
+    def test_raw_requests(self):
+        import io
+        from gnmvidispine.vs_retry import VSRetryPolicy
+        from gnmvidispine.vs_storage import VSStorage
+        policy = VSRetryPolicy(base_delay=0, max_attempts=4)
+        storage = VSStorage(host=self.server.host, port=self.server.port, user="admin", passwd="admin",
+                            retry_policy=policy)
+        storage.populate("VX-1")
+        f = next(storage.files())
+
+        #downloads and other requests that don't go through request() are retried by the policy as well
+        self.server.fail_next(503)
+        self.server.fail_next(502)
+        output = io.BytesIO()
+        f.download_to(output)
+        self.assertEqual(len(output.getvalue()), int(f.size))
+        self.server.fail_next(504)
+        self.assertIn(b"StorageDocument", storage.raw_request("/storage/VX-1"))
+        self.assertEqual(policy.retries, 3)
+
+    def test_not_found(self):
+        from gnmvidispine.vs_retry import VSRetryPolicy
+        from gnmvidispine.vidispine_api import VSNotFound
+        policy = VSRetryPolicy(base_delay=0, failure_threshold=1)
+        with self.assertRaises(VSNotFound):
+            self._item(policy).populate("VX-999")
+        self.assertEqual(policy.retries, 0)
+        self.assertFalse(policy.is_open(self.server.host, self.server.port))
+
+    def test_circuit_open(self):
+        from gnmvidispine.vs_retry import VSRetryPolicy, VSCircuitOpen
+        policy = VSRetryPolicy(base_delay=0, max_attempts=10, failure_threshold=3, reset_timeout=60)
+        self.server.fail_next(503, count=3)
+        before = sum(self.server.requests.values())
+        with self.assertRaises(VSCircuitOpen):
+            self._item(policy).populate("VX-4")
+        #nothing more is sent while the circuit is open, from any object using the policy
+        with self.assertRaises(VSCircuitOpen):
+            self._item(policy).populate("VX-5")
+        self.assertEqual(sum(self.server.requests.values()) - before, 3)
+
+    def test_connection_error(self):
+        import socket
+        from gnmvidispine.vs_retry import VSRetryPolicy
+        from gnmvidispine.vs_item import VSItem
+        listener = socket.socket()
+        listener.bind(("localhost", 0))
+        port = listener.getsockname()[1]
+        listener.close()
+
+        policy = VSRetryPolicy(base_delay=0, max_attempts=3, failure_threshold=None)
+        item = VSItem(host="localhost", port=port, user="admin", passwd="admin", retry_policy=policy)
+        with patch("time.sleep") as mock_sleep:
+            with self.assertRaises(socket.error):
+                item.populate("VX-1")
+        #retried by the policy rather than the fixed one-second sleeps
+        mock_sleep.assert_not_called()
+        self.assertEqual(policy.retries, 2)
@@ -0,0 +1,114 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+import threading
+from mock import patch
+import xml.etree.ElementTree as ET
+
+
+class TestVSSearchResultPrefetch(unittest2.TestCase):
+    fake_host = 'localhost'
+    fake_port = 8080
+    fake_user = 'username'
+    fake_passwd = 'password'
+
+    def _fake_search(self, total, requested):
+        """
+        returns a request() replacement serving a search of total items, recording the first position of each request
+        """
+        lock = threading.Lock()
+
+        def request(path, method="GET", matrix=None, query=None, body=None, accept='application/xml'):
+            with lock:
+                requested.append(matrix['first'])
+            items = "".join(['<item id="VX-{0}" start="-INF" end="+INF"/>'.format(n)
+                             for n in range(matrix['first'], min(matrix['first']+matrix['number'], total+1))])
+            return ET.fromstring("""<ItemListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+                <hits>{0}</hits>{1}</ItemListDocument>""".format(total, items))
+        return request
+
+    def _result(self):
+        from gnmvidispine.vs_search import VSSearchResult
+        return VSSearchResult(search_url="/item", body="<ItemSearchDocument/>", searchType="item", pageSize=10,
+                              host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+
+    def test_prefetch_order(self):
+        requested = []
+        with patch("gnmvidispine.vs_search.VSSearchResult.request", side_effect=self._fake_search(95, requested)):
+            result = self._result()
+            names = [i.name for i in result.results(shouldPopulate=False, prefetch=3)]
+        self.assertEqual(names, ["VX-{0}".format(n) for n in range(1, 96)])
+        self.assertEqual(sorted(requested), [1, 11, 21, 31, 41, 51, 61, 71, 81, 91])
+        self.assertEqual(result.itemsRetrieved, 95)
+        self.assertEqual(result.totalItems, 95)
+
+    def test_page_fetcher_settings(self):
+        import http.client
+        from gnmvidispine.vs_search import VSSearchResult
+        from gnmvidispine.vs_governor import VSRequestGovernor
+        governor = VSRequestGovernor()
+        result = VSSearchResult(search_url="/item", body="<ItemSearchDocument/>", searchType="item", pageSize=10,
+                                host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd,
+                                https=True, governor=governor)
+        fetcher = result._page_fetcher()
+        self.assertIsInstance(fetcher._conn, http.client.HTTPSConnection)
+        self.assertIs(fetcher.governor, governor)
+        self.assertEqual(fetcher.pageSize, 10)
+
+    def test_prefetch_parallel(self):
+        requested = []
+        with patch("gnmvidispine.vs_search.VSSearchResult.request", side_effect=self._fake_search(40, requested)):
+            names = [i.name for i in self._result().results(shouldPopulate=False, prefetch=4, threads=2)]
+        self.assertEqual(names, ["VX-{0}".format(n) for n in range(1, 41)])
+        self.assertEqual(sorted(requested), [1, 11, 21, 31])
+
+    def test_prefetch_single_page(self):
+        requested = []
+        with patch("gnmvidispine.vs_search.VSSearchResult.request", side_effect=self._fake_search(5, requested)):
+            names = [i.name for i in self._result().results(shouldPopulate=False, prefetch=2)]
+        self.assertEqual(names, ["VX-{0}".format(n) for n in range(1, 6)])
+        self.assertEqual(requested, [1])
+
+    def test_prefetch_window(self):
+        requested = []
+        with patch("gnmvidispine.vs_search.VSSearchResult.request", side_effect=self._fake_search(1000, requested)):
+            results = self._result().results(shouldPopulate=False, prefetch=2)
+            for n in range(0, 5):
+                next(results)
+            #the first page and no more than two after it
+            self.assertLessEqual(len(requested), 3)
+            results.close()
+
+    def test_prefetch_populate(self):
+        requested = []
+        item_doc = """<MetadataListDocument xmlns="http://xml.vidispine.com/schema/vidispine">{0}</MetadataListDocument>"""
+        with patch("gnmvidispine.vs_search.VSSearchResult.request", side_effect=self._fake_search(25, requested)):
+            with patch("gnmvidispine.vs_item.VSItem.request",
+                       side_effect=lambda path, **kwargs: ET.fromstring(item_doc.format(
+                           "".join(['<item id="{0}"><metadata><timespan start="-INF" end="+INF"><field><name>title</name>'
+                                    '<value>{0}</value></field></timespan></metadata></item>'.format(v.text)
+                                    for v in ET.fromstring(kwargs['body']).iter('{http://xml.vidispine.com/schema/vidispine}value')])))):
+                titles = [i.get("title") for i in self._result().results(shouldPopulate=True, prefetch=2)]
+        self.assertEqual(titles, ["VX-{0}".format(n) for n in range(1, 26)])
+
+    def test_populate_fields(self):
+        requested = []
+        fields_requested = []
+        item_doc = """<MetadataListDocument xmlns="http://xml.vidispine.com/schema/vidispine">{0}</MetadataListDocument>"""
+
+        def item_request(path, **kwargs):
+            fields_requested.append(kwargs['query'].get('field'))
+            return ET.fromstring(item_doc.format(
+                "".join(['<item id="{0}"><metadata><timespan start="-INF" end="+INF"><field><name>title</name>'
+                         '<value>{0}</value></field></timespan></metadata></item>'.format(v.text)
+                         for v in ET.fromstring(kwargs['body']).iter('{http://xml.vidispine.com/schema/vidispine}value')])))
+
+        search = self._fake_search(25, requested)
+        for prefetch in (0, 2):
+            del fields_requested[:]
+            with patch("gnmvidispine.vs_search.VSSearchResult.request", side_effect=search), \
+                    patch("gnmvidispine.vs_search.VSSearchResult.stream_request",
+                          side_effect=lambda path, **kwargs: list(search(path, **kwargs))):
+                with patch("gnmvidispine.vs_item.VSItem.request", side_effect=item_request):
+                    titles = [i.get("title") for i in self._result().results(prefetch=prefetch, fields=["title", "duration"])]
+            self.assertEqual(titles, ["VX-{0}".format(n) for n in range(1, 26)])
+            self.assertEqual(fields_requested, ["title,duration"]*3)
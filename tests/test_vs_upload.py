@@ -0,0 +1,162 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+import os
+import tempfile
+import threading
+from mock import patch
+
+
+class TestVSChunkedUpload(unittest2.TestCase):
+    fake_host = 'localhost'
+    fake_port = 8080
+    fake_user = 'username'
+    fake_passwd = 'password'
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, "media.dat")
+        self.content = bytes(bytearray([n % 251 for n in range(0, 100000)]))
+        with open(self.filename, "wb") as f:
+            f.write(self.content)
+
+    def tearDown(self):
+        for name in os.listdir(self.tmpdir):
+            os.unlink(os.path.join(self.tmpdir, name))
+        os.rmdir(self.tmpdir)
+
+    def _connection(self):
+        from gnmvidispine.vidispine_api import VSApi
+        return VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+
+    def _fake_server(self, received, fail_at=None):
+        """
+        returns a raw_request() replacement recording the chunks sent as (transferId, index, data).  If fail_at is given,
+        the chunk starting at that index fails with the given HTTPError code once.
+        """
+        from gnmvidispine.vidispine_api import HTTPError
+        lock = threading.Lock()
+        failed = []
+
+        def raw_request(path, method="GET", matrix=None, query=None, body=None, content_type='application/xml',
+                        rawData=False, extra_headers=None):
+            index = extra_headers['index']
+            with lock:
+                if fail_at is not None and index == fail_at[0] and not failed:
+                    failed.append(index)
+                    raise HTTPError(fail_at[1], method, path, fail_at[1], "error", "")
+                received.append((query['transferId'], index, bytes(body)))
+            return b""
+        return raw_request
+
+    def _reassemble(self, received):
+        data = bytearray(len(self.content))
+        for transfer_id, index, chunk in received:
+            data[index:index+len(chunk)] = chunk
+        return bytes(data)
+
+    def test_parallel(self):
+        from gnmvidispine.vs_upload import VSChunkedUpload
+        received = []
+        with patch("gnmvidispine.vs_upload.VSApi.raw_request", side_effect=self._fake_server(received)):
+            upload = VSChunkedUpload(self._connection(), "/item/VX-1/shape/raw", self.filename,
+                                     query={'tag': 'original'}, threads=4, chunk_size=3000)
+            upload.run()
+        self.assertEqual(len(received), 34)
+        self.assertEqual(sorted([r[1] for r in received]), list(range(0, 100000, 3000)))
+        self.assertEqual(len(set([r[0] for r in received])), 1)
+        self.assertEqual(self._reassemble(received), self.content)
+        self.assertEqual(upload.bytes_sent, 100000)
+        self.assertEqual(upload.chunks_sent, 34)
+
+    def test_sender_settings(self):
+        import http.client
+        from gnmvidispine.vidispine_api import VSApi
+        from gnmvidispine.vs_upload import VSChunkedUpload
+        from gnmvidispine.vs_governor import VSRequestGovernor
+        governor = VSRequestGovernor()
+        connection = VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd,
+                           https=True, governor=governor)
+        sender = VSChunkedUpload(connection, "/item/VX-1/shape/raw", self.filename)._sender()
+        self.assertIsInstance(sender._conn, http.client.HTTPSConnection)
+        self.assertIs(sender.governor, governor)
+
+    def test_query(self):
+        from gnmvidispine.vs_upload import VSChunkedUpload
+        with patch("gnmvidispine.vs_upload.VSApi.raw_request", return_value=b"") as mock_request:
+            VSChunkedUpload(self._connection(), "/item/VX-1/shape/raw", self.filename, query={'tag': 'original'},
+                            upload_filename="renamed.dat", threads=1, chunk_size=200000).run()
+        kwargs = mock_request.call_args[1]
+        self.assertEqual(mock_request.call_args[0][0], "/item/VX-1/shape/raw")
+        self.assertEqual(kwargs['method'], "POST")
+        self.assertEqual(kwargs['query']['tag'], 'original')
+        self.assertEqual(kwargs['query']['filename'], 'renamed.dat')
+        self.assertEqual(kwargs['extra_headers'], {'size': 100000, 'index': 0})
+        self.assertEqual(kwargs['content_type'], 'application/octet-stream')
+
+    def test_empty_file(self):
+        from gnmvidispine.vs_upload import VSChunkedUpload
+        empty = os.path.join(self.tmpdir, "empty.dat")
+        open(empty, "wb").close()
+        received = []
+        with patch("gnmvidispine.vs_upload.VSApi.raw_request", side_effect=self._fake_server(received)):
+            VSChunkedUpload(self._connection(), "/item/VX-1/shape/raw", empty).run()
+        self.assertEqual([(r[1], r[2]) for r in received], [(0, b"")])
+
+    def test_retry(self):
+        from gnmvidispine.vs_upload import VSChunkedUpload
+        received = []
+        with patch("gnmvidispine.vs_upload.VSApi.raw_request", side_effect=self._fake_server(received, (30000, 503))):
+            with patch("gnmvidispine.vs_upload.time.sleep") as mock_sleep:
+                VSChunkedUpload(self._connection(), "/item/VX-1/shape/raw", self.filename, threads=2,
+                                chunk_size=10000).run()
+        self.assertEqual(mock_sleep.call_count, 1)
+        self.assertEqual(self._reassemble(received), self.content)
+
+    def test_resume(self):
+        from gnmvidispine.vs_upload import VSChunkedUpload
+        from gnmvidispine.vidispine_api import HTTPError
+        journal = os.path.join(self.tmpdir, "media.dat.upload")
+        first = []
+        with patch("gnmvidispine.vs_upload.VSApi.raw_request", side_effect=self._fake_server(first, (50000, 400))):
+            with self.assertRaises(HTTPError):
+                VSChunkedUpload(self._connection(), "/item/VX-1/shape/raw", self.filename, threads=1,
+                                chunk_size=10000, journal=journal).run()
+        self.assertTrue(os.path.exists(journal))
+        self.assertEqual([r[1] for r in first], [0, 10000, 20000, 30000, 40000])
+
+        second = []
+        with patch("gnmvidispine.vs_upload.VSApi.raw_request", side_effect=self._fake_server(second)):
+            VSChunkedUpload(self._connection(), "/item/VX-1/shape/raw", self.filename, threads=2,
+                            chunk_size=10000, journal=journal).run()
+        self.assertEqual(sorted([r[1] for r in second]), [50000, 60000, 70000, 80000, 90000])
+        self.assertEqual(set([r[0] for r in first + second]), set([first[0][0]]))
+        self.assertEqual(self._reassemble(first + second), self.content)
+        self.assertFalse(os.path.exists(journal))
+
+    def test_journal_other_file(self):
+        from gnmvidispine.vs_upload import VSUploadJournal
+        journal = VSUploadJournal(os.path.join(self.tmpdir, "journal"))
+        self.assertFalse(journal.begin({'file': 'a'}))
+        journal.save("abc", [(0, 10)])
+        self.assertTrue(VSUploadJournal(journal.filename).begin({'file': 'a'}))
+        self.assertFalse(VSUploadJournal(journal.filename).begin({'file': 'b'}))
+
+    def test_adjust_chunk_size(self):
+        from gnmvidispine.vs_upload import VSChunkedUpload
+        upload = VSChunkedUpload(self._connection(), "/item/VX-1/shape/raw", self.filename, target_seconds=2.0)
+        upload._adjust_chunk_size(10*1024*1024, 1.0)
+        self.assertEqual(upload.chunk_size, 20*1024*1024)
+        upload._adjust_chunk_size(1024, 10.0)
+        self.assertEqual(upload.chunk_size % upload.chunk_granularity, 0)
+        self.assertLess(upload.chunk_size, 20*1024*1024)
+        upload._adjust_chunk_size(1024*1024*1024, 0.1)
+        self.assertEqual(upload.chunk_size, upload.max_chunk_size)
+
+    def test_read_without_mmap(self):
+        from gnmvidispine.vs_upload import VSChunkedUpload
+        received = []
+        with patch("gnmvidispine.vs_upload.VSApi.raw_request", side_effect=self._fake_server(received)):
+            with patch("gnmvidispine.vs_upload.mmap.mmap", side_effect=OSError("no mmap")):
+                VSChunkedUpload(self._connection(), "/item/VX-1/shape/raw", self.filename, threads=3,
+                                chunk_size=7000).run()
+        self.assertEqual(self._reassemble(received), self.content)
@@ -0,0 +1,101 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+import xml.etree.ElementTree as ET
+
+
+class TestVSXml(unittest2.TestCase):
+    sample_xml = """<?xml version="1.0" encoding="UTF-8"?>
+<ItemDocument xmlns="http://xml.vidispine.com/schema/vidispine" id="VX-1234">
+  <metadata>
+    <timespan start="-INF" end="+INF">
+      <field><name>title</name><value>Test item</value></field>
+      <field><name>gnm_asset_category</name><value>Rushes</value><value>Master</value></field>
+      <field><name>empty_field</name><value/></field>
+    </timespan>
+  </metadata>
+</ItemDocument>"""
+
+    def setUp(self):
+        from gnmvidispine import vs_xml
+        self.previous_backend = vs_xml.backend()
+
+    def tearDown(self):
+        from gnmvidispine import vs_xml
+        vs_xml.set_backend(self.previous_backend)
+
+    def _check_paths(self, root):
+        from gnmvidispine.vs_xml import vs_path
+
+        fields = vs_path("vs:metadata/vs:timespan/vs:field").findall(root)
+        self.assertEqual(len(fields), 3)
+        self.assertEqual(vs_path("vs:name").text(fields[0]), "title")
+        self.assertEqual([n.text for n in vs_path("vs:value").findall(fields[1])], ["Rushes", "Master"])
+        self.assertEqual(vs_path("vs:value").text(fields[2], "default"), None)
+        self.assertEqual(vs_path("vs:nothere").text(fields[2], "default"), "default")
+        self.assertIsNone(vs_path("vs:nothere").find(root))
+
+    def test_paths_stdlib(self):
+        from gnmvidispine import vs_xml
+        vs_xml.set_backend("stdlib")
+        root = vs_xml.fromstring(self.sample_xml)
+        self.assertIsInstance(root, ET.Element)
+        self._check_paths(root)
+
+    def test_paths_lxml(self):
+        from gnmvidispine import vs_xml
+        if not vs_xml.lxml_available():
+            self.skipTest("lxml is not installed")
+        vs_xml.set_backend("lxml")
+        root = vs_xml.fromstring(self.sample_xml)
+        self.assertTrue(vs_xml.is_lxml_element(root))
+        self._check_paths(root)
+
+    def test_vs_path_cached(self):
+        from gnmvidispine.vs_xml import vs_path
+        self.assertIs(vs_path("vs:item/vs:id"), vs_path("vs:item/vs:id"))
+        self.assertIs(vs_path("vs:id", "{http://xml.vidispine.com/schema/vidispine}"), vs_path("vs:id"))
+        self.assertIsNot(vs_path("vs:id", "http://example.com/other"), vs_path("vs:id"))
+
+    def test_set_backend(self):
+        from gnmvidispine import vs_xml
+        self.assertEqual(vs_xml.set_backend("stdlib"), "stdlib")
+        self.assertEqual(vs_xml.backend(), "stdlib")
+        with self.assertRaises(ValueError):
+            vs_xml.set_backend("libxml3")
+        self.assertEqual(vs_xml.backend(), "stdlib")
+
+        if vs_xml.lxml_available():
+            self.assertEqual(vs_xml.set_backend("auto"), "lxml")
+        else:
+            with self.assertRaises(vs_xml.XMLBackendError):
+                vs_xml.set_backend("lxml")
+            self.assertEqual(vs_xml.set_backend("auto"), "stdlib")
+
+    def test_mixed_backends(self):
+        from gnmvidispine import vs_xml
+        if not vs_xml.lxml_available():
+            self.skipTest("lxml is not installed")
+        vs_xml.set_backend("lxml")
+        root = vs_xml.fromstring(self.sample_xml)
+
+        newnode = ET.Element("{http://xml.vidispine.com/schema/vidispine}extra")
+        newnode.text = "added"
+        appended = vs_xml.append(root, newnode)
+        self.assertTrue(vs_xml.is_lxml_element(appended))
+        self.assertEqual(vs_xml.vs_path("vs:extra").text(root), "added")
+
+        child = vs_xml.SubElement(root, "{http://xml.vidispine.com/schema/vidispine}child")
+        self.assertTrue(vs_xml.is_lxml_element(child))
+        self.assertIs(vs_xml.vs_path("vs:child").find(root), child)
+        self.assertIn(b"<extra>added</extra>", vs_xml.tostring(root))
+
+    def test_tostring_declaration(self):
+        from gnmvidispine import vs_xml
+        if not vs_xml.lxml_available():
+            self.skipTest("lxml is not installed")
+        for name in ("stdlib", "lxml"):
+            vs_xml.set_backend(name)
+            root = vs_xml.fromstring(self.sample_xml)
+            self.assertTrue(vs_xml.tostring(root, encoding="utf8").startswith(b"<?xml version='1.0' encoding='utf8'?>"),
+                            name)
+            self.assertFalse(vs_xml.tostring(root).startswith(b"<?xml"), name)
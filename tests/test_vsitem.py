@@ -197,6 +197,43 @@ class TestVSItem(unittest2.TestCase):
             self.assertEqual(i.get("someotherfield",allowArray=True),["valueone","valuetwo"])
             self.assertEqual(i.name,"VX-1234")
 
+    def test_populate_many(self):
+        """
+        populate_many should load all of the items with one search, and fall back to populate() for anything not returned
+        """
+        search_result = """<?xml version="1.0" encoding="UTF-8"?>
+        <ItemListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+        <hits>2</hits>
+        <item id="VX-2" start="-INF" end="+INF"><metadata><timespan start="-INF" end="+INF">
+            <field><name>title</name><value>second</value></field>
+        </timespan></metadata></item>
+        <item id="VX-1" start="-INF" end="+INF"><metadata><timespan start="-INF" end="+INF">
+            <field><name>title</name><value>first</value></field>
+        </timespan></metadata></item>
+        </ItemListDocument>"""
+
+        with patch("gnmvidispine.vs_item.VSItem.request", side_effect=[ET.fromstring(search_result), ET.fromstring(self.testdoc)]) as mock_request:
+            from gnmvidispine.vs_item import VSItem
+            i = VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+            result = i.populate_many(["VX-1", "VX-2", "VX-1234"], specificFields=('title','sometestfield'))
+
+            self.assertEqual([item.name for item in result], ["VX-1", "VX-2", "VX-1234"])
+            self.assertEqual(result[0].get("title"), "first")
+            self.assertEqual(result[1].get("title"), "second")
+            self.assertEqual(result[2].get("sometestfield"), "sometestvalue")
+            self.assertEqual(result[0].dataContent.find('{http://xml.vidispine.com/schema/vidispine}item').attrib['id'], "VX-1")
+
+            self.assertEqual(mock_request.call_count, 2)
+            args, kwargs = mock_request.call_args_list[0]
+            self.assertEqual(args[0], "/item")
+            self.assertEqual(kwargs['method'], "PUT")
+            self.assertEqual(kwargs['matrix'], {'number': 3})
+            self.assertEqual(kwargs['query'], {'content': 'metadata', 'field': 'title,sometestfield'})
+            searchdoc = ET.fromstring(kwargs['body'])
+            self.assertEqual([v.text for v in searchdoc.findall('{http://xml.vidispine.com/schema/vidispine}field/{http://xml.vidispine.com/schema/vidispine}value')],
+                             ["VX-1", "VX-2", "VX-1234"])
+            mock_request.assert_called_with("/item/VX-1234/metadata;field=title,sometestfield", method="GET")
+
     def test_fromxml(self):
         from gnmvidispine.vs_item import VSItem
         i = VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
@@ -205,6 +242,100 @@ class TestVSItem(unittest2.TestCase):
         self.assertEqual(i.get("sometestfield"),"sometestvalue")
         self.assertEqual(i.get("someotherfield", allowArray=True),["valueone","valuetwo"])
 
+    def test_metadata_path_fields(self):
+        from gnmvidispine.vs_item import VSItem
+        i = VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        self.assertEqual(i._metadata_path("VX-1", "item", ["title"]), "/item/VX-1/metadata;field=title")
+        #a collection's name comes from its collectionId field, so that is always asked for
+        self.assertEqual(i._metadata_path("VX-2", "collection", ("title",)),
+                         "/collection/VX-2/metadata;field=title,collectionId")
+        self.assertEqual(i._metadata_path("VX-2", "collection", ["collectionId", "title"]),
+                         "/collection/VX-2/metadata;field=collectionId,title")
+        self.assertEqual(i._metadata_path("VX-2", "collection"), "/collection/VX-2/metadata")
+
+    def test_from_search_result_json(self):
+        from gnmvidispine.vs_item import VSItem
+        from gnmvidispine.vidispine_api import VSNotFound
+        node = {'id': 'VX-12', 'start': '-INF', 'end': '+INF',
+                'metadata': {'timespan': [{'start': '-INF', 'end': '+INF',
+                                           'field': [{'name': 'title', 'value': [{'value': 'the title'}]}]}]},
+                'shape': [{'id': 'VX-30', 'tag': ['original'], 'mimeType': 'video/mp4',
+                           'containerComponent': {'file': [{'id': 'VX-40', 'uri': ['file:///media/a.mp4']}]}}],
+                'thumbnails': {'uri': ['http://vshost:8080/API/thumbnail/VX-1/VX-12/0@PAL']}}
+        i = VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        with patch("gnmvidispine.vs_item.VSItem.request") as mock_request:
+            i.fromSearchResult(node, content=['metadata', 'shape', 'thumbnail'])
+            self.assertEqual(i.name, "VX-12")
+            self.assertEqual(i.get("title"), "the title")
+            shape = i.get_shape("original")
+            self.assertEqual(shape.name, "VX-30")
+            self.assertEqual(list(shape.fileURIs()), ["file:///media/a.mp4"])
+            self.assertEqual(i.thumbnails().thumbnail_urls, ["/thumbnail/VX-1/VX-12/0@PAL"])
+            with self.assertRaises(VSNotFound):
+                i.get_shape("lowres")
+            mock_request.assert_not_called()
+
+        #asked for, but there were none
+        i = VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        with patch("gnmvidispine.vs_item.VSItem.request") as mock_request:
+            i.fromSearchResult({'id': 'VX-13'}, content=['shape'])
+            self.assertEqual(list(i.shapes()), [])
+            mock_request.assert_not_called()
+
+    def test_fromxml_lazy(self):
+        from gnmvidispine.vs_item import VSItem
+        doc = """<?xml version="1.0" encoding="UTF-8"?>
+<MetadataListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+    <item id="VX-1234">
+    <metadata>
+        <timespan end="+INF" start="-INF">
+            <field><name>title</name><value>the title</value></field>
+            <field><name>empty</name></field>
+            <group>
+                <name>Asset</name>
+                <field><name>title</name><value>another title</value></field>
+                <field><name>asset_field</name><value>asset value</value></field>
+            </group>
+        </timespan>
+    </metadata>
+    </item>
+</MetadataListDocument>"""
+        i = VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        with patch("gnmvidispine.vs_item.VSItem.makeContentDict") as mock_make:
+            i.fromXML(doc)
+            self.assertEqual(i.get("asset_field"), "asset value")
+            self.assertEqual(i.get("title", allowArray=True), ["the title", "another title"])
+            self.assertEqual(i.get("title"), "the title|another title")
+            self.assertIsNone(i.get("empty"))
+            self.assertIsNone(i.get("nonexistent"))
+            mock_make.assert_not_called()
+
+        #the whole dictionary is the same as it would be if it had been decoded straight away
+        self.assertEqual(i.contentDict, {'title': ['the title', 'another title'], 'asset_field': 'asset value'})
+        self.assertEqual(i.get("asset_field"), "asset value")
+
+        #loading a second document adds to what is already there, as before
+        i.fromXML(doc)
+        self.assertEqual(i.get("asset_field", allowArray=True), ["asset value", "asset value"])
+
+        i.contentDict = {}
+        self.assertIsNone(i.get("asset_field"))
+
+    def test_fromjson_lazy(self):
+        from gnmvidispine.vs_item import VSItem
+        doc = {'item': [{'id': 'VX-1234', 'metadata': {'timespan': [{'start': '-INF', 'end': '+INF',
+                'field': [{'name': 'title', 'value': [{'value': 'the title'}]},
+                          {'name': 'count', 'value': [{'value': 3}]}],
+                'group': [{'name': 'Asset', 'field': [{'name': 'title', 'value': [{'value': 'another title'}]}]}]}]}}]}
+        i = VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        with patch("gnmvidispine.vs_item.VSItem.makeContentDictJSON") as mock_make:
+            i.fromJSON(doc)
+            self.assertEqual(i.name, "VX-1234")
+            self.assertEqual(i.get("count"), "3")
+            self.assertEqual(i.get("title", allowArray=True), ["the title", "another title"])
+            mock_make.assert_not_called()
+        self.assertEqual(i.contentDict, {'title': ['the title', 'another title'], 'count': '3'})
+
     def test_fromxml_can_code_with_ItemDocument(self):
         from gnmvidispine.vs_item import VSItem
         i = VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
@@ -315,10 +446,20 @@ class TestVSItem(unittest2.TestCase):
         with patch('gnmvidispine.vs_item.VSItem.request', return_value=ET.fromstring(job_doc)) as mock_request:
             with patch('gnmvidispine.vs_item.VSJob.request', return_value=ET.fromstring(job_doc)) as mock_request_two:
                 from gnmvidispine.vs_item import VSItem, VSTranscodeError
+                from gnmvidispine.vs_job import VSJobFailed
                 i = VSItem(host=self.fake_host,port=self.fake_port,user=self.fake_user,passwd=self.fake_passwd)
                 with self.assertRaises(VSTranscodeError) as ex:
                     i.transcode("VX-3245")
 
+        #a job that disappears has not produced anything either
+        job_doc = job_doc.replace("FAILED", "DISAPPEARED")
+        with patch('gnmvidispine.vs_item.VSItem.request', return_value=ET.fromstring(job_doc)) as mock_request:
+            with patch('gnmvidispine.vs_item.VSJob.request', return_value=ET.fromstring(job_doc)) as mock_request_two:
+                with self.assertRaises(VSTranscodeError) as ex:
+                    i.transcode("VX-3245")
+                with self.assertRaises(VSJobFailed):
+                    i.export("lowres", '/test/path', use_media_filename=False)
+
     def test_path(self):
         test_item_doc = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
         <ItemDocument id="VX-1234" xmlns="http://xml.vidispine.com/schema/vidispine">
@@ -21,8 +21,11 @@ class TestVSStorage(unittest2.TestCase):
             self.body = content
             self.reason = reason
         
-        def read(self):
-            return self.body
+        def read(self, amt=None):
+            if amt is None:
+                return self.body
+            chunk, self.body = self.body[:amt], self.body[amt:]
+            return chunk
     
     def test_download(self):
         from gnmvidispine.vs_storage import VSFile,VSStorage
@@ -481,6 +484,81 @@ class TestVSStorage(unittest2.TestCase):
         self.assertEqual(query_dict['path'], ['/'])
         self.assertEqual(query_dict['state'], ['CLOSED'])
 
+    def test_files_compact(self):
+        from gnmvidispine.vs_storage import VSStorage, VSFileRecord, VSFile
+
+        s = VSStorage(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+
+        s.sendAuthorized = MagicMock(side_effect=[self.MockedResponse(200, self.test_list_doc),
+                                                  self.MockedResponse(200, self.test_list_doc_end)])
+        files_list = [f for f in s.files(compact=True)]
+        self.assertEqual(len(files_list),10)
+        self.assertIsInstance(files_list[0], VSFileRecord)
+        self.assertFalse(hasattr(files_list[0], '__dict__'))
+
+        s.sendAuthorized = MagicMock(side_effect=[self.MockedResponse(200, self.test_list_doc),
+                                                  self.MockedResponse(200, self.test_list_doc_end)])
+        full_list = [f for f in s.files()]
+        self.assertEqual([f.json_data() for f in files_list], [f.json_data() for f in full_list])
+
+    def test_file_record(self):
+        from gnmvidispine.vs_storage import VSStorage, VSFileRecord
+        from gnmvidispine.vs_item import VSItem
+        import xml.etree.ElementTree as ET
+
+        s = VSStorage(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        doc = ET.fromstring("""<FileDocument xmlns="http://xml.vidispine.com/schema/vidispine"><id>VX-5</id>
+            <path>some/file.mxf</path><uri>file:///first</uri><uri>file:///second</uri><state>CLOSED</state>
+            <size>1234</size><hash>abcd</hash><storage>VX-2</storage><item><id>VX-99</id></item></FileDocument>""")
+        f = VSFileRecord(s, doc)
+        self.assertEqual(f.name, "VX-5")
+        self.assertEqual(f.path, "some/file.mxf")
+        self.assertEqual(f.uri, "file:///first")
+        self.assertEqual(f.size, "1234")
+        self.assertEqual(f.hash, "abcd")
+        self.assertEqual(f.storageName, "VX-2")
+        self.assertIsNone(f.timestamp)
+        self.assertEqual(f.itemId, "VX-99")
+        self.assertIs(f.parent, s)
+
+        #the item is only made when it is asked for, and then kept
+        self.assertIsNone(f._item)
+        item = f.memberOfItem
+        self.assertIsInstance(item, VSItem)
+        self.assertEqual(item.name, "VX-99")
+        self.assertEqual(item.host, self.fake_host)
+        self.assertIs(f.memberOfItem, item)
+        self.assertEqual(f.json_data()['memberOfItem'], "VX-99")
+
+        s.sendAuthorized = MagicMock(return_value=self.MockedResponse(200, "test content"))
+        f.download()
+        s.sendAuthorized.assert_called_with('GET', '/API/storage/file/VX-5/data', '', {'Accept': '*'})
+
+        f = VSFileRecord(s, {'id': 'VX-6', 'path': 'other.mxf', 'size': 42, 'item': [{'id': 'VX-100'}]})
+        self.assertEqual(f.name, "VX-6")
+        self.assertEqual(f.size, "42")
+        self.assertIsNone(f.state)
+        self.assertEqual(f.memberOfItem.name, "VX-100")
+
+        f = VSFileRecord(s, {'id': 'VX-7'})
+        self.assertIsNone(f.memberOfItem)
+
+    def test_file_record_storage(self):
+        from gnmvidispine.vs_storage import VSFileRecord
+        from gnmvidispine.vidispine_api import VSApi
+        import xml.etree.ElementTree as ET
+
+        conn = VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        doc = ET.fromstring("""<FileDocument xmlns="http://xml.vidispine.com/schema/vidispine"><id>VX-5</id>
+            <storage>VX-2</storage></FileDocument>""")
+        with patch("gnmvidispine.vs_storage.VSStorage.populate") as mock_populate:
+            f = VSFileRecord(None, doc, conn=conn)
+            mock_populate.assert_not_called()
+            storage = f.parent
+            mock_populate.assert_called_once_with("VX-2")
+            self.assertIs(f.parent, storage)
+            self.assertEqual(storage.host, self.fake_host)
+
     def test_file_count(self):
         from gnmvidispine.vs_storage import VSStorage
 
@@ -526,4 +604,119 @@ class TestVSStorage(unittest2.TestCase):
         self.assertIn('number=0', parsed_url.params)
         query_dict = parse_qs(parsed_url.query)
         self.assertEqual(query_dict['path'], ['/'])
-        self.assertEqual(query_dict['state'], ['LOST'])
\ No newline at end of file
+        self.assertEqual(query_dict['state'], ['LOST'])
+
+    def _fake_file_listing(self, counts, requested, fail_at=None):
+        """
+        returns a request() replacement serving a file listing of counts[path] files under each path
+        """
+        import threading
+        import xml.etree.ElementTree as ET
+        lock = threading.Lock()
+
+        def request(path, method="GET", matrix=None, query=None, body=None, accept='application/xml'):
+            start, number = matrix['start'], matrix['number']
+            if number > 0:
+                if fail_at is not None and start == fail_at:
+                    raise IOError("connection lost")
+                with lock:
+                    requested.append((query['path'], start))
+            files = "".join(["<file><id>VX-{0}{1}</id><path>{0}/{1}</path><state>CLOSED</state></file>".format(query['path'], n)
+                             for n in range(start, min(start+number, counts[query['path']]))])
+            return ET.fromstring("""<FileListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+                <hits>{0}</hits>{1}</FileListDocument>""".format(counts[query['path']], files))
+        return request
+
+    def test_files_parallel(self):
+        from gnmvidispine.vs_storage import VSStorage
+        requested = []
+        with patch("gnmvidispine.vs_storage.VSStorage.request", side_effect=self._fake_file_listing({'/': 95}, requested)):
+            s = VSStorage(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+            paths = [f.path for f in s.files_parallel(pageSize=10, threads=3)]
+        self.assertEqual(sorted(paths), sorted(["//{0}".format(n) for n in range(0, 95)]))
+        self.assertEqual(sorted(requested), [('/', n) for n in range(0, 100, 10)])
+
+    def test_files_parallel_paths(self):
+        from gnmvidispine.vs_storage import VSStorage
+        requested = []
+        counts = {'/a': 25, '/b': 20}
+        with patch("gnmvidispine.vs_storage.VSStorage.request", side_effect=self._fake_file_listing(counts, requested)):
+            s = VSStorage(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+            names = [f.name for f in s.files_parallel(pageSize=10, paths=['/a', '/b'])]
+        self.assertEqual(len(names), 45)
+        self.assertEqual(len(set(names)), 45)
+        #/b is exactly two pages, so the third is asked for in case files were added during the listing
+        self.assertEqual(sorted(requested), [('/a', 0), ('/a', 10), ('/a', 20), ('/b', 0), ('/b', 10), ('/b', 20)])
+
+    def test_files_parallel_resume(self):
+        import os
+        import tempfile
+        from gnmvidispine.vs_storage import VSStorage
+        checkpoint = os.path.join(tempfile.mkdtemp(), "listing.json")
+        s = VSStorage(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+
+        first_run = []
+        with patch("gnmvidispine.vs_storage.VSStorage.request",
+                   side_effect=self._fake_file_listing({'/': 45}, [], fail_at=30)):
+            with self.assertRaises(IOError):
+                for f in s.files_parallel(pageSize=10, threads=1, checkpoint=checkpoint):
+                    first_run.append(f.name)
+        self.assertEqual(len(first_run), 30)
+        self.assertTrue(os.path.exists(checkpoint))
+
+        requested = []
+        with patch("gnmvidispine.vs_storage.VSStorage.request", side_effect=self._fake_file_listing({'/': 45}, requested)):
+            with self.assertRaises(ValueError):
+                list(s.files_parallel(pageSize=20, threads=1, checkpoint=checkpoint))
+            second_run = [f.name for f in s.files_parallel(pageSize=10, threads=1, checkpoint=checkpoint)]
+        self.assertEqual(requested, [('/', 30), ('/', 40)])
+        self.assertEqual(sorted(first_run + second_run), sorted(["VX-/{0}".format(n) for n in range(0, 45)]))
+        self.assertFalse(os.path.exists(checkpoint))
+        self.assertFalse(os.path.exists(checkpoint + ".journal"))
+
+    def test_checkpoint_journal(self):
+        import os
+        import json
+        import tempfile
+        from gnmvidispine.vs_storage import VSFileListCheckpoint
+        filename = os.path.join(tempfile.mkdtemp(), "listing.json")
+        spec = {'storage': 'VX-1', 'paths': ['/']}
+        checkpoint = VSFileListCheckpoint(filename)
+        checkpoint.begin(spec)
+        checkpoint.done('/', 0)
+        checkpoint.done('/', 10)
+        #pages are appended to the journal rather than rewriting the checkpoint each time
+        with open(filename) as f:
+            self.assertEqual(json.load(f)['done'], [])
+        with open(filename + ".journal", "a") as f:
+            f.write('["/", 2')     #as if killed part way through a write
+
+        resumed = VSFileListCheckpoint(filename)
+        resumed.begin(spec)
+        self.assertTrue(resumed.is_done('/', 10))
+        self.assertFalse(resumed.is_done('/', 20))
+        self.assertFalse(os.path.exists(filename + ".journal"))
+        with open(filename) as f:
+            self.assertEqual(json.load(f)['done'], [['/', 0], ['/', 10]])
+        resumed.finish()
+        self.assertFalse(os.path.exists(filename))
+
+    def test_files_parallel_settings(self):
+        import http.client
+        from gnmvidispine.vs_storage import VSStorage
+        from gnmvidispine.vs_governor import VSRequestGovernor
+        governor = VSRequestGovernor()
+        listers = []
+        listing = self._fake_file_listing({'/': 15}, [])
+
+        def file_request(lister, page_path, start, number, state, include_item):
+            listers.append(lister)
+            return listing(page_path, matrix={'start': start, 'number': number}, query={'path': page_path})
+
+        with patch("gnmvidispine.vs_storage.VSStorage.request", side_effect=listing):
+            with patch("gnmvidispine.vs_storage.VSStorage._file_request", autospec=True, side_effect=file_request):
+                s = VSStorage(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd,
+                              https=True, governor=governor)
+                self.assertEqual(len(list(s.files_parallel(pageSize=10, threads=1))), 15)
+        self.assertIsInstance(listers[0]._conn, http.client.HTTPSConnection)
+        self.assertIs(listers[0].governor, governor)